@@ -2,11 +2,18 @@
 """
 AI引擎模块
 包含Vanna AI和其他AI相关的服务组件
-"""
 
-from .vanna_service import get_vanna_service, init_vanna_service
+Vanna服务在首次访问时才导入，使用检索、候选生成等子模块时不依赖Vanna及其向量库
+"""
 
 __all__ = [
     'get_vanna_service',
     'init_vanna_service'
-] 
\ No newline at end of file
+]
+
+
+def __getattr__(name):
+    if name in __all__:
+        from . import vanna_service
+        return getattr(vanna_service, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
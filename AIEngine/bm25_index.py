@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+关键词倒排索引模块
+对训练内容建立BM25倒排索引，弥补向量检索对精确业务术语和表名匹配不敏感的问题：
+
+- 中文按相邻二字切分（单独出现的汉字保留单字），不依赖分词词典；不收录单字可避免常用字形成超长倒排表
+- 标识符整体保留，同时按下划线和驼峰拆分（order_items、orderItems均可由items命中）
+- 倒排表按词项追加，检索时转换为NumPy数组向量化计算BM25；删除只标记失效，失效文档较多时压缩
+"""
+import re
+import math
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+_TOKEN = re.compile(r'[A-Za-z][A-Za-z0-9_]*|\d+|[一-鿿]+')
+_CAMEL = re.compile(r'[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+')
+
+def tokenize(content: str) -> List[str]:
+    """切分中文二字、标识符及其子词"""
+    tokens = []
+    for match in _TOKEN.finditer(content or ''):
+        word = match.group()
+        if '一' <= word[0] <= '鿿':
+            if len(word) == 1:
+                tokens.append(word)
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+            continue
+        tokens.append(word.lower())
+        parts = [part.lower() for segment in word.split('_') for part in _CAMEL.findall(segment) if len(part) > 1]
+        if len(parts) > 1 or (parts and parts[0] != tokens[-1]):
+            tokens.extend(parts)
+    return tokens
+
+class _Posting:
+    __slots__ = ('docs', 'freqs', 'arrays', 'weights', 'max_weight', 'weights_version')
+
+    def __init__(self):
+        self.docs: List[int] = []
+        self.freqs: List[int] = []
+        self.arrays: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self.weights: Optional[np.ndarray] = None
+        self.max_weight = 0.0
+        self.weights_version = -1
+
+    def get_arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        if self.arrays is None:
+            self.arrays = (np.asarray(self.docs, dtype=np.int64), np.asarray(self.freqs, dtype=np.float32))
+        return self.arrays
+
+    def append(self, doc: int, freq: int):
+        self.docs.append(doc)
+        self.freqs.append(freq)
+        self.arrays = None
+        self.weights = None
+
+class BM25Index:
+    """支持增量增删的BM25倒排索引"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, initial_capacity: int = 1024):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._postings: Dict[str, _Posting] = {}
+        self._doc_ids: List[str] = []
+        self._doc_index: Dict[str, int] = {}
+        self._lengths = np.zeros(initial_capacity, dtype=np.float32)
+        self._alive = np.zeros(initial_capacity, dtype=bool)
+        self._types = np.zeros(initial_capacity, dtype=np.int16)
+        self._type_codes: Dict[str, int] = {}
+        self._alive_count = 0
+        self._total_length = 0.0
+        # 词频权重依赖平均文档长度，按快照缓存，平均长度漂移超过阈值后整体失效
+        self._average_length = 1.0
+        self._weights_version = 0
+
+    def __len__(self) -> int:
+        return self._alive_count
+
+    def __contains__(self, doc_id) -> bool:
+        return str(doc_id) in self._doc_index
+
+    def _refresh_average(self):
+        average = self._total_length / self._alive_count if self._alive_count else 1.0
+        if abs(average - self._average_length) > 0.05 * self._average_length:
+            self._average_length = max(average, 1.0)
+            self._weights_version += 1
+
+    def _term_weights(self, posting: _Posting) -> Tuple[np.ndarray, np.ndarray]:
+        """文档的BM25词频分量 tf*(k1+1) / (tf + k1*(1-b+b*dl/avgdl))"""
+        docs, freqs = posting.get_arrays()
+        if posting.weights is None or posting.weights_version != self._weights_version:
+            norm = self.k1 * (1.0 - self.b + self.b * self._lengths[docs] / self._average_length)
+            posting.weights = (freqs * (self.k1 + 1.0) / (freqs + norm)).astype(np.float32)
+            posting.max_weight = float(posting.weights.max())
+            posting.weights_version = self._weights_version
+        return docs, posting.weights
+
+    def _ensure_capacity(self, size: int):
+        if size <= len(self._lengths):
+            return
+        capacity = max(size, len(self._lengths) * 2)
+        for name in ('_lengths', '_alive', '_types'):
+            old = getattr(self, name)
+            grown = np.zeros(capacity, dtype=old.dtype)
+            grown[:len(old)] = old
+            setattr(self, name, grown)
+
+    def add(self, doc_id, content: str, doc_type: str = ''):
+        """新增或替换文档"""
+        doc_id = str(doc_id)
+        terms = Counter(tokenize(content))
+        with self._lock:
+            self._remove(doc_id)
+            index = len(self._doc_ids)
+            self._ensure_capacity(index + 1)
+            self._doc_ids.append(doc_id)
+            self._doc_index[doc_id] = index
+            length = float(sum(terms.values()))
+            self._lengths[index] = length
+            self._alive[index] = True
+            self._types[index] = self._type_codes.setdefault(doc_type, len(self._type_codes))
+            self._alive_count += 1
+            self._total_length += length
+            for term, freq in terms.items():
+                posting = self._postings.get(term)
+                if posting is None:
+                    posting = self._postings[term] = _Posting()
+                posting.append(index, freq)
+            self._refresh_average()
+
+    def remove(self, doc_id) -> bool:
+        """删除文档，返回是否存在"""
+        with self._lock:
+            removed = self._remove(str(doc_id))
+            dead = len(self._doc_ids) - self._alive_count
+            if removed and dead > max(1000, len(self._doc_ids) // 3):
+                self._compact()
+            return removed
+
+    def _remove(self, doc_id: str) -> bool:
+        index = self._doc_index.pop(doc_id, None)
+        if index is None:
+            return False
+        self._alive[index] = False
+        self._alive_count -= 1
+        self._total_length -= float(self._lengths[index])
+        self._refresh_average()
+        return True
+
+    def _compact(self):
+        """去掉失效文档并重新编号"""
+        size = len(self._doc_ids)
+        keep = np.flatnonzero(self._alive[:size])
+        remap = np.full(size, -1, dtype=np.int64)
+        remap[keep] = np.arange(len(keep))
+
+        for term in list(self._postings):
+            docs, freqs = self._postings[term].get_arrays()
+            mask = remap[docs] >= 0
+            if not mask.any():
+                del self._postings[term]
+                continue
+            posting = _Posting()
+            posting.docs = remap[docs[mask]].tolist()
+            posting.freqs = freqs[mask].astype(int).tolist()
+            self._postings[term] = posting
+        self._weights_version += 1
+
+        self._doc_ids = [self._doc_ids[i] for i in keep]
+        self._doc_index = {doc_id: i for i, doc_id in enumerate(self._doc_ids)}
+        capacity = len(self._lengths)
+        for name in ('_lengths', '_alive', '_types'):
+            old = getattr(self, name)
+            compacted = np.zeros(capacity, dtype=old.dtype)
+            compacted[:len(keep)] = old[keep]
+            setattr(self, name, compacted)
+
+    def search(self, query: str, k: int = 10, doc_type: Optional[str] = None) -> List[Tuple[str, float]]:
+        """
+        BM25检索
+
+        词项按分数上界从高到低累加；当剩余词项上界之和已不足以让新文档进入前k时，
+        剩余的高频词项（倒排表最长）只在已有候选上二分查找补分，不再扫描整个倒排表。
+
+        Returns:
+            [(文档ID, 分数)]，按分数降序
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            if not terms or not self._alive_count:
+                return []
+            size = len(self._doc_ids)
+            mask = self._alive[:size]
+            if doc_type is not None:
+                if doc_type not in self._type_codes:
+                    return []
+                mask = mask & (self._types[:size] == self._type_codes[doc_type])
+
+            total = self._alive_count
+            weighted = []
+            for term in terms:
+                posting = self._postings.get(term)
+                if posting is None:
+                    continue
+                docs, weights = self._term_weights(posting)
+                idf = math.log(1.0 + (total - len(docs) + 0.5) / (len(docs) + 0.5))
+                weighted.append((idf * posting.max_weight, np.float32(idf), docs, weights))
+            if not weighted:
+                return []
+            weighted.sort(key=lambda item: item[0], reverse=True)
+            remaining = [0.0] * (len(weighted) + 1)
+            for i in range(len(weighted) - 1, -1, -1):
+                remaining[i] = remaining[i + 1] + weighted[i][0]
+
+            scores = np.zeros(size, dtype=np.float32)
+            touched, touched_count = [], 0
+            candidates = None
+            for i, (_, idf, docs, weights) in enumerate(weighted):
+                if candidates is None and k <= touched_count < size // 4:
+                    # 已累加文档中的第k高分是前k门槛的下界，剩余上界之和低于门槛时进入补分阶段
+                    seen = np.concatenate(touched)
+                    seen = seen[mask[seen]]
+                    if len(seen) >= k:
+                        threshold = float(np.partition(scores[seen], len(seen) - k)[len(seen) - k])
+                        if remaining[i] < threshold:
+                            candidates = seen[scores[seen] + remaining[i] >= threshold]
+                if candidates is None:
+                    fresh = docs[scores[docs] == 0]
+                    touched.append(fresh)
+                    touched_count += len(fresh)
+                    scores[docs] += idf * weights
+                elif len(candidates) * 8 < len(docs):
+                    positions = np.minimum(np.searchsorted(docs, candidates), len(docs) - 1)
+                    hit = docs[positions] == candidates
+                    scores[candidates[hit]] += idf * weights[positions[hit]]
+                else:
+                    scores[docs] += idf * weights
+
+            if candidates is None:
+                candidates = np.flatnonzero(mask & (scores > 0))
+            if not len(candidates):
+                return []
+            if len(candidates) > k:
+                candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+            candidates = candidates[np.argsort(-scores[candidates])]
+            return [(self._doc_ids[i], float(scores[i])) for i in candidates]
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    倒数排名融合：score(d) = Σ 1 / (k + rank_i(d))
+
+    Args:
+        rankings: 多个检索结果的ID列表，各自按相关度降序
+        k: 平滑常数，越大越弱化头部排名的差异
+    """
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+批量向量计算模块
+训练和语义检索统一通过本模块计算文本向量：
+
+- 按文本内容缓存：键为「模型ID + 规范化文本」的SHA-256，缓存保存在本地SQLite文件，
+  重复训练或重建索引时相同的DDL和文档不再计算
+- 未命中的文本去重后按长度排序分桶，每桶一次前向计算，多个桶由线程池并行执行
+- 默认使用sentence-transformers模型，也可以注入任意批量编码函数
+"""
+import os
+import re
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Callable, Sequence
+import numpy as np
+from config.base_config import Config
+from tools.exceptions import ExternalServiceException
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r'\s+')
+
+# SQLite单条语句的参数数量上限以内
+_LOOKUP_CHUNK = 500
+
+def normalize_text(content: str) -> str:
+    """规范化文本：全角半角统一、合并空白"""
+    return _WHITESPACE.sub(' ', unicodedata.normalize('NFKC', content or '')).strip()
+
+def cache_key(model_id: str, content: str) -> str:
+    """缓存键：模型ID与规范化文本的SHA-256"""
+    return hashlib.sha256(f'{model_id}\0{normalize_text(content)}'.encode('utf-8')).hexdigest()
+
+class EmbeddingCache:
+    """基于SQLite的向量缓存，多个进程可同时读写"""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)')
+        self._conn.commit()
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), _LOOKUP_CHUNK):
+                chunk = keys[start:start + _LOOKUP_CHUNK]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                found.update((key, np.frombuffer(vector, dtype=np.float32)) for key, vector in rows)
+        return found
+
+    def put_many(self, items: Dict[str, np.ndarray]):
+        if not items:
+            return
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)',
+                [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items.items()]
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def _sentence_transformer_encoder(model_name: str, device: str) -> Callable[[List[str]], np.ndarray]:
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        raise ExternalServiceException('未安装sentence-transformers，无法计算文本向量')
+    model = SentenceTransformer(model_name, device=device)
+
+    def _encode(texts: List[str]) -> np.ndarray:
+        return model.encode(texts, batch_size=len(texts), convert_to_numpy=True, show_progress_bar=False)
+    return _encode
+
+class EmbeddingService:
+    """带内容缓存的批量向量计算服务"""
+
+    def __init__(self, model_id: Optional[str] = None, encoder: Optional[Callable[[List[str]], np.ndarray]] = None,
+                 cache: Optional[EmbeddingCache] = None, batch_size: Optional[int] = None,
+                 workers: Optional[int] = None):
+        """
+        Args:
+            model_id: 模型标识，参与缓存键计算，更换模型后旧缓存自动失效
+            encoder: 批量编码函数，默认按model_id加载sentence-transformers模型
+            cache: 向量缓存，默认保存在Config.EMBEDDING_CACHE_DIR
+            batch_size: 每桶文本数
+            workers: 并行计算的线程数
+        """
+        self.model_id = model_id or Config.EMBEDDING_MODEL
+        self._encoder = encoder
+        self._encoder_lock = threading.Lock()
+        self.cache = cache or EmbeddingCache(os.path.join(
+            Config.EMBEDDING_CACHE_DIR, re.sub(r'[^A-Za-z0-9_.-]', '_', self.model_id) + '.sqlite3'
+        ))
+        self.batch_size = batch_size or Config.EMBEDDING_BATCH_SIZE
+        self._executor = ThreadPoolExecutor(max_workers=workers or Config.EMBEDDING_WORKERS,
+                                            thread_name_prefix='embedding')
+        self._stats_lock = threading.Lock()
+        self.stats = {'requested': 0, 'cache_hits': 0, 'encoded': 0, 'batches': 0, 'encode_seconds': 0.0}
+
+    def _get_encoder(self) -> Callable[[List[str]], np.ndarray]:
+        if self._encoder is None:
+            with self._encoder_lock:
+                if self._encoder is None:
+                    self._encoder = _sentence_transformer_encoder(self.model_id, Config.EMBEDDING_DEVICE)
+        return self._encoder
+
+    def _encode_bucket(self, texts: List[str]) -> np.ndarray:
+        started = time.perf_counter()
+        vectors = np.asarray(self._get_encoder()(texts), dtype=np.float32)
+        with self._stats_lock:
+            self.stats['batches'] += 1
+            self.stats['encode_seconds'] += time.perf_counter() - started
+        return vectors
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        计算一组文本的向量
+
+        Returns:
+            (len(texts), dim) float32数组，顺序与输入一致
+        """
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        keys = [cache_key(self.model_id, content) for content in texts]
+        vectors = self.cache.get_many(list(set(keys)))
+
+        # 未命中的文本去重后按长度分桶，相近长度的文本一起计算可减少padding
+        pending: Dict[str, str] = {}
+        for key, content in zip(keys, texts):
+            if key not in vectors and key not in pending:
+                pending[key] = normalize_text(content)
+        if pending:
+            ordered = sorted(pending.items(), key=lambda item: len(item[1]))
+            buckets = [ordered[i:i + self.batch_size] for i in range(0, len(ordered), self.batch_size)]
+            futures = [self._executor.submit(self._encode_bucket, [content for _, content in bucket])
+                       for bucket in buckets]
+            computed = {}
+            for bucket, future in zip(buckets, futures):
+                computed.update(zip((key for key, _ in bucket), future.result()))
+            self.cache.put_many(computed)
+            vectors.update(computed)
+
+        with self._stats_lock:
+            self.stats['requested'] += len(texts)
+            self.stats['cache_hits'] += len(texts) - sum(1 for key in keys if key in pending)
+            self.stats['encoded'] += len(pending)
+        return np.stack([vectors[key] for key in keys])
+
+    def embed_one(self, content: str) -> np.ndarray:
+        """计算单条文本的向量"""
+        return self.embed([content])[0]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return dict(self.stats)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+        self.cache.close()
+
+# 全局向量计算服务实例
+_embedding_service = None
+_embedding_lock = threading.Lock()
+
+def get_embedding_service() -> EmbeddingService:
+    """获取向量计算服务实例"""
+    global _embedding_service
+    if _embedding_service is None:
+        with _embedding_lock:
+            if _embedding_service is None:
+                _embedding_service = EmbeddingService()
+    return _embedding_service
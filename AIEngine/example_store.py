@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+训练样本检索模块
+训练完成的ai_training_records按批计算向量（AIEngine/embedding_service.py）后写入本地向量索引
+（问题-SQL对按问题文本、DDL和文档按内容），同时写入BM25关键词索引（AIEngine/bm25_index.py）。
+生成SQL时按问题检索相似样本，再回表读取有效的训练内容作为few-shot示例；
+DDL和文档上下文由向量检索与关键词检索的排名融合选取，兼顾语义相近和表名、业务术语的精确匹配。
+
+关键词索引保存在进程内存中：本进程训练或删除时直接增删，其他进程的变更按updated_at定期从训练记录表同步。
+向量索引保存在磁盘上由各进程共用，训练任务之外写入的记录（如启用本模块前已训练的记录）由backfill补齐。
+"""
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Callable, Sequence
+import numpy as np
+from sqlalchemy import text, bindparam
+from config.base_config import Config
+from tools.engine_registry import get_engine
+from .vector_index import VectorIndex
+from .bm25_index import BM25Index, reciprocal_rank_fusion
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_TYPES = ('ddl', 'documentation')
+
+_EPOCH = datetime(1970, 1, 1)
+
+def _default_embedder(texts: List[str]) -> np.ndarray:
+    from .embedding_service import get_embedding_service
+    return get_embedding_service().embed(texts)
+
+class ExampleStore:
+    """训练样本向量与关键词检索"""
+
+    def __init__(self, index: Optional[VectorIndex] = None, engine=None,
+                 embedder: Optional[Callable[[List[str]], np.ndarray]] = None,
+                 keyword_index: Optional[BM25Index] = None):
+        self.index = index or VectorIndex(
+            Config.VECTOR_INDEX_PATH,
+            nprobe=Config.VECTOR_INDEX_NPROBE,
+            train_threshold=Config.VECTOR_INDEX_TRAIN_THRESHOLD
+        )
+        self.engine = engine or get_engine(Config.VANNA_DATABASE_URI)
+        self.embedder = embedder or _default_embedder
+        self.keywords = keyword_index or BM25Index()
+        self._sync_lock = threading.Lock()
+        self._synced_until = None
+        self._checked_at = None
+
+    @staticmethod
+    def _embedding_text(record) -> str:
+        if record.training_type == 'question_sql' and record.question:
+            return record.question
+        return record.content
+
+    @staticmethod
+    def _keyword_text(record) -> str:
+        return ' '.join(part for part in (record.question, record.content) if part)
+
+    def add_records(self, records: Sequence[Any]) -> int:
+        """
+        写入训练记录的向量和关键词索引
+
+        Args:
+            records: 带id、training_type、content、question属性的训练记录
+        """
+        if not records:
+            return 0
+        vectors = self.embedder([self._embedding_text(record) for record in records])
+        added = self.index.add([record.id for record in records], vectors,
+                               [record.training_type for record in records])
+        for record in records:
+            self.keywords.add(record.id, self._keyword_text(record), record.training_type)
+        return added
+
+    def populated(self) -> bool:
+        """向量索引中是否已有有效样本（未训练也未执行backfill时为空）"""
+        return self.index.stats()['alive'] > 0
+
+    def remove_records(self, record_ids: Sequence[Any]) -> int:
+        """删除训练记录的向量和关键词索引"""
+        if not record_ids:
+            return 0
+        for record_id in record_ids:
+            self.keywords.remove(record_id)
+        return self.index.remove(record_ids)
+
+    def backfill(self, batch_size: int = 500) -> Dict[str, int]:
+        """
+        按ID顺序扫描有效且已训练的记录，补齐向量索引中缺少的记录，并删除已失效记录的向量
+
+        Returns:
+            {'added': 新写入数, 'removed': 删除数, 'indexed': 有效记录数}
+        """
+        indexed = self.index.alive_ids()
+        valid = set()
+        added, after_id = 0, 0
+        while True:
+            with self.engine.connect() as conn:
+                rows = conn.execute(text("""
+                    SELECT id, training_type, content, question
+                    FROM ai_training_records
+                    WHERE status = 1 AND train_status = 'trained' AND id > :after_id
+                    ORDER BY id
+                    LIMIT :limit
+                """), {'after_id': after_id, 'limit': batch_size}).fetchall()
+            if not rows:
+                break
+            after_id = rows[-1].id
+            valid.update(str(row.id) for row in rows)
+            missing = [row for row in rows if str(row.id) not in indexed]
+            if missing:
+                added += self.add_records(missing)
+                logger.info(f"训练样本向量补齐进度: 已扫描到ID {after_id}，新写入{added}条")
+        stale = list(indexed - valid)
+        removed = self.index.remove(stale) if stale else 0
+        return {'added': added, 'removed': removed, 'indexed': len(valid)}
+
+    def sync_keywords(self, force: bool = False) -> int:
+        """
+        从训练记录表同步关键词索引
+
+        首次全量加载有效且已训练的记录，此后只读取updated_at不早于上次同步时间的记录，
+        据此增删（按秒精度取 >= 以免漏掉同一秒内的变更，重复写入同一记录会替换）。
+
+        Returns:
+            本次处理的记录数
+        """
+        now = time.monotonic()
+        if not force and self._checked_at is not None and now - self._checked_at < Config.KEYWORD_INDEX_SYNC_SECONDS:
+            return 0
+        with self._sync_lock:
+            if not force and self._checked_at is not None and now - self._checked_at < Config.KEYWORD_INDEX_SYNC_SECONDS:
+                return 0
+            self._checked_at = now
+            with self.engine.connect() as conn:
+                if self._synced_until is None:
+                    rows = conn.execute(text("""
+                        SELECT id, training_type, content, question, status, train_status, updated_at
+                        FROM ai_training_records
+                        WHERE status = 1 AND train_status = 'trained'
+                    """)).fetchall()
+                else:
+                    rows = conn.execute(text("""
+                        SELECT id, training_type, content, question, status, train_status, updated_at
+                        FROM ai_training_records
+                        WHERE updated_at >= :since
+                    """), {'since': self._synced_until}).fetchall()
+
+            for row in rows:
+                if row.status == 1 and row.train_status == 'trained':
+                    self.keywords.add(row.id, self._keyword_text(row), row.training_type)
+                else:
+                    self.keywords.remove(row.id)
+            latest = max((row.updated_at for row in rows if row.updated_at is not None), default=None)
+            if latest is not None and (self._synced_until is None or latest > self._synced_until):
+                self._synced_until = latest
+            elif self._synced_until is None:
+                self._synced_until = _EPOCH
+            return len(rows)
+
+    def _load_records(self, scores: Dict[int, float]) -> List[Dict[str, Any]]:
+        if not scores:
+            return []
+        with self.engine.connect() as conn:
+            rows = conn.execute(text("""
+                SELECT id, training_type, content, question, sql_statement
+                FROM ai_training_records
+                WHERE id IN :ids AND status = 1
+            """).bindparams(bindparam('ids', expanding=True)), {'ids': list(scores)}).fetchall()
+        records = [{**dict(row._mapping), 'score': scores[row.id]} for row in rows]
+        return sorted(records, key=lambda record: record['score'], reverse=True)
+
+    def similar(self, question: str, k: int = 10, training_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        检索与问题相似的训练样本
+
+        Args:
+            question: 用户问题
+            k: 返回数量
+            training_type: 只检索指定训练类型（ddl/documentation/question_sql）
+
+        Returns:
+            按相似度降序的训练记录，包含score
+        """
+        hits = self.index.search(self.embedder([question])[0], k=k, training_type=training_type)
+        return self._load_records({int(record_id): score for record_id, score in hits})
+
+    def context(self, question: str, k: Optional[int] = None,
+                training_types: Sequence[str] = CONTEXT_TYPES) -> List[Dict[str, Any]]:
+        """
+        混合检索提示词上下文
+
+        每种训练类型分别取向量检索和BM25检索的前若干候选，按倒数排名融合（RRF）后取前k条。
+        向量计算不可用时只使用关键词检索。
+
+        Args:
+            question: 用户问题
+            k: 每种训练类型返回的数量
+            training_types: 参与检索的训练类型
+
+        Returns:
+            按融合分数降序的训练记录，score为RRF分数
+        """
+        k = k or Config.HYBRID_CONTEXT_SIZE
+        depth = max(k * 4, Config.HYBRID_CANDIDATES)
+        self.sync_keywords()
+
+        try:
+            vector = self.embedder([question])[0]
+        except Exception as e:
+            logger.warning(f"问题向量计算失败，仅使用关键词检索: {str(e)}")
+            vector = None
+
+        scores: Dict[int, float] = {}
+        for training_type in training_types:
+            rankings = [[record_id for record_id, _ in self.keywords.search(question, k=depth, doc_type=training_type)]]
+            if vector is not None:
+                rankings.append([record_id for record_id, _ in
+                                 self.index.search(vector, k=depth, training_type=training_type)])
+            for record_id, score in reciprocal_rank_fusion(rankings, k=Config.HYBRID_RRF_K)[:k]:
+                scores[int(record_id)] = score
+        return self._load_records(scores)
+
+# 全局训练样本检索实例
+_example_store = None
+_example_store_lock = threading.Lock()
+
+def get_example_store() -> ExampleStore:
+    """获取训练样本检索实例"""
+    global _example_store
+    if _example_store is None:
+        with _example_store_lock:
+            if _example_store is None:
+                _example_store = ExampleStore()
+    return _example_store
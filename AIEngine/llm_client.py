@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+大模型调用模块
+通过OpenAI兼容接口（默认DashScope兼容模式）调用Vanna配置的模型，
+供多候选生成、流式生成等需要自行控制采样参数、并发和输出方式的场景使用
+"""
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Iterator
+from config.base_config import Config
+from tools.exceptions import ExternalServiceException
+
+logger = logging.getLogger(__name__)
+
+class LLMClient:
+    """OpenAI兼容接口的对话补全客户端，可被多个线程共用"""
+
+    def __init__(self, model: Optional[str] = None, api_key: Optional[str] = None,
+                 api_base: Optional[str] = None, timeout: Optional[float] = None):
+        self.model = model or Config.VANNA_MODEL
+        self.api_key = api_key or Config.VANNA_API_KEY
+        self.api_base = api_base or Config.VANNA_API_BASE
+        self.timeout = timeout or Config.VANNA_REQUEST_TIMEOUT
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    try:
+                        from openai import OpenAI
+                    except ImportError:
+                        raise ExternalServiceException('未安装openai，无法调用大模型')
+                    self._client = OpenAI(api_key=self.api_key, base_url=self.api_base, timeout=self.timeout)
+        return self._client
+
+    def complete(self, messages: List[Dict[str, str]], temperature: float = 0.0, **kwargs: Any) -> str:
+        """
+        对话补全
+
+        Args:
+            messages: [{'role', 'content'}]
+            temperature: 采样温度
+
+        Returns:
+            模型回复文本
+        """
+        try:
+            response = self.client.chat.completions.create(
+                model=self.model, messages=messages, temperature=temperature, **kwargs
+            )
+        except ExternalServiceException:
+            raise
+        except Exception as e:
+            logger.error(f"大模型调用失败: {str(e)}")
+            raise ExternalServiceException(f'大模型调用失败: {str(e)}')
+        return response.choices[0].message.content or ''
+
+    def stream(self, messages: List[Dict[str, str]], temperature: float = 0.0, **kwargs: Any) -> Iterator[str]:
+        """
+        流式对话补全（stream=true），逐段产出模型回复文本
+        """
+        try:
+            response = self.client.chat.completions.create(
+                model=self.model, messages=messages, temperature=temperature, stream=True, **kwargs
+            )
+            for chunk in response:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except ExternalServiceException:
+            raise
+        except Exception as e:
+            logger.error(f"大模型流式调用失败: {str(e)}")
+            raise ExternalServiceException(f'大模型调用失败: {str(e)}')
+
+# 全局大模型客户端实例
+_llm_client = None
+_llm_client_lock = threading.Lock()
+
+def get_llm_client() -> LLMClient:
+    """获取大模型客户端实例"""
+    global _llm_client
+    if _llm_client is None:
+        with _llm_client_lock:
+            if _llm_client is None:
+                _llm_client = LLMClient()
+    return _llm_client
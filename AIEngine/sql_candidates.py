@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+"""
+多候选SQL生成模块
+一次大模型调用只产生一条SQL，无法执行时用户要等/execute报错后重新生成，相当于两次完整往返。
+多候选模式并发请求N个候选（不同采样温度、轮换不同的few-shot示例子集），每个候选完成后立即校验：
+
+1. 语法检查：单条SELECT/WITH语句，括号和引号成对，不含写操作
+2. 业务库EXPLAIN：表、字段不存在或语法错误时MySQL直接报错；按各表估算行数之积评估代价
+
+第一个通过校验且代价可接受的候选直接返回，其余尚未开始的候选取消、已在调用的候选结果丢弃；
+都不满足代价要求时，在全部完成或超时后返回代价最小的可执行候选。
+上游调用次数增加，但"得到可执行SQL"的端到端耗时分位数下降。
+"""
+import re
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FutureTimeoutError
+from typing import Dict, Any, List, Optional, Callable, Sequence, Tuple
+from config.base_config import Config
+
+logger = logging.getLogger(__name__)
+
+_FENCED = re.compile(r'```(?:sql|mysql)?\s*\n?(.*?)```', re.I | re.S)
+_STATEMENT = re.compile(r'\b(?:WITH|SELECT)\b.*', re.I | re.S)
+_LEADING = re.compile(r'\s*\(*\s*(SELECT|WITH)\b', re.I)
+_FORBIDDEN = re.compile(
+    r'\b(INSERT|UPDATE|DELETE|DROP|ALTER|CREATE|TRUNCATE|RENAME|GRANT|REVOKE|CALL|LOAD|LOCK|HANDLER|'
+    r'OUTFILE|DUMPFILE|SLEEP|BENCHMARK)\b', re.I
+)
+
+SYSTEM_PROMPT = (
+    '你是MySQL专家。根据给出的表结构、业务文档和示例，为用户问题生成一条可以直接执行的MySQL查询语句。'
+    '只使用表结构中存在的表和字段，只输出SQL，放在```sql代码块中，不要解释。'
+)
+
+def find_statement(content: str) -> Optional[str]:
+    """第一个SELECT/WITH开始的内容"""
+    match = _STATEMENT.search(content)
+    return match.group(0) if match else None
+
+def extract_sql(content: str) -> Optional[str]:
+    """从模型回复中提取SQL：优先取代码块，否则取第一个SELECT/WITH开始的内容"""
+    if not content:
+        return None
+    fenced = _FENCED.search(content)
+    candidate = fenced.group(1) if fenced else content
+    sql = find_statement(candidate)
+    if not sql:
+        return None
+    sql = sql.strip()
+    # 模型在语句后追加说明时只保留第一条语句
+    end = statement_end(sql)
+    return sql[:end].strip().rstrip(';').strip() or None
+
+def _scan(sql: str) -> Tuple[str, Optional[str]]:
+    """
+    去掉字符串、带引号的标识符和注释
+
+    Returns:
+        (代码部分, 错误原因)
+    """
+    code, index, length = [], 0, len(sql)
+    while index < length:
+        char = sql[index]
+        if char in '\'"`':
+            close = index + 1
+            while close < length:
+                if sql[close] == '\\' and char != '`':
+                    close += 2
+                    continue
+                if sql[close] == char:
+                    if close + 1 < length and sql[close + 1] == char:
+                        close += 2
+                        continue
+                    break
+                close += 1
+            if close >= length:
+                return ''.join(code), '引号未闭合'
+            code.append(' ? ' if char != '`' else ' _ ')
+            index = close + 1
+        elif sql.startswith('--', index) or char == '#':
+            newline = sql.find('\n', index)
+            index = length if newline < 0 else newline
+        elif sql.startswith('/*', index):
+            close = sql.find('*/', index + 2)
+            if close < 0:
+                return ''.join(code), '注释未闭合'
+            index = close + 2
+        else:
+            code.append(char)
+            index += 1
+    return ''.join(code), None
+
+def statement_end(sql: str) -> int:
+    """第一条语句的结束位置（引号中的分号不计）"""
+    index, length, quote = 0, len(sql), None
+    while index < length:
+        char = sql[index]
+        if quote:
+            if char == '\\' and quote != '`':
+                index += 1
+            elif char == quote:
+                quote = None
+        elif char in '\'"`':
+            quote = char
+        elif char == ';':
+            return index
+        index += 1
+    return length
+
+def check_sql(sql: str) -> Optional[str]:
+    """
+    语法检查
+
+    Returns:
+        不通过的原因，通过时返回None
+    """
+    if not sql or not sql.strip():
+        return '未生成SQL'
+    code, error = _scan(sql.strip().rstrip(';'))
+    if error:
+        return error
+    if ';' in code:
+        return '包含多条语句'
+    if not _LEADING.match(code):
+        return '不是查询语句'
+    forbidden = _FORBIDDEN.search(code)
+    if forbidden:
+        return f'包含不允许的关键字{forbidden.group(1).upper()}'
+    depth = 0
+    for char in code:
+        depth += (char == '(') - (char == ')')
+        if depth < 0:
+            break
+    if depth != 0:
+        return '括号不匹配'
+    return None
+
+def _default_db_provider():
+    from tools.database import get_database_service
+    return get_database_service()
+
+class SqlValidator:
+    """语法检查加业务库EXPLAIN"""
+
+    def __init__(self, db_provider: Optional[Callable[[], Any]] = None, max_cost: Optional[float] = None):
+        self._db_provider = db_provider or _default_db_provider
+        self.max_cost = max_cost or Config.SQL_CANDIDATE_MAX_COST
+
+    @staticmethod
+    def estimate_cost(plan: Sequence[Dict[str, Any]]) -> float:
+        """按EXPLAIN各表估算行数 × 过滤比例之积估算扫描行数"""
+        cost = 1.0
+        for row in plan:
+            rows = float(row.get('rows') or 1)
+            filtered = row.get('filtered')
+            cost *= max(rows * (float(filtered) / 100 if filtered is not None else 1.0), 1.0)
+        return cost
+
+    def validate(self, sql: str) -> Dict[str, Any]:
+        """
+        校验SQL
+
+        Returns:
+            {'valid', 'reason', 'cost', 'cheap'}
+        """
+        reason = check_sql(sql)
+        if reason:
+            return {'valid': False, 'reason': reason, 'cost': None, 'cheap': False}
+        try:
+            plan = self._db_provider().execute_query(f'EXPLAIN {sql}')
+        except Exception as e:
+            return {'valid': False, 'reason': f'EXPLAIN失败: {str(e)}', 'cost': None, 'cheap': False}
+        cost = self.estimate_cost(plan)
+        return {'valid': True, 'reason': None, 'cost': cost, 'cheap': cost <= self.max_cost}
+
+def build_messages(question: str, context: Sequence[Dict[str, Any]],
+                   examples: Sequence[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """组装提示词：表结构与文档作为系统提示，问题-SQL示例作为多轮对话"""
+    sections = [SYSTEM_PROMPT]
+    ddl = [record['content'] for record in context if record.get('training_type') == 'ddl']
+    documentation = [record['content'] for record in context if record.get('training_type') == 'documentation']
+    if ddl:
+        sections.append('表结构：\n' + '\n\n'.join(ddl))
+    if documentation:
+        sections.append('业务文档：\n' + '\n'.join(documentation))
+    messages = [{'role': 'system', 'content': '\n\n'.join(sections)}]
+    for example in examples:
+        if example.get('question') and example.get('sql_statement'):
+            messages.append({'role': 'user', 'content': example['question']})
+            messages.append({'role': 'assistant', 'content': f"```sql\n{example['sql_statement']}\n```"})
+    messages.append({'role': 'user', 'content': question})
+    return messages
+
+def _default_complete(messages: List[Dict[str, str]], temperature: float) -> str:
+    from .llm_client import get_llm_client
+    return get_llm_client().complete(messages, temperature=temperature)
+
+def retrieve_context(question: str) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """混合检索DDL和文档上下文，以及相似的问题-SQL示例"""
+    from .example_store import get_example_store
+    store = get_example_store()
+    try:
+        examples = store.similar(question, k=Config.SQL_CANDIDATE_EXAMPLES, training_type='question_sql')
+    except Exception as e:
+        logger.warning(f"检索相似示例失败: {str(e)}")
+        examples = []
+    return store.context(question), examples
+
+class CandidateGenerator:
+    """并发生成多个SQL候选，返回第一个可执行且代价可接受的候选"""
+
+    def __init__(self, complete: Optional[Callable[[List[Dict[str, str]], float], str]] = None,
+                 validator: Optional[SqlValidator] = None,
+                 retriever: Optional[Callable[[str], Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]]] = None,
+                 temperatures: Optional[Sequence[float]] = None, timeout: Optional[float] = None,
+                 workers: Optional[int] = None, source: str = 'candidates'):
+        self.complete = complete or _default_complete
+        self.validator = validator or SqlValidator()
+        self.retriever = retriever or retrieve_context
+        self.temperatures = list(temperatures or Config.SQL_CANDIDATE_TEMPERATURES)
+        self.timeout = timeout or Config.SQL_CANDIDATE_TIMEOUT
+        self.source = source
+        self._executor = ThreadPoolExecutor(max_workers=workers or Config.SQL_CANDIDATE_WORKERS,
+                                            thread_name_prefix='sql-candidate')
+
+    def _plans(self, question: str) -> List[Tuple[float, List[Dict[str, str]]]]:
+        """每个候选的(采样温度, 提示词)：第一个候选使用全部示例，其余轮换使用示例子集"""
+        context, examples = self.retriever(question)
+        count = len(self.temperatures)
+        plans = []
+        for index, temperature in enumerate(self.temperatures):
+            subset = examples if index == 0 or len(examples) < count else examples[index - 1::count - 1]
+            plans.append((temperature, build_messages(question, context, subset)))
+        return plans
+
+    def _run(self, index: int, temperature: float, messages: List[Dict[str, str]],
+             cancelled: threading.Event) -> Dict[str, Any]:
+        if cancelled.is_set():
+            return {'index': index, 'cancelled': True}
+        started = time.monotonic()
+        sql = extract_sql(self.complete(messages, temperature))
+        llm_ms = int((time.monotonic() - started) * 1000)
+        if cancelled.is_set():
+            return {'index': index, 'cancelled': True}
+        result = self.validator.validate(sql) if sql else \
+            {'valid': False, 'reason': '未生成SQL', 'cost': None, 'cheap': False}
+        return {'index': index, 'temperature': temperature, 'sql': sql, 'llm_ms': llm_ms, **result}
+
+    def generate(self, question: str) -> Dict[str, Any]:
+        """
+        多候选生成SQL
+
+        Returns:
+            {'success', 'data'/'error'}，data包含sql、候选序号、采样温度、EXPLAIN估算代价和被淘汰候选的原因
+        """
+        started = time.monotonic()
+        try:
+            plans = self._plans(question)
+        except Exception as e:
+            logger.error(f"检索提示词上下文失败: {str(e)}")
+            return {'success': False, 'error': f'检索提示词上下文失败: {str(e)}'}
+
+        cancelled = threading.Event()
+        futures = [self._executor.submit(self._run, index, temperature, messages, cancelled)
+                   for index, (temperature, messages) in enumerate(plans)]
+        chosen, best, rejected = None, None, []
+        try:
+            for future in as_completed(futures, timeout=self.timeout):
+                try:
+                    candidate = future.result()
+                except Exception as e:
+                    rejected.append({'index': futures.index(future), 'reason': str(e)})
+                    continue
+                if not candidate['valid']:
+                    rejected.append({'index': candidate['index'], 'reason': candidate['reason']})
+                elif candidate['cheap']:
+                    chosen = candidate
+                    break
+                elif best is None or candidate['cost'] < best['cost']:
+                    best = candidate
+        except FutureTimeoutError:
+            logger.warning(f"多候选生成超时（{self.timeout}秒），已完成{sum(f.done() for f in futures)}个候选")
+        finally:
+            cancelled.set()
+            for future in futures:
+                future.cancel()
+
+        chosen = chosen or best
+        elapsed = int((time.monotonic() - started) * 1000)
+        if chosen is None:
+            reasons = '；'.join(f"候选{item['index'] + 1}: {item['reason']}" for item in rejected) or '生成超时'
+            return {'success': False, 'error': f'没有可执行的SQL候选（{reasons}）'}
+        return {
+            'success': True,
+            'data': {
+                'sql': chosen['sql'],
+                'source': self.source,
+                'candidate': chosen['index'],
+                'temperature': chosen['temperature'],
+                'estimated_cost': chosen['cost'],
+                'candidates': len(futures),
+                'rejected': rejected,
+                'elapsed_ms': elapsed
+            }
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+# 全局多候选生成实例
+_candidate_generator = None
+_candidate_generator_lock = threading.Lock()
+
+def get_candidate_generator() -> CandidateGenerator:
+    """获取多候选SQL生成实例"""
+    global _candidate_generator
+    if _candidate_generator is None:
+        with _candidate_generator_lock:
+            if _candidate_generator is None:
+                _candidate_generator = CandidateGenerator()
+    return _candidate_generator
+
+# 全局单候选生成实例
+_sql_generator = None
+_sql_generator_lock = threading.Lock()
+
+def get_sql_generator() -> CandidateGenerator:
+    """获取默认生成路径使用的单候选实例：本地混合检索组装提示词，调用一次大模型并经EXPLAIN校验"""
+    global _sql_generator
+    if _sql_generator is None:
+        with _sql_generator_lock:
+            if _sql_generator is None:
+                _sql_generator = CandidateGenerator(temperatures=(0.0,), source='retrieval')
+    return _sql_generator
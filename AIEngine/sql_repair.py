@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""
+SQL自动修复模块
+生成的SQL执行失败时，/execute直接报错，客户端要重新调用/generate，相当于多了两次往返。
+开启auto_repair后在同一个请求内修复：
+
+1. 按MySQL错误码（或错误信息关键字）归类，连接中断、锁等待等与SQL本身无关的错误不修复
+2. 先查修复缓存：键为（失败SQL指纹, 错误类别），值为修复后执行成功的SQL
+3. 未命中时把错误信息和相关的表结构片段（SQL引用的表的字段；表不存在时附上名称相近的表）交给大模型修正
+4. 修正后的SQL须通过只读语法检查，重新执行；仍失败时以新的错误继续，受尝试次数和截止时间限制
+
+修复成功后，过程中每一条失败SQL都以（指纹, 错误类别）缓存到最终成功的SQL，相同错误再次出现时不调用大模型。
+"""
+import re
+import time
+import difflib
+import hashlib
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Callable, Tuple
+from config.base_config import Config
+from .sql_candidates import check_sql, extract_sql
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = 'ai:sql_repair:'
+
+_ERROR_CODE = re.compile(r'\(\s*(\d{4})\s*,')
+_ERROR_KEYWORDS = (
+    ('unknown column', 'unknown_column'),
+    ("doesn't exist", 'no_such_table'),
+    ('syntax', 'syntax'),
+    ('timed out', 'timeout'),
+    ('timeout', 'timeout'),
+    ('lost connection', 'connection'),
+    ("can't connect", 'connection'),
+)
+# 与SQL本身无关的错误：连接失败/中断、锁等待超时、死锁、连接数过多、查询超时
+_UNREPAIRABLE = {'2003', '2006', '2013', '1205', '1213', '1040', '3024', 'timeout', 'connection'}
+_TABLE_REFERENCE = re.compile(r'\b(?:FROM|JOIN)\s+`?(\w+)`?(?:\s*\.\s*`?(\w+)`?)?', re.I)
+
+REPAIR_PROMPT = (
+    '你是MySQL专家。下面的SQL执行失败，请根据错误信息和表结构修正它，保持原有的查询意图。'
+    '只使用表结构中存在的表和字段，只输出修正后的一条SQL，放在```sql代码块中，不要解释。'
+)
+
+def error_class(error: str) -> str:
+    """错误类别：MySQL错误码，没有错误码时按关键字归类"""
+    error = error or ''
+    match = _ERROR_CODE.search(error)
+    if match:
+        return match.group(1)
+    lowered = error.lower()
+    for keyword, name in _ERROR_KEYWORDS:
+        if keyword in lowered:
+            return name
+    return 'other'
+
+def sql_fingerprint(sql: str) -> str:
+    """SQL指纹：合并空白、去掉结尾分号后的SHA-256（字面值不同的SQL不共用修复结果）"""
+    return hashlib.sha256(' '.join(sql.strip().rstrip(';').split()).encode('utf-8')).hexdigest()
+
+def referenced_tables(sql: str) -> List[str]:
+    """SQL中FROM/JOIN引用的表名（去掉库名前缀，按出现顺序去重）"""
+    tables = []
+    for first, second in _TABLE_REFERENCE.findall(sql):
+        table = second or first
+        if table.upper() not in ('SELECT', 'LATERAL', 'DUAL') and table not in tables:
+            tables.append(table)
+    return tables
+
+def _default_db_provider():
+    from tools.database import get_database_service
+    return get_database_service()
+
+def _default_redis_provider():
+    from tools.redis_service import get_redis_service
+    return get_redis_service().redis_client
+
+def _default_complete(messages: List[Dict[str, str]], timeout: float) -> str:
+    from .llm_client import get_llm_client
+    return get_llm_client().complete(messages, temperature=0.0, timeout=timeout)
+
+class SqlRepairer:
+    """执行失败的SQL在请求内自动修复"""
+
+    def __init__(self, complete: Optional[Callable[[List[Dict[str, str]], float], str]] = None,
+                 db_provider: Optional[Callable[[], Any]] = None,
+                 redis_provider: Optional[Callable[[], Any]] = None,
+                 schema: Optional[str] = None, max_attempts: Optional[int] = None,
+                 deadline: Optional[float] = None):
+        self.complete = complete or _default_complete
+        self._db_provider = db_provider or _default_db_provider
+        self._redis_provider = redis_provider or _default_redis_provider
+        self.schema = schema or Config.SQL_REPAIR_SCHEMA
+        self.max_attempts = max_attempts or Config.SQL_REPAIR_MAX_ATTEMPTS
+        self.deadline = deadline or Config.SQL_REPAIR_DEADLINE_SECONDS
+
+    # ================================
+    # 修复缓存
+    # ================================
+
+    @staticmethod
+    def _cache_key(sql: str, error_kind: str) -> str:
+        return f'{CACHE_PREFIX}{sql_fingerprint(sql)}:{error_kind}'
+
+    def _cached(self, key: str) -> Optional[str]:
+        try:
+            return self._redis_provider().get(key)
+        except Exception as e:
+            logger.warning(f"读取SQL修复缓存失败: {str(e)}")
+            return None
+
+    def _cache(self, keys: List[str], sql: str):
+        try:
+            pipe = self._redis_provider().pipeline(transaction=False)
+            for key in keys:
+                pipe.set(key, sql, ex=Config.SQL_REPAIR_CACHE_TTL)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"写入SQL修复缓存失败: {str(e)}")
+
+    def _forget(self, key: str):
+        try:
+            self._redis_provider().delete(key)
+        except Exception as e:
+            logger.warning(f"删除SQL修复缓存失败: {str(e)}")
+
+    # ================================
+    # 提示词
+    # ================================
+
+    def schema_slice(self, sql: str) -> str:
+        """SQL引用的表的字段定义；引用的表不存在时附上名称相近的表"""
+        tables = referenced_tables(sql)
+        if not tables:
+            return ''
+        db = self._db_provider()
+        params = {'schema': self.schema, **{f't{i}': table for i, table in enumerate(tables)}}
+        placeholders = ', '.join(f':t{i}' for i in range(len(tables)))
+        rows = db.execute_query(f"""
+            SELECT TABLE_NAME AS table_name, COLUMN_NAME AS column_name, COLUMN_TYPE AS column_type,
+                   COLUMN_COMMENT AS column_comment
+            FROM INFORMATION_SCHEMA.COLUMNS
+            WHERE TABLE_SCHEMA = :schema AND TABLE_NAME IN ({placeholders})
+            ORDER BY TABLE_NAME, ORDINAL_POSITION
+        """, params)
+        columns: Dict[str, List[str]] = {}
+        for row in rows:
+            comment = f" -- {row['column_comment']}" if row.get('column_comment') else ''
+            columns.setdefault(row['table_name'], []).append(f"  {row['column_name']} {row['column_type']}{comment}")
+
+        missing = [table for table in tables if table not in columns]
+        if missing:
+            names = [row['table_name'] for row in db.execute_query("""
+                SELECT TABLE_NAME AS table_name FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_SCHEMA = :schema
+            """, {'schema': self.schema})]
+            for table in missing:
+                close = difflib.get_close_matches(table, names, n=3, cutoff=0.5)
+                columns[table] = [f"  （表不存在，名称相近的表：{'、'.join(close) if close else '无'}）"]
+        return '\n'.join(f"{table}:\n" + '\n'.join(lines[:Config.SQL_REPAIR_MAX_COLUMNS])
+                         for table, lines in columns.items())
+
+    def build_messages(self, sql: str, error: str, question: Optional[str] = None) -> List[Dict[str, str]]:
+        try:
+            schema = self.schema_slice(sql)
+        except Exception as e:
+            logger.warning(f"读取表结构失败: {str(e)}")
+            schema = ''
+        parts = [f'用户问题：{question}'] if question else []
+        parts.append(f'执行失败的SQL：\n```sql\n{sql}\n```')
+        parts.append(f'错误信息：{error}')
+        if schema:
+            parts.append(f'相关表结构：\n{schema}')
+        return [{'role': 'system', 'content': REPAIR_PROMPT}, {'role': 'user', 'content': '\n\n'.join(parts)}]
+
+    # ================================
+    # 修复
+    # ================================
+
+    def repair(self, sql: str, result: Dict[str, Any], execute: Callable[[str], Dict[str, Any]],
+               question: Optional[str] = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        修复执行失败的SQL并重新执行
+
+        Args:
+            sql: 执行失败的SQL
+            result: 执行结果（{'success': False, 'error'}）
+            execute: 执行SQL的函数，返回与result相同格式的结果
+            question: 用户问题，提供时一并交给大模型
+
+        Returns:
+            (最后一次执行结果, 修复过程：最终SQL、是否修复成功及每次尝试的SQL、错误类别和是否来自缓存)
+        """
+        deadline = time.monotonic() + self.deadline
+        current, attempts, failed_keys = sql, [], []
+        while not result.get('success') and len(attempts) < self.max_attempts:
+            error = result.get('error') or ''
+            kind = error_class(error)
+            if kind in _UNREPAIRABLE:
+                break
+            key = self._cache_key(current, kind)
+            failed_keys.append(key)
+
+            repaired = self._cached(key)
+            from_cache = repaired is not None
+            if not from_cache:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    repaired = extract_sql(self.complete(self.build_messages(current, error, question), remaining))
+                except Exception as e:
+                    logger.warning(f"SQL修复调用大模型失败: {str(e)}")
+                    break
+            reason = check_sql(repaired) if repaired else '未生成SQL'
+            if reason is None and sql_fingerprint(repaired) == sql_fingerprint(current):
+                reason = '修复结果与原SQL相同'
+            if reason:
+                attempts.append({'sql': repaired, 'error_class': kind, 'cached': from_cache, 'error': reason})
+                if from_cache:
+                    self._forget(key)
+                break
+
+            result = execute(repaired)
+            attempts.append({'sql': repaired, 'error_class': kind, 'cached': from_cache,
+                             'error': None if result.get('success') else result.get('error')})
+            if not result.get('success') and from_cache:
+                # 缓存的修复已失效（例如表结构又有变化）
+                self._forget(key)
+            current = repaired
+            if time.monotonic() >= deadline:
+                break
+
+        succeeded = bool(result.get('success')) and current != sql
+        if succeeded:
+            self._cache(failed_keys, current)
+        if attempts:
+            logger.info(f"SQL自动修复{'成功' if succeeded else '失败'}: 尝试{len(attempts)}次，"
+                        f"错误类别{[attempt['error_class'] for attempt in attempts]}")
+        return result, {'original_sql': sql, 'sql': current, 'repaired': succeeded, 'attempts': attempts}
+
+# 全局SQL修复实例
+_sql_repairer = None
+_sql_repairer_lock = threading.Lock()
+
+def get_sql_repairer() -> SqlRepairer:
+    """获取SQL自动修复实例"""
+    global _sql_repairer
+    if _sql_repairer is None:
+        with _sql_repairer_lock:
+            if _sql_repairer is None:
+                _sql_repairer = SqlRepairer()
+    return _sql_repairer
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+流式SQL生成模块
+非流式生成要等完整回复返回后才能响应，用户在整个大模型耗时内只能看到加载状态。
+流式生成以stream=true调用OpenAI兼容接口，逐段转发模型输出，事件依次为：
+
+- token：模型输出的原始文本片段，首个token的耗时即感知延迟
+- sql：从已输出内容中增量提取的SQL片段（代码块或第一个SELECT/WITH语句），拼接即为SQL预览
+- final：输出结束后提取完整SQL并经语法检查和EXPLAIN校验，携带校验结果、缓存键和耗时
+
+校验通过的SQL按问题写入vanna_sql缓存（与RedisService.cache_vanna_sql相同的键），
+相同问题再次请求时重新EXPLAIN校验后直接返回final事件，不调用大模型。
+"""
+import time
+import hashlib
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Callable, Iterator, Tuple
+from config.base_config import Config
+from .sql_candidates import SqlValidator, build_messages, extract_sql, find_statement, retrieve_context, statement_end
+
+logger = logging.getLogger(__name__)
+
+def question_hash(question: str) -> str:
+    """问题指纹：合并空白后的SHA-256"""
+    return hashlib.sha256(' '.join(question.split()).encode('utf-8')).hexdigest()
+
+def sql_cache_key(question: str) -> str:
+    return f'vanna_sql:{question_hash(question)}'
+
+class IncrementalSqlExtractor:
+    """随模型输出增量提取SQL，产出的片段拼接后是最终SQL的前缀预览"""
+
+    def __init__(self):
+        self.content = ''
+        self._emitted = ''
+        self._finished = False
+
+    def _available(self) -> Tuple[str, bool]:
+        """当前可确定的SQL文本及是否已结束"""
+        content = self.content
+        fence = content.find('```')
+        if fence >= 0:
+            header_end = content.find('\n', fence + 3)
+            if header_end < 0:
+                return '', False
+            close = content.find('```', header_end + 1)
+            if close >= 0:
+                return content[header_end + 1:close].rstrip().rstrip(';'), True
+            # 结尾可能是尚未输出完整的```
+            return content[header_end + 1:].rstrip('`'), False
+        sql = find_statement(content)
+        if not sql:
+            return '', False
+        end = statement_end(sql)
+        if end < len(sql):
+            return sql[:end], True
+        # 未出现代码块标记前，结尾的反引号可能是代码块的开始
+        return sql.rstrip('`'), False
+
+    def feed(self, delta: str) -> str:
+        """
+        追加模型输出
+
+        Returns:
+            新增的SQL片段，没有新增时返回空字符串
+        """
+        self.content += delta
+        if self._finished:
+            return ''
+        available, self._finished = self._available()
+        if not available.startswith(self._emitted):
+            # 之前的预览不再是前缀（例如正文中的SELECT后出现了代码块），停止增量输出，以final事件为准
+            self._finished = True
+            return ''
+        fragment = available[len(self._emitted):]
+        self._emitted = available
+        return fragment
+
+    def result(self) -> Optional[str]:
+        """完整输出中提取的SQL"""
+        return extract_sql(self.content)
+
+def _default_stream(messages: List[Dict[str, str]], temperature: float) -> Iterator[str]:
+    from .llm_client import get_llm_client
+    return get_llm_client().stream(messages, temperature=temperature)
+
+def _default_redis_provider():
+    from tools.redis_service import get_redis_service
+    return get_redis_service().redis_client
+
+class SqlStreamer:
+    """流式SQL生成"""
+
+    def __init__(self, stream: Optional[Callable[[List[Dict[str, str]], float], Iterator[str]]] = None,
+                 validator: Optional[SqlValidator] = None,
+                 retriever: Optional[Callable[[str], Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]]] = None,
+                 redis_provider: Optional[Callable[[], Any]] = None, cache_ttl: Optional[int] = None):
+        self.stream_completion = stream or _default_stream
+        self.validator = validator or SqlValidator()
+        self.retriever = retriever or retrieve_context
+        self._redis_provider = redis_provider or _default_redis_provider
+        self.cache_ttl = cache_ttl or Config.SQL_STREAM_CACHE_TTL
+
+    def _cached(self, cache_key: str) -> Optional[str]:
+        try:
+            return self._redis_provider().get(cache_key)
+        except Exception as e:
+            logger.warning(f"读取SQL缓存失败: {str(e)}")
+            return None
+
+    def _cache(self, cache_key: str, sql: str):
+        try:
+            self._redis_provider().set(cache_key, sql, ex=self.cache_ttl)
+        except Exception as e:
+            logger.warning(f"写入SQL缓存失败: {str(e)}")
+
+    def stream(self, question: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        流式生成SQL
+
+        Yields:
+            (事件名, 数据)：token、sql、final
+        """
+        started = time.monotonic()
+        cache_key = sql_cache_key(question)
+
+        def elapsed_ms():
+            return int((time.monotonic() - started) * 1000)
+
+        cached = self._cached(cache_key)
+        if cached:
+            validation = self.validator.validate(cached)
+            if validation['valid']:
+                yield 'final', {
+                    'sql': cached, 'valid': True, 'reason': None, 'estimated_cost': validation['cost'],
+                    'cached': True, 'cache_key': cache_key, 'first_token_ms': elapsed_ms(),
+                    'elapsed_ms': elapsed_ms()
+                }
+                return
+
+        context, examples = self.retriever(question)
+        extractor = IncrementalSqlExtractor()
+        first_token_ms = None
+        for delta in self.stream_completion(build_messages(question, context, examples), 0.0):
+            if first_token_ms is None:
+                first_token_ms = elapsed_ms()
+            yield 'token', {'text': delta}
+            fragment = extractor.feed(delta)
+            if fragment:
+                yield 'sql', {'text': fragment}
+
+        sql = extractor.result()
+        validation = self.validator.validate(sql) if sql else \
+            {'valid': False, 'reason': '未生成SQL', 'cost': None, 'cheap': False}
+        if validation['valid']:
+            self._cache(cache_key, sql)
+        yield 'final', {
+            'sql': sql, 'valid': validation['valid'], 'reason': validation['reason'],
+            'estimated_cost': validation['cost'], 'cached': False, 'cache_key': cache_key,
+            'first_token_ms': first_token_ms, 'elapsed_ms': elapsed_ms()
+        }
+
+# 全局流式生成实例
+_sql_streamer = None
+_sql_streamer_lock = threading.Lock()
+
+def get_sql_streamer() -> SqlStreamer:
+    """获取流式SQL生成实例"""
+    global _sql_streamer
+    if _sql_streamer is None:
+        with _sql_streamer_lock:
+            if _sql_streamer is None:
+                _sql_streamer = SqlStreamer()
+    return _sql_streamer
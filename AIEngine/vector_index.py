@@ -0,0 +1,393 @@
+# -*- coding: utf-8 -*-
+"""
+训练样本向量索引模块
+基于NumPy的IVF（倒排文件）近似最近邻索引，用于few-shot示例检索，替代每次生成SQL都经过ChromaDB。
+
+- 向量归一化后以float16写入内存映射文件，同一台机器上的多个worker进程共享页缓存
+- 追加写入：新增向量直接写入文件尾部，跨进程写入通过文件锁串行化
+- 样本数达到阈值后用球面k-means训练聚类中心，检索只扫描最近的nprobe个聚类；
+  未训练前或聚类后新增的尾部数据按暴力检索处理
+- 每个向量带训练类型编码，检索时可按类型过滤；删除只标记失效，不移动数据
+
+目录结构：
+    header.json   维度、行数、容量、类型表、聚类版本
+    vectors.f16   (capacity, dim) float16
+    types.u8 / alive.u8 / assign.i32   每行的类型编码、有效标记、所属聚类
+    ids.txt       每行一个外部ID（追加写入）
+    centroids.npy 聚类中心
+"""
+import os
+import json
+import time
+import fcntl
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Sequence, Set, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+HEADER_FILE = 'header.json'
+VECTOR_FILE = 'vectors.f16'
+TYPE_FILE = 'types.u8'
+ALIVE_FILE = 'alive.u8'
+ASSIGN_FILE = 'assign.i32'
+ID_FILE = 'ids.txt'
+CENTROID_FILE = 'centroids.npy'
+LOCK_FILE = 'index.lock'
+
+DEFAULT_TYPES = ['ddl', 'documentation', 'question_sql']
+
+# 暴力检索和批量分配聚类时每次转换为float32的行数
+CHUNK_ROWS = 65536
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+class VectorIndex:
+    """float16内存映射的IVF向量索引，余弦相似度"""
+
+    def __init__(self, path: str, nprobe: int = 16, train_threshold: int = 20000,
+                 reload_interval: float = 0.5, initial_capacity: int = 1024, seed: int = 42):
+        """
+        Args:
+            path: 索引目录
+            nprobe: 检索时扫描的聚类数
+            train_threshold: 样本数达到该值后训练聚类，之后样本数每增长4倍重新训练
+            reload_interval: 检查其他进程写入的最小间隔（秒）
+            initial_capacity: 首次创建时预分配的行数
+        """
+        self.path = path
+        self.nprobe = nprobe
+        self.train_threshold = train_threshold
+        self.reload_interval = reload_interval
+        self.initial_capacity = initial_capacity
+        self.seed = seed
+        os.makedirs(path, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._header: Optional[Dict[str, Any]] = None
+        self._header_mtime = None
+        self._checked_at = 0.0
+        self._vectors = self._types = self._alive = self._assign = None
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._ids_offset = 0
+        self._centroids: Optional[np.ndarray] = None
+        self._centroid_version = 0
+        self._order: Optional[np.ndarray] = None
+        self._bounds: Optional[np.ndarray] = None
+        self._listed = 0
+        with self._lock:
+            self._reload(force=True)
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    # ================================
+    # 头信息与内存映射
+    # ================================
+
+    def _read_header(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._file(HEADER_FILE), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_header(self, header: Dict[str, Any]):
+        tmp = self._file(HEADER_FILE + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(header, f)
+        os.replace(tmp, self._file(HEADER_FILE))
+
+    def _map_files(self, header: Dict[str, Any]):
+        capacity, dim = header['capacity'], header['dim']
+        if not capacity:
+            return
+        self._vectors = np.memmap(self._file(VECTOR_FILE), dtype=np.float16, mode='r+', shape=(capacity, dim))
+        self._types = np.memmap(self._file(TYPE_FILE), dtype=np.uint8, mode='r+', shape=(capacity,))
+        self._alive = np.memmap(self._file(ALIVE_FILE), dtype=np.uint8, mode='r+', shape=(capacity,))
+        self._assign = np.memmap(self._file(ASSIGN_FILE), dtype=np.int32, mode='r+', shape=(capacity,))
+
+    def _reload(self, force: bool = False):
+        """读取其他进程写入的新数据，调用方需持有self._lock"""
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.reload_interval:
+            return
+        self._checked_at = now
+        try:
+            mtime = os.stat(self._file(HEADER_FILE)).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if not force and mtime == self._header_mtime:
+            return
+        header = self._read_header()
+        if header is not None:
+            self._header_mtime = mtime
+            self._apply_header(header)
+
+    def _apply_header(self, header: Dict[str, Any]):
+        if self._header is None or header['capacity'] != self._header['capacity']:
+            self._map_files(header)
+        if header['centroid_version'] != self._centroid_version:
+            self._centroids = np.load(self._file(CENTROID_FILE)) if header['centroid_version'] else None
+            self._centroid_version = header['centroid_version']
+            self._listed = 0
+
+        # header在ids.txt写入之后更新，按header中的行数读取的ID都是完整的
+        missing = header['count'] - len(self._ids)
+        if missing > 0:
+            with open(self._file(ID_FILE), 'rb') as f:
+                f.seek(self._ids_offset)
+                for _ in range(missing):
+                    line = f.readline()
+                    self._ids_offset += len(line)
+                    record_id = line.decode('utf-8').rstrip('\n')
+                    self._rows[record_id] = len(self._ids)
+                    self._ids.append(record_id)
+        self._header = header
+        self._rebuild_lists()
+
+    def _rebuild_lists(self, force: bool = False):
+        """按聚类重建倒排表，尾部新增数据较少时保留为暴力扫描"""
+        if self._centroids is None:
+            return
+        count = self._header['count']
+        if not force and self._listed and count - self._listed <= max(1024, count // 50):
+            return
+        assign = np.asarray(self._assign[:count])
+        self._order = np.argsort(assign, kind='stable')
+        self._bounds = np.searchsorted(assign[self._order], np.arange(len(self._centroids) + 1))
+        self._listed = count
+
+    @contextmanager
+    def _write_lock(self):
+        with self._lock:
+            with open(self._file(LOCK_FILE), 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    # 持有文件锁后同步其他进程的写入
+                    self._reload(force=True)
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _grow(self, header: Dict[str, Any], needed: int):
+        capacity = max(header['capacity'] * 2, needed, self.initial_capacity)
+        for name, width in ((VECTOR_FILE, header['dim'] * 2), (TYPE_FILE, 1), (ALIVE_FILE, 1), (ASSIGN_FILE, 4)):
+            with open(self._file(name), 'ab') as f:
+                f.truncate(capacity * width)
+        header['capacity'] = capacity
+        self._map_files(header)
+
+    # ================================
+    # 写入
+    # ================================
+
+    def add(self, ids: Sequence[Any], vectors, training_types: Sequence[str]) -> int:
+        """
+        追加向量，已存在的ID先标记失效再追加
+
+        Args:
+            ids: 外部ID（如训练记录ID）
+            vectors: (n, dim) 向量
+            training_types: 每个向量的训练类型
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors.reshape(1, -1)
+        if not len(ids):
+            return 0
+        if len(ids) != len(vectors) or len(ids) != len(training_types):
+            raise ValueError('ids、vectors和training_types长度不一致')
+        vectors = _normalize(vectors)
+        ids = [str(i).replace('\n', ' ') for i in ids]
+
+        with self._write_lock():
+            header = dict(self._header) if self._header else {
+                'dim': vectors.shape[1], 'count': 0, 'capacity': 0, 'version': 0,
+                'types': list(DEFAULT_TYPES), 'centroid_version': 0, 'trained_count': 0
+            }
+            header['types'] = list(header['types'])
+            if vectors.shape[1] != header['dim']:
+                raise ValueError(f"向量维度{vectors.shape[1]}与索引维度{header['dim']}不一致")
+
+            self._mark_removed(ids)
+            for training_type in training_types:
+                if training_type not in header['types']:
+                    header['types'].append(training_type)
+            start, end = header['count'], header['count'] + len(ids)
+            if end > header['capacity']:
+                self._grow(header, end)
+
+            self._vectors[start:end] = vectors.astype(np.float16)
+            self._types[start:end] = [header['types'].index(t) for t in training_types]
+            self._assign[start:end] = self._nearest(vectors) if self._centroids is not None else -1
+            self._alive[start:end] = 1
+            for array in (self._vectors, self._types, self._assign, self._alive):
+                array.flush()
+            with open(self._file(ID_FILE), 'ab') as f:
+                f.write(''.join(f'{i}\n' for i in ids).encode('utf-8'))
+
+            header['count'] = end
+            header['version'] += 1
+            if end >= self.train_threshold and (not header['trained_count'] or end >= header['trained_count'] * 4):
+                self._train(header)
+            self._write_header(header)
+            self._apply_header(header)
+        return len(ids)
+
+    def remove(self, ids: Sequence[Any]) -> int:
+        """标记向量失效，返回实际删除的数量"""
+        with self._write_lock():
+            if not self._header:
+                return 0
+            removed = self._mark_removed([str(i) for i in ids])
+            if removed:
+                self._alive.flush()
+                header = dict(self._header)
+                header['version'] += 1
+                self._write_header(header)
+                self._header = header
+        return removed
+
+    def _mark_removed(self, ids: Sequence[str]) -> int:
+        removed = 0
+        for record_id in ids:
+            row = self._rows.get(record_id)
+            if row is not None and self._alive[row]:
+                self._alive[row] = 0
+                removed += 1
+        return removed
+
+    # ================================
+    # 聚类训练
+    # ================================
+
+    def _nearest(self, vectors: np.ndarray) -> np.ndarray:
+        return np.argmax(vectors @ self._centroids.T, axis=1).astype(np.int32)
+
+    def _train(self, header: Dict[str, Any], iterations: int = 10):
+        """球面k-means训练聚类中心并重新分配全部行"""
+        count = header['count']
+        live = np.flatnonzero(np.asarray(self._alive[:count]))
+        nlist = int(min(max(np.sqrt(len(live)), 16), 4096))
+        rng = np.random.default_rng(self.seed)
+        sample = np.sort(rng.choice(live, size=min(len(live), nlist * 64, 200000), replace=False))
+        data = np.asarray(self._vectors[sample], dtype=np.float32)
+        centroids = data[rng.choice(len(data), size=nlist, replace=False)].copy()
+
+        for _ in range(iterations):
+            labels = np.concatenate([
+                np.argmax(data[i:i + CHUNK_ROWS] @ centroids.T, axis=1) for i in range(0, len(data), CHUNK_ROWS)
+            ])
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, data)
+            empty = np.bincount(labels, minlength=nlist) == 0
+            # 空聚类重新取随机样本作为中心
+            sums[empty] = data[rng.choice(len(data), size=int(empty.sum()), replace=False)]
+            centroids = _normalize(sums)
+
+        self._centroids = centroids
+        for start in range(0, count, CHUNK_ROWS):
+            end = min(start + CHUNK_ROWS, count)
+            self._assign[start:end] = self._nearest(np.asarray(self._vectors[start:end], dtype=np.float32))
+        self._assign.flush()
+
+        tmp = self._file('centroids.tmp.npy')
+        np.save(tmp, centroids)
+        os.replace(tmp, self._file(CENTROID_FILE))
+        header['centroid_version'] += 1
+        header['trained_count'] = count
+        logger.info(f"向量索引聚类训练完成: {count}行, {nlist}个聚类")
+
+    # ================================
+    # 检索
+    # ================================
+
+    def search(self, vector, k: int = 10, training_type: Optional[str] = None,
+               nprobe: Optional[int] = None) -> List[Tuple[str, float]]:
+        """
+        检索最相似的向量
+
+        Args:
+            vector: 查询向量
+            k: 返回数量
+            training_type: 只检索指定训练类型
+            nprobe: 扫描的聚类数，默认使用初始化参数
+
+        Returns:
+            [(外部ID, 余弦相似度)]，按相似度降序
+        """
+        with self._lock:
+            self._reload()
+            header = self._header
+            if not header or not header['count']:
+                return []
+            count, listed = header['count'], self._listed
+            centroids, order, bounds = self._centroids, self._order, self._bounds
+            vectors, types, alive, ids = self._vectors, self._types, self._alive, self._ids
+            type_code = None
+            if training_type is not None:
+                if training_type not in header['types']:
+                    return []
+                type_code = header['types'].index(training_type)
+
+        query = _normalize(np.asarray(vector, dtype=np.float32).reshape(1, -1))[0]
+        if centroids is None:
+            candidates = np.arange(count)
+        else:
+            probe = min(nprobe or self.nprobe, len(centroids))
+            nearest = np.argpartition(-(centroids @ query), probe - 1)[:probe]
+            candidates = np.concatenate(
+                [order[bounds[c]:bounds[c + 1]] for c in nearest] + [np.arange(listed, count)]
+            )
+            candidates.sort()
+
+        best_rows = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        for start in range(0, len(candidates), CHUNK_ROWS):
+            rows = candidates[start:start + CHUNK_ROWS]
+            mask = alive[rows] == 1
+            if type_code is not None:
+                mask &= types[rows] == type_code
+            rows = rows[mask]
+            if not len(rows):
+                continue
+            scores = np.asarray(vectors[rows], dtype=np.float32) @ query
+            best_rows = np.concatenate([best_rows, rows])
+            best_scores = np.concatenate([best_scores, scores])
+            if len(best_rows) > k:
+                top = np.argpartition(-best_scores, k - 1)[:k]
+                best_rows, best_scores = best_rows[top], best_scores[top]
+
+        ranked = np.argsort(-best_scores)[:k]
+        return [(ids[row], float(best_scores[i])) for i, row in zip(ranked, best_rows[ranked])]
+
+    def alive_ids(self) -> Set[str]:
+        """当前有效向量的外部ID"""
+        with self._lock:
+            self._reload()
+            count = (self._header or {}).get('count', 0)
+            if not count:
+                return set()
+            return {self._ids[row] for row in np.flatnonzero(np.asarray(self._alive[:count]))}
+
+    def stats(self) -> Dict[str, Any]:
+        """索引统计信息"""
+        with self._lock:
+            self._reload()
+            header = self._header or {}
+            count = header.get('count', 0)
+            return {
+                'dim': header.get('dim'),
+                'count': count,
+                'alive': int(np.count_nonzero(np.asarray(self._alive[:count]))) if count else 0,
+                'capacity': header.get('capacity', 0),
+                'nlist': len(self._centroids) if self._centroids is not None else 0,
+                'trained_count': header.get('trained_count', 0),
+            }
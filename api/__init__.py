@@ -19,6 +19,7 @@ from . import workflow_routes
 from . import audit_routes
 from . import text2sql_routes
 from . import message_routes
+from . import event_routes
 
 # 注册所有路由模块
 def init_app(app):
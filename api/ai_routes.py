@@ -82,8 +82,11 @@ def train_model():
         if not model_type or not training_data:
             raise ValidationException('模型类型和训练数据不能为空')
             
+        current_user = getattr(g, 'current_user', None)
+        user_id = current_user.get('id') if current_user else None
+        
         ai_service = get_ai_service_instance()
-        result = ai_service.train_model(model_type, training_data, parameters)
+        result = ai_service.train_model(model_type, training_data, parameters, user_id)
         
         if not result['success']:
             raise BusinessException(result.get('error', '模型训练失败'))
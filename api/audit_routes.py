@@ -1,10 +1,12 @@
-from flask import request, jsonify, g
+from flask import request, jsonify, g, send_file
 from . import api_bp
 from tools.auth_middleware import auth_required, permission_required
 from service import get_audit_service_instance
+from tools.audit_export import get_audit_export_service
 from tools.exceptions import (
     ValidationException,
     BusinessException,
+    ResourceNotFoundException,
     handle_exception,
     create_error_response
 )
@@ -27,6 +29,7 @@ def get_audit_logs():
         operation_type = request.args.get('operation_type')
         operator = request.args.get('operator')
         status = request.args.get('status')
+        cursor = request.args.get('cursor')
         
         audit_service = get_audit_service_instance()
         result = audit_service.get_audit_logs(
@@ -36,7 +39,8 @@ def get_audit_logs():
             end_time=end_time,
             operation_type=operation_type,
             operator=operator,
-            status=status
+            status=status,
+            cursor=cursor
         )
         
         if not result['success']:
@@ -89,6 +93,7 @@ def get_login_logs():
         username = request.args.get('username')
         status = request.args.get('status')
         ip = request.args.get('ip')
+        cursor = request.args.get('cursor')
         
         audit_service = get_audit_service_instance()
         result = audit_service.get_login_logs(
@@ -98,7 +103,8 @@ def get_login_logs():
             end_time=end_time,
             username=username,
             status=status,
-            ip=ip
+            ip=ip,
+            cursor=cursor
         )
         
         if not result['success']:
@@ -120,19 +126,26 @@ def get_login_logs():
 def export_audit_logs():
     """导出审计日志"""
     try:
-        data = request.get_json()
+        data = request.get_json() or {}
         log_type = data.get('log_type', 'operation')  # operation/login
+        file_format = data.get('format', 'csv')  # csv/xlsx
         filters = data.get('filters', {})
+        current_user = getattr(g, 'current_user', None)
         
         audit_service = get_audit_service_instance()
-        result = audit_service.export_logs(log_type, filters)
+        result = audit_service.export_logs(
+            log_type,
+            filters,
+            file_format=file_format,
+            user_id=current_user.get('id') if current_user else None
+        )
         
         if not result['success']:
             raise BusinessException(result.get('error', '导出审计日志失败'))
             
         return jsonify({
             'code': 200,
-            'message': '导出审计日志成功',
+            'message': '导出任务已提交',
             'data': result['data']
         })
             
@@ -140,6 +153,55 @@ def export_audit_logs():
         logger.error(f"导出审计日志失败: {str(e)}")
         return handle_exception(e)
 
+@api_bp.route('/audit/export/<job_id>', methods=['GET'])
+@auth_required
+@permission_required('audit:export')
+def get_audit_export_job(job_id):
+    """获取审计日志导出任务状态"""
+    try:
+        current_user = getattr(g, 'current_user', None)
+        audit_service = get_audit_service_instance()
+        result = audit_service.get_export_job(job_id, current_user.get('id') if current_user else None)
+        
+        if not result['success']:
+            raise ResourceNotFoundException(result.get('error', '导出任务不存在'))
+            
+        return jsonify({
+            'code': 200,
+            'message': '获取导出任务状态成功',
+            'data': result['data']
+        })
+            
+    except Exception as e:
+        logger.error(f"获取导出任务状态失败: {str(e)}")
+        return handle_exception(e)
+
+@api_bp.route('/audit/export/<job_id>/download', methods=['GET'])
+@auth_required
+@permission_required('audit:export')
+def download_audit_export(job_id):
+    """下载审计日志导出文件"""
+    try:
+        current_user = getattr(g, 'current_user', None)
+        audit_service = get_audit_service_instance()
+        result = audit_service.get_export_job(job_id, current_user.get('id') if current_user else None)
+        
+        if not result['success']:
+            raise ResourceNotFoundException(result.get('error', '导出任务不存在'))
+        job = result['data']
+        if job['status'] != 'completed':
+            raise BusinessException('导出任务尚未完成')
+            
+        return send_file(
+            get_audit_export_service().get_file_path(job),
+            as_attachment=True,
+            download_name=job['file_name']
+        )
+            
+    except Exception as e:
+        logger.error(f"下载导出文件失败: {str(e)}")
+        return handle_exception(e)
+
 @api_bp.route('/audit/stats', methods=['GET'])
 @auth_required
 @permission_required('audit:view')
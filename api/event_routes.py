@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+服务端推送API路由模块
+通过SSE向前端推送通知、消息和后台任务进度，替代轮询
+"""
+import time
+from typing import Dict, Any, Optional
+from flask import request, jsonify, Response
+from . import api_bp
+from tools.auth_middleware import verify_token
+from tools.event_bus import get_event_bus
+from config.base_config import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+def _unauthorized():
+    return jsonify({
+        'code': 401,
+        'message': '无效的认证令牌',
+        'data': None
+    }), 401
+
+def _access_payload() -> Optional[Dict[str, Any]]:
+    """校验Authorization头中的访问令牌"""
+    auth_header = request.headers.get('Authorization', '')
+    payload = verify_token(auth_header[7:]) if auth_header.startswith('Bearer ') else None
+    if not payload or payload.get('type') != 'access':
+        return None
+    return payload
+
+@api_bp.route('/events/ticket', methods=['POST'])
+def issue_event_ticket():
+    """签发SSE连接票据，用于EventSource无法设置请求头时在URL中传递"""
+    payload = _access_payload()
+    if payload is None:
+        return _unauthorized()
+
+    ticket = get_event_bus().issue_ticket(payload.get('id'), payload.get('exp'))
+    return jsonify({
+        'code': 200,
+        'success': True,
+        'data': {'ticket': ticket, 'expires_in': Config.EVENT_TICKET_TTL},
+        'message': '签发成功'
+    })
+
+@api_bp.route('/events', methods=['GET'])
+def event_stream():
+    """
+    SSE事件流
+
+    访问令牌通过Authorization头传递；浏览器EventSource无法设置请求头时，
+    先调用/events/ticket换取一次性票据，再通过ticket查询参数连接，避免令牌出现在URL和访问日志中。
+    票据连接后即失效，EventSource出错重连时需重新换取票据，并以last_event_id查询参数续传。
+    断线重连时浏览器自动携带Last-Event-ID，从积压流补发期间错过的事件
+    """
+    ticket = request.args.get('ticket')
+    payload = get_event_bus().redeem_ticket(ticket) if ticket else _access_payload()
+    if not payload:
+        return _unauthorized()
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    deadline = payload.get('exp') or (time.time() + 3600)
+
+    return Response(
+        get_event_bus().stream(payload.get('id'), last_event_id, deadline=deadline),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # 禁止nginx缓冲
+        }
+    )
@@ -5,10 +5,12 @@
 from flask import request, jsonify, g
 from . import api_bp
 from tools.auth_middleware import auth_required, permission_required
+from service import get_message_service_instance
 from tools.exceptions import (
     ValidationException,
     BusinessException,
     ResourceNotFoundException,
+    AuthenticationException,
     handle_exception,
     create_error_response
 )
@@ -16,6 +18,13 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+def _current_user() -> dict:
+    """获取当前登录用户"""
+    current_user = getattr(g, 'current_user', None)
+    if not current_user:
+        raise AuthenticationException('用户未登录')
+    return current_user
+
 @api_bp.route('/message', methods=['GET'])
 @auth_required
 def get_messages():
@@ -28,46 +37,22 @@ def get_messages():
         status = request.args.get('status', '')
         sender = request.args.get('sender', '')
         
-        # 模拟数据，实际应该从数据库获取
-        messages = [
-            {
-                'id': 1,
-                'title': '系统维护通知',
-                'content': '系统将于今晚22:00-24:00进行维护',
-                'type': 'system',
-                'status': 'sent',
-                'sender': '系统管理员',
-                'recipient': '全体用户',
-                'created_at': '2025-07-25 10:00:00',
-                'sent_at': '2025-07-25 10:05:00'
-            },
-            {
-                'id': 2,
-                'title': '业务流程更新',
-                'content': '业务审批流程已更新，请查看新版本',
-                'type': 'business',
-                'status': 'draft',
-                'sender': '业务管理员',
-                'recipient': '相关部门',
-                'created_at': '2025-07-25 09:30:00'
-            }
-        ]
-        
-        # 简单过滤（实际应该在数据库层面进行）
-        if title:
-            messages = [m for m in messages if title.lower() in m['title'].lower()]
-        if message_type:
-            messages = [m for m in messages if m['type'] == message_type]
-        if status:
-            messages = [m for m in messages if m['status'] == status]
-        if sender:
-            messages = [m for m in messages if sender.lower() in m['sender'].lower()]
+        result = get_message_service_instance().get_messages(
+            page=page,
+            page_size=page_size,
+            title=title,
+            message_type=message_type,
+            status=status,
+            sender=sender
+        )
+        if not result['success']:
+            raise BusinessException(result.get('error', '获取消息列表失败'))
         
         return jsonify({
             'code': 200,
             'success': True,
-            'data': messages,
-            'total': len(messages),
+            'data': result['data']['list'],
+            'total': result['data']['total'],
             'message': '获取消息列表成功'
         })
     except Exception as e:
@@ -79,23 +64,14 @@ def get_messages():
 def get_message(message_id):
     """获取单个消息详情"""
     try:
-        # 模拟数据
-        message = {
-            'id': message_id,
-            'title': '系统维护通知',
-            'content': '系统将于今晚22:00-24:00进行维护，期间服务可能不可用。',
-            'type': 'system',
-            'status': 'sent',
-            'sender': '系统管理员',
-            'recipient': '全体用户',
-            'created_at': '2025-07-25 10:00:00',
-            'sent_at': '2025-07-25 10:05:00'
-        }
+        result = get_message_service_instance().get_message_by_id(message_id)
+        if not result['success']:
+            raise ResourceNotFoundException(result.get('error', '消息不存在'))
         
         return jsonify({
             'code': 200,
             'success': True,
-            'data': message,
+            'data': result['data'],
             'message': '获取消息详情成功'
         })
     except Exception as e:
@@ -108,21 +84,19 @@ def get_message(message_id):
 def create_message():
     """创建新消息"""
     try:
-        data = request.get_json()
-        
-        # 验证必填字段
-        required_fields = ['title', 'content', 'type']
-        for field in required_fields:
-            if not data.get(field):
-                raise ValidationException(f"缺少必填字段: {field}")
+        data = request.get_json() or {}
+        current_user = _current_user()
         
-        # 模拟创建消息
-        message_id = 123  # 实际应该从数据库获取
+        result = get_message_service_instance().create_message(
+            data, current_user.get('id'), current_user.get('username')
+        )
+        if not result['success']:
+            raise BusinessException(result.get('error', '消息创建失败'))
         
         return jsonify({
             'code': 200,
             'success': True,
-            'data': {'id': message_id},
+            'data': result['data'],
             'message': '消息创建成功'
         })
     except Exception as e:
@@ -135,7 +109,11 @@ def create_message():
 def update_message(message_id):
     """更新消息"""
     try:
-        data = request.get_json()
+        data = request.get_json() or {}
+        
+        result = get_message_service_instance().update_message(message_id, data)
+        if not result['success']:
+            raise BusinessException(result.get('error', '消息更新失败'))
         
         return jsonify({
             'code': 200,
@@ -152,6 +130,12 @@ def update_message(message_id):
 def delete_message(message_id):
     """删除消息"""
     try:
+        result = get_message_service_instance().delete_messages([message_id])
+        if not result['success']:
+            raise BusinessException(result.get('error', '消息删除失败'))
+        if not result['data']['deleted']:
+            raise ResourceNotFoundException('消息不存在')
+        
         return jsonify({
             'code': 200,
             'success': True,
@@ -167,10 +151,17 @@ def delete_message(message_id):
 def send_message(message_id):
     """发送消息"""
     try:
+        result = get_message_service_instance().send_messages([message_id])
+        if not result['success']:
+            raise BusinessException(result.get('error', '消息发送失败'))
+        if result['data']['skipped']:
+            raise BusinessException('消息不存在或已发送')
+        
         return jsonify({
             'code': 200,
             'success': True,
-            'message': '消息发送成功'
+            'data': result['data'],
+            'message': '消息发送中' if result['data']['sending'] else '消息发送成功'
         })
     except Exception as e:
         logger.error(f"发送消息失败: {str(e)}")
@@ -182,13 +173,17 @@ def send_message(message_id):
 def batch_delete_messages():
     """批量删除消息"""
     try:
-        data = request.get_json()
+        data = request.get_json() or {}
         ids = data.get('ids', [])
         
+        result = get_message_service_instance().delete_messages(ids)
+        if not result['success']:
+            raise BusinessException(result.get('error', '批量删除消息失败'))
+        
         return jsonify({
             'code': 200,
             'success': True,
-            'message': f'成功删除 {len(ids)} 条消息'
+            'message': f"成功删除 {result['data']['deleted']} 条消息"
         })
     except Exception as e:
         logger.error(f"批量删除消息失败: {str(e)}")
@@ -200,13 +195,19 @@ def batch_delete_messages():
 def batch_send_messages():
     """批量发送消息"""
     try:
-        data = request.get_json()
+        data = request.get_json() or {}
         ids = data.get('ids', [])
         
+        result = get_message_service_instance().send_messages(ids)
+        if not result['success']:
+            raise BusinessException(result.get('error', '批量发送消息失败'))
+        accepted = len(result['data']['sent']) + len(result['data']['sending'])
+        
         return jsonify({
             'code': 200,
             'success': True,
-            'message': f'成功发送 {len(ids)} 条消息'
+            'data': result['data'],
+            'message': f'成功提交 {accepted} 条消息'
         })
     except Exception as e:
         logger.error(f"批量发送消息失败: {str(e)}")
@@ -217,18 +218,14 @@ def batch_send_messages():
 def get_message_stats():
     """获取消息统计信息"""
     try:
-        stats = {
-            'total': 156,
-            'sent': 89,
-            'draft': 45,
-            'failed': 12,
-            'today_sent': 23
-        }
+        result = get_message_service_instance().get_stats()
+        if not result['success']:
+            raise BusinessException(result.get('error', '获取统计信息失败'))
         
         return jsonify({
             'code': 200,
             'success': True,
-            'data': stats,
+            'data': result['data'],
             'message': '获取统计信息成功'
         })
     except Exception as e:
@@ -240,22 +237,99 @@ def get_message_stats():
 def get_message_types():
     """获取消息类型列表"""
     try:
-        types = [
-            {'value': 'system', 'label': '系统通知'},
-            {'value': 'business', 'label': '业务消息'},
-            {'value': 'alert', 'label': '告警消息'}
-        ]
-        
         return jsonify({
             'code': 200,
             'success': True,
-            'data': types,
+            'data': get_message_service_instance().get_message_types(),
             'message': '获取消息类型成功'
         })
     except Exception as e:
         logger.error(f"获取消息类型失败: {str(e)}")
         return handle_exception(e)
 
+@api_bp.route('/message/inbox', methods=['GET'])
+@auth_required
+def get_inbox():
+    """获取当前用户收件箱"""
+    try:
+        page = request.args.get('pi', 1, type=int)
+        page_size = request.args.get('ps', 20, type=int)
+        unread_only = request.args.get('unread', 'false').lower() in ('1', 'true')
+        
+        result = get_message_service_instance().get_inbox(
+            _current_user().get('id'), page=page, page_size=page_size, unread_only=unread_only
+        )
+        if not result['success']:
+            raise BusinessException(result.get('error', '获取收件箱失败'))
+        
+        return jsonify({
+            'code': 200,
+            'success': True,
+            'data': result['data']['list'],
+            'total': result['data']['total'],
+            'message': '获取收件箱成功'
+        })
+    except Exception as e:
+        logger.error(f"获取收件箱失败: {str(e)}")
+        return handle_exception(e)
+
+@api_bp.route('/message/unread-count', methods=['GET'])
+@auth_required
+def get_unread_count():
+    """获取当前用户未读消息数"""
+    try:
+        result = get_message_service_instance().get_unread_count(_current_user().get('id'))
+        if not result['success']:
+            raise BusinessException(result.get('error', '获取未读数失败'))
+        
+        return jsonify({
+            'code': 200,
+            'success': True,
+            'data': result['data'],
+            'message': '获取未读数成功'
+        })
+    except Exception as e:
+        logger.error(f"获取未读数失败: {str(e)}")
+        return handle_exception(e)
+
+@api_bp.route('/message/<int:message_id>/read', methods=['POST'])
+@auth_required
+def mark_message_read(message_id):
+    """标记消息已读"""
+    try:
+        result = get_message_service_instance().mark_read(_current_user().get('id'), message_id)
+        if not result['success']:
+            raise BusinessException(result.get('error', '标记已读失败'))
+        
+        return jsonify({
+            'code': 200,
+            'success': True,
+            'data': result['data'],
+            'message': '标记已读成功'
+        })
+    except Exception as e:
+        logger.error(f"标记已读失败: {str(e)}")
+        return handle_exception(e)
+
+@api_bp.route('/message/read-all', methods=['POST'])
+@auth_required
+def mark_all_messages_read():
+    """全部标记为已读"""
+    try:
+        result = get_message_service_instance().mark_all_read(_current_user().get('id'))
+        if not result['success']:
+            raise BusinessException(result.get('error', '全部标记已读失败'))
+        
+        return jsonify({
+            'code': 200,
+            'success': True,
+            'data': result['data'],
+            'message': '全部标记已读成功'
+        })
+    except Exception as e:
+        logger.error(f"全部标记已读失败: {str(e)}")
+        return handle_exception(e)
+
 @api_bp.route('/message/channels', methods=['GET'])
 @auth_required
 def get_message_channels():
@@ -167,6 +167,21 @@ def health_check():
         logger.error(f"健康检查失败: {str(e)}")
         return handle_exception(e)
 
+@api_bp.route('/health/db-pool', methods=['GET'])
+@auth_required
+def db_pool_stats():
+    """数据库连接池使用情况（当前进程）"""
+    try:
+        from tools.engine_registry import get_engine_registry
+        return jsonify({
+            'code': 200,
+            'message': '获取连接池状态成功',
+            'data': get_engine_registry().stats()
+        })
+    except Exception as e:
+        logger.error(f"获取连接池状态失败: {str(e)}")
+        return handle_exception(e)
+
 @api_bp.route('/notice', methods=['GET'])
 def get_notice():
     """获取通知列表"""
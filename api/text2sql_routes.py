@@ -4,13 +4,29 @@ Text2SQL API路由模块
 提供自然语言转SQL的HTTP接口
 """
 import json
+import uuid
 from datetime import datetime
-from flask import Blueprint, request, jsonify, g
+from flask import Blueprint, request, jsonify, g, Response
 from AIEngine.vanna_service import get_vanna_service
+from AIEngine.sql_candidates import get_candidate_generator, get_sql_generator
+from AIEngine.sql_stream import get_sql_streamer
+from AIEngine.sql_repair import get_sql_repairer
+from AIEngine.example_store import get_example_store
+from config.base_config import Config
 from tools.auth_middleware import auth_required
+from tools.database import get_database_service
+from tools.result_store import get_result_store
+from tools.write_behind import get_write_behind_queue
+from tools.stats_aggregator import get_stats_aggregator
+from tools.event_bus import format_sse
+from service.saved_query_service import get_saved_query_service
+from service.training_job_service import get_training_job_service, normalize_training_items
+from service.sql_template_service import get_sql_template_service
+from service.value_dictionary_service import get_value_dictionary_service
 from tools.exceptions import (
     ValidationException, BusinessException,
-    DatabaseException, ExternalServiceException
+    DatabaseException, ExternalServiceException,
+    ResourceNotFoundException
 )
 import logging
 
@@ -19,6 +35,79 @@ logger = logging.getLogger(__name__)
 # 创建蓝图
 text2sql_bp = Blueprint('text2sql', __name__, url_prefix='/api/text2sql')
 
+def _save_session_message(vanna_service, session_id, user_id, message_type, content,
+                          sql_query=None, query_result=None, execution_time=None):
+    """记录会话消息，启用异步批量写入时不在请求路径上等待数据库"""
+    if not Config.WRITE_BEHIND_ENABLED:
+        vanna_service.add_message_to_session(
+            session_id=session_id,
+            user_id=user_id,
+            message_type=message_type,
+            content=content,
+            sql_query=sql_query,
+            query_result=query_result,
+            execution_time=execution_time
+        )
+        return
+    
+    # 会话归属由刷盘线程批量校验（tools/write_behind.ROW_CHECKS），不属于当前用户的消息写入死信文件
+    get_write_behind_queue().submit('vanna', 'text2sql_messages', {
+        'id': str(uuid.uuid4()),
+        'session_id': session_id,
+        'user_id': user_id,
+        'message_type': message_type,
+        'content': content,
+        'sql_query': sql_query,
+        'query_result': json.dumps(query_result, ensure_ascii=False, default=str) if query_result is not None else None,
+        'execution_time': execution_time,
+        # 入队时记录时间，保证消息顺序不受刷盘延迟影响
+        'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    })
+
+def _match_sql_template(question):
+    """按已挖掘的SQL模板生成，未启用、未命中或出错时返回None"""
+    if not Config.SQL_TEMPLATE_ENABLED:
+        return None
+    try:
+        match = get_sql_template_service().match(question)
+    except Exception as e:
+        logger.warning(f"SQL模板匹配失败: {str(e)}")
+        return None
+    if match is None:
+        return None
+    return {
+        'success': True,
+        'data': {
+            'sql': match['sql'],
+            'confidence': match['confidence'],
+            'source': 'template',
+            'template_id': match['template_id'],
+            'slots': match['slots']
+        }
+    }
+
+def _link_values(question):
+    """识别问题中提到的字段取值，返回(识别结果, 附加取值提示的问题)"""
+    if not Config.VALUE_DICTIONARY_ENABLED:
+        return [], question
+    try:
+        service = get_value_dictionary_service()
+        entities = service.link(question)
+    except Exception as e:
+        logger.warning(f"字段取值识别失败: {str(e)}")
+        return [], question
+    if not entities:
+        return [], question
+    return entities, f"{question}\n{service.describe(entities)}"
+
+def _example_index_ready():
+    """本地样本向量索引是否已有数据（需先训练或执行scripts/backfill_example_index.py）"""
+    try:
+        return get_example_store().populated()
+    except Exception as e:
+        logger.warning(f"读取样本索引状态失败: {str(e)}")
+        return False
+
 @text2sql_bp.route('/generate', methods=['POST'])
 @auth_required
 def generate_sql():
@@ -38,9 +127,35 @@ def generate_sql():
         # 记录用户查询
         logger.info(f"用户查询: {question} (用户ID: {user_id})")
         
-        # 调用Vanna服务
-        vanna_service = get_vanna_service()
-        result = vanna_service.generate_sql(question)
+        # 同类问题优先按SQL模板确定性生成，未命中时调用Vanna服务
+        start_time = datetime.now()
+        result = _match_sql_template(question)
+        from_template = result is not None
+        if not from_template:
+            # 问题中提到的字段取值解析为精确的表、字段和取值后提示大模型
+            entities, prompt_question = _link_values(question)
+            if data.get('candidates', Config.SQL_CANDIDATE_ENABLED):
+                # 并发生成多个候选，返回第一个通过EXPLAIN校验的SQL
+                result = get_candidate_generator().generate(prompt_question)
+            elif Config.SQL_RETRIEVAL_ENABLED and _example_index_ready():
+                # 提示词上下文和few-shot示例取自本地向量+BM25混合检索，不经过Vanna的Chroma检索；
+                # 失败时直接返回，不在请求路径上再调用一次大模型
+                result = get_sql_generator().generate(prompt_question)
+            else:
+                result = get_vanna_service().generate_sql(prompt_question)
+            if entities and isinstance(result.get('data'), dict):
+                result['data']['entities'] = entities
+        elapsed = int((datetime.now() - start_time).total_seconds() * 1000)
+        if not from_template and Config.SQL_TEMPLATE_ENABLED and result.get('success'):
+            get_sql_template_service().record_fallback(elapsed)
+        
+        # 进程内聚合统计，由后台线程定期合并到sql_generation_stats
+        result_data = result.get('data') if isinstance(result.get('data'), dict) else {}
+        get_stats_aggregator().record(
+            success=bool(result.get('success')),
+            execution_time=elapsed,
+            confidence=result_data.get('confidence')
+        )
         
         if result['success']:
             return jsonify({
@@ -58,6 +173,64 @@ def generate_sql():
         logger.error(f"生成SQL失败: {str(e)}")
         raise ExternalServiceException('SQL生成服务异常')
 
+@text2sql_bp.route('/generate/stream', methods=['POST'])
+@auth_required
+def generate_sql_stream():
+    """
+    流式生成SQL（SSE）
+
+    依次推送token（模型输出片段）、sql（增量提取的SQL片段）和final（校验后的SQL及缓存键）事件，
+    命中SQL模板时只推送final事件；出错时推送error事件
+    """
+    started = datetime.now()
+    data = request.get_json() or {}
+    question = data.get('question', '').strip()
+    if not question:
+        raise ValidationException('请输入查询问题')
+
+    current_user = getattr(g, 'current_user', None)
+    user_id = current_user.get('id') if current_user else None
+    logger.info(f"用户流式查询: {question} (用户ID: {user_id})")
+
+    template = _match_sql_template(question)
+    entities, prompt_question = ([], question) if template else _link_values(question)
+
+    def elapsed_ms():
+        return int((datetime.now() - started).total_seconds() * 1000)
+
+    def events():
+        success, first_token_ms = False, None
+        try:
+            if template:
+                success, first_token_ms = True, elapsed_ms()
+                yield format_sse('final', json.dumps({**template['data'], 'valid': True},
+                                                     ensure_ascii=False, default=str))
+                return
+            if entities:
+                yield format_sse('entities', json.dumps(entities, ensure_ascii=False))
+            for event, payload in get_sql_streamer().stream(prompt_question):
+                if first_token_ms is None and event in ('token', 'final'):
+                    first_token_ms = elapsed_ms()
+                if event == 'final':
+                    success = payload['valid']
+                yield format_sse(event, json.dumps(payload, ensure_ascii=False, default=str))
+        except Exception as e:
+            logger.error(f"流式生成SQL失败: {str(e)}")
+            yield format_sse('error', json.dumps({'message': 'SQL生成服务异常'}, ensure_ascii=False))
+        finally:
+            # 客户端中途断开时也记录，首个token耗时作为感知延迟统计
+            get_stats_aggregator().record(success=success, execution_time=elapsed_ms(),
+                                          first_token_time=first_token_ms)
+
+    return Response(
+        events(),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # 禁止nginx缓冲
+        }
+    )
+
 @text2sql_bp.route('/execute', methods=['POST'])
 @auth_required
 def execute_sql():
@@ -66,6 +239,7 @@ def execute_sql():
         data = request.get_json()
         sql = data.get('sql', '').strip()
         session_id = data.get('session_id')  # 添加会话ID参数
+        auto_repair = data.get('auto_repair', Config.SQL_REPAIR_ENABLED)
         
         if not sql:
             raise ValidationException('SQL语句不能为空')
@@ -83,18 +257,35 @@ def execute_sql():
         vanna_service = get_vanna_service()
         result = vanna_service.execute_sql(sql)
         
+        # 执行失败时在本次请求内结合错误信息和表结构修正SQL后重新执行
+        repair = None
+        if not result['success'] and auto_repair:
+            repaired_result, repair = get_sql_repairer().repair(
+                sql, result, vanna_service.execute_sql, question=data.get('question')
+            )
+            # 修复失败时按原SQL的错误返回
+            if repair['repaired']:
+                result, sql = repaired_result, repair['sql']
+        
         execution_time = int((datetime.now() - start_time).total_seconds() * 1000)
         
         if result['success']:
-            # 如果提供了会话ID，记录执行结果
+            # 如果提供了会话ID，记录执行结果（大结果只保留预览和结果引用）
             if session_id:
-                vanna_service.add_message_to_session(
+                query_result = get_result_store().build_message_result(
+                    result['data'],
+                    result.get('columns'),
+                    threshold=Config.RESULT_SPILL_THRESHOLD,
+                    preview_rows=Config.RESULT_PREVIEW_ROWS
+                )
+                _save_session_message(
+                    vanna_service,
                     session_id=session_id,
                     user_id=user_id,
                     message_type='assistant',
                     content=f"SQL执行成功，返回{len(result['data'])}条记录",
                     sql_query=sql,
-                    query_result=result['data'],
+                    query_result=query_result,
                     execution_time=execution_time
                 )
             
@@ -106,7 +297,9 @@ def execute_sql():
                     'columns': result['columns'],
                     'row_count': result['row_count'],
                     'execution_time': execution_time,
-                    'timestamp': datetime.now().isoformat()
+                    'timestamp': datetime.now().isoformat(),
+                    'sql': sql,
+                    'repair': repair
                 },
                 'message': 'SQL执行成功'
             })
@@ -115,7 +308,8 @@ def execute_sql():
             
             # 如果提供了会话ID，记录执行失败
             if session_id:
-                vanna_service.add_message_to_session(
+                _save_session_message(
+                    vanna_service,
                     session_id=session_id,
                     user_id=user_id,
                     message_type='assistant',
@@ -132,44 +326,152 @@ def execute_sql():
         logger.error(f"执行SQL失败: {str(e)}")
         raise ExternalServiceException('SQL执行服务异常')
 
+@text2sql_bp.route('/results/<result_ref>', methods=['GET'])
+@auth_required
+def get_query_result_page(result_ref):
+    """分页读取会话中已存储的查询结果"""
+    try:
+        page = request.args.get('page', 1, type=int)
+        
+        # 获取当前用户ID
+        current_user = getattr(g, 'current_user', None)
+        user_id = current_user.get('id') if current_user else None
+        
+        # 仅允许读取本人会话消息引用的结果（result_ref为生成列，见sql/result_store.sql）
+        owned = get_database_service().execute_vanna_query(
+            """
+            SELECT 1 FROM text2sql_messages
+            WHERE user_id = :user_id AND result_ref = :result_ref
+            LIMIT 1
+            """,
+            {'user_id': user_id, 'result_ref': result_ref}
+        )
+        if not owned:
+            raise ResourceNotFoundException('查询结果不存在')
+        
+        result_page = get_result_store().get_page(result_ref, page)
+        if result_page is None:
+            raise ResourceNotFoundException('查询结果不存在')
+        
+        return jsonify({
+            'code': 200,
+            'success': True,
+            'data': result_page,
+            'message': '获取查询结果成功'
+        })
+        
+    except ResourceNotFoundException:
+        raise
+    except Exception as e:
+        logger.error(f"获取查询结果失败: {str(e)}")
+        raise ExternalServiceException('查询结果服务异常')
+
+@text2sql_bp.route('/stats', methods=['GET'])
+@auth_required
+def get_generation_stats():
+    """获取SQL生成统计（含P50/P95/P99耗时）"""
+    try:
+        date_str = request.args.get('date')
+        try:
+            date_key = datetime.strptime(date_str, '%Y-%m-%d').date() if date_str else None
+        except ValueError:
+            raise ValidationException('日期格式应为YYYY-MM-DD')
+        
+        stats = get_stats_aggregator().get_stats(date_key)
+        
+        return jsonify({
+            'code': 200,
+            'success': True,
+            'data': stats,
+            'message': '获取统计数据成功'
+        })
+        
+    except ValidationException:
+        raise
+    except Exception as e:
+        logger.error(f"获取SQL生成统计失败: {str(e)}")
+        raise ExternalServiceException('统计服务异常')
+
+@text2sql_bp.route('/templates/stats', methods=['GET'])
+@auth_required
+def get_template_stats():
+    """获取SQL模板命中率及节省的耗时"""
+    try:
+        return jsonify({
+            'code': 200,
+            'success': True,
+            'data': get_sql_template_service().get_stats(),
+            'message': '获取统计数据成功'
+        })
+    except Exception as e:
+        logger.error(f"获取SQL模板统计失败: {str(e)}")
+        raise ExternalServiceException('统计服务异常')
+
+@text2sql_bp.route('/templates/rebuild', methods=['POST'])
+@auth_required
+def rebuild_templates():
+    """从问答历史全量重建SQL模板"""
+    try:
+        data = request.get_json(silent=True) or {}
+        limit = data.get('limit')
+        if limit is not None and (not isinstance(limit, int) or limit <= 0):
+            raise ValidationException('limit必须为正整数')
+        
+        return jsonify({
+            'code': 200,
+            'success': True,
+            'data': get_sql_template_service().rebuild(limit),
+            'message': 'SQL模板重建完成'
+        })
+    except ValidationException:
+        raise
+    except Exception as e:
+        logger.error(f"重建SQL模板失败: {str(e)}")
+        raise ExternalServiceException('SQL模板服务异常')
+
 @text2sql_bp.route('/train', methods=['POST'])
 @auth_required
 def train_model():
-    """训练模型"""
+    """提交训练任务，训练由后台worker执行，通过/train/<task_id>查询进度"""
     try:
         data = request.get_json()
         if not data:
             raise ValidationException('缺少训练数据')
         
-        vanna_service = get_vanna_service()
+        current_user = getattr(g, 'current_user', None)
+        user_id = current_user.get('id') if current_user else None
         
-        # 支持多种训练方式
-        if 'ddl' in data:
-            # DDL训练
-            ddl_statements = data['ddl'] if isinstance(data['ddl'], list) else [data['ddl']]
-            success = vanna_service.train_with_ddl(ddl_statements)
-        elif 'documentation' in data:
-            # 文档训练
-            success = vanna_service.train_with_documentation(data['documentation'])
-        elif 'question' in data and 'sql' in data:
-            # 问题-SQL对训练
-            success = vanna_service.train_with_sql(data['question'], data['sql'])
-        else:
-            raise ValidationException('无效的训练数据格式')
+        # 支持DDL、文档和问题-SQL对，可在一次请求中混合提交多条
+        items = normalize_training_items(data)
+        job = get_training_job_service().submit(items, 'manual', user_id)
         
-        if success:
-            return jsonify({
-                'code': 200,
-                'success': True,
-                'message': '模型训练成功'
-            })
-        else:
-            raise BusinessException('模型训练失败')
+        return jsonify({
+            'code': 200,
+            'success': True,
+            'message': '训练任务已提交',
+            'data': job
+        })
             
-    except (ValidationException, BusinessException):
+    except ValidationException:
         raise
     except Exception as e:
-        logger.error(f"模型训练失败: {str(e)}")
+        logger.error(f"提交训练任务失败: {str(e)}")
+        raise ExternalServiceException('训练服务异常')
+
+@text2sql_bp.route('/train/<task_id>', methods=['GET'])
+@auth_required
+def get_train_status(task_id):
+    """获取训练任务进度、吞吐量和预计剩余时间"""
+    try:
+        return jsonify({
+            'code': 200,
+            'success': True,
+            'data': get_training_job_service().get_status(task_id)
+        })
+    except ResourceNotFoundException:
+        raise
+    except Exception as e:
+        logger.error(f"获取训练任务状态失败: {str(e)}")
         raise ExternalServiceException('训练服务异常')
 
 @text2sql_bp.route('/sessions', methods=['GET'])
@@ -216,7 +518,8 @@ def create_session():
         if result['success']:
             # 添加欢迎消息
             session_id = result['data']['id']
-            vanna_service.add_message_to_session(
+            _save_session_message(
+                vanna_service,
                 session_id=session_id,
                 user_id=user_id,
                 message_type='system',
@@ -254,21 +557,142 @@ def delete_session(session_id):
 @text2sql_bp.route('/train-samples', methods=['POST'])
 @auth_required
 def train_initial_samples():
-    """训练初始SQL样本"""
+    """训练初始SQL样本（提交到训练任务队列）"""
     try:
         # 获取当前用户ID
         current_user = getattr(g, 'current_user', None)
         user_id = current_user.get('id') if current_user else None
         
         # 记录训练操作
-        logger.info(f"开始训练初始SQL样本 (用户ID: {user_id})")
+        logger.info(f"提交初始SQL样本训练任务 (用户ID: {user_id})")
         
-        # 调用Vanna服务
-        vanna_service = get_vanna_service()
-        result = vanna_service.train_initial_samples()
+        job = get_training_job_service().submit([], 'samples', user_id)
         
-        return jsonify(result)
+        return jsonify({
+            'success': True,
+            'message': '训练任务已提交',
+            'data': job
+        })
         
     except Exception as e:
         logger.error(f"训练初始样本失败: {str(e)}")
-        return jsonify({'error': '服务器内部错误'}), 500 
\ No newline at end of file
+        return jsonify({'error': '服务器内部错误'}), 500 
+
+@text2sql_bp.route('/saved-queries', methods=['POST'])
+@auth_required
+def create_saved_query():
+    """保存查询（问题及校验过的SQL），结果由后台按计划物化"""
+    try:
+        data = request.get_json() or {}
+        current_user = getattr(g, 'current_user', None)
+        user_id = current_user.get('id') if current_user else None
+        
+        result = get_saved_query_service().create_saved_query(data, user_id)
+        
+        return jsonify({
+            'code': 200,
+            'success': True,
+            'data': result['data'],
+            'message': result['message']
+        })
+        
+    except (ValidationException, BusinessException):
+        raise
+    except Exception as e:
+        logger.error(f"保存查询失败: {str(e)}")
+        raise ExternalServiceException('保存查询服务异常')
+
+@text2sql_bp.route('/saved-queries', methods=['GET'])
+@auth_required
+def get_saved_queries():
+    """获取保存查询列表"""
+    try:
+        current_user = getattr(g, 'current_user', None)
+        user_id = current_user.get('id') if current_user else None
+        
+        result = get_saved_query_service().get_saved_queries(user_id)
+        
+        return jsonify({
+            'code': 200,
+            'success': True,
+            'data': result['data'],
+            'message': '获取保存查询列表成功'
+        })
+        
+    except Exception as e:
+        logger.error(f"获取保存查询列表失败: {str(e)}")
+        raise ExternalServiceException('保存查询服务异常')
+
+@text2sql_bp.route('/saved-queries/<int:saved_query_id>', methods=['DELETE'])
+@auth_required
+def delete_saved_query(saved_query_id):
+    """删除保存查询及其物化结果"""
+    try:
+        current_user = getattr(g, 'current_user', None)
+        user_id = current_user.get('id') if current_user else None
+        
+        result = get_saved_query_service().delete_saved_query(saved_query_id, user_id)
+        
+        return jsonify({
+            'code': 200,
+            'success': True,
+            'data': None,
+            'message': result['message']
+        })
+        
+    except ResourceNotFoundException:
+        raise
+    except Exception as e:
+        logger.error(f"删除保存查询失败: {str(e)}")
+        raise ExternalServiceException('保存查询服务异常')
+
+@text2sql_bp.route('/saved-queries/<int:saved_query_id>/result', methods=['GET'])
+@auth_required
+def get_saved_query_result(saved_query_id):
+    """分页读取保存查询的物化结果（不执行原查询）"""
+    try:
+        page = request.args.get('page', 1, type=int)
+        page_size = request.args.get('page_size', 100, type=int)
+        current_user = getattr(g, 'current_user', None)
+        user_id = current_user.get('id') if current_user else None
+        
+        result = get_saved_query_service().get_result(saved_query_id, user_id, page, page_size)
+        
+        return jsonify({
+            'code': 200,
+            'success': True,
+            'data': result['data'],
+            'message': '获取物化结果成功'
+        })
+        
+    except ResourceNotFoundException:
+        raise
+    except Exception as e:
+        logger.error(f"获取物化结果失败: {str(e)}")
+        raise ExternalServiceException('保存查询服务异常')
+
+@text2sql_bp.route('/saved-queries/<int:saved_query_id>/refresh', methods=['POST'])
+@auth_required
+def refresh_saved_query(saved_query_id):
+    """立即刷新保存查询，full=1时强制全量刷新"""
+    try:
+        full = request.args.get('full', '0') in ('1', 'true')
+        current_user = getattr(g, 'current_user', None)
+        user_id = current_user.get('id') if current_user else None
+        
+        result = get_saved_query_service().refresh(saved_query_id, full=full, user_id=user_id)
+        if not result['success']:
+            raise BusinessException(result.get('error') or result['message'])
+        
+        return jsonify({
+            'code': 200,
+            'success': True,
+            'data': result['data'],
+            'message': result['message']
+        })
+        
+    except (ResourceNotFoundException, BusinessException):
+        raise
+    except Exception as e:
+        logger.error(f"刷新保存查询失败: {str(e)}")
+        raise ExternalServiceException('保存查询服务异常')
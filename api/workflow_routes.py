@@ -3,6 +3,8 @@ from . import api_bp
 from tools.auth_middleware import auth_required, permission_required
 from service import get_workflow_service_instance
 from service.workflow_service import get_workflow_service as get_enhanced_workflow_service
+from service.workflow_watch import get_workflow_watch
+from config.base_config import Config
 from tools.exceptions import (
     ValidationException,
     BusinessException,
@@ -130,38 +132,88 @@ def delete_workflow(workflow_id):
 def execute_workflow(workflow_id):
     """执行工作流"""
     try:
+        data = request.get_json(silent=True) or {}
         enhanced_service = get_enhanced_workflow_service()
-        result = enhanced_service.execute_workflow(workflow_id)
+        result = enhanced_service.execute_workflow(
+            workflow_id, user_id=g.current_user.get('id'), conf=data.get('conf')
+        )
+        if not result['success']:
+            raise BusinessException(result.get('message', '执行工作流失败'))
         
         return jsonify({
             'code': 200,
             'success': True,
-            'message': '工作流执行成功'
+            'data': {
+                'instance_id': result['instance_id'],
+                'dag_run_id': result['dag_run_id']
+            },
+            'message': '工作流执行已提交'
         })
     except Exception as e:
         logger.error(f"执行工作流失败: {str(e)}")
         return handle_exception(e)
 
+@api_bp.route('/workflow/instances/<int:instance_id>/wait', methods=['GET'])
+@auth_required
+def wait_workflow_instance(instance_id):
+    """
+    等待工作流实例状态变化（长轮询）
+
+    客户端携带上次返回的version作为since，实例或任一节点在该版本之后变化时立即返回变化部分，
+    否则最多等待timeout秒后返回changed=false；finished为true时无需继续等待
+    """
+    try:
+        since = request.args.get('since', 0, type=int)
+        timeout = request.args.get('timeout', Config.WORKFLOW_WATCH_TIMEOUT, type=float)
+        if since < 0 or timeout < 0:
+            raise ValidationException('since和timeout不能为负数')
+        
+        user_id = g.current_user.get('id')
+        permissions = get_enhanced_workflow_service().permissions
+        result = get_workflow_watch().wait(
+            instance_id, since, min(timeout, Config.WORKFLOW_WATCH_MAX_TIMEOUT),
+            authorize=lambda workflow_id: permissions.check(user_id, 'workflow', workflow_id, 'view')
+        )
+        if result is None:
+            raise ResourceNotFoundException('工作流实例不存在')
+        
+        return jsonify({
+            'code': 200,
+            'success': True,
+            'data': result,
+            'message': '实例状态已变化' if result['changed'] else '实例状态无变化'
+        })
+    except Exception as e:
+        logger.error(f"等待工作流实例状态失败: {str(e)}")
+        return handle_exception(e)
+
 @api_bp.route('/workflow/batch/activate', methods=['PUT'])
 @auth_required
 @permission_required('workflow:manage')
 def batch_activate_workflows():
     """批量激活工作流"""
     try:
-        data = request.get_json()
+        data = request.get_json() or {}
         ids = data.get('ids', [])
         
         if not ids:
             raise ValidationException("请选择要激活的工作流")
         
-        enhanced_service = get_enhanced_workflow_service()
-        for workflow_id in ids:
-            enhanced_service.activate_workflow(workflow_id)
+        user_id = g.current_user.get('id')
+        result = get_enhanced_workflow_service().bulk_set_status(ids, 'active', user_id)
+        if not result['success']:
+            raise BusinessException(result.get('message', '批量激活工作流失败'))
         
+        summary = result['data']['summary']
+        changed = summary.get('updated', 0) + summary.get('unchanged', 0)
+        rejected = summary.get('forbidden', 0) + summary.get('not_found', 0)
         return jsonify({
             'code': 200,
             'success': True,
-            'message': f'成功激活 {len(ids)} 个工作流'
+            'data': result['data'],
+            'message': f'成功激活 {changed} 个工作流' + (
+                f'，{rejected} 个无权限或不存在' if rejected else ''
+            )
         })
     except Exception as e:
         logger.error(f"批量激活工作流失败: {str(e)}")
@@ -173,20 +225,27 @@ def batch_activate_workflows():
 def batch_deactivate_workflows():
     """批量停用工作流"""
     try:
-        data = request.get_json()
+        data = request.get_json() or {}
         ids = data.get('ids', [])
         
         if not ids:
             raise ValidationException("请选择要停用的工作流")
         
-        enhanced_service = get_enhanced_workflow_service()
-        for workflow_id in ids:
-            enhanced_service.deactivate_workflow(workflow_id)
+        user_id = g.current_user.get('id')
+        result = get_enhanced_workflow_service().bulk_set_status(ids, 'inactive', user_id)
+        if not result['success']:
+            raise BusinessException(result.get('message', '批量停用工作流失败'))
         
+        summary = result['data']['summary']
+        changed = summary.get('updated', 0) + summary.get('unchanged', 0)
+        rejected = summary.get('forbidden', 0) + summary.get('not_found', 0)
         return jsonify({
             'code': 200,
             'success': True,
-            'message': f'成功停用 {len(ids)} 个工作流'
+            'data': result['data'],
+            'message': f'成功停用 {changed} 个工作流' + (
+                f'，{rejected} 个无权限或不存在' if rejected else ''
+            )
         })
     except Exception as e:
         logger.error(f"批量停用工作流失败: {str(e)}")
@@ -198,20 +257,27 @@ def batch_deactivate_workflows():
 def batch_delete_workflows():
     """批量删除工作流"""
     try:
-        data = request.get_json()
+        data = request.get_json() or {}
         ids = data.get('ids', [])
         
         if not ids:
             raise ValidationException("请选择要删除的工作流")
         
-        enhanced_service = get_enhanced_workflow_service()
-        for workflow_id in ids:
-            enhanced_service.delete_workflow(workflow_id)
+        user_id = g.current_user.get('id')
+        result = get_enhanced_workflow_service().bulk_delete(ids, user_id)
+        if not result['success']:
+            raise BusinessException(result.get('message', '批量删除工作流失败'))
         
+        summary = result['data']['summary']
+        changed = summary.get('updated', 0) + summary.get('unchanged', 0)
+        rejected = summary.get('forbidden', 0) + summary.get('not_found', 0)
         return jsonify({
             'code': 200,
             'success': True,
-            'message': f'成功删除 {len(ids)} 个工作流'
+            'data': result['data'],
+            'message': f'成功删除 {changed} 个工作流' + (
+                f'，{rejected} 个无权限或不存在' if rejected else ''
+            )
         })
     except Exception as e:
         logger.error(f"批量删除工作流失败: {str(e)}")
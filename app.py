@@ -95,6 +95,32 @@ def init_services(config_obj):
         get_user_service_instance()
         logger.info("用户服务初始化成功")
         
+        # 启动工作流执行后端（恢复未完成实例的状态同步）
+        logger.info("正在启动工作流执行后端...")
+        from service.workflow_backend import get_workflow_backend
+        get_workflow_backend()
+        logger.info("工作流执行后端启动成功")
+        
+        # 启动保存查询刷新调度
+        logger.info("正在启动保存查询刷新调度...")
+        from service.saved_query_service import get_saved_query_scheduler
+        get_saved_query_scheduler()
+        logger.info("保存查询刷新调度启动成功")
+        
+        # 启动字段取值词典刷新
+        if config_obj.VALUE_DICTIONARY_ENABLED:
+            logger.info("正在启动字段取值词典刷新...")
+            from service.value_dictionary_service import get_value_dictionary_refresher
+            get_value_dictionary_refresher()
+            logger.info("字段取值词典刷新启动成功")
+        
+        # 启动训练任务worker（也可以关闭后以独立进程运行scripts/training_worker.py）
+        if config_obj.TRAINING_WORKER_EMBEDDED:
+            logger.info("正在启动训练任务worker...")
+            from service.training_job_service import get_training_worker
+            get_training_worker()
+            logger.info("训练任务worker启动成功")
+        
     except Exception as e:
         logger.error(f"服务初始化失败: {str(e)}")
         raise
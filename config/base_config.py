@@ -21,12 +21,18 @@ class Config:
     # SQLAlchemy配置
     SQLALCHEMY_DATABASE_URI = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}?charset=utf8mb4"
     VANNA_DATABASE_URI = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{VANNA_DATABASE}?charset=utf8mb4"
+    AIRFLOW_DATABASE_URI = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/airflow?charset=utf8mb4"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ENGINE_OPTIONS = {
         'pool_size': 10,
         'pool_recycle': 120,
         'pool_pre_ping': True
     }
+    # 按负载类型覆盖连接池参数（engine_registry），长时间占用连接的任务使用独立的小连接池
+    DB_WORKLOAD_POOL_OPTIONS = {
+        'export': {'pool_size': 2, 'max_overflow': 2},
+        'background': {'pool_size': 2, 'max_overflow': 3}
+    }
     
     # Redis配置
     REDIS_HOST = 'localhost'
@@ -48,7 +54,165 @@ class Config:
     VANNA_MODEL = 'qwen-turbo'
     VANNA_API_KEY = ''
     VANNA_API_BASE = 'https://dashscope.aliyuncs.com/compatible-mode/v1'
+    VANNA_REQUEST_TIMEOUT = 60  # 单次大模型调用超时（秒）
     
+    # 查询结果存储配置（大结果写入压缩的内容寻址存储，消息表只保留预览）
+    RESULT_STORE_BACKEND = 'local'  # 可选: local, minio
+    RESULT_STORE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'results')
+    RESULT_STORE_PAGE_SIZE = 500
+    RESULT_SPILL_THRESHOLD = 200  # 超过该行数的结果写入结果存储
+    RESULT_PREVIEW_ROWS = 20
+    MINIO_ENDPOINT = 'localhost:9001'
+    MINIO_ACCESS_KEY = ''
+    MINIO_SECRET_KEY = ''
+    MINIO_BUCKET = 'dataask-results'
+    MINIO_SECURE = False
+
+    # 异步批量写入配置（会话消息、问答历史、审计日志）
+    WRITE_BEHIND_ENABLED = True
+    WRITE_BEHIND_FLUSH_INTERVAL_MS = 200
+    WRITE_BEHIND_BATCH_ROWS = 500
+    WRITE_BEHIND_MAX_QUEUE = 10000
+    WRITE_BEHIND_WAL_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'wal', 'write_behind.wal')
+
+    # SQL生成统计刷盘间隔（秒）
+    SQL_STATS_FLUSH_INTERVAL = 5
+
+    # 审计日志分区维护配置（按月分区）
+    AUDIT_RETENTION_MONTHS = 12  # 明细保留月数，0表示不删除
+    AUDIT_PARTITIONS_AHEAD = 3  # 提前创建的未来月份分区数
+
+    # 审计日志导出配置（后台任务流式写文件）
+    AUDIT_EXPORT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'exports')
+    AUDIT_EXPORT_WORKERS = 2
+    AUDIT_EXPORT_FETCH_SIZE = 5000  # 每次从服务端游标读取的行数
+
+    # 消息中心配置（定向消息后台扇出到收件箱）
+    MESSAGE_FANOUT_WORKERS = 2
+    MESSAGE_FANOUT_BATCH = 1000  # 每条INSERT写入的收件箱行数
+    MESSAGE_FANOUT_LEASE = 120  # 扇出认领的有效期（秒），每批写入后续期，进程退出后到期由其他进程恢复
+
+    # 服务端推送（SSE）配置
+    EVENT_BACKLOG_SIZE = 200  # 每个事件流保留的积压事件数，用于断线补发
+    EVENT_BACKLOG_TTL = 86400  # 事件流过期时间（秒）
+    EVENT_HEARTBEAT_SECONDS = 15
+    EVENT_RETRY_MS = 3000  # 客户端断线重连间隔
+    EVENT_QUEUE_SIZE = 100  # 单个连接的本地队列长度，溢出后改为从积压流补发
+    EVENT_TICKET_TTL = 30  # SSE连接票据有效期（秒），票据一次性使用
+
+    # 工作流配置（权限按用户缓存权限位，授权变更时主动失效）
+    WORKFLOW_PERMISSION_CACHE_TTL = 300  # 秒，授权到期时间早于该值时以到期时间为准
+    WORKFLOW_BULK_CHUNK_SIZE = 500  # 批量修改状态时每条UPDATE包含的工作流数
+
+    # Airflow集成配置（异步触发DAG运行，后台批量同步运行状态）
+    AIRFLOW_API_URL = 'http://localhost:8080/api/v1'
+    AIRFLOW_USERNAME = 'admin'
+    AIRFLOW_PASSWORD = 'admin'
+    AIRFLOW_REQUEST_TIMEOUT = 10  # 秒
+    AIRFLOW_MAX_RETRIES = 3  # 连接错误和5xx/429的重试次数（指数退避）
+    AIRFLOW_TRIGGER_WORKERS = 4  # 触发线程数，同时也是HTTP连接池大小
+    AIRFLOW_SYNC_INTERVAL = 10  # 状态同步间隔（秒）
+    AIRFLOW_SYNC_BATCH = 500  # 每次同步请求覆盖的实例数
+    AIRFLOW_TRIGGER_STALE_SECONDS = 120  # pending超过该时长且Airflow无对应运行时重新触发
+
+    # 工作流执行后端配置（airflow：提交到Airflow；local：进程内按依赖拓扑执行，无需部署Airflow）
+    WORKFLOW_EXECUTION_BACKEND = 'airflow'
+    LOCAL_EXECUTOR_WORKERS = 8  # 节点执行线程数，互不依赖的分支并发执行
+    LOCAL_EXECUTOR_MAX_INSTANCES = 4  # 同时调度的实例数
+    LOCAL_EXECUTOR_POLL_INTERVAL = 30  # 恢复未完成实例的扫描间隔（秒）
+    LOCAL_EXECUTOR_LEASE_SECONDS = 60  # 实例租约时长，进程退出后租约过期由其他进程接管
+    LOCAL_EXECUTOR_ALLOW_SHELL = False  # 是否允许script节点执行shell命令
+
+    # 工作流实例状态订阅（长轮询按版本返回增量）
+    WORKFLOW_WATCH_TIMEOUT = 30  # 默认最长等待秒数
+    WORKFLOW_WATCH_MAX_TIMEOUT = 60  # 客户端可指定的最长等待秒数上限
+    WORKFLOW_WATCH_RECHECK = 5  # 订阅通知丢失时重新读取状态的间隔（秒）
+    WORKFLOW_WATCH_STATE_TTL = 86400  # 实例状态哈希过期时间（秒），过期后从数据库重新加载
+
+    # Text2SQL保存查询配置（结果物化，有水位列时增量刷新）
+    SAVED_QUERY_DATABASE_URI = SQLALCHEMY_DATABASE_URI  # 保存查询执行的业务数据源
+    SAVED_QUERY_DEFAULT_INTERVAL = 3600  # 默认刷新间隔（秒）
+    SAVED_QUERY_MIN_INTERVAL = 60
+    SAVED_QUERY_MAX_ROWS = 100000  # 可物化的最大行数
+    SAVED_QUERY_FETCH_SIZE = 1000  # 流式读取和批量写入的行数
+    SAVED_QUERY_MAX_PAGE_SIZE = 1000
+    SAVED_QUERY_SCHEDULER_INTERVAL = 30  # 检查到期保存查询的间隔（秒）
+    SAVED_QUERY_REFRESH_BATCH = 20  # 每轮最多刷新的保存查询数
+    SAVED_QUERY_REFRESH_LEASE = 1800  # 认领到期查询后的租约（秒），进程中途退出时到期后由其他进程重新刷新
+
+    # AI训练任务队列配置（训练请求入队后由worker分批执行）
+    # 是否在Web进程内启动worker线程。默认关闭：gevent worker中训练的向量计算和聚类训练是CPU密集型，
+    # 会阻塞同一进程的所有请求和SSE连接，应以独立进程运行scripts/training_worker.py（start.sh会一并启动）
+    TRAINING_WORKER_EMBEDDED = False
+    TRAINING_WORKERS = 1  # 每个进程的worker线程数
+    TRAINING_BATCH_SIZE = 100  # 每批训练的条目数
+    TRAINING_MAX_ITEMS = 50000  # 单个任务最多条目数
+    TRAINING_STALE_SECONDS = 300  # 任务心跳超过该时间未更新视为worker退出，重新投递
+    TRAINING_STREAM_MAXLEN = 10000
+
+    # 表结构增量自动训练配置
+    SCHEMA_TRAINING_DATABASE_URI = SQLALCHEMY_DATABASE_URI  # 读取表结构的业务数据源
+    SCHEMA_TRAINING_SCHEMA = DB_NAME
+    SCHEMA_TRAINING_WORKERS = 8  # 并行读取建表语句的线程数
+    SCHEMA_TRAINING_LOCK_SECONDS = 600
+
+    # 训练样本向量索引配置（float16向量内存映射，多个worker进程共享页缓存）
+    VECTOR_INDEX_ENABLED = True
+    VECTOR_INDEX_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'vector_index')
+    VECTOR_INDEX_NPROBE = 16  # 检索时扫描的聚类数，增大可提高召回率
+    VECTOR_INDEX_TRAIN_THRESHOLD = 20000  # 样本数达到该值后训练聚类，此前暴力检索
+
+    # 文本向量计算配置（按内容哈希缓存向量，未命中的文本按长度分桶批量计算）
+    EMBEDDING_MODEL = 'paraphrase-multilingual-MiniLM-L12-v2'  # sentence-transformers模型
+    EMBEDDING_DEVICE = 'cpu'
+    EMBEDDING_BATCH_SIZE = 64  # 每桶文本数，一次前向计算
+    EMBEDDING_WORKERS = 2  # 并行计算的桶数
+    EMBEDDING_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'embedding_cache')
+
+    # 混合检索配置（BM25关键词检索与向量检索按倒数排名融合，选取DDL和文档上下文）
+    HYBRID_CONTEXT_SIZE = 8  # 每种训练类型选取的上下文条数
+    HYBRID_CANDIDATES = 50  # 每路检索的候选数
+    HYBRID_RRF_K = 60  # 倒数排名融合平滑常数
+    KEYWORD_INDEX_SYNC_SECONDS = 5  # 关键词索引从训练记录表同步其他进程变更的最小间隔
+
+    # SQL模板快速路径配置（从执行成功的问答历史挖掘参数化模板，命中时不调用大模型）
+    SQL_TEMPLATE_ENABLED = True
+    SQL_TEMPLATE_MIN_CONFIDENCE = 0.75  # 启用模板的最低置信度（同骨架占比 × 取值组合数证据）
+    SQL_TEMPLATE_MIN_QA_CONFIDENCE = 0.8  # 参与挖掘的问答历史最低置信度
+    SQL_TEMPLATE_MINE_LIMIT = 50000  # 每个来源最多读取的历史记录数
+    SQL_TEMPLATE_RELOAD_SECONDS = 60  # 检查模板表变化的间隔
+
+    # 字段取值词典配置（采样业务库低基数文本字段，生成SQL前识别问题中提到的取值）
+    VALUE_DICTIONARY_ENABLED = True
+    VALUE_DICTIONARY_SCHEMA = DB_NAME  # 采样的业务库
+    VALUE_DICTIONARY_MAX_DISTINCT = 1000  # 去重取值超过该数量的字段视为高基数，不进入词典
+    VALUE_DICTIONARY_MAX_LENGTH = 100  # 只采样声明长度不超过该值的char/varchar字段
+    VALUE_DICTIONARY_MIN_LENGTH = 2  # 取值最短长度，过短的取值容易误匹配
+    VALUE_DICTIONARY_EXCLUDE_PATTERN = r'password|passwd|token|secret|salt|hash|email|phone|mobile|id_card|idcard'
+    VALUE_DICTIONARY_REFRESH_INTERVAL = 600  # 增量刷新间隔（秒）
+    VALUE_DICTIONARY_FULL_REFRESH_HOURS = 24  # 全量重新采样间隔（小时）
+    VALUE_DICTIONARY_RELOAD_SECONDS = 60  # 检查词典表变化的间隔
+
+    # 多候选SQL生成配置（并发生成多个候选，EXPLAIN校验后返回第一个可执行且代价可接受的SQL）
+    SQL_CANDIDATE_ENABLED = False  # 默认生成模式，请求中的candidates参数优先
+    SQL_CANDIDATE_TEMPERATURES = (0.0, 0.4, 0.8)  # 每个候选的采样温度，候选数与之相同
+    SQL_CANDIDATE_EXAMPLES = 6  # few-shot示例总数，候选之间轮换使用不同的示例子集
+    SQL_CANDIDATE_TIMEOUT = 30  # 整体等待时间（秒），超时后返回已通过校验的最优候选
+    SQL_CANDIDATE_MAX_COST = 1000000  # EXPLAIN估算扫描行数（各表rows × filtered之积）不超过该值视为代价可接受
+    SQL_CANDIDATE_WORKERS = 16  # 候选生成线程池大小（所有请求共用）
+    SQL_RETRIEVAL_ENABLED = False  # 不使用多候选时按本地混合检索（ExampleStore）组装提示词单次生成，仅在向量索引已有样本时生效，否则使用Vanna服务
+
+    # 流式SQL生成配置（/api/text2sql/generate/stream，逐段转发模型输出）
+    SQL_STREAM_CACHE_TTL = 7200  # 校验通过的SQL按问题缓存的时间（秒）
+
+    # SQL自动修复配置（/execute开启auto_repair时，执行失败的SQL结合错误信息和表结构由大模型修正后重新执行）
+    SQL_REPAIR_ENABLED = False  # 默认是否自动修复，请求中的auto_repair参数优先
+    SQL_REPAIR_SCHEMA = DB_NAME  # 读取表结构片段的业务库
+    SQL_REPAIR_MAX_ATTEMPTS = 2  # 每个请求最多修复次数
+    SQL_REPAIR_DEADLINE_SECONDS = 20  # 修复的截止时间（秒），超过后不再调用大模型
+    SQL_REPAIR_MAX_COLUMNS = 80  # 表结构片段中每张表最多列出的字段数
+    SQL_REPAIR_CACHE_TTL = 604800  # 修复结果按（失败SQL指纹, 错误类别）缓存的时间（秒）
+
     # 跨域配置
     CORS_ORIGINS = [
         'http://localhost:4200',  # Angular开发服务器
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+"""
+Gunicorn配置
+使用gevent协程worker：SSE长连接（/api/events）空闲时只占用一个协程，
+数千个连接不会耗尽同步worker的线程
+启动: gunicorn -c gunicorn.conf.py wsgi:app
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 9000)}"
+workers = int(os.environ.get('GUNICORN_WORKERS', min(multiprocessing.cpu_count(), 4)))
+worker_class = 'gevent'
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 2000))
+
+# SSE连接依靠心跳保持活跃，超时只针对卡死的worker
+timeout = 60
+graceful_timeout = 30
+keepalive = 75
+
+accesslog = '-'
+# 只记录路径不记录查询字符串，避免SSE票据等URL参数写入日志
+access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(m)s %(U)s %(H)s" %(s)s %(b)s "%(f)s" "%(a)s" %(L)s'
+errorlog = '-'
+loglevel = os.environ.get('LOG_LEVEL', 'info').lower()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+审计日志维护脚本
+增量刷新审计汇总表并维护operation_audit月分区，建议由cron每分钟执行：
+    * * * * * python scripts/audit_maintenance.py
+    0 3 * * * python scripts/audit_maintenance.py --partitions
+"""
+import os
+import sys
+import argparse
+import logging
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.base_config import Config
+from tools.database import init_database_service
+from service.audit_service import AuditService
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def main():
+    parser = argparse.ArgumentParser(description='审计日志汇总与分区维护')
+    parser.add_argument('--partitions', action='store_true', help='同时维护月分区（新建未来分区、删除过期分区）')
+    args = parser.parse_args()
+
+    init_database_service(Config)
+    audit_service = AuditService()
+
+    result = audit_service.refresh_rollups()
+    if not result['success']:
+        logger.error(result['error'])
+        return 1
+    logger.info(f"审计汇总完成: {result['data']}")
+
+    if args.partitions:
+        result = audit_service.rotate_partitions()
+        if not result['success']:
+            logger.error(result['error'])
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
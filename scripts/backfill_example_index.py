@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+训练样本向量索引补齐脚本
+把ai_training_records中有效且已训练、但尚未写入本地向量索引的记录计算向量后写入，
+并删除已失效记录的向量。启用向量索引前已训练的记录需要执行一次；重复执行只处理差异：
+    python scripts/backfill_example_index.py [--batch-size 500]
+训练worker进程（scripts/training_worker.py）启动时也会执行一次
+"""
+import os
+import sys
+import time
+import argparse
+import logging
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from AIEngine.example_store import get_example_store
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def main():
+    parser = argparse.ArgumentParser(description='训练样本向量索引补齐')
+    parser.add_argument('--batch-size', type=int, default=500, help='每批读取和计算向量的记录数')
+    args = parser.parse_args()
+
+    started = time.monotonic()
+    result = get_example_store().backfill(batch_size=args.batch_size)
+    logger.info(f"训练样本向量索引补齐完成: 有效记录{result['indexed']}条，新写入{result['added']}条，"
+                f"删除{result['removed']}条，耗时{time.monotonic() - started:.1f}秒")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
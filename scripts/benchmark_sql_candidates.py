@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+多候选SQL生成基准测试脚本
+用模拟大模型（对数正态分布的调用耗时，一定比例生成引用不存在表的SQL）对比两种方式得到可执行SQL的端到端耗时：
+
+- 单候选：生成一条SQL，执行失败时客户端重新生成（每次重试都是一次完整往返）
+- 多候选：并发生成N个候选，返回第一个通过EXPLAIN校验的候选
+
+    python scripts/benchmark_sql_candidates.py --requests 300 --invalid-rate 0.25
+    python scripts/benchmark_sql_candidates.py --median-ms 1500 --time-scale 0.01
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import logging
+import threading
+import numpy as np
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from AIEngine.sql_candidates import CandidateGenerator, SqlValidator, build_messages, extract_sql
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+class StubLLM:
+    """模拟大模型：耗时服从对数正态分布，温度越高生成错误SQL的概率越高"""
+
+    def __init__(self, median_ms: float, sigma: float, invalid_rate: float, time_scale: float, seed: int):
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.invalid_rate = invalid_rate
+        self.time_scale = time_scale
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self, messages, temperature):
+        with self._lock:
+            self.calls += 1
+            latency = self.median_ms * self._rng.lognormvariate(0, self.sigma)
+            invalid = self._rng.random() < self.invalid_rate * (1 + temperature / 2)
+        time.sleep(latency / 1000 * self.time_scale)
+        table = 'missing_orders' if invalid else 'orders'
+        return f"```sql\nSELECT region, SUM(amount) FROM {table} GROUP BY region\n```"
+
+class StubDatabase:
+    """模拟业务库：不存在的表EXPLAIN报错"""
+
+    def execute_query(self, sql, params=None):
+        if 'missing_' in sql:
+            raise RuntimeError("Table 'dataask.missing_orders' doesn't exist")
+        return [{'table': 'orders', 'rows': 5000, 'filtered': 100.0}]
+
+def single_with_retry(llm: StubLLM, validator: SqlValidator, max_attempts: int) -> bool:
+    """单候选，失败后客户端重新生成"""
+    messages = build_messages('各区域销售额', [], [])
+    for _ in range(max_attempts):
+        if validator.validate(extract_sql(llm(messages, 0.0)))['valid']:
+            return True
+    return False
+
+def report(name: str, latencies: list, successes: int, calls: int, total: int, time_scale: float):
+    # 换算回未缩放的耗时
+    latencies_ms = np.array(latencies) * 1000 / time_scale
+    logger.info(f"{name}: 成功率={successes / total:.1%}, 平均调用次数={calls / total:.2f}, "
+                f"p50={np.percentile(latencies_ms, 50):.0f}ms, p95={np.percentile(latencies_ms, 95):.0f}ms, "
+                f"p99={np.percentile(latencies_ms, 99):.0f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description='多候选SQL生成基准测试')
+    parser.add_argument('--requests', type=int, default=300, help='请求数')
+    parser.add_argument('--candidates', type=int, default=3, help='候选数')
+    parser.add_argument('--median-ms', type=float, default=1500, help='模拟大模型调用耗时中位数')
+    parser.add_argument('--sigma', type=float, default=0.5, help='调用耗时对数正态分布的sigma')
+    parser.add_argument('--invalid-rate', type=float, default=0.25, help='温度为0时生成错误SQL的概率')
+    parser.add_argument('--max-attempts', type=int, default=3, help='单候选模式客户端最多尝试次数')
+    parser.add_argument('--time-scale', type=float, default=0.01, help='实际等待时间缩放比例')
+    args = parser.parse_args()
+
+    validator = SqlValidator(db_provider=StubDatabase, max_cost=1000000)
+
+    llm = StubLLM(args.median_ms, args.sigma, args.invalid_rate, args.time_scale, seed=0)
+    latencies, successes = [], 0
+    for _ in range(args.requests):
+        began = time.perf_counter()
+        successes += single_with_retry(llm, validator, args.max_attempts)
+        latencies.append(time.perf_counter() - began)
+    report('单候选+客户端重试', latencies, successes, llm.calls, args.requests, args.time_scale)
+
+    llm = StubLLM(args.median_ms, args.sigma, args.invalid_rate, args.time_scale, seed=0)
+    temperatures = [round(0.8 * i / max(args.candidates - 1, 1), 2) for i in range(args.candidates)]
+    generator = CandidateGenerator(complete=llm, validator=validator, retriever=lambda question: ([], []),
+                                   temperatures=temperatures, timeout=60, workers=args.candidates * 4)
+    latencies, successes = [], 0
+    for _ in range(args.requests):
+        began = time.perf_counter()
+        successes += generator.generate('各区域销售额')['success']
+        latencies.append(time.perf_counter() - began)
+    report(f'{args.candidates}候选并发', latencies, successes, llm.calls, args.requests, args.time_scale)
+    generator.shutdown()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+训练样本向量索引基准测试脚本
+生成聚类分布的模拟向量，对比本地IVF索引与ChromaDB的构建耗时、召回率recall@k和单次检索延迟，
+召回率以float32暴力检索结果为准：
+    python scripts/benchmark_vector_index.py --size 100000
+    python scripts/benchmark_vector_index.py --size 1000000 --nprobe 32 --no-chroma
+"""
+import os
+import sys
+import time
+import argparse
+import logging
+import tempfile
+import numpy as np
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from AIEngine.vector_index import VectorIndex
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+ADD_BATCH = 10000
+
+def generate(size: int, dim: int, seed: int) -> np.ndarray:
+    """生成聚类分布的向量，接近真实文本向量的分布"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(size // 300, 10), dim)).astype(np.float32)
+    return centers[rng.integers(0, len(centers), size)] + 0.5 * rng.normal(size=(size, dim)).astype(np.float32)
+
+def ground_truth(data: np.ndarray, queries: np.ndarray, k: int) -> list:
+    normalized = data / np.linalg.norm(data, axis=1, keepdims=True)
+    truth = []
+    for query in queries:
+        scores = normalized @ (query / np.linalg.norm(query))
+        truth.append(set(np.argpartition(-scores, k)[:k].tolist()))
+    return truth
+
+def report(name: str, build_seconds: float, latencies: list, results: list, truth: list, k: int):
+    recall = np.mean([len(t & r) / k for t, r in zip(truth, results)])
+    latencies_ms = np.array(latencies) * 1000
+    logger.info(f"[{name}] 构建{build_seconds:.1f}s, recall@{k}={recall:.3f}, "
+                f"延迟p50={np.percentile(latencies_ms, 50):.2f}ms, p95={np.percentile(latencies_ms, 95):.2f}ms")
+
+def bench_local(data, queries, truth, k, nprobe, work_dir):
+    started = time.time()
+    index = VectorIndex(os.path.join(work_dir, 'local'), nprobe=nprobe)
+    for start in range(0, len(data), ADD_BATCH):
+        end = min(start + ADD_BATCH, len(data))
+        index.add(range(start, end), data[start:end], ['question_sql'] * (end - start))
+    build_seconds = time.time() - started
+    logger.info(f"本地索引: {index.stats()}")
+
+    latencies, results = [], []
+    for query in queries:
+        began = time.perf_counter()
+        hits = index.search(query, k=k)
+        latencies.append(time.perf_counter() - began)
+        results.append({int(record_id) for record_id, _ in hits})
+    report('local-ivf', build_seconds, latencies, results, truth, k)
+
+def bench_chroma(data, queries, truth, k, work_dir):
+    try:
+        import chromadb
+    except ImportError:
+        logger.warning("未安装chromadb，跳过ChromaDB对比")
+        return
+    started = time.time()
+    client = chromadb.PersistentClient(path=os.path.join(work_dir, 'chroma'))
+    collection = client.create_collection('bench', metadata={'hnsw:space': 'cosine'})
+    for start in range(0, len(data), 5000):
+        end = min(start + 5000, len(data))
+        collection.add(ids=[str(i) for i in range(start, end)], embeddings=data[start:end].tolist(),
+                       metadatas=[{'training_type': 'question_sql'}] * (end - start))
+    build_seconds = time.time() - started
+
+    latencies, results = [], []
+    for query in queries:
+        began = time.perf_counter()
+        hits = collection.query(query_embeddings=[query.tolist()], n_results=k,
+                                where={'training_type': 'question_sql'})
+        latencies.append(time.perf_counter() - began)
+        results.append({int(record_id) for record_id in hits['ids'][0]})
+    report('chroma', build_seconds, latencies, results, truth, k)
+
+def main():
+    parser = argparse.ArgumentParser(description='训练样本向量索引基准测试')
+    parser.add_argument('--size', type=int, default=100000, help='向量数量')
+    parser.add_argument('--dim', type=int, default=384, help='向量维度')
+    parser.add_argument('--queries', type=int, default=200, help='查询次数')
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--nprobe', type=int, default=16, help='本地索引扫描的聚类数')
+    parser.add_argument('--no-chroma', action='store_true', help='不执行ChromaDB对比')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='vector_index_bench_')
+    logger.info(f"生成{args.size}个{args.dim}维向量...")
+    # 查询向量与数据来自同一分布，但不在索引中
+    data = generate(args.size + args.queries, args.dim, seed=0)
+    data, queries = data[:args.size], data[args.size:]
+    truth = ground_truth(data, queries, args.k)
+
+    bench_local(data, queries, truth, args.k, args.nprobe, work_dir)
+    if not args.no_chroma:
+        bench_chroma(data, queries, truth, args.k, work_dir)
+    logger.info(f"输出目录: {work_dir}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+SQL模板挖掘脚本
+从执行成功的qa_history和text2sql_messages全量重建参数化SQL模板，建议每天定时执行：
+    python scripts/mine_sql_templates.py [--limit 50000]
+"""
+import os
+import sys
+import argparse
+import logging
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from service.sql_template_service import get_sql_template_service
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def main():
+    parser = argparse.ArgumentParser(description='SQL模板挖掘')
+    parser.add_argument('--limit', type=int, default=None, help='每个来源最多读取的历史记录数')
+    args = parser.parse_args()
+
+    service = get_sql_template_service()
+    result = service.rebuild(args.limit)
+    logger.info(f"SQL模板挖掘完成: 历史问题{result['pairs']}条，模板{result['templates']}个，"
+                f"启用{result['enabled']}个，耗时{result['elapsed_ms']}ms")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+字段取值词典刷新脚本
+采样业务库低基数文本字段的取值，默认增量刷新，首次初始化或业务数据大量删除后使用--full：
+    python scripts/refresh_value_dictionary.py [--full]
+"""
+import os
+import sys
+import argparse
+import logging
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from service.value_dictionary_service import get_value_dictionary_service
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def main():
+    parser = argparse.ArgumentParser(description='字段取值词典刷新')
+    parser.add_argument('--full', action='store_true', help='全部字段重新采样')
+    args = parser.parse_args()
+
+    service = get_value_dictionary_service()
+    result = service.refresh(full=args.full)
+    logger.info(f"字段取值词典刷新完成: 候选字段{result['columns']}个，全量采样{result['sampled']}个，"
+                f"增量采样{result['incremental']}个，高基数{result['high_cardinality']}个，耗时{result['elapsed_ms']}ms")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+表结构增量自动训练脚本
+比较表结构指纹，只为新增或变化的表提交训练任务，已删除表的训练内容失效；
+建议在数据库迁移后执行，--full忽略快照全部重训：
+    python scripts/schema_auto_train.py [--full]
+"""
+import os
+import sys
+import logging
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.base_config import Config
+from AIEngine.vanna_service import init_vanna_service
+from service.schema_auto_trainer import get_schema_auto_trainer
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def main():
+    init_vanna_service(Config)
+    result = get_schema_auto_trainer().run(full='--full' in sys.argv[1:])
+    logger.info(f"表结构自动训练完成: {result}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+训练任务worker进程
+消费Redis Stream中的训练任务并分批训练，可启动多个进程横向扩展；
+启动时先把尚未写入本地向量索引的已训练记录补齐（scripts/backfill_example_index.py）；
+Config.TRAINING_WORKER_EMBEDDED默认关闭，Web进程不执行训练，由本进程消费（start.sh会一并启动）：
+    python scripts/training_worker.py
+"""
+import os
+import sys
+import logging
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.base_config import Config
+from tools.database import init_database_service
+from AIEngine.vanna_service import init_vanna_service
+from service.training_job_service import TrainingWorker
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def main():
+    init_database_service(Config)
+    init_vanna_service(Config)
+    if Config.VECTOR_INDEX_ENABLED:
+        # 补齐启用向量索引前已训练的记录，失败不影响消费训练任务
+        try:
+            from AIEngine.example_store import get_example_store
+            result = get_example_store().backfill()
+            logger.info(f"训练样本向量索引补齐: 新写入{result['added']}条，删除{result['removed']}条")
+        except Exception as e:
+            logger.warning(f"训练样本向量索引补齐失败: {str(e)}")
+    logger.info(f"训练任务worker启动，线程数: {Config.TRAINING_WORKERS}")
+    TrainingWorker().run_forever()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+工作流维护脚本
+按明细表校正工作流节点数、实例数、成功数以及工作域分类数、工作流数，
+分类在服务之外维护，建议由cron定期执行：
+    */10 * * * * python scripts/workflow_maintenance.py
+"""
+import os
+import sys
+import logging
+
+# 添加项目根目录到路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.base_config import Config
+from tools.database import init_database_service
+from service.workflow_service import get_workflow_service
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def main():
+    init_database_service(Config)
+    result = get_workflow_service().reconcile_counters()
+    if not result['success']:
+        logger.error(result['error'])
+        return 1
+    logger.info(f"工作流计数校正完成: {result['data']}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
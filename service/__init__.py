@@ -13,6 +13,7 @@ from .ai_service import AIService
 from .workflow_service import WorkflowService
 from .audit_service import AuditService
 from .enhanced_permission_service import EnhancedPermissionService
+from .message_service import MessageService
 
 # 服务实例缓存
 _user_service: Optional[UserService] = None
@@ -24,6 +25,7 @@ _ai_service: Optional[AIService] = None
 _workflow_service: Optional[WorkflowService] = None
 _audit_service: Optional[AuditService] = None
 _enhanced_permission_service: Optional[EnhancedPermissionService] = None
+_message_service: Optional[MessageService] = None
 
 def get_user_service_instance() -> UserService:
     """获取用户服务实例"""
@@ -92,6 +94,14 @@ def get_enhanced_permission_service_instance() -> EnhancedPermissionService:
         _enhanced_permission_service = EnhancedPermissionService()
     return _enhanced_permission_service
 
+def get_message_service_instance() -> MessageService:
+    """获取消息服务实例（首次创建时恢复中断的扇出任务）"""
+    global _message_service
+    if _message_service is None:
+        _message_service = MessageService()
+        _message_service.resume_pending()
+    return _message_service
+
 __all__ = [
     'get_user_service_instance',
     'get_organization_service_instance',
@@ -102,5 +112,6 @@ __all__ = [
     'get_workflow_service_instance',
     'get_enhanced_workflow_service_instance',
     'get_audit_service_instance',
-    'get_enhanced_permission_service_instance'
+    'get_enhanced_permission_service_instance',
+    'get_message_service_instance'
 ] 
\ No newline at end of file
@@ -4,7 +4,8 @@ AI服务模块
 """
 from typing import Dict, Any, Optional
 from tools.database import get_database_service
-from tools.exceptions import BusinessException
+from tools.exceptions import BusinessException, ValidationException, ResourceNotFoundException
+from service.training_job_service import get_training_job_service, normalize_training_items
 import logging
 
 logger = logging.getLogger(__name__)
@@ -73,27 +74,31 @@ class AIService:
         self,
         model_type: str,
         training_data: Dict[str, Any],
-        parameters: Optional[Dict[str, Any]] = None
+        parameters: Optional[Dict[str, Any]] = None,
+        user_id: Optional[int] = None
     ) -> Dict[str, Any]:
         """
-        训练模型
+        训练模型（提交到训练任务队列，立即返回任务ID）
         
         Args:
             model_type: 模型类型
-            training_data: 训练数据
+            training_data: 训练数据，支持ddl、documentation和问题-SQL对
             parameters: 训练参数
+            user_id: 提交用户ID
             
         Returns:
             Dict[str, Any]: 包含训练任务信息的字典
         """
         try:
-            # TODO: 实现模型训练逻辑
+            items = normalize_training_items(training_data)
             return {
                 'success': True,
-                'data': {
-                    'task_id': 'train_task_001',
-                    'status': 'started'
-                }
+                'data': get_training_job_service().submit(items, 'manual', user_id)
+            }
+        except ValidationException as e:
+            return {
+                'success': False,
+                'error': e.message
             }
         except Exception as e:
             logger.error(f"训练模型失败: {str(e)}")
@@ -113,20 +118,47 @@ class AIService:
         
         Args:
             model_type: 模型类型
-            data_source: 数据源信息
-            parameters: 训练参数
+            data_source: 数据源信息，type为schema时按表结构指纹增量训练变化的表，
+                         type为qa_history时从执行成功的问答历史中收集未训练的问题-SQL对，
+                         否则按训练数据格式解析
+            parameters: 训练参数（full、limit、min_confidence）
             
         Returns:
             Dict[str, Any]: 包含训练任务信息的字典
         """
         try:
-            # TODO: 实现自动训练逻辑
+            parameters = parameters or {}
+            training_service = get_training_job_service()
+            if data_source.get('type') == 'schema':
+                from service.schema_auto_trainer import get_schema_auto_trainer
+                return {
+                    'success': True,
+                    'data': get_schema_auto_trainer().run(full=bool(parameters.get('full')))
+                }
+            if data_source.get('type') == 'qa_history':
+                items = training_service.collect_history_items(
+                    limit=int(parameters.get('limit', 1000)),
+                    min_confidence=float(parameters.get('min_confidence', 0.8))
+                )
+                if not items:
+                    return {
+                        'success': True,
+                        'data': {
+                            'task_id': None,
+                            'status': 'completed',
+                            'total_items': 0
+                        }
+                    }
+            else:
+                items = normalize_training_items(data_source)
             return {
                 'success': True,
-                'data': {
-                    'task_id': 'auto_train_001',
-                    'status': 'started'
-                }
+                'data': training_service.submit(items, 'auto')
+            }
+        except ValidationException as e:
+            return {
+                'success': False,
+                'error': e.message
             }
         except Exception as e:
             logger.error(f"自动训练失败: {str(e)}")
@@ -143,21 +175,17 @@ class AIService:
             task_id: 训练任务ID
             
         Returns:
-            Dict[str, Any]: 包含训练状态的字典
+            Dict[str, Any]: 包含训练进度、吞吐量和预计剩余时间的字典
         """
         try:
-            # TODO: 实现获取训练状态逻辑
             return {
                 'success': True,
-                'data': {
-                    'task_id': task_id,
-                    'status': 'running',
-                    'progress': 0.5,
-                    'metrics': {
-                        'accuracy': 0.95,
-                        'loss': 0.05
-                    }
-                }
+                'data': get_training_job_service().get_status(task_id)
+            }
+        except ResourceNotFoundException as e:
+            return {
+                'success': False,
+                'error': e.message
             }
         except Exception as e:
             logger.error(f"获取训练状态失败: {str(e)}")
@@ -1,20 +1,192 @@
 """
 审计日志服务模块
 提供审计日志相关功能的业务逻辑处理
+
+operation_audit按月RANGE分区，列表使用(operation_time, id)键集分页；
+统计数据读取按日/周/月预聚合的operation_audit_rollup表，汇总表按created_at水位增量维护
 """
-from typing import Dict, Any, Optional, List
+import base64
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, Optional, List, Tuple
+from sqlalchemy import text
+from config.base_config import Config
 from tools.database import get_database_service
-from tools.exceptions import BusinessException
+from tools.exceptions import BusinessException, ValidationException
+from tools.audit_export import get_audit_export_service, EXPORT_FORMATS
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 登录日志在审计表中的模块与操作类型
+LOGIN_MODULE = 'auth'
+LOGIN_OPERATION = 'login'
+
+# 汇总滞后时间，避免遗漏尚未提交的事务写入的行
+ROLLUP_LAG_SECONDS = 60
+
+# MySQL TO_DAYS与Python序数日期的差值
+_TO_DAYS_OFFSET = 365
+
+def _encode_cursor(operation_time: datetime, log_id: int) -> str:
+    """编码键集分页游标"""
+    raw = f"{operation_time.strftime('%Y-%m-%d %H:%M:%S')}|{log_id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """解码键集分页游标"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        time_str, log_id = raw.rsplit('|', 1)
+        return datetime.strptime(time_str, '%Y-%m-%d %H:%M:%S'), int(log_id)
+    except Exception:
+        raise ValidationException('无效的分页游标')
+
+def _month_start(value: date, offset: int = 0) -> date:
+    """返回value所在月份偏移offset个月后的月初"""
+    month_index = value.year * 12 + value.month - 1 + offset
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+def _format_time(value: Any) -> Optional[str]:
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
 class AuditService:
     """审计日志服务类"""
-    
+
     def __init__(self):
         self.db = get_database_service()
-        
+
+    # ================================
+    # 明细查询
+    # ================================
+
+    @staticmethod
+    def operation_log_conditions(
+        start_time: Optional[str] = None,
+        end_time: Optional[str] = None,
+        operation_type: Optional[str] = None,
+        operator: Optional[str] = None,
+        status: Optional[str] = None
+    ) -> Tuple[List[str], Dict[str, Any], Dict[str, Any]]:
+        """构建操作日志查询条件，返回(条件列表, 参数, 汇总表过滤条件)"""
+        conditions = []
+        params: Dict[str, Any] = {}
+        rollup_filters: Dict[str, Any] = {}
+
+        # 时间条件直接作用于分区列，可裁剪到相关月份分区
+        if start_time:
+            conditions.append("operation_time >= :start_time")
+            params['start_time'] = start_time
+        if end_time:
+            conditions.append("operation_time <= :end_time")
+            params['end_time'] = end_time
+        if operation_type:
+            conditions.append("operation = :operation")
+            params['operation'] = rollup_filters['operation'] = operation_type
+        if operator:
+            conditions.append("username = :username")
+            params['username'] = rollup_filters['username'] = operator
+        if status:
+            conditions.append("result = :result")
+            params['result'] = rollup_filters['result'] = status
+        return conditions, params, rollup_filters
+
+    @staticmethod
+    def login_log_conditions(
+        start_time: Optional[str] = None,
+        end_time: Optional[str] = None,
+        username: Optional[str] = None,
+        status: Optional[str] = None,
+        ip: Optional[str] = None
+    ) -> Tuple[List[str], Dict[str, Any], Dict[str, Any]]:
+        """构建登录日志查询条件，返回(条件列表, 参数, 汇总表过滤条件)"""
+        conditions = ["module = :module", "operation = :operation"]
+        params: Dict[str, Any] = {'module': LOGIN_MODULE, 'operation': LOGIN_OPERATION}
+        rollup_filters: Dict[str, Any] = {'module': LOGIN_MODULE, 'operation': LOGIN_OPERATION}
+
+        if start_time:
+            conditions.append("operation_time >= :start_time")
+            params['start_time'] = start_time
+        if end_time:
+            conditions.append("operation_time <= :end_time")
+            params['end_time'] = end_time
+        if username:
+            conditions.append("username = :username")
+            params['username'] = rollup_filters['username'] = username
+        if status:
+            conditions.append("result = :result")
+            params['result'] = rollup_filters['result'] = status
+        if ip:
+            conditions.append("ip_address = :ip")
+            params['ip'] = ip
+        return conditions, params, rollup_filters
+
+    def _keyset_page(
+        self,
+        conditions: List[str],
+        params: Dict[str, Any],
+        page: int,
+        page_size: int,
+        cursor: Optional[str]
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        按(operation_time, id)倒序键集分页
+
+        有游标时从游标处继续；无游标且page>1时退化为OFFSET以兼容旧的页码参数
+        """
+        conditions = list(conditions)
+        params = dict(params)
+        offset = 0
+        if cursor:
+            cursor_time, cursor_id = _decode_cursor(cursor)
+            conditions.append(
+                "(operation_time < :cursor_time OR (operation_time = :cursor_time AND id < :cursor_id))"
+            )
+            params['cursor_time'] = cursor_time
+            params['cursor_id'] = cursor_id
+        elif page > 1:
+            offset = (page - 1) * page_size
+
+        where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        params['limit'] = page_size + 1
+        params['offset'] = offset
+        rows = self.db.execute_query(f"""
+            SELECT id, user_id, username, user_code, org_code, module, operation,
+                   target_type, target_id, target_name, operation_desc, ip_address,
+                   user_agent, operation_time, result, error_message
+            FROM operation_audit
+            {where_clause}
+            ORDER BY operation_time DESC, id DESC
+            LIMIT :limit OFFSET :offset
+        """, params)
+
+        next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            last = rows[-1]
+            next_cursor = _encode_cursor(last['operation_time'], last['id'])
+        return rows, next_cursor
+
+    def _rollup_total(self, start_time: Optional[str], end_time: Optional[str],
+                      filters: Dict[str, Any]) -> int:
+        """从日汇总表估算满足条件的总行数（按天粒度，滞后约一分钟）"""
+        conditions = ["period_type = 'day'"]
+        params: Dict[str, Any] = {}
+        if start_time:
+            conditions.append("period_start >= DATE(:start_time)")
+            params['start_time'] = start_time
+        if end_time:
+            conditions.append("period_start <= DATE(:end_time)")
+            params['end_time'] = end_time
+        for column, value in filters.items():
+            conditions.append(f"{column} = :{column}")
+            params[column] = value
+        rows = self.db.execute_query(f"""
+            SELECT COALESCE(SUM(op_count), 0) AS total
+            FROM operation_audit_rollup
+            WHERE {' AND '.join(conditions)}
+        """, params)
+        return int(rows[0]['total']) if rows else 0
+
     def get_audit_logs(
         self,
         page: int = 1,
@@ -23,76 +195,112 @@ class AuditService:
         end_time: Optional[str] = None,
         operation_type: Optional[str] = None,
         operator: Optional[str] = None,
-        status: Optional[str] = None
+        status: Optional[str] = None,
+        cursor: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         获取审计日志列表
-        
+
         Args:
-            page: 页码
+            page: 页码（未提供游标时使用）
             page_size: 每页大小
             start_time: 开始时间
             end_time: 结束时间
             operation_type: 操作类型
             operator: 操作人
             status: 状态
-            
+            cursor: 键集分页游标（上一页返回的next_cursor）
+
         Returns:
             Dict[str, Any]: 包含审计日志列表的字典
         """
         try:
-            # TODO: 实现获取审计日志列表逻辑
+            conditions, params, rollup_filters = self.operation_log_conditions(
+                start_time, end_time, operation_type, operator, status
+            )
+            rows, next_cursor = self._keyset_page(conditions, params, page, page_size, cursor)
+
+            logs = [{
+                'id': row['id'],
+                'module': row['module'],
+                'operation_type': row['operation'],
+                'operator': row['username'],
+                'user_code': row['user_code'],
+                'org_code': row['org_code'],
+                'target_type': row['target_type'],
+                'target_id': row['target_id'],
+                'target_name': row['target_name'],
+                'operation_time': _format_time(row['operation_time']),
+                'status': row['result'],
+                'ip': row['ip_address'],
+                'details': row['operation_desc']
+            } for row in rows]
+
             return {
                 'success': True,
                 'data': {
-                    'list': [
-                        {
-                            'id': 1,
-                            'operation_type': 'login',
-                            'operator': 'admin',
-                            'operation_time': '2024-01-09T10:00:00Z',
-                            'status': 'success',
-                            'ip': '127.0.0.1',
-                            'details': '用户登录成功'
-                        }
-                    ],
-                    'total': 1,
+                    'list': logs,
+                    'total': self._rollup_total(start_time, end_time, rollup_filters),
                     'page': page,
-                    'page_size': page_size
+                    'page_size': page_size,
+                    'next_cursor': next_cursor
                 }
             }
+        except ValidationException:
+            raise
         except Exception as e:
             logger.error(f"获取审计日志列表失败: {str(e)}")
             return {
                 'success': False,
                 'error': f'获取审计日志列表失败: {str(e)}'
             }
-            
+
     def get_audit_log_by_id(self, log_id: int) -> Dict[str, Any]:
         """
         获取审计日志详情
-        
+
         Args:
             log_id: 日志ID
-            
+
         Returns:
             Dict[str, Any]: 包含审计日志详情的字典
         """
         try:
-            # TODO: 实现获取审计日志详情逻辑
+            rows = self.db.execute_query("""
+                SELECT id, username, module, operation, target_type, target_id, target_name,
+                       old_data, new_data, operation_desc, ip_address, user_agent,
+                       request_id, operation_time, result, error_message
+                FROM operation_audit
+                WHERE id = :log_id
+                LIMIT 1
+            """, {'log_id': log_id})
+
+            if not rows:
+                return {
+                    'success': False,
+                    'error': '审计日志不存在'
+                }
+
+            row = rows[0]
             return {
                 'success': True,
                 'data': {
-                    'id': log_id,
-                    'operation_type': 'login',
-                    'operator': 'admin',
-                    'operation_time': '2024-01-09T10:00:00Z',
-                    'status': 'success',
-                    'ip': '127.0.0.1',
-                    'details': '用户登录成功',
-                    'request_data': {'username': 'admin'},
-                    'response_data': {'code': 200, 'message': '登录成功'},
-                    'error_message': None
+                    'id': row['id'],
+                    'module': row['module'],
+                    'operation_type': row['operation'],
+                    'operator': row['username'],
+                    'operation_time': _format_time(row['operation_time']),
+                    'status': row['result'],
+                    'ip': row['ip_address'],
+                    'user_agent': row['user_agent'],
+                    'request_id': row['request_id'],
+                    'details': row['operation_desc'],
+                    'target_type': row['target_type'],
+                    'target_id': row['target_id'],
+                    'target_name': row['target_name'],
+                    'old_data': row['old_data'],
+                    'new_data': row['new_data'],
+                    'error_message': row['error_message']
                 }
             }
         except Exception as e:
@@ -101,7 +309,7 @@ class AuditService:
                 'success': False,
                 'error': f'获取审计日志详情失败: {str(e)}'
             }
-            
+
     def get_login_logs(
         self,
         page: int = 1,
@@ -110,79 +318,147 @@ class AuditService:
         end_time: Optional[str] = None,
         username: Optional[str] = None,
         status: Optional[str] = None,
-        ip: Optional[str] = None
+        ip: Optional[str] = None,
+        cursor: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         获取登录日志列表
-        
+
         Args:
-            page: 页码
+            page: 页码（未提供游标时使用）
             page_size: 每页大小
             start_time: 开始时间
             end_time: 结束时间
             username: 用户名
             status: 状态
             ip: IP地址
-            
+            cursor: 键集分页游标
+
         Returns:
             Dict[str, Any]: 包含登录日志列表的字典
         """
         try:
-            # TODO: 实现获取登录日志列表逻辑
+            conditions, params, rollup_filters = self.login_log_conditions(
+                start_time, end_time, username, status, ip
+            )
+            rows, next_cursor = self._keyset_page(conditions, params, page, page_size, cursor)
+
+            logs = [{
+                'id': row['id'],
+                'username': row['username'],
+                'login_time': _format_time(row['operation_time']),
+                'status': row['result'],
+                'ip': row['ip_address'],
+                'device': row['user_agent'],
+                'location': None
+            } for row in rows]
+
+            # 汇总表没有IP维度，按IP过滤时不提供估算总数
+            total = None if ip else self._rollup_total(start_time, end_time, rollup_filters)
+
             return {
                 'success': True,
                 'data': {
-                    'list': [
-                        {
-                            'id': 1,
-                            'username': 'admin',
-                            'login_time': '2024-01-09T10:00:00Z',
-                            'status': 'success',
-                            'ip': '127.0.0.1',
-                            'device': 'Chrome 120.0.0.0',
-                            'location': '广东省深圳市'
-                        }
-                    ],
-                    'total': 1,
+                    'list': logs,
+                    'total': total,
                     'page': page,
-                    'page_size': page_size
+                    'page_size': page_size,
+                    'next_cursor': next_cursor
                 }
             }
+        except ValidationException:
+            raise
         except Exception as e:
             logger.error(f"获取登录日志列表失败: {str(e)}")
             return {
                 'success': False,
                 'error': f'获取登录日志列表失败: {str(e)}'
             }
-            
-    def export_logs(self, log_type: str, filters: Dict[str, Any]) -> Dict[str, Any]:
+
+    def export_logs(
+        self,
+        log_type: str,
+        filters: Dict[str, Any],
+        file_format: str = 'csv',
+        user_id: Optional[int] = None
+    ) -> Dict[str, Any]:
         """
-        导出审计日志
-        
+        提交审计日志导出任务
+
         Args:
             log_type: 日志类型（operation/login）
-            filters: 过滤条件
-            
+            filters: 过滤条件，与对应列表接口的查询参数一致
+            file_format: 文件格式（csv/xlsx）
+            user_id: 发起导出的用户ID
+
         Returns:
-            Dict[str, Any]: 包含导出结果的字典
+            Dict[str, Any]: 包含导出任务状态的字典
         """
         try:
-            # TODO: 实现导出审计日志逻辑
+            if log_type == 'login':
+                conditions, params, rollup_filters = self.login_log_conditions(
+                    filters.get('start_time'), filters.get('end_time'), filters.get('username'),
+                    filters.get('status'), filters.get('ip')
+                )
+            elif log_type == 'operation':
+                conditions, params, rollup_filters = self.operation_log_conditions(
+                    filters.get('start_time'), filters.get('end_time'), filters.get('operation_type'),
+                    filters.get('operator'), filters.get('status')
+                )
+            else:
+                raise ValidationException('日志类型必须为operation/login')
+            if file_format not in EXPORT_FORMATS:
+                raise ValidationException('导出格式必须为csv/xlsx')
+
+            estimated_total = None
+            if not (log_type == 'login' and filters.get('ip')):
+                estimated_total = self._rollup_total(
+                    filters.get('start_time'), filters.get('end_time'), rollup_filters
+                )
+
+            job = get_audit_export_service().submit(
+                log_type, file_format, conditions, params,
+                estimated_total=estimated_total, user_id=user_id
+            )
             return {
                 'success': True,
-                'data': {
-                    'file_url': '/downloads/audit_logs_20240109.xlsx',
-                    'file_name': 'audit_logs_20240109.xlsx',
-                    'file_size': 1024
-                }
+                'data': job
             }
+        except ValidationException:
+            raise
         except Exception as e:
             logger.error(f"导出审计日志失败: {str(e)}")
             return {
                 'success': False,
                 'error': f'导出审计日志失败: {str(e)}'
             }
-            
+
+    def get_export_job(self, job_id: str, user_id: Optional[int] = None) -> Dict[str, Any]:
+        """
+        获取审计日志导出任务状态
+
+        Args:
+            job_id: 任务ID
+            user_id: 当前用户ID，只能查看自己发起的任务
+
+        Returns:
+            Dict[str, Any]: 包含任务状态的字典
+        """
+        job = get_audit_export_service().get_job(job_id)
+        if not job or (user_id is not None and job.get('user_id') != user_id):
+            return {
+                'success': False,
+                'error': '导出任务不存在'
+            }
+        return {
+            'success': True,
+            'data': job
+        }
+
+    # ================================
+    # 统计
+    # ================================
+
     def get_audit_stats(
         self,
         dimension: str = 'day',
@@ -191,61 +467,209 @@ class AuditService:
     ) -> Dict[str, Any]:
         """
         获取审计统计数据
-        
+
         Args:
             dimension: 统计维度（day/week/month）
             start_time: 开始时间
             end_time: 结束时间
-            
+
         Returns:
             Dict[str, Any]: 包含统计数据的字典
         """
         try:
-            # TODO: 实现获取审计统计数据逻辑
+            if dimension not in ('day', 'week', 'month'):
+                raise ValidationException('统计维度必须为day/week/month')
+
+            conditions = ["period_type = :period_type"]
+            params: Dict[str, Any] = {'period_type': dimension}
+            if start_time:
+                conditions.append("period_start >= DATE(:start_time)")
+                params['start_time'] = start_time
+            if end_time:
+                conditions.append("period_start <= DATE(:end_time)")
+                params['end_time'] = end_time
+            where_clause = ' AND '.join(conditions)
+
+            def period_stats(extra_condition: str = '') -> List[Dict[str, Any]]:
+                rows = self.db.execute_query(f"""
+                    SELECT period_start,
+                           SUM(op_count) AS total,
+                           SUM(CASE WHEN result = 'success' THEN op_count ELSE 0 END) AS success
+                    FROM operation_audit_rollup
+                    WHERE {where_clause} {extra_condition}
+                    GROUP BY period_start
+                    ORDER BY period_start
+                """, {**params, 'login_module': LOGIN_MODULE, 'login_operation': LOGIN_OPERATION})
+                return [{
+                    'date': _format_time(row['period_start']),
+                    'total': int(row['total']),
+                    'success': int(row['success']),
+                    'failed': int(row['total']) - int(row['success'])
+                } for row in rows]
+
+            top_operations = self.db.execute_query(f"""
+                SELECT operation AS operation_type, SUM(op_count) AS count
+                FROM operation_audit_rollup
+                WHERE {where_clause}
+                GROUP BY operation
+                ORDER BY count DESC
+                LIMIT 10
+            """, params)
+
+            top_operators = self.db.execute_query(f"""
+                SELECT username AS operator, SUM(op_count) AS count
+                FROM operation_audit_rollup
+                WHERE {where_clause}
+                GROUP BY username
+                ORDER BY count DESC
+                LIMIT 10
+            """, params)
+
             return {
                 'success': True,
                 'data': {
-                    'operation_stats': [
-                        {
-                            'date': '2024-01-09',
-                            'total': 100,
-                            'success': 95,
-                            'failed': 5
-                        }
-                    ],
-                    'login_stats': [
-                        {
-                            'date': '2024-01-09',
-                            'total': 50,
-                            'success': 48,
-                            'failed': 2
-                        }
-                    ],
+                    'operation_stats': period_stats(),
+                    'login_stats': period_stats(
+                        "AND module = :login_module AND operation = :login_operation"
+                    ),
                     'top_operations': [
-                        {
-                            'operation_type': 'login',
-                            'count': 50
-                        },
-                        {
-                            'operation_type': 'query',
-                            'count': 30
-                        }
+                        {'operation_type': row['operation_type'], 'count': int(row['count'])}
+                        for row in top_operations
                     ],
                     'top_operators': [
-                        {
-                            'operator': 'admin',
-                            'count': 40
-                        },
-                        {
-                            'operator': 'user1',
-                            'count': 20
-                        }
+                        {'operator': row['operator'], 'count': int(row['count'])}
+                        for row in top_operators
                     ]
                 }
             }
+        except ValidationException:
+            raise
         except Exception as e:
             logger.error(f"获取审计统计数据失败: {str(e)}")
             return {
                 'success': False,
                 'error': f'获取审计统计数据失败: {str(e)}'
-            } 
\ No newline at end of file
+            }
+
+    # ================================
+    # 汇总与分区维护
+    # ================================
+
+    def refresh_rollups(self, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        增量汇总审计数据
+
+        只处理created_at位于[上次水位, now - 滞后时间)之间的新行，
+        汇总写入与水位推进在同一事务中完成，重复执行不会重复计数
+        """
+        try:
+            upper = (now or datetime.now()) - timedelta(seconds=ROLLUP_LAG_SECONDS)
+            periods = {
+                'day': "DATE(operation_time)",
+                'week': "DATE_SUB(DATE(operation_time), INTERVAL WEEKDAY(operation_time) DAY)",
+                'month': "DATE_FORMAT(operation_time, '%Y-%m-01')"
+            }
+
+            with self.db.engine.begin() as conn:
+                state = conn.execute(text("""
+                    SELECT last_rolled_at FROM operation_audit_rollup_state WHERE id = 1 FOR UPDATE
+                """)).fetchone()
+                lower = state.last_rolled_at if state else datetime(1970, 1, 1)
+                if lower >= upper:
+                    return {'success': True, 'data': {'rolled_rows': 0, 'watermark': _format_time(lower)}}
+
+                rolled_rows = 0
+                for period_type, period_expr in periods.items():
+                    result = conn.execute(text(f"""
+                        INSERT INTO operation_audit_rollup
+                            (period_type, period_start, module, operation, username, result, op_count)
+                        SELECT * FROM (
+                            SELECT '{period_type}' AS period_type, {period_expr} AS period_start,
+                                   module, operation, username, result, COUNT(*) AS cnt
+                            FROM operation_audit
+                            WHERE created_at >= :lower AND created_at < :upper
+                            GROUP BY period_start, module, operation, username, result
+                        ) AS agg
+                        ON DUPLICATE KEY UPDATE op_count = op_count + agg.cnt
+                    """), {'lower': lower, 'upper': upper})
+                    if period_type == 'day':
+                        rolled_rows = result.rowcount
+
+                conn.execute(text("""
+                    INSERT INTO operation_audit_rollup_state (id, last_rolled_at)
+                    VALUES (1, :upper)
+                    ON DUPLICATE KEY UPDATE last_rolled_at = :upper
+                """), {'upper': upper})
+
+            return {'success': True, 'data': {'rolled_rows': rolled_rows, 'watermark': _format_time(upper)}}
+        except Exception as e:
+            logger.error(f"审计汇总失败: {str(e)}")
+            return {
+                'success': False,
+                'error': f'审计汇总失败: {str(e)}'
+            }
+
+    def rotate_partitions(
+        self,
+        months_ahead: Optional[int] = None,
+        retention_months: Optional[int] = None,
+        today: Optional[date] = None
+    ) -> Dict[str, Any]:
+        """
+        维护operation_audit的月分区
+
+        从pmax中拆分出未来months_ahead个月的分区，并删除早于保留期的分区。
+        汇总表不受影响，删除明细后历史统计仍然可查
+        """
+        try:
+            months_ahead = Config.AUDIT_PARTITIONS_AHEAD if months_ahead is None else months_ahead
+            retention_months = Config.AUDIT_RETENTION_MONTHS if retention_months is None else retention_months
+            today = today or date.today()
+
+            partitions = self.db.execute_query("""
+                SELECT PARTITION_NAME AS name, PARTITION_DESCRIPTION AS description
+                FROM INFORMATION_SCHEMA.PARTITIONS
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'operation_audit'
+                  AND PARTITION_NAME IS NOT NULL
+                ORDER BY PARTITION_ORDINAL_POSITION
+            """)
+            if not partitions:
+                raise BusinessException('operation_audit未分区，请先执行sql/audit_enhancement.sql')
+
+            bounds = {}
+            for partition in partitions:
+                if partition['description'] != 'MAXVALUE':
+                    bounds[partition['name']] = date.fromordinal(int(partition['description']) - _TO_DAYS_OFFSET)
+            last_bound = max(bounds.values()) if bounds else _month_start(today)
+
+            created = []
+            target_bound = _month_start(today, months_ahead + 1)
+            while last_bound < target_bound:
+                next_bound = _month_start(last_bound, 1)
+                name = f"p{last_bound.strftime('%Y%m')}"
+                self.db.execute_update(f"""
+                    ALTER TABLE operation_audit REORGANIZE PARTITION pmax INTO (
+                        PARTITION {name} VALUES LESS THAN (TO_DAYS('{next_bound.isoformat()}')),
+                        PARTITION pmax VALUES LESS THAN MAXVALUE
+                    )
+                """)
+                created.append(name)
+                last_bound = next_bound
+
+            dropped = []
+            if retention_months:
+                cutoff = _month_start(today, -retention_months)
+                dropped = [name for name, bound in bounds.items() if bound <= cutoff]
+                if dropped:
+                    self.db.execute_update(f"ALTER TABLE operation_audit DROP PARTITION {', '.join(dropped)}")
+
+            logger.info(f"审计分区维护完成: 新建{created}, 删除{dropped}")
+            return {'success': True, 'data': {'created': created, 'dropped': dropped}}
+        except BusinessException:
+            raise
+        except Exception as e:
+            logger.error(f"审计分区维护失败: {str(e)}")
+            return {
+                'success': False,
+                'error': f'审计分区维护失败: {str(e)}'
+            }
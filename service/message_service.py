@@ -0,0 +1,738 @@
+# -*- coding: utf-8 -*-
+"""
+消息中心服务模块
+提供消息管理、投递和收件箱相关的业务逻辑
+
+消息内容只写一份：定向消息（指定用户/机构）由后台线程按批扇出到message_inbox，
+全体广播不扇出，读取收件箱时合并，已读时才写入收件箱行。
+扇出前在Redis认领消息，多进程时同一条消息只扇出一次，进程中断后认领过期再由其他进程恢复。
+未读数保存在Redis哈希中，角标查询为O(1)；Redis字段缺失时按用户从数据库重建
+"""
+import os
+import json
+import uuid
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Iterator, Tuple, Callable
+from sqlalchemy import text
+from config.base_config import Config
+from tools.database import get_database_service
+from tools.event_bus import get_event_bus
+from tools.exceptions import ValidationException, BusinessException, ResourceNotFoundException
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_TYPES = [
+    {'value': 'system', 'label': '系统通知'},
+    {'value': 'business', 'label': '业务消息'},
+    {'value': 'alert', 'label': '告警消息'}
+]
+RECIPIENT_TYPES = ('all', 'users', 'org')
+EDITABLE_STATUSES = ('draft', 'failed')
+
+# Redis键：定向消息未读数、已读广播数、已发送广播总数
+UNREAD_KEY = 'message:unread'
+BROADCAST_READ_KEY = 'message:broadcast_read'
+BROADCAST_META_KEY = 'message:broadcast'
+BROADCAST_TOTAL_FIELD = 'total'
+# 定向消息扇出认领锁，多进程时同一条消息只由一个进程扇出
+FANOUT_LOCK_PREFIX = 'message:fanout:'
+
+# 字段存在时才累加，避免在未初始化的字段上累加出错误的计数
+_INCR_IF_EXISTS = """
+if redis.call('HEXISTS', KEYS[1], ARGV[1]) == 1 then
+    return redis.call('HINCRBY', KEYS[1], ARGV[1], ARGV[2])
+end
+return nil
+"""
+
+_MESSAGE_COLUMNS = """
+    m.id, m.title, m.content, m.type, m.status, m.sender_id, m.sender_name,
+    m.recipient_type, m.recipient_scope, m.recipient_count, m.channels,
+    m.error_message, m.created_at, m.sent_at
+"""
+
+def _in_clause(prefix: str, values: List[Any], params: Dict[str, Any]) -> str:
+    """生成IN子句的命名参数占位符"""
+    placeholders = []
+    for index, value in enumerate(values):
+        key = f'{prefix}{index}'
+        params[key] = value
+        placeholders.append(f':{key}')
+    return ', '.join(placeholders)
+
+def _format_time(value: Any) -> Optional[str]:
+    return value.strftime('%Y-%m-%d %H:%M:%S') if isinstance(value, datetime) else value
+
+def _default_redis_provider():
+    from tools.redis_service import get_redis_service
+    return get_redis_service().redis_client
+
+class UnreadCounter:
+    """基于Redis哈希的未读数计数器，Redis不可用时直接查询数据库"""
+
+    def __init__(self, db, redis_provider: Optional[Callable[[], Any]] = None):
+        self.db = db
+        self._redis_provider = redis_provider or _default_redis_provider
+        self._script = None
+
+    def _client(self):
+        try:
+            return self._redis_provider()
+        except Exception as e:
+            logger.warning(f"Redis不可用，未读数改为查询数据库: {str(e)}")
+            return None
+
+    def _incr_script(self, client):
+        if self._script is None:
+            self._script = client.register_script(_INCR_IF_EXISTS)
+        return self._script
+
+    def incr(self, key: str, field: Any, amount: int = 1):
+        """累加单个计数字段"""
+        self.incr_many(key, [field], amount)
+
+    def incr_many(self, key: str, fields: List[Any], amount: int = 1):
+        """批量累加计数字段（管道一次提交）"""
+        client = self._client()
+        if client is None or not fields:
+            return
+        try:
+            script = self._incr_script(client)
+            pipe = client.pipeline(transaction=False)
+            for field in fields:
+                script(keys=[key], args=[str(field), amount], client=pipe)
+            pipe.execute()
+        except Exception as e:
+            logger.error(f"累加未读数失败: {str(e)}")
+            self.invalidate_users(fields)
+
+    def invalidate_users(self, user_ids: List[Any]):
+        """删除用户计数字段，下次查询时从数据库重建"""
+        client = self._client()
+        if client is None or not user_ids:
+            return
+        try:
+            fields = [str(user_id) for user_id in user_ids]
+            pipe = client.pipeline(transaction=False)
+            pipe.hdel(UNREAD_KEY, *fields)
+            pipe.hdel(BROADCAST_READ_KEY, *fields)
+            pipe.execute()
+        except Exception as e:
+            logger.error(f"清除未读数失败: {str(e)}")
+
+    def reset(self):
+        """清空全部计数（删除已发送消息后调用）"""
+        client = self._client()
+        if client is None:
+            return
+        try:
+            client.delete(UNREAD_KEY, BROADCAST_READ_KEY, BROADCAST_META_KEY)
+        except Exception as e:
+            logger.error(f"重置未读数失败: {str(e)}")
+
+    def _count_from_db(self, user_id: int) -> Tuple[int, int, int]:
+        """从数据库统计(定向未读数, 已读广播数, 广播总数)"""
+        rows = self.db.execute_query("""
+            SELECT
+                (SELECT COUNT(*) FROM message_inbox i JOIN messages m ON m.id = i.message_id
+                 WHERE i.user_id = :user_id AND i.is_read = 0 AND m.recipient_type <> 'all') AS unread,
+                (SELECT COUNT(*) FROM message_inbox i JOIN messages m ON m.id = i.message_id
+                 WHERE i.user_id = :user_id AND m.recipient_type = 'all' AND m.status = 'sent') AS broadcast_read,
+                (SELECT COUNT(*) FROM messages
+                 WHERE recipient_type = 'all' AND status = 'sent') AS broadcast_total
+        """, {'user_id': user_id})
+        row = rows[0]
+        return int(row['unread']), int(row['broadcast_read']), int(row['broadcast_total'])
+
+    def get(self, user_id: int) -> int:
+        """获取用户未读数"""
+        client = self._client()
+        if client is not None:
+            try:
+                field = str(user_id)
+                pipe = client.pipeline(transaction=False)
+                pipe.hget(UNREAD_KEY, field)
+                pipe.hget(BROADCAST_READ_KEY, field)
+                pipe.hget(BROADCAST_META_KEY, BROADCAST_TOTAL_FIELD)
+                unread, broadcast_read, broadcast_total = pipe.execute()
+                if None not in (unread, broadcast_read, broadcast_total):
+                    return int(unread) + max(0, int(broadcast_total) - int(broadcast_read))
+            except Exception as e:
+                logger.error(f"读取未读数失败: {str(e)}")
+                client = None
+
+        unread, broadcast_read, broadcast_total = self._count_from_db(user_id)
+        if client is not None:
+            try:
+                pipe = client.pipeline(transaction=False)
+                pipe.hset(UNREAD_KEY, str(user_id), unread)
+                pipe.hset(BROADCAST_READ_KEY, str(user_id), broadcast_read)
+                pipe.hsetnx(BROADCAST_META_KEY, BROADCAST_TOTAL_FIELD, broadcast_total)
+                pipe.execute()
+            except Exception as e:
+                logger.error(f"重建未读数失败: {str(e)}")
+        return unread + max(0, broadcast_total - broadcast_read)
+
+class MessageService:
+    """消息中心服务类"""
+
+    def __init__(self, db=None, redis_provider: Optional[Callable[[], Any]] = None,
+                 fanout_workers: Optional[int] = None, event_bus=None):
+        self.db = db or get_database_service()
+        self._redis_provider = redis_provider or _default_redis_provider
+        self.counter = UnreadCounter(self.db, self._redis_provider)
+        self.events = event_bus or get_event_bus()
+        self.fanout_batch = Config.MESSAGE_FANOUT_BATCH
+        self.fanout_lease = Config.MESSAGE_FANOUT_LEASE
+        self._token = f'{os.getpid()}:{uuid.uuid4().hex}'
+        self._executor = ThreadPoolExecutor(
+            max_workers=fanout_workers or Config.MESSAGE_FANOUT_WORKERS,
+            thread_name_prefix='message-fanout'
+        )
+
+    # ================================
+    # 消息管理
+    # ================================
+
+    def _serialize(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        scope = row.get('recipient_scope')
+        if isinstance(scope, str):
+            scope = json.loads(scope)
+        channels = row.get('channels')
+        if isinstance(channels, str):
+            channels = json.loads(channels)
+
+        if row['recipient_type'] == 'all':
+            recipient = '全体用户'
+        elif row['recipient_type'] == 'org':
+            recipient = ', '.join(scope or [])
+        else:
+            recipient = f"{len(scope or [])}位用户"
+
+        message = {
+            'id': row['id'],
+            'title': row['title'],
+            'content': row['content'],
+            'type': row['type'],
+            'status': row['status'],
+            'sender': row['sender_name'],
+            'sender_id': row['sender_id'],
+            'recipient': recipient,
+            'recipient_type': row['recipient_type'],
+            'recipients': scope or [],
+            'recipient_count': row['recipient_count'],
+            'channels': channels or [],
+            'error_message': row['error_message'],
+            'created_at': _format_time(row['created_at']),
+            'sent_at': _format_time(row['sent_at'])
+        }
+        if 'is_read' in row:
+            message['is_read'] = bool(row['is_read'])
+        return message
+
+    def _validate(self, data: Dict[str, Any], partial: bool = False) -> Dict[str, Any]:
+        """校验并规范化消息字段"""
+        if not partial:
+            for field in ('title', 'content', 'type'):
+                if not data.get(field):
+                    raise ValidationException(f"缺少必填字段: {field}")
+
+        values = {}
+        for field in ('title', 'content', 'type'):
+            if field in data:
+                values[field] = data[field]
+        if 'type' in values and values['type'] not in [t['value'] for t in MESSAGE_TYPES]:
+            raise ValidationException(f"不支持的消息类型: {values['type']}")
+
+        if 'recipient_type' in data or not partial:
+            recipient_type = data.get('recipient_type', 'all')
+            if recipient_type not in RECIPIENT_TYPES:
+                raise ValidationException(f"不支持的接收范围: {recipient_type}")
+            recipients = data.get('recipients') or []
+            if recipient_type != 'all' and not recipients:
+                raise ValidationException('请选择接收对象')
+            if recipient_type == 'users':
+                try:
+                    recipients = sorted({int(user_id) for user_id in recipients})
+                except (TypeError, ValueError):
+                    raise ValidationException('接收用户ID必须为整数')
+            values['recipient_type'] = recipient_type
+            values['recipient_scope'] = json.dumps(recipients if recipient_type != 'all' else None)
+        if 'channels' in data:
+            values['channels'] = json.dumps(data.get('channels') or [])
+        return values
+
+    def get_messages(
+        self,
+        page: int = 1,
+        page_size: int = 20,
+        title: str = '',
+        message_type: str = '',
+        status: str = '',
+        sender: str = ''
+    ) -> Dict[str, Any]:
+        """
+        获取消息列表
+
+        Args:
+            page: 页码
+            page_size: 每页数量
+            title: 标题关键词
+            message_type: 消息类型
+            status: 消息状态
+            sender: 发送人（前缀匹配，可使用索引）
+
+        Returns:
+            消息列表数据
+        """
+        try:
+            conditions = []
+            params: Dict[str, Any] = {}
+            if message_type:
+                conditions.append("m.type = :type")
+                params['type'] = message_type
+            if status:
+                conditions.append("m.status = :status")
+                params['status'] = status
+            if sender:
+                conditions.append("m.sender_name LIKE :sender")
+                params['sender'] = f"{sender}%"
+            if title:
+                conditions.append("m.title LIKE :title")
+                params['title'] = f"%{title}%"
+            where_clause = " AND ".join(conditions) if conditions else "1=1"
+
+            total = self.db.execute_query(
+                f"SELECT COUNT(*) AS total FROM messages m WHERE {where_clause}", params
+            )[0]['total']
+
+            params['limit'] = page_size
+            params['offset'] = (page - 1) * page_size
+            rows = self.db.execute_query(f"""
+                SELECT {_MESSAGE_COLUMNS}
+                FROM messages m
+                WHERE {where_clause}
+                ORDER BY m.created_at DESC, m.id DESC
+                LIMIT :limit OFFSET :offset
+            """, params)
+
+            return {
+                'success': True,
+                'data': {
+                    'list': [self._serialize(row) for row in rows],
+                    'total': total,
+                    'page': page,
+                    'page_size': page_size
+                }
+            }
+        except Exception as e:
+            logger.error(f"获取消息列表失败: {str(e)}")
+            return {'success': False, 'error': f'获取消息列表失败: {str(e)}'}
+
+    def get_message_by_id(self, message_id: int) -> Dict[str, Any]:
+        """获取消息详情"""
+        try:
+            rows = self.db.execute_query(
+                f"SELECT {_MESSAGE_COLUMNS} FROM messages m WHERE m.id = :id",
+                {'id': message_id}
+            )
+            if not rows:
+                return {'success': False, 'error': '消息不存在'}
+            return {'success': True, 'data': self._serialize(rows[0])}
+        except Exception as e:
+            logger.error(f"获取消息详情失败: {str(e)}")
+            return {'success': False, 'error': f'获取消息详情失败: {str(e)}'}
+
+    def create_message(self, data: Dict[str, Any], sender_id: int, sender_name: str) -> Dict[str, Any]:
+        """创建消息草稿"""
+        values = self._validate(data)
+        values.update({'sender_id': sender_id, 'sender_name': sender_name})
+        try:
+            with self.db.engine.begin() as conn:
+                columns = ', '.join(values)
+                placeholders = ', '.join(f':{column}' for column in values)
+                result = conn.execute(
+                    text(f"INSERT INTO messages ({columns}) VALUES ({placeholders})"), values
+                )
+                message_id = result.lastrowid
+            return {'success': True, 'data': {'id': message_id}}
+        except Exception as e:
+            logger.error(f"创建消息失败: {str(e)}")
+            return {'success': False, 'error': f'创建消息失败: {str(e)}'}
+
+    def update_message(self, message_id: int, data: Dict[str, Any]) -> Dict[str, Any]:
+        """更新消息（仅草稿和发送失败的消息可以修改）"""
+        values = self._validate(data, partial=True)
+        if not values:
+            raise ValidationException('没有需要更新的字段')
+        try:
+            assignments = ', '.join(f'{column} = :{column}' for column in values)
+            params = {**values, 'id': message_id}
+            statuses = _in_clause('status', list(EDITABLE_STATUSES), params)
+            updated = self.db.execute_update(
+                f"UPDATE messages SET {assignments} WHERE id = :id AND status IN ({statuses})", params
+            )
+            if not updated:
+                if not self.db.execute_query("SELECT id FROM messages WHERE id = :id", {'id': message_id}):
+                    raise ResourceNotFoundException('消息不存在')
+                raise BusinessException('已发送的消息不能修改')
+            return {'success': True, 'data': {'id': message_id}}
+        except (ResourceNotFoundException, BusinessException):
+            raise
+        except Exception as e:
+            logger.error(f"更新消息失败: {str(e)}")
+            return {'success': False, 'error': f'更新消息失败: {str(e)}'}
+
+    def delete_messages(self, message_ids: List[int]) -> Dict[str, Any]:
+        """删除消息，收件箱行随外键级联删除"""
+        if not message_ids:
+            raise ValidationException('请选择要删除的消息')
+        try:
+            params: Dict[str, Any] = {}
+            ids = _in_clause('id', message_ids, params)
+            delivered = self.db.execute_query(
+                f"SELECT COUNT(*) AS cnt FROM messages WHERE id IN ({ids}) AND status <> 'draft'", params
+            )[0]['cnt']
+            deleted = self.db.execute_update(f"DELETE FROM messages WHERE id IN ({ids})", params)
+            # 已投递的消息可能影响任意用户的未读数，整体失效后按需重建
+            if delivered:
+                self.counter.reset()
+            return {'success': True, 'data': {'deleted': deleted}}
+        except Exception as e:
+            logger.error(f"删除消息失败: {str(e)}")
+            return {'success': False, 'error': f'删除消息失败: {str(e)}'}
+
+    # ================================
+    # 投递
+    # ================================
+
+    def send_messages(self, message_ids: List[int]) -> Dict[str, Any]:
+        """
+        发送消息
+
+        全体广播直接标记为已发送；定向消息置为sending后交给后台线程扇出
+
+        Returns:
+            各状态的消息ID
+        """
+        if not message_ids:
+            raise ValidationException('请选择要发送的消息')
+        try:
+            params: Dict[str, Any] = {}
+            ids = _in_clause('id', message_ids, params)
+            statuses = _in_clause('status', list(EDITABLE_STATUSES), params)
+            rows = self.db.execute_query(f"""
+                SELECT id, title, type, recipient_type FROM messages
+                WHERE id IN ({ids}) AND status IN ({statuses})
+            """, params)
+
+            sent, queued = [], []
+            for row in rows:
+                if row['recipient_type'] == 'all':
+                    updated = self.db.execute_update("""
+                        UPDATE messages SET status = 'sent', sent_at = NOW(), error_message = NULL
+                        WHERE id = :id AND status IN ('draft', 'failed')
+                    """, {'id': row['id']})
+                    if updated:
+                        self.counter.incr(BROADCAST_META_KEY, BROADCAST_TOTAL_FIELD)
+                        self.events.publish(None, 'message', {'id': row['id'], 'title': row['title'], 'type': row['type']})
+                        sent.append(row['id'])
+                else:
+                    updated = self.db.execute_update("""
+                        UPDATE messages SET status = 'sending', error_message = NULL
+                        WHERE id = :id AND status IN ('draft', 'failed')
+                    """, {'id': row['id']})
+                    if updated:
+                        self._executor.submit(self._fanout, row['id'])
+                        queued.append(row['id'])
+
+            skipped = sorted(set(message_ids) - set(sent) - set(queued))
+            return {'success': True, 'data': {'sent': sent, 'sending': queued, 'skipped': skipped}}
+        except Exception as e:
+            logger.error(f"发送消息失败: {str(e)}")
+            return {'success': False, 'error': f'发送消息失败: {str(e)}'}
+
+    def _iter_recipients(self, recipient_type: str, scope: List[Any]) -> Iterator[List[int]]:
+        """按批返回有效的接收用户ID"""
+        if recipient_type == 'users':
+            for start in range(0, len(scope), self.fanout_batch):
+                params: Dict[str, Any] = {}
+                ids = _in_clause('uid', scope[start:start + self.fanout_batch], params)
+                rows = self.db.execute_query(
+                    f"SELECT id FROM users WHERE id IN ({ids}) AND status = 1 ORDER BY id", params
+                )
+                if rows:
+                    yield [row['id'] for row in rows]
+            return
+
+        # 机构范围按主键键集分页，避免一次加载全部用户
+        last_id = 0
+        while True:
+            params = {'last_id': last_id, 'limit': self.fanout_batch}
+            org_codes = _in_clause('org', scope, params)
+            rows = self.db.execute_query(f"""
+                SELECT id FROM users
+                WHERE org_code IN ({org_codes}) AND status = 1 AND id > :last_id
+                ORDER BY id
+                LIMIT :limit
+            """, params)
+            if not rows:
+                return
+            yield [row['id'] for row in rows]
+            last_id = rows[-1]['id']
+
+    def _claim_fanout(self, message_id: int) -> bool:
+        """认领消息扇出，其他进程持有未过期的认领时返回False；Redis不可用时本进程直接扇出"""
+        try:
+            client = self._redis_provider()
+            if client is None:
+                return True
+            return bool(client.set(f'{FANOUT_LOCK_PREFIX}{message_id}', self._token, nx=True,
+                                   ex=self.fanout_lease))
+        except Exception as e:
+            logger.warning(f"认领消息扇出失败，本进程直接扇出: {message_id}, {str(e)}")
+            return True
+
+    def _renew_fanout(self, message_id: int) -> bool:
+        """每批写入后续期认领，认领已被其他进程接管时返回False"""
+        try:
+            client = self._redis_provider()
+            if client is None:
+                return True
+            key = f'{FANOUT_LOCK_PREFIX}{message_id}'
+            owner = client.get(key)
+            if owner == self._token:
+                return bool(client.expire(key, self.fanout_lease))
+            if owner is None:
+                return bool(client.set(key, self._token, nx=True, ex=self.fanout_lease))
+            return False
+        except Exception:
+            return True
+
+    def _release_fanout(self, message_id: int):
+        try:
+            client = self._redis_provider()
+            key = f'{FANOUT_LOCK_PREFIX}{message_id}'
+            if client is not None and client.get(key) == self._token:
+                client.delete(key)
+        except Exception:
+            pass
+
+    def _fanout_in_progress(self, message_id: int) -> bool:
+        try:
+            client = self._redis_provider()
+            return client is not None and bool(client.exists(f'{FANOUT_LOCK_PREFIX}{message_id}'))
+        except Exception:
+            return False
+
+    def _fanout(self, message_id: int):
+        """扇出定向消息到收件箱，先认领消息，其他进程正在扇出的消息直接跳过"""
+        if not self._claim_fanout(message_id):
+            return
+        try:
+            self._deliver(message_id)
+        finally:
+            self._release_fanout(message_id)
+
+    def _deliver(self, message_id: int):
+        """按批写入收件箱，完成后标记为已发送"""
+        try:
+            rows = self.db.execute_query(
+                "SELECT title, type, recipient_type, recipient_scope FROM messages WHERE id = :id AND status = 'sending'",
+                {'id': message_id}
+            )
+            if not rows:
+                return
+            event = {'id': message_id, 'title': rows[0].get('title'), 'type': rows[0].get('type')}
+            scope = rows[0]['recipient_scope']
+            if isinstance(scope, str):
+                scope = json.loads(scope)
+
+            delivered = 0
+            for user_ids in self._iter_recipients(rows[0]['recipient_type'], scope or []):
+                params: Dict[str, Any] = {'message_id': message_id}
+                values = ', '.join(
+                    f'(:u{index}, :message_id)' for index in range(len(user_ids))
+                )
+                params.update({f'u{index}': user_id for index, user_id in enumerate(user_ids)})
+                inserted = self.db.execute_update(
+                    f"INSERT IGNORE INTO message_inbox (user_id, message_id) VALUES {values}", params
+                )
+                delivered += len(user_ids)
+                if inserted == len(user_ids):
+                    self.counter.incr_many(UNREAD_KEY, user_ids)
+                else:
+                    # 中断后重新扇出时部分行已存在，无法区分，清除这些用户的计数
+                    self.counter.invalidate_users(user_ids)
+                self.events.publish_many(user_ids, 'message', event)
+                if not self._renew_fanout(message_id):
+                    logger.warning(f"消息扇出已被其他进程接管: {message_id}")
+                    return
+
+            self.db.execute_update("""
+                UPDATE messages SET status = 'sent', sent_at = NOW(), recipient_count = :delivered
+                WHERE id = :id
+            """, {'id': message_id, 'delivered': delivered})
+            logger.info(f"消息扇出完成: {message_id}, 投递{delivered}人")
+        except Exception as e:
+            logger.error(f"消息扇出失败: {message_id}, {str(e)}")
+            try:
+                self.db.execute_update(
+                    "UPDATE messages SET status = 'failed', error_message = :error WHERE id = :id",
+                    {'id': message_id, 'error': str(e)[:500]}
+                )
+            except Exception:
+                logger.error(f"更新消息状态失败: {message_id}")
+
+    def resume_pending(self) -> int:
+        """
+        重新扇出进程中断时仍处于sending状态的消息
+
+        其他进程正在扇出的消息持有未过期的认领，跳过；认领随扇出进程退出而过期后才会被重新扇出
+        """
+        try:
+            rows = self.db.execute_query("SELECT id FROM messages WHERE status = 'sending'")
+        except Exception as e:
+            logger.error(f"恢复消息扇出失败: {str(e)}")
+            return 0
+        stale = [row['id'] for row in rows if not self._fanout_in_progress(row['id'])]
+        for message_id in stale:
+            self._executor.submit(self._fanout, message_id)
+        if stale:
+            logger.info(f"恢复未完成的消息扇出: {len(stale)}条")
+        return len(stale)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取消息统计信息"""
+        try:
+            rows = self.db.execute_query("""
+                SELECT status, COUNT(*) AS cnt,
+                       SUM(CASE WHEN sent_at >= CURDATE() THEN 1 ELSE 0 END) AS today_sent
+                FROM messages
+                GROUP BY status
+            """)
+            stats = {'total': 0, 'sent': 0, 'draft': 0, 'sending': 0, 'failed': 0, 'today_sent': 0}
+            for row in rows:
+                stats['total'] += int(row['cnt'])
+                stats[row['status']] = int(row['cnt'])
+                stats['today_sent'] += int(row['today_sent'] or 0)
+            return {'success': True, 'data': stats}
+        except Exception as e:
+            logger.error(f"获取消息统计失败: {str(e)}")
+            return {'success': False, 'error': f'获取消息统计失败: {str(e)}'}
+
+    # ================================
+    # 收件箱
+    # ================================
+
+    def get_inbox(self, user_id: int, page: int = 1, page_size: int = 20,
+                  unread_only: bool = False) -> Dict[str, Any]:
+        """获取用户收件箱（定向消息与全体广播合并）"""
+        try:
+            direct_filter = "AND i.is_read = 0" if unread_only else ""
+            broadcast_filter = "AND r.id IS NULL" if unread_only else ""
+            params = {'user_id': user_id, 'limit': page_size, 'offset': (page - 1) * page_size}
+            rows = self.db.execute_query(f"""
+                SELECT * FROM (
+                    SELECT {_MESSAGE_COLUMNS}, i.is_read
+                    FROM message_inbox i
+                    JOIN messages m ON m.id = i.message_id
+                    WHERE i.user_id = :user_id AND m.recipient_type <> 'all' {direct_filter}
+                    UNION ALL
+                    SELECT {_MESSAGE_COLUMNS}, r.id IS NOT NULL AS is_read
+                    FROM messages m
+                    LEFT JOIN message_inbox r ON r.message_id = m.id AND r.user_id = :user_id
+                    WHERE m.recipient_type = 'all' AND m.status = 'sent' {broadcast_filter}
+                ) inbox
+                ORDER BY sent_at DESC, id DESC
+                LIMIT :limit OFFSET :offset
+            """, params)
+
+            if unread_only:
+                total = self.counter.get(user_id)
+            else:
+                total = self.db.execute_query("""
+                    SELECT
+                        (SELECT COUNT(*) FROM message_inbox i JOIN messages m ON m.id = i.message_id
+                         WHERE i.user_id = :user_id AND m.recipient_type <> 'all')
+                      + (SELECT COUNT(*) FROM messages WHERE recipient_type = 'all' AND status = 'sent')
+                        AS total
+                """, {'user_id': user_id})[0]['total']
+
+            return {
+                'success': True,
+                'data': {
+                    'list': [self._serialize(row) for row in rows],
+                    'total': int(total),
+                    'page': page,
+                    'page_size': page_size
+                }
+            }
+        except Exception as e:
+            logger.error(f"获取收件箱失败: {str(e)}")
+            return {'success': False, 'error': f'获取收件箱失败: {str(e)}'}
+
+    def get_unread_count(self, user_id: int) -> Dict[str, Any]:
+        """获取用户未读消息数"""
+        try:
+            return {'success': True, 'data': {'unread': self.counter.get(user_id)}}
+        except Exception as e:
+            logger.error(f"获取未读数失败: {str(e)}")
+            return {'success': False, 'error': f'获取未读数失败: {str(e)}'}
+
+    def mark_read(self, user_id: int, message_id: int) -> Dict[str, Any]:
+        """标记消息已读"""
+        try:
+            rows = self.db.execute_query(
+                "SELECT recipient_type FROM messages WHERE id = :id AND status IN ('sending', 'sent')",
+                {'id': message_id}
+            )
+            if not rows:
+                raise ResourceNotFoundException('消息不存在')
+
+            params = {'user_id': user_id, 'message_id': message_id}
+            if rows[0]['recipient_type'] == 'all':
+                changed = self.db.execute_update("""
+                    INSERT IGNORE INTO message_inbox (user_id, message_id, is_read, read_at)
+                    VALUES (:user_id, :message_id, 1, NOW())
+                """, params)
+                if changed:
+                    self.counter.incr(BROADCAST_READ_KEY, user_id)
+            else:
+                changed = self.db.execute_update("""
+                    UPDATE message_inbox SET is_read = 1, read_at = NOW()
+                    WHERE user_id = :user_id AND message_id = :message_id AND is_read = 0
+                """, params)
+                if changed:
+                    self.counter.incr(UNREAD_KEY, user_id, -1)
+            return {'success': True, 'data': {'unread': self.counter.get(user_id)}}
+        except ResourceNotFoundException:
+            raise
+        except Exception as e:
+            logger.error(f"标记已读失败: {str(e)}")
+            return {'success': False, 'error': f'标记已读失败: {str(e)}'}
+
+    def mark_all_read(self, user_id: int) -> Dict[str, Any]:
+        """全部标记为已读"""
+        try:
+            params = {'user_id': user_id}
+            self.db.execute_update("""
+                UPDATE message_inbox SET is_read = 1, read_at = NOW()
+                WHERE user_id = :user_id AND is_read = 0
+            """, params)
+            self.db.execute_update("""
+                INSERT IGNORE INTO message_inbox (user_id, message_id, is_read, read_at)
+                SELECT :user_id, id, 1, NOW() FROM messages
+                WHERE recipient_type = 'all' AND status = 'sent'
+            """, params)
+            self.counter.invalidate_users([user_id])
+            return {'success': True, 'data': {'unread': 0}}
+        except Exception as e:
+            logger.error(f"全部标记已读失败: {str(e)}")
+            return {'success': False, 'error': f'全部标记已读失败: {str(e)}'}
+
+    def get_message_types(self) -> List[Dict[str, str]]:
+        """获取消息类型列表"""
+        return MESSAGE_TYPES
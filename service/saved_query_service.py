@@ -0,0 +1,465 @@
+# -*- coding: utf-8 -*-
+"""
+Text2SQL保存查询服务模块
+保存问题及校验过的SQL，查询结果物化到text2sql_saved_query_rows，看板分页读取物化结果。
+
+刷新方式：
+- 设置了水位列（如created_at）时增量刷新：只查询水位不小于上次最大值的行，按行键合并
+- 未设置水位列时全量刷新：结果摘要未变化则跳过重写，否则在同一事务内替换
+到期的保存查询由后台调度线程刷新，也可以作为工作流script节点（subtype=saved_query）的步骤执行
+"""
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Callable, Tuple
+from sqlalchemy import text, bindparam
+from config.base_config import Config
+from tools.engine_registry import get_engine
+from tools.exceptions import ValidationException, BusinessException, ResourceNotFoundException
+
+logger = logging.getLogger(__name__)
+
+# 多进程部署时只允许一个进程执行调度
+REFRESH_LOCK_KEY = 'text2sql:saved_query:refresh_lock'
+
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]{0,63}$')
+_WRITE_KEYWORDS = re.compile(
+    r'\b(INSERT|UPDATE|DELETE|REPLACE|MERGE|DROP|ALTER|CREATE|TRUNCATE|RENAME|GRANT|REVOKE|CALL|LOCK|HANDLER|LOAD)\b'
+    r'|\bINTO\s+(OUTFILE|DUMPFILE)\b|\bFOR\s+UPDATE\b',
+    re.IGNORECASE
+)
+_STRING_LITERALS = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+
+_SAVED_QUERY_COLUMNS = """
+    id, user_id, session_id, name, question, sql_query, watermark_column, key_columns,
+    refresh_interval, status, columns, row_count, result_digest, last_watermark, last_refreshed_at,
+    last_refresh_ms, refresh_error, next_refresh_at, created_at
+"""
+
+def validate_select_sql(sql: str) -> str:
+    """
+    校验保存查询的SQL只包含一条只读查询，返回去掉结尾分号的SQL
+
+    Raises:
+        ValidationException: 非SELECT/WITH查询、多条语句或包含写操作
+    """
+    sql = (sql or '').strip().rstrip(';').strip()
+    if not sql:
+        raise ValidationException('SQL语句不能为空')
+    stripped = _STRING_LITERALS.sub("''", sql)
+    if ';' in stripped:
+        raise ValidationException('保存查询只能包含一条SQL语句')
+    if not re.match(r'^(SELECT|WITH)\b', stripped, re.IGNORECASE):
+        raise ValidationException('保存查询只支持SELECT查询')
+    if _WRITE_KEYWORDS.search(stripped):
+        raise ValidationException('保存查询不能包含写操作')
+    return sql
+
+def build_refresh_sql(sql: str, watermark_column: Optional[str], incremental: bool) -> str:
+    """构造刷新查询：增量刷新时在外层按水位过滤并排序"""
+    if not watermark_column:
+        return sql
+    where = f' WHERE saved_q.`{watermark_column}` >= :watermark' if incremental else ''
+    return f'SELECT * FROM ({sql}) AS saved_q{where} ORDER BY saved_q.`{watermark_column}`'
+
+def row_key(row: Dict[str, Any], key_columns: Optional[List[str]]) -> str:
+    """行键：指定键列时取键列的值，否则取整行（完全相同的行只保留一行），重复拉取的同一行得到相同的行键"""
+    values = [row.get(column) for column in key_columns] if key_columns else row
+    return hashlib.sha1(json.dumps(values, sort_keys=True, default=str, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+def _format_watermark(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S.%f')
+    return str(value)
+
+def _format_time(value: Any) -> Optional[str]:
+    return value.strftime('%Y-%m-%d %H:%M:%S') if isinstance(value, datetime) else value
+
+def _default_redis_provider():
+    from tools.redis_service import get_redis_service
+    return get_redis_service().redis_client
+
+class SavedQueryService:
+    """保存查询服务类"""
+
+    def __init__(self, store_engine=None, source_engine=None):
+        # 保存查询和物化结果存放在vanna库，查询本身在业务数据源上执行
+        self.store_engine = store_engine or get_engine(Config.VANNA_DATABASE_URI)
+        self.source_engine = source_engine or get_engine(Config.SAVED_QUERY_DATABASE_URI, 'background')
+        self.max_rows = Config.SAVED_QUERY_MAX_ROWS
+        self.fetch_size = Config.SAVED_QUERY_FETCH_SIZE
+
+    # ================================
+    # 保存查询管理
+    # ================================
+
+    def _serialize(self, row) -> Dict[str, Any]:
+        data = dict(row._mapping)
+        for field in ('key_columns', 'columns'):
+            if isinstance(data.get(field), str):
+                data[field] = json.loads(data[field])
+        for field in ('last_refreshed_at', 'next_refresh_at', 'created_at'):
+            data[field] = _format_time(data.get(field))
+        return data
+
+    def _get(self, conn, saved_query_id: int, user_id: Optional[int] = None, lock: bool = False):
+        params: Dict[str, Any] = {'id': saved_query_id}
+        owner = ''
+        if user_id is not None:
+            owner = ' AND user_id = :user_id'
+            params['user_id'] = user_id
+        row = conn.execute(text(
+            f"SELECT {_SAVED_QUERY_COLUMNS} FROM text2sql_saved_queries WHERE id = :id{owner}"
+            + (' FOR UPDATE' if lock else '')
+        ), params).fetchone()
+        if not row:
+            raise ResourceNotFoundException('保存查询不存在')
+        return row
+
+    def create_saved_query(self, data: Dict[str, Any], user_id: int) -> Dict[str, Any]:
+        """
+        保存查询
+
+        SQL在数据源上EXPLAIN校验通过后保存，首次物化由调度线程立即执行
+        """
+        name = (data.get('name') or '').strip()
+        question = (data.get('question') or '').strip()
+        if not name or not question:
+            raise ValidationException('名称和问题不能为空')
+        sql = validate_select_sql(data.get('sql'))
+
+        watermark_column = (data.get('watermark_column') or '').strip() or None
+        key_columns = data.get('key_columns') or None
+        if key_columns is not None and not isinstance(key_columns, list):
+            raise ValidationException('key_columns必须是列名数组')
+        for column in ([watermark_column] if watermark_column else []) + (key_columns or []):
+            if not isinstance(column, str) or not _IDENTIFIER.match(column):
+                raise ValidationException(f'无效的列名: {column}')
+
+        refresh_interval = int(data.get('refresh_interval') or Config.SAVED_QUERY_DEFAULT_INTERVAL)
+        if refresh_interval < Config.SAVED_QUERY_MIN_INTERVAL:
+            raise ValidationException(f'刷新间隔不能小于{Config.SAVED_QUERY_MIN_INTERVAL}秒')
+
+        try:
+            with self.source_engine.connect() as conn:
+                conn.execute(text(f'EXPLAIN {build_refresh_sql(sql, watermark_column, True)}'),
+                             {'watermark': '0'})
+        except Exception as e:
+            raise ValidationException(f'SQL校验失败: {str(e)}')
+
+        with self.store_engine.begin() as conn:
+            result = conn.execute(text("""
+                INSERT INTO text2sql_saved_queries (
+                    user_id, session_id, name, question, sql_query, watermark_column,
+                    key_columns, refresh_interval, next_refresh_at
+                ) VALUES (
+                    :user_id, :session_id, :name, :question, :sql_query, :watermark_column,
+                    :key_columns, :refresh_interval, NOW()
+                )
+            """), {
+                'user_id': user_id,
+                'session_id': data.get('session_id'),
+                'name': name,
+                'question': question,
+                'sql_query': sql,
+                'watermark_column': watermark_column,
+                'key_columns': json.dumps(key_columns) if key_columns else None,
+                'refresh_interval': refresh_interval
+            })
+            saved_query_id = result.lastrowid
+
+        return {'success': True, 'data': {'id': saved_query_id}, 'message': '保存查询成功'}
+
+    def get_saved_queries(self, user_id: int) -> Dict[str, Any]:
+        """获取用户的保存查询列表"""
+        with self.store_engine.connect() as conn:
+            rows = conn.execute(text(f"""
+                SELECT {_SAVED_QUERY_COLUMNS} FROM text2sql_saved_queries
+                WHERE user_id = :user_id
+                ORDER BY created_at DESC
+            """), {'user_id': user_id}).fetchall()
+        return {'success': True, 'data': [self._serialize(row) for row in rows]}
+
+    def delete_saved_query(self, saved_query_id: int, user_id: int) -> Dict[str, Any]:
+        """删除保存查询及其物化结果"""
+        with self.store_engine.begin() as conn:
+            deleted = conn.execute(text("""
+                DELETE FROM text2sql_saved_queries WHERE id = :id AND user_id = :user_id
+            """), {'id': saved_query_id, 'user_id': user_id}).rowcount
+        if not deleted:
+            raise ResourceNotFoundException('保存查询不存在')
+        return {'success': True, 'message': '删除保存查询成功'}
+
+    def get_result(self, saved_query_id: int, user_id: Optional[int], page: int = 1,
+                   page_size: int = 100) -> Dict[str, Any]:
+        """分页读取物化结果（按主键范围扫描，不执行原查询）"""
+        page = max(page, 1)
+        page_size = min(max(page_size, 1), Config.SAVED_QUERY_MAX_PAGE_SIZE)
+        with self.store_engine.connect() as conn:
+            saved = self._serialize(self._get(conn, saved_query_id, user_id))
+            rows = conn.execute(text("""
+                SELECT row_data FROM text2sql_saved_query_rows
+                WHERE saved_query_id = :id
+                ORDER BY id
+                LIMIT :limit OFFSET :offset
+            """), {'id': saved_query_id, 'limit': page_size, 'offset': (page - 1) * page_size}).fetchall()
+
+        return {
+            'success': True,
+            'data': {
+                'columns': saved['columns'] or [],
+                'records': [json.loads(row.row_data) if isinstance(row.row_data, str) else row.row_data
+                            for row in rows],
+                'row_count': saved['row_count'],
+                'page': page,
+                'page_size': page_size,
+                'last_refreshed_at': saved['last_refreshed_at'],
+                'refresh_error': saved['refresh_error']
+            }
+        }
+
+    # ================================
+    # 物化刷新
+    # ================================
+
+    def _fetch(self, sql: str, params: Dict[str, Any]) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """流式读取查询结果，超过行数上限时报错"""
+        rows: List[Dict[str, Any]] = []
+        with self.source_engine.connect() as conn:
+            result = conn.execution_options(stream_results=True).execute(text(sql), params)
+            columns = list(result.keys())
+            while True:
+                chunk = result.fetchmany(self.fetch_size)
+                if not chunk:
+                    break
+                rows.extend(dict(row._mapping) for row in chunk)
+                if len(rows) > self.max_rows:
+                    raise BusinessException(f'查询结果超过{self.max_rows}行，不能物化')
+        return columns, rows
+
+    def _insert_rows(self, conn, saved_query_id: int, rows: List[Dict[str, Any]],
+                     key_columns: Optional[List[str]], ordinal: bool = False):
+        """
+        按行键合并写入，已存在的行更新内容
+
+        ordinal为True时以行号为键（无水位列的全量结果，保留完全相同的重复行）
+        """
+        for start in range(0, len(rows), self.fetch_size):
+            if ordinal:
+                keys = [hashlib.sha1(str(index).encode()).hexdigest()
+                        for index in range(start, min(start + self.fetch_size, len(rows)))]
+            else:
+                keys = [row_key(row, key_columns) for row in rows[start:start + self.fetch_size]]
+            conn.execute(text("""
+                INSERT INTO text2sql_saved_query_rows (saved_query_id, row_key, row_data)
+                VALUES (:saved_query_id, :row_key, :row_data)
+                ON DUPLICATE KEY UPDATE row_data = VALUES(row_data)
+            """), [{
+                'saved_query_id': saved_query_id,
+                'row_key': key,
+                'row_data': json.dumps(row, default=str, ensure_ascii=False)
+            } for key, row in zip(keys, rows[start:start + self.fetch_size])])
+
+    def refresh(self, saved_query_id: int, full: bool = False, user_id: Optional[int] = None) -> Dict[str, Any]:
+        """
+        刷新保存查询的物化结果
+
+        Args:
+            saved_query_id: 保存查询ID
+            full: 强制全量刷新（水位列之前的行发生修改或删除时使用）
+            user_id: 指定时只允许刷新该用户的保存查询
+        """
+        started = time.monotonic()
+        with self.store_engine.connect() as conn:
+            saved = self._serialize(self._get(conn, saved_query_id, user_id))
+
+        watermark_column = saved['watermark_column']
+        key_columns = saved['key_columns']
+        incremental = bool(watermark_column) and not full and saved['last_watermark'] is not None
+        try:
+            columns, rows = self._fetch(
+                build_refresh_sql(saved['sql_query'], watermark_column, incremental),
+                {'watermark': saved['last_watermark']} if incremental else {}
+            )
+        except Exception as e:
+            logger.error(f"刷新保存查询{saved_query_id}失败: {str(e)}")
+            self._record_error(saved_query_id, saved['refresh_interval'], str(e))
+            return {'success': False, 'error': str(e), 'message': '刷新保存查询失败'}
+
+        new_watermark = None
+        if watermark_column and rows:
+            if watermark_column not in columns:
+                message = f'查询结果中没有水位列{watermark_column}'
+                self._record_error(saved_query_id, saved['refresh_interval'], message)
+                return {'success': False, 'error': message, 'message': '刷新保存查询失败'}
+            values = [row[watermark_column] for row in rows if row[watermark_column] is not None]
+            new_watermark = _format_watermark(max(values)) if values else None
+
+        with self.store_engine.begin() as conn:
+            current = self._get(conn, saved_query_id, lock=True)
+            if incremental:
+                # 增量合并后物化结果不再对应某次全量结果，清空摘要
+                self._insert_rows(conn, saved_query_id, rows, key_columns)
+                mode, digest = 'incremental', None
+            else:
+                digest = hashlib.sha1(json.dumps(rows, default=str, ensure_ascii=False).encode('utf-8')).hexdigest()
+                if digest == current.result_digest and current.row_count == len(rows):
+                    mode = 'unchanged'
+                else:
+                    conn.execute(text("DELETE FROM text2sql_saved_query_rows WHERE saved_query_id = :id"),
+                                 {'id': saved_query_id})
+                    self._insert_rows(conn, saved_query_id, rows, key_columns,
+                                      ordinal=not watermark_column and not key_columns)
+                    mode = 'full'
+
+            row_count = conn.execute(text("""
+                SELECT COUNT(*) FROM text2sql_saved_query_rows WHERE saved_query_id = :id
+            """), {'id': saved_query_id}).scalar()
+            elapsed = int((time.monotonic() - started) * 1000)
+            conn.execute(text("""
+                UPDATE text2sql_saved_queries
+                SET columns = :columns, row_count = :row_count, result_digest = :digest,
+                    last_watermark = IF(:incremental, COALESCE(:watermark, last_watermark), :watermark),
+                    last_refreshed_at = NOW(), last_refresh_ms = :elapsed, refresh_error = NULL,
+                    next_refresh_at = DATE_ADD(NOW(), INTERVAL refresh_interval SECOND)
+                WHERE id = :id
+            """), {
+                'columns': json.dumps(columns, ensure_ascii=False),
+                'row_count': row_count,
+                'digest': digest,
+                # 并发刷新时各自的水位之前的行都已物化，取任一个都不会漏行
+                'watermark': new_watermark,
+                'incremental': incremental,
+                'elapsed': elapsed,
+                'id': saved_query_id
+            })
+
+        return {
+            'success': True,
+            'data': {'mode': mode, 'fetched': len(rows), 'row_count': row_count, 'elapsed_ms': elapsed},
+            'message': '刷新保存查询成功'
+        }
+
+    def _record_error(self, saved_query_id: int, refresh_interval: int, error: str):
+        with self.store_engine.begin() as conn:
+            conn.execute(text("""
+                UPDATE text2sql_saved_queries
+                SET refresh_error = :error,
+                    next_refresh_at = DATE_ADD(NOW(), INTERVAL :interval SECOND)
+                WHERE id = :id
+            """), {'error': error[:2000], 'interval': refresh_interval, 'id': saved_query_id})
+
+    def refresh_due(self, limit: int) -> Dict[str, int]:
+        """
+        刷新到期的保存查询，返回本轮统计
+        选取到期查询的事务内把next_refresh_at推迟一个租约时长认领，其他进程不会重复刷新；
+        刷新结束时按刷新间隔重新设置，进程中途退出时租约到期后由其他进程接管
+        """
+        with self.store_engine.begin() as conn:
+            due = conn.execute(text("""
+                SELECT id FROM text2sql_saved_queries
+                WHERE status = 'active' AND next_refresh_at <= NOW()
+                ORDER BY next_refresh_at
+                LIMIT :limit
+                FOR UPDATE SKIP LOCKED
+            """), {'limit': limit}).fetchall()
+            if due:
+                conn.execute(text("""
+                    UPDATE text2sql_saved_queries
+                    SET next_refresh_at = DATE_ADD(NOW(), INTERVAL :lease SECOND)
+                    WHERE id IN :ids
+                """).bindparams(bindparam('ids', expanding=True)),
+                    {'lease': Config.SAVED_QUERY_REFRESH_LEASE, 'ids': [row.id for row in due]})
+
+        stats = {'refreshed': 0, 'failed': 0}
+        for row in due:
+            try:
+                result = self.refresh(row.id)
+            except Exception as e:
+                logger.error(f"刷新保存查询{row.id}异常: {str(e)}")
+                result = {'success': False}
+            stats['refreshed' if result['success'] else 'failed'] += 1
+        return stats
+
+class SavedQueryScheduler:
+    """保存查询刷新调度线程"""
+
+    def __init__(self, service_provider: Optional[Callable[[], SavedQueryService]] = None,
+                 redis_provider: Optional[Callable[[], Any]] = None,
+                 interval: Optional[float] = None, batch: Optional[int] = None):
+        self._service_provider = service_provider or get_saved_query_service
+        self._redis_provider = redis_provider or _default_redis_provider
+        self.interval = interval or Config.SAVED_QUERY_SCHEDULER_INTERVAL
+        self.batch = batch or Config.SAVED_QUERY_REFRESH_BATCH
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+
+    def _acquire_lock(self) -> bool:
+        try:
+            ttl = max(int(self.interval) - 1, 1)
+            return bool(self._redis_provider().set(REFRESH_LOCK_KEY, str(time.time()), nx=True, ex=ttl))
+        except Exception as e:
+            logger.warning(f"获取保存查询调度锁失败，本进程直接刷新: {str(e)}")
+            return True
+
+    def run_once(self) -> Dict[str, int]:
+        """执行一轮调度"""
+        if not self._acquire_lock():
+            return {'refreshed': 0, 'failed': 0}
+        return self._service_provider().refresh_due(self.batch)
+
+    def start(self):
+        """启动调度线程"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._loop, name='saved-query-scheduler', daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                stats = self.run_once()
+                if stats['refreshed'] or stats['failed']:
+                    logger.info(f"保存查询刷新: {stats}")
+            except Exception as e:
+                logger.error(f"保存查询调度失败: {str(e)}")
+
+    def stop(self):
+        """停止调度线程"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+# 全局保存查询服务实例
+_saved_query_service = None
+_saved_query_scheduler = None
+_saved_query_lock = threading.Lock()
+
+def get_saved_query_service() -> SavedQueryService:
+    """获取保存查询服务实例"""
+    global _saved_query_service
+    if _saved_query_service is None:
+        with _saved_query_lock:
+            if _saved_query_service is None:
+                _saved_query_service = SavedQueryService()
+    return _saved_query_service
+
+def get_saved_query_scheduler() -> SavedQueryScheduler:
+    """获取保存查询调度实例（首次调用时启动调度线程）"""
+    global _saved_query_scheduler
+    if _saved_query_scheduler is None:
+        with _saved_query_lock:
+            if _saved_query_scheduler is None:
+                scheduler = SavedQueryScheduler()
+                scheduler.start()
+                _saved_query_scheduler = scheduler
+    return _saved_query_scheduler
@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+"""
+表结构增量自动训练模块
+按表计算结构指纹（字段名、类型、注释及表注释）并与vanna库中的上次快照比较：
+
+- 新增或变化的表：并行读取建表语句，生成DDL和文档训练内容，提交到训练任务队列
+- 变化或删除的表：旧训练记录置为无效，并从向量库和本地样本索引中删除对应内容
+- 未变化的表不产生任何训练或向量库操作，上次训练失败的表会在下次执行时重试
+"""
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Callable, Tuple
+from sqlalchemy import text, bindparam
+from config.base_config import Config
+from tools.engine_registry import get_engine
+from tools.exceptions import BusinessException
+
+logger = logging.getLogger(__name__)
+
+# 同一时间只允许一个自动训练执行
+AUTO_TRAIN_LOCK_KEY = 'ai:schema_auto_train:lock'
+
+def table_fingerprint(table_comment: str, columns: List[Tuple[str, str, str]]) -> str:
+    """计算表结构指纹，columns为按字段顺序排列的(字段名, 字段类型, 字段注释)"""
+    payload = json.dumps([table_comment or '', [list(column) for column in columns]], ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+# 训练内容在向量库中的ID后缀，与Vanna向量库按内容生成确定性ID的规则一致
+_VECTOR_ID_SUFFIXES = {'ddl': '-ddl', 'documentation': '-doc'}
+
+def vector_id(training_type: str, content: str) -> Optional[str]:
+    """按训练内容计算向量ID（与vanna.utils.deterministic_uuid相同），不支持的训练类型返回None"""
+    suffix = _VECTOR_ID_SUFFIXES.get(training_type)
+    if suffix is None:
+        return None
+    content_hash = hashlib.sha256(content.encode('utf-8')).hexdigest()
+    return str(uuid.uuid5(uuid.UUID(int=0), content_hash)) + suffix
+
+def diff_snapshots(current: Dict[str, str], previous: Dict[str, str],
+                   retry: Optional[set] = None) -> Tuple[List[str], List[str], List[str]]:
+    """
+    比较表指纹
+
+    Returns:
+        (新增表, 变化表, 删除表)，上次训练失败的表视为变化
+    """
+    retry = retry or set()
+    added = sorted(name for name in current if name not in previous)
+    changed = sorted(name for name in current
+                     if name in previous and (current[name] != previous[name] or name in retry))
+    dropped = sorted(name for name in previous if name not in current)
+    return added, changed, dropped
+
+def _default_training_service():
+    from service.training_job_service import get_training_job_service
+    return get_training_job_service()
+
+def _default_trainer_provider():
+    from AIEngine.vanna_service import get_vanna_service
+    return get_vanna_service()
+
+def _default_example_store_provider():
+    if not Config.VECTOR_INDEX_ENABLED:
+        return None
+    from AIEngine.example_store import get_example_store
+    return get_example_store()
+
+def _default_redis_provider():
+    from tools.redis_service import get_redis_service
+    return get_redis_service().redis_client
+
+class SchemaAutoTrainer:
+    """表结构增量自动训练"""
+
+    def __init__(self, source_engine=None, store_engine=None, schema: Optional[str] = None,
+                 training_service_provider: Optional[Callable[[], Any]] = None,
+                 trainer_provider: Optional[Callable[[], Any]] = None,
+                 redis_provider: Optional[Callable[[], Any]] = None, workers: Optional[int] = None,
+                 example_store_provider: Optional[Callable[[], Any]] = None):
+        self.source_engine = source_engine or get_engine(Config.SCHEMA_TRAINING_DATABASE_URI, 'background')
+        self.store_engine = store_engine or get_engine(Config.VANNA_DATABASE_URI, 'background')
+        self.schema = schema or Config.SCHEMA_TRAINING_SCHEMA
+        self._training_service_provider = training_service_provider or _default_training_service
+        self._trainer_provider = trainer_provider or _default_trainer_provider
+        self._redis_provider = redis_provider or _default_redis_provider
+        self._example_store_provider = example_store_provider or _default_example_store_provider
+        self.workers = workers or Config.SCHEMA_TRAINING_WORKERS
+        self._token = f'{os.getpid()}:{uuid.uuid4().hex}'
+
+    def _source_table(self, table: str) -> str:
+        return f'{self.schema}.{table}'
+
+    # ================================
+    # 快照与比较
+    # ================================
+
+    def _read_schema(self) -> Dict[str, Dict[str, Any]]:
+        """一次读取整个库的表注释和字段信息"""
+        with self.source_engine.connect() as conn:
+            tables = conn.execute(text("""
+                SELECT TABLE_NAME AS table_name, TABLE_COMMENT AS table_comment
+                FROM INFORMATION_SCHEMA.TABLES
+                WHERE TABLE_SCHEMA = :schema AND TABLE_TYPE = 'BASE TABLE'
+            """), {'schema': self.schema}).fetchall()
+            columns = conn.execute(text("""
+                SELECT TABLE_NAME AS table_name, COLUMN_NAME AS column_name,
+                       COLUMN_TYPE AS column_type, COLUMN_COMMENT AS column_comment
+                FROM INFORMATION_SCHEMA.COLUMNS
+                WHERE TABLE_SCHEMA = :schema
+                ORDER BY TABLE_NAME, ORDINAL_POSITION
+            """), {'schema': self.schema}).fetchall()
+
+        schema = {row.table_name: {'comment': row.table_comment or '', 'columns': []} for row in tables}
+        for row in columns:
+            if row.table_name in schema:
+                schema[row.table_name]['columns'].append(
+                    (row.column_name, row.column_type, row.column_comment or '')
+                )
+        return schema
+
+    def _load_previous(self) -> Tuple[Dict[str, str], set]:
+        with self.store_engine.connect() as conn:
+            snapshots = conn.execute(text("""
+                SELECT table_name, fingerprint FROM ai_schema_snapshots WHERE schema_name = :schema
+            """), {'schema': self.schema}).fetchall()
+            failed = conn.execute(text("""
+                SELECT DISTINCT source_table FROM ai_training_records
+                WHERE source_table LIKE :prefix AND status = 1 AND train_status = 'failed'
+            """), {'prefix': f'{self.schema}.%'}).fetchall()
+        prefix_length = len(self.schema) + 1
+        return ({row.table_name: row.fingerprint for row in snapshots},
+                {row.source_table[prefix_length:] for row in failed})
+
+    # ================================
+    # 训练内容生成
+    # ================================
+
+    def _show_create(self, table: str) -> str:
+        with self.source_engine.connect() as conn:
+            row = conn.execute(text(f'SHOW CREATE TABLE `{self.schema}`.`{table}`')).fetchone()
+        return row[1]
+
+    def _build_table_items(self, table: str, info: Dict[str, Any]) -> List[Dict[str, Any]]:
+        try:
+            ddl = self._show_create(table)
+        except Exception as e:
+            # 读取建表语句失败时按字段信息拼接，保证训练内容与指纹一致
+            logger.warning(f"读取表{table}建表语句失败，按字段信息生成DDL: {str(e)}")
+            columns = ',\n'.join(
+                f"  `{name}` {column_type}" + (f" COMMENT '{comment}'" if comment else '')
+                for name, column_type, comment in info['columns']
+            )
+            ddl = f"CREATE TABLE `{table}` (\n{columns}\n)"
+            if info['comment']:
+                ddl += f" COMMENT='{info['comment']}'"
+
+        fields = '；'.join(
+            f"{name}（{column_type}{'，' + comment if comment else ''}）"
+            for name, column_type, comment in info['columns']
+        )
+        documentation = f"表{table}" + (f"（{info['comment']}）" if info['comment'] else '') + f"包含字段：{fields}"
+
+        source_table = self._source_table(table)
+        return [
+            {'training_type': 'ddl', 'content': ddl, 'question': None, 'sql_statement': None,
+             'source_table': source_table},
+            {'training_type': 'documentation', 'content': documentation, 'question': None,
+             'sql_statement': None, 'source_table': source_table},
+        ]
+
+    def _build_items(self, tables: List[str], schema: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """并行生成训练内容，保持表名顺序"""
+        if not tables:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(tables)),
+                                thread_name_prefix='schema-train') as executor:
+            results = executor.map(lambda table: self._build_table_items(table, schema[table]), tables)
+            return [item for items in results for item in items]
+
+    # ================================
+    # 失效旧训练内容
+    # ================================
+
+    def _retire(self, tables: List[str]) -> int:
+        """
+        旧训练记录置为无效并从向量库删除对应内容，返回删除的向量数
+        尚未训练的记录同时标记为失败，训练worker不会再训练已失效的内容
+        """
+        if not tables:
+            return 0
+        source_tables = [self._source_table(table) for table in tables]
+        with self.store_engine.begin() as conn:
+            retired = conn.execute(text("""
+                SELECT id, training_type, content FROM ai_training_records
+                WHERE source_table IN :tables AND status = 1
+            """).bindparams(bindparam('tables', expanding=True)), {'tables': source_tables}).fetchall()
+            conn.execute(text("""
+                UPDATE ai_training_records
+                SET status = 0,
+                    error_message = CASE WHEN train_status = 'pending' THEN '表结构已变化，训练内容已失效'
+                                         ELSE error_message END,
+                    train_status = CASE WHEN train_status = 'pending' THEN 'failed' ELSE train_status END
+                WHERE source_table IN :tables AND status = 1
+            """).bindparams(bindparam('tables', expanding=True)), {'tables': source_tables})
+        if not retired:
+            return 0
+        try:
+            example_store = self._example_store_provider()
+            if example_store is not None:
+                example_store.remove_records([row.id for row in retired])
+        except Exception as e:
+            logger.warning(f"删除训练样本索引失败: {str(e)}")
+
+        # 向量ID由内容确定，只删除受影响表的向量，不再读取整个向量库
+        vector_ids = {vector_id(row.training_type, row.content) for row in retired} - {None}
+        removed = 0
+        try:
+            trainer = self._trainer_provider()
+            for record_id in sorted(vector_ids):
+                if trainer.remove_training_data(record_id):
+                    removed += 1
+        except Exception as e:
+            # 向量删除失败不影响新内容训练，残留的旧内容会在下次该表变化时再次尝试删除
+            logger.warning(f"删除旧训练向量失败: {str(e)}")
+        return removed
+
+    # ================================
+    # 执行
+    # ================================
+
+    def _acquire_lock(self) -> bool:
+        try:
+            return bool(self._redis_provider().set(AUTO_TRAIN_LOCK_KEY, self._token, nx=True,
+                                                   ex=Config.SCHEMA_TRAINING_LOCK_SECONDS))
+        except Exception as e:
+            logger.warning(f"获取自动训练锁失败，本进程直接执行: {str(e)}")
+            return True
+
+    def _release_lock(self):
+        """只释放本实例持有的锁，执行超过锁有效期后其他进程取得的锁不受影响"""
+        try:
+            client = self._redis_provider()
+            if client.get(AUTO_TRAIN_LOCK_KEY) == self._token:
+                client.delete(AUTO_TRAIN_LOCK_KEY)
+        except Exception:
+            pass
+
+    def run(self, full: bool = False, user_id: Optional[int] = None) -> Dict[str, Any]:
+        """
+        执行一次增量自动训练
+
+        Args:
+            full: 是否忽略快照，全部表重新训练
+            user_id: 提交用户ID
+
+        Returns:
+            本次比较结果及训练任务ID，无变化时task_id为None
+        """
+        if not self._acquire_lock():
+            raise BusinessException('表结构自动训练正在执行')
+        started = time.monotonic()
+        try:
+            schema = self._read_schema()
+            current = {table: table_fingerprint(info['comment'], info['columns']) for table, info in schema.items()}
+            previous, retry = self._load_previous()
+            added, changed, dropped = diff_snapshots(current, previous, set(current) if full else retry)
+
+            items = self._build_items(added + changed, schema)
+            # 全量重训时新增表也可能残留快照丢失前的训练内容
+            removed = self._retire((added if full else []) + changed + dropped)
+
+            task_id = None
+            if items:
+                task_id = self._training_service_provider().submit(items, 'auto', user_id)['task_id']
+            self._save_snapshots(added + changed, dropped, current, schema, task_id)
+
+            result = {
+                'task_id': task_id,
+                'table_count': len(current),
+                'added': added,
+                'changed': changed,
+                'dropped': dropped,
+                'training_items': len(items),
+                'removed_vectors': removed,
+                'elapsed_ms': int((time.monotonic() - started) * 1000),
+            }
+            logger.info(f"表结构自动训练: 新增{len(added)}，变化{len(changed)}，删除{len(dropped)}，"
+                        f"共{len(current)}张表，耗时{result['elapsed_ms']}ms")
+            return result
+        finally:
+            self._release_lock()
+
+    def _save_snapshots(self, trained: List[str], dropped: List[str], current: Dict[str, str],
+                        schema: Dict[str, Dict[str, Any]], task_id: Optional[str]):
+        stale = trained + dropped
+        if not stale:
+            return
+        with self.store_engine.begin() as conn:
+            conn.execute(text("""
+                DELETE FROM ai_schema_snapshots WHERE schema_name = :schema AND table_name IN :tables
+            """).bindparams(bindparam('tables', expanding=True)), {'schema': self.schema, 'tables': stale})
+            if trained:
+                conn.execute(text("""
+                    INSERT INTO ai_schema_snapshots (schema_name, table_name, fingerprint, column_count, job_id)
+                    VALUES (:schema, :table, :fingerprint, :column_count, :job_id)
+                """), [{'schema': self.schema, 'table': table, 'fingerprint': current[table],
+                        'column_count': len(schema[table]['columns']), 'job_id': task_id} for table in trained])
+
+# 全局自动训练实例
+_schema_auto_trainer = None
+_schema_auto_trainer_lock = threading.Lock()
+
+def get_schema_auto_trainer() -> SchemaAutoTrainer:
+    """获取表结构自动训练实例"""
+    global _schema_auto_trainer
+    if _schema_auto_trainer is None:
+        with _schema_auto_trainer_lock:
+            if _schema_auto_trainer is None:
+                _schema_auto_trainer = SchemaAutoTrainer()
+    return _schema_auto_trainer
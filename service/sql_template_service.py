@@ -0,0 +1,551 @@
+# -*- coding: utf-8 -*-
+"""
+SQL模板快速路径模块
+大量问题只是字面值不同的同一类问题（"查询XX机构的用户数"、"统计YYYY年的订单金额"），
+从执行成功的qa_history和text2sql_messages中挖掘参数化SQL模板，命中时不调用大模型：
+
+- 问题中的日期、机构名称、枚举值和数字替换为槽位占位符，得到问题骨架
+- SQL中与槽位取值或其派生形式（日期的起止日、机构编码等）相同的字面值替换为槽位引用；
+  同一槽位形式对应多个字面值、或同一字面值对应多个槽位时视为有歧义，不生成模板
+- 同一骨架下生成该模板的历史问题占比和不同取值组合数决定置信度，达到阈值的模板才会启用
+- 新问题按骨架查找模板并确定性地填充槽位，未命中时由调用方回退到Vanna
+- 查找次数、命中次数和两条路径的耗时记录在Redis中，多个进程共享
+"""
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from typing import Dict, Any, List, Optional, Callable, Tuple, Iterable
+from sqlalchemy import text
+from config.base_config import Config
+from tools.engine_registry import get_engine
+
+logger = logging.getLogger(__name__)
+
+STATS_KEY = 'ai:sql_template:stats'
+
+_DATE = (r'(?<!\d)(?:(?P<y1>\d{4})年(?P<m1>\d{1,2})月(?P<d1>\d{1,2})[日号]'
+         r'|(?P<y2>\d{4})[-/.](?P<m2>\d{1,2})[-/.](?P<d2>\d{1,2})(?!\d)'
+         r'|(?P<y3>\d{4})年(?P<m3>\d{1,2})月'
+         r'|(?P<y4>\d{4})[-/](?P<m4>\d{1,2})(?![\d-])'
+         r'|(?P<y5>\d{4})年)')
+_NUMBER = r'(?<![\d.])\d+(?:\.\d+)?(?![\d.])'
+_TRAILING = re.compile(r'[\s？?。！!.]+$')
+_WHITESPACE = re.compile(r'\s+')
+
+# SQL中的注释、反引号标识符、字符串和数字字面值
+_SQL_TOKEN = re.compile(
+    r"--[^\n]*|/\*.*?\*/|`[^`]*`|'(?:[^'\\]|''|\\.)*'|\"(?:[^\"\\]|\"\"|\\.)*\""
+    r"|(?<![\w.])\d+(?:\.\d+)?(?![\w.])",
+    re.S
+)
+_COLUMN_BEFORE = re.compile(r'([A-Za-z_`][\w.`]*)\s*(?:<>|!=|>=|<=|=|>|<|\s+LIKE|\s+IN\s*\([^()]*)\s*$', re.I)
+
+def normalize_question(question: str) -> str:
+    """规范化问题：全角半角统一、去掉空白和句末标点"""
+    return _TRAILING.sub('', _WHITESPACE.sub('', unicodedata.normalize('NFKC', question or '')))
+
+def date_forms(year: int, month: Optional[int] = None, day: Optional[int] = None) -> Dict[str, str]:
+    """
+    日期槽位的派生形式，顺序即绑定SQL字面值时的优先级
+
+    Raises:
+        ValueError: 日期不合法
+    """
+    if day:
+        start = date(year, month, day)
+        end, following = start, start + timedelta(days=1)
+        value, compact = start.isoformat(), start.strftime('%Y%m%d')
+    elif month:
+        start = date(year, month, 1)
+        following = date(year + month // 12, month % 12 + 1, 1)
+        end = following - timedelta(days=1)
+        value, compact = start.strftime('%Y-%m'), start.strftime('%Y%m')
+    else:
+        start, end, following = date(year, 1, 1), date(year, 12, 31), date(year + 1, 1, 1)
+        value, compact = str(year), str(year)
+    forms = {
+        'value': value, 'start': start.isoformat(), 'end': end.isoformat(), 'next': following.isoformat(),
+        'start_time': f'{start.isoformat()} 00:00:00', 'end_time': f'{end.isoformat()} 23:59:59',
+        'compact': compact, 'year': str(year),
+    }
+    if month:
+        forms.update({'month': str(month), 'month2': f'{month:02d}'})
+    if day:
+        forms.update({'day': str(day), 'day2': f'{day:02d}'})
+    return forms
+
+class QuestionNormalizer:
+    """将问题切分为骨架和槽位"""
+
+    def __init__(self, orgs: Optional[Dict[str, str]] = None, enums: Iterable[str] = ()):
+        """
+        Args:
+            orgs: 机构名称 -> 机构编码
+            enums: 枚举取值
+        """
+        self.orgs = dict(orgs or {})
+        self.enums = set(enums) - set(self.orgs)
+        values = sorted(set(self.orgs) | self.enums, key=len, reverse=True)
+        alternatives = [f'(?P<date>{_DATE})']
+        if values:
+            # 同一位置优先匹配最长的取值
+            alternatives.append('(?P<value>' + '|'.join(re.escape(value) for value in values) + ')')
+        alternatives.append(f'(?P<number>{_NUMBER})')
+        self._pattern = re.compile('|'.join(alternatives))
+
+    def _date_slot(self, match) -> Optional[Dict[str, Any]]:
+        groups = match.groupdict()
+        for i in range(1, 6):
+            if groups.get(f'y{i}'):
+                year = int(groups[f'y{i}'])
+                month = int(groups[f'm{i}']) if groups.get(f'm{i}') else None
+                day = int(groups[f'd{i}']) if groups.get(f'd{i}') else None
+                try:
+                    forms = date_forms(year, month, day)
+                except ValueError:
+                    return None
+                granularity = 'day' if day else 'month' if month else 'year'
+                return {'type': 'date', 'granularity': granularity, 'raw': match.group(), 'forms': forms}
+        return None
+
+    def canonicalize(self, question: str) -> Tuple[str, List[Dict[str, Any]]]:
+        """
+        Returns:
+            (问题骨架, 槽位列表)，槽位包含type、raw（问题中的原文）和forms（可出现在SQL中的形式）
+        """
+        question = normalize_question(question)
+        parts, slots, position = [], [], 0
+        for match in self._pattern.finditer(question):
+            if match.group('date'):
+                slot = self._date_slot(match)
+                if slot is None:
+                    continue
+                placeholder = f"⟨date:{slot['granularity']}⟩"
+            elif match.group('number') is not None:
+                slot = {'type': 'number', 'raw': match.group(), 'forms': {'value': match.group()}}
+                placeholder = '⟨number⟩'
+            else:
+                raw = match.group()
+                if raw in self.orgs:
+                    slot = {'type': 'org', 'raw': raw, 'forms': {'name': raw, 'code': self.orgs[raw]}}
+                    placeholder = '⟨org⟩'
+                else:
+                    slot = {'type': 'enum', 'raw': raw, 'forms': {'value': raw}}
+                    placeholder = '⟨enum⟩'
+            parts.append(question[position:match.start()])
+            parts.append(placeholder)
+            slots.append(slot)
+            position = match.end()
+        parts.append(question[position:])
+        return ''.join(parts), slots
+
+def sql_literals(sql: str) -> List[Dict[str, Any]]:
+    """
+    提取SQL中的字符串和数字字面值
+
+    Returns:
+        [{'start', 'end', 'value', 'quote', 'column'}]，quote为空表示数字，column为比较的列名（小写，可能为None）
+    """
+    literals = []
+    for match in _SQL_TOKEN.finditer(sql):
+        token = match.group()
+        if token[0] in '\'"':
+            quote = token[0]
+            value = token[1:-1].replace(quote * 2, quote)
+        elif token[0].isdigit():
+            quote, value = '', token
+        else:
+            continue
+        column = _COLUMN_BEFORE.search(sql[max(0, match.start() - 200):match.start()])
+        literals.append({
+            'start': match.start(), 'end': match.end(), 'value': value, 'quote': quote,
+            'column': column.group(1).replace('`', '').split('.')[-1].lower() if column else None,
+        })
+    return literals
+
+def build_template(normalizer: QuestionNormalizer, question: str, sql: str) -> Optional[Dict[str, Any]]:
+    """
+    由一条问题-SQL对生成模板
+
+    Returns:
+        模板（skeleton、fixed、slots、segments、values），有歧义时返回None
+    """
+    skeleton, slots = normalizer.canonicalize(question)
+    literals = sql_literals(sql)
+    bindings, claimed = {}, set()
+    for index, literal in enumerate(literals):
+        owners = {}
+        for slot_index, slot in enumerate(slots):
+            for form, value in slot['forms'].items():
+                if value == literal['value']:
+                    owners.setdefault(slot_index, form)
+        if len(owners) > 1:
+            return None
+        if owners:
+            binding = owners.popitem()
+            if binding in claimed:
+                return None
+            claimed.add(binding)
+            bindings[index] = binding
+
+    bound = {slot_index for slot_index, _ in bindings.values()}
+    segments, position = [], 0
+    for index, literal in enumerate(literals):
+        if index not in bindings:
+            continue
+        slot_index, form = bindings[index]
+        segments.append(sql[position:literal['start']])
+        segments.append({'slot': slot_index, 'form': form, 'quote': literal['quote']})
+        position = literal['end']
+    segments.append(sql[position:])
+
+    definitions = []
+    for slot_index, slot in enumerate(slots):
+        definition = {'type': slot['type']}
+        if slot['type'] == 'date':
+            definition['granularity'] = slot['granularity']
+        if slot['type'] == 'enum' and slot_index in bound:
+            column = next(literals[i]['column'] for i, (s, _) in bindings.items() if s == slot_index)
+            definition['column'] = column
+        definitions.append(definition)
+
+    return {
+        'skeleton': skeleton,
+        'fixed': {str(i): slot['raw'] for i, slot in enumerate(slots) if i not in bound},
+        'slots': definitions,
+        'segments': segments,
+        'values': tuple(slot['raw'] for i, slot in enumerate(slots) if i in bound),
+    }
+
+def fill_template(segments: List[Any], slots: List[Dict[str, Any]]) -> Optional[str]:
+    """按槽位取值填充SQL模板，数字位置的取值不是数字时返回None"""
+    parts = []
+    for segment in segments:
+        if isinstance(segment, str):
+            parts.append(segment)
+            continue
+        value = slots[segment['slot']]['forms'].get(segment['form'])
+        if value is None:
+            return None
+        if segment['quote']:
+            quote = segment['quote']
+            parts.append(quote + value.replace(quote, quote * 2) + quote)
+        elif re.fullmatch(r'\d+(?:\.\d+)?', value):
+            parts.append(value)
+        else:
+            return None
+    return ''.join(parts)
+
+def _template_key(*parts) -> str:
+    return hashlib.sha1(json.dumps(parts, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()
+
+def _load_json(value):
+    return json.loads(value) if isinstance(value, (str, bytes)) else value
+
+def _default_redis_provider():
+    from tools.redis_service import get_redis_service
+    return get_redis_service().redis_client
+
+class SqlTemplateService:
+    """SQL模板挖掘与匹配"""
+
+    def __init__(self, engine=None, org_engine=None, redis_provider: Optional[Callable[[], Any]] = None,
+                 min_confidence: Optional[float] = None):
+        self.engine = engine or get_engine(Config.VANNA_DATABASE_URI)
+        self.org_engine = org_engine or get_engine(Config.SQLALCHEMY_DATABASE_URI)
+        self._redis_provider = redis_provider or _default_redis_provider
+        self.min_confidence = Config.SQL_TEMPLATE_MIN_CONFIDENCE if min_confidence is None else min_confidence
+        self._lock = threading.Lock()
+        self._normalizer = QuestionNormalizer()
+        self._templates: Dict[str, List[Dict[str, Any]]] = {}
+        self._signature = None
+        self._checked_at = None
+
+    # ================================
+    # 挖掘
+    # ================================
+
+    def _load_orgs(self) -> Dict[str, str]:
+        try:
+            with self.org_engine.connect() as conn:
+                rows = conn.execute(text("""
+                    SELECT org_name, org_code FROM organizations WHERE status = 1
+                """)).fetchall()
+            return {row.org_name: row.org_code for row in rows if row.org_name}
+        except Exception as e:
+            logger.warning(f"读取机构名称失败，模板不识别机构槽位: {str(e)}")
+            return {}
+
+    def _load_pairs(self, limit: int) -> List[Tuple[str, str]]:
+        """执行成功的问答历史及会话中执行成功的问题-SQL对"""
+        with self.engine.connect() as conn:
+            history = conn.execute(text("""
+                SELECT question, generated_sql FROM qa_history
+                WHERE success = 1 AND generated_sql IS NOT NULL AND confidence >= :min_confidence
+                ORDER BY id DESC
+                LIMIT :limit
+            """), {'min_confidence': Config.SQL_TEMPLATE_MIN_QA_CONFIDENCE, 'limit': limit}).fetchall()
+            messages = conn.execute(text("""
+                SELECT session_id, message_type, content, sql_query, created_at FROM text2sql_messages
+                WHERE message_type IN ('user', 'assistant')
+                ORDER BY created_at DESC
+                LIMIT :limit
+            """), {'limit': limit}).fetchall()
+
+        pairs = [(row.question, row.generated_sql) for row in history]
+        # 会话消息按时间排列，执行成功的SQL对应此前最近一条用户问题；同一秒内用户消息在前
+        sessions = defaultdict(list)
+        for row in messages:
+            sessions[row.session_id].append(row)
+        for rows in sessions.values():
+            rows.sort(key=lambda row: (row.created_at, row.message_type != 'user'))
+            question = None
+            for row in rows:
+                if row.message_type == 'user':
+                    question = row.content
+                elif question and row.sql_query and (row.content or '').startswith('SQL执行成功'):
+                    pairs.append((question, row.sql_query))
+                    question = None
+        return pairs
+
+    @staticmethod
+    def _collect_enums(pairs: List[Tuple[str, str]], orgs: Dict[str, str]) -> Dict[Optional[str], set]:
+        """SQL中原样出现在问题里的字符串字面值（非日期、数字、机构）按比较的列归类为枚举值"""
+        date_or_number = re.compile(f'{_DATE}|{_NUMBER}')
+        enums = defaultdict(set)
+        for question, sql in pairs:
+            normalized = normalize_question(question)
+            for literal in sql_literals(sql):
+                value = literal['value']
+                if not literal['quote'] or not value or len(value) > 50 or value in orgs:
+                    continue
+                if date_or_number.fullmatch(value) or value not in normalized:
+                    continue
+                enums[literal['column']].add(value)
+        return enums
+
+    def rebuild(self, limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        从问答历史全量重建模板
+
+        Returns:
+            历史问题数、模板数和启用（达到置信度阈值）的模板数
+        """
+        started = time.monotonic()
+        pairs = self._load_pairs(limit or Config.SQL_TEMPLATE_MINE_LIMIT)
+        orgs = self._load_orgs()
+        enums = self._collect_enums(pairs, orgs)
+        normalizer = QuestionNormalizer(orgs, set().union(*enums.values()) if enums else ())
+
+        templates, groups = {}, defaultdict(Counter)
+        for question, sql in pairs:
+            template = build_template(normalizer, question, sql)
+            if template is None:
+                continue
+            question_key = _template_key(template['skeleton'], template['fixed'])
+            template_key = _template_key(template['skeleton'], template['fixed'], template['segments'])
+            groups[question_key][template_key] += 1
+            entry = templates.setdefault(template_key, {**template, 'question': question, 'sql': sql,
+                                                        'variants': set()})
+            entry['variants'].add(template['values'])
+
+        rows = []
+        for question_key, counter in groups.items():
+            # 同一骨架只保留最常见的模板，置信度按其占比和取值组合数（无槽位时按次数）计算
+            template_key, support = counter.most_common(1)[0]
+            entry = templates[template_key]
+            share = support / sum(counter.values())
+            evidence = len(entry['variants']) if entry['values'] else support
+            slots = entry['slots']
+            for definition in slots:
+                if 'column' in definition:
+                    definition['values'] = sorted(enums.get(definition['column'], ()))
+            rows.append({
+                'template_key': template_key,
+                'skeleton': entry['skeleton'][:500],
+                'fixed_values': json.dumps(entry['fixed'], ensure_ascii=False),
+                'slots': json.dumps(slots, ensure_ascii=False),
+                'sql_template': json.dumps(entry['segments'], ensure_ascii=False),
+                'example_question': entry['question'][:500],
+                'example_sql': entry['sql'],
+                'support': support,
+                'variants': len(entry['variants']),
+                'confidence': round(share * (1 - 0.5 ** evidence), 3),
+            })
+
+        with self.engine.begin() as conn:
+            conn.execute(text("DELETE FROM ai_sql_templates"))
+            if rows:
+                conn.execute(text("""
+                    INSERT INTO ai_sql_templates
+                        (template_key, skeleton, fixed_values, slots, sql_template, example_question,
+                         example_sql, support, variants, confidence)
+                    VALUES (:template_key, :skeleton, :fixed_values, :slots, :sql_template, :example_question,
+                            :example_sql, :support, :variants, :confidence)
+                """), rows)
+        self._checked_at = None
+
+        result = {
+            'pairs': len(pairs),
+            'templates': len(rows),
+            'enabled': sum(1 for row in rows if row['confidence'] >= self.min_confidence),
+            'elapsed_ms': int((time.monotonic() - started) * 1000),
+        }
+        logger.info(f"SQL模板重建完成: {result}")
+        return result
+
+    # ================================
+    # 匹配
+    # ================================
+
+    def reload(self, force: bool = False):
+        """模板表有变化时重新加载（按间隔检查）"""
+        now = time.monotonic()
+        if not force and self._checked_at is not None and now - self._checked_at < Config.SQL_TEMPLATE_RELOAD_SECONDS:
+            return
+        with self._lock:
+            if not force and self._checked_at is not None and now - self._checked_at < Config.SQL_TEMPLATE_RELOAD_SECONDS:
+                return
+            self._checked_at = now
+            with self.engine.connect() as conn:
+                signature = tuple(conn.execute(text("""
+                    SELECT COUNT(*) AS total, MAX(id) AS last_id FROM ai_sql_templates
+                """)).fetchone())
+                if signature == self._signature:
+                    return
+                rows = conn.execute(text("""
+                    SELECT id, skeleton, fixed_values, slots, sql_template, confidence
+                    FROM ai_sql_templates
+                    WHERE confidence >= :min_confidence
+                    ORDER BY confidence DESC
+                """), {'min_confidence': self.min_confidence}).fetchall()
+
+            templates, enums = defaultdict(list), set()
+            for row in rows:
+                template = {
+                    'id': row.id, 'fixed': _load_json(row.fixed_values) or {}, 'slots': _load_json(row.slots),
+                    'segments': _load_json(row.sql_template), 'confidence': float(row.confidence),
+                }
+                for index, definition in enumerate(template['slots']):
+                    if definition['type'] == 'enum':
+                        enums.update(definition.get('values') or ())
+                        if str(index) in template['fixed']:
+                            enums.add(template['fixed'][str(index)])
+                templates[row.skeleton].append(template)
+            self._normalizer = QuestionNormalizer(self._load_orgs(), enums)
+            self._templates = dict(templates)
+            self._signature = signature
+            logger.info(f"加载SQL模板{len(rows)}个")
+
+    @staticmethod
+    def _accepts(template: Dict[str, Any], slots: List[Dict[str, Any]]) -> bool:
+        if len(template['slots']) != len(slots):
+            return False
+        for index, (definition, slot) in enumerate(zip(template['slots'], slots)):
+            fixed = template['fixed'].get(str(index))
+            if fixed is not None:
+                if fixed != slot['raw']:
+                    return False
+            elif definition['type'] != slot['type']:
+                return False
+            elif definition['type'] == 'enum' and slot['raw'] not in (definition.get('values') or ()):
+                # 枚举取值必须属于该列出现过的取值
+                return False
+        return True
+
+    def match(self, question: str) -> Optional[Dict[str, Any]]:
+        """
+        按模板生成SQL
+
+        Returns:
+            命中时返回sql、confidence、template_id和槽位取值，否则返回None
+        """
+        started = time.perf_counter()
+        try:
+            self.reload()
+        except Exception as e:
+            logger.warning(f"加载SQL模板失败: {str(e)}")
+        skeleton, slots = self._normalizer.canonicalize(question)
+        result = None
+        for template in self._templates.get(skeleton, ()):
+            if not self._accepts(template, slots):
+                continue
+            sql = fill_template(template['segments'], slots)
+            if sql is not None:
+                result = {
+                    'sql': sql,
+                    'confidence': template['confidence'],
+                    'template_id': template['id'],
+                    'slots': [{'type': slot['type'], 'value': slot['raw']} for slot in slots],
+                }
+                break
+        self._record(hit=result is not None, elapsed_ms=(time.perf_counter() - started) * 1000)
+        return result
+
+    # ================================
+    # 统计
+    # ================================
+
+    def _record(self, hit: bool, elapsed_ms: float):
+        try:
+            pipe = self._redis_provider().pipeline()
+            pipe.hincrby(STATS_KEY, 'lookups', 1)
+            if hit:
+                pipe.hincrby(STATS_KEY, 'hits', 1)
+                pipe.hincrbyfloat(STATS_KEY, 'template_ms', elapsed_ms)
+            pipe.execute()
+        except Exception as e:
+            logger.debug(f"记录SQL模板统计失败: {str(e)}")
+
+    def record_fallback(self, elapsed_ms: float):
+        """记录未命中模板时调用大模型生成SQL的耗时"""
+        try:
+            pipe = self._redis_provider().pipeline()
+            pipe.hincrby(STATS_KEY, 'fallbacks', 1)
+            pipe.hincrbyfloat(STATS_KEY, 'fallback_ms', elapsed_ms)
+            pipe.execute()
+        except Exception as e:
+            logger.debug(f"记录SQL模板统计失败: {str(e)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        命中率及节省的耗时
+
+        节省耗时 = 命中次数 × (大模型平均耗时 - 模板平均耗时)
+        """
+        raw = self._redis_provider().hgetall(STATS_KEY) or {}
+        lookups, hits = int(raw.get('lookups', 0)), int(raw.get('hits', 0))
+        fallbacks = int(raw.get('fallbacks', 0))
+        template_ms = float(raw.get('template_ms', 0.0)) / hits if hits else None
+        fallback_ms = float(raw.get('fallback_ms', 0.0)) / fallbacks if fallbacks else None
+        saved_ms = None
+        if hits and fallback_ms is not None:
+            saved_ms = round(hits * (fallback_ms - template_ms))
+        return {
+            'lookups': lookups,
+            'hits': hits,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            'avg_template_ms': round(template_ms, 3) if template_ms is not None else None,
+            'avg_llm_ms': round(fallback_ms, 1) if fallback_ms is not None else None,
+            'saved_ms': saved_ms,
+            'templates': sum(len(templates) for templates in self._templates.values()),
+        }
+
+# 全局SQL模板服务实例
+_sql_template_service = None
+_sql_template_lock = threading.Lock()
+
+def get_sql_template_service() -> SqlTemplateService:
+    """获取SQL模板服务实例"""
+    global _sql_template_service
+    if _sql_template_service is None:
+        with _sql_template_lock:
+            if _sql_template_service is None:
+                _sql_template_service = SqlTemplateService()
+    return _sql_template_service
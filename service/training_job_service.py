@@ -0,0 +1,554 @@
+# -*- coding: utf-8 -*-
+"""
+AI训练任务队列模块
+训练请求只在ai_training_jobs/ai_training_records中登记并投递到Redis Stream，立即返回任务ID；
+后台worker（进程内线程或scripts/training_worker.py独立进程）按批次训练并记录进度。
+
+- 每条训练内容对应一行ai_training_records，train_status记录pending/trained/failed
+- 同一批次的DDL合并为一次train_with_ddl调用，批次失败时逐条重试以定位失败内容
+- 任务进度、吞吐量和预计剩余时间由任务表计数计算
+- 训练成功的内容同时写入本地样本向量索引（AIEngine/vector_index.py）
+- Redis不可用或worker中途退出时，任务由定期巡检重新投递，已训练的内容不会重复训练
+- 任务开始、每批完成和结束时通过事件总线向提交用户推送training_progress事件，客户端无需轮询
+"""
+import os
+import time
+import uuid
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Callable
+from sqlalchemy import text, bindparam
+from config.base_config import Config
+from tools.engine_registry import get_engine
+from tools.exceptions import ValidationException, ResourceNotFoundException
+
+logger = logging.getLogger(__name__)
+
+STREAM_KEY = 'ai:training:jobs'
+CONSUMER_GROUP = 'training-workers'
+JOB_LOCK_PREFIX = 'ai:training:job_lock:'
+
+_JOB_COLUMNS = """
+    id, job_type, status, total_items, processed_items, failed_items, created_by,
+    error_message, started_at, heartbeat_at, finished_at, created_at
+"""
+
+def _as_list(value) -> List[Any]:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+def normalize_training_items(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    将训练请求转换为训练条目
+
+    支持的格式：
+        {'ddl': str | [str], 'documentation': str | [str],
+         'sql': [{'question': ..., 'sql': ...}], 'question': ..., 'sql': ...}
+    """
+    if not isinstance(data, dict):
+        raise ValidationException('训练数据格式错误')
+
+    items = []
+    for ddl in _as_list(data.get('ddl')):
+        if isinstance(ddl, str) and ddl.strip():
+            items.append({'training_type': 'ddl', 'content': ddl.strip(), 'question': None, 'sql_statement': None})
+    for doc in _as_list(data.get('documentation')):
+        if isinstance(doc, str) and doc.strip():
+            items.append({'training_type': 'documentation', 'content': doc.strip(),
+                          'question': None, 'sql_statement': None})
+
+    pairs = []
+    if isinstance(data.get('question'), str) and isinstance(data.get('sql'), str):
+        pairs.append({'question': data['question'], 'sql': data['sql']})
+    elif isinstance(data.get('sql'), list):
+        pairs.extend(data['sql'])
+    pairs.extend(_as_list(data.get('question_sql')))
+    for pair in pairs:
+        if not isinstance(pair, dict) or not str(pair.get('question') or '').strip() \
+                or not str(pair.get('sql') or '').strip():
+            raise ValidationException('问题-SQL对必须同时包含question和sql')
+        question, sql = pair['question'].strip(), pair['sql'].strip()
+        items.append({'training_type': 'question_sql', 'content': sql,
+                      'question': question[:500], 'sql_statement': sql})
+
+    if not items:
+        raise ValidationException('无效的训练数据格式')
+    return items
+
+def _default_redis_provider():
+    from tools.redis_service import get_redis_service
+    return get_redis_service().redis_client
+
+def _default_trainer_provider():
+    from AIEngine.vanna_service import get_vanna_service
+    return get_vanna_service()
+
+def _default_event_bus_provider():
+    from tools.event_bus import get_event_bus
+    return get_event_bus()
+
+def _default_example_store_provider():
+    if not Config.VECTOR_INDEX_ENABLED:
+        return None
+    from AIEngine.example_store import get_example_store
+    return get_example_store()
+
+class TrainingJobService:
+    """训练任务服务类"""
+
+    def __init__(self, engine=None, redis_provider: Optional[Callable[[], Any]] = None,
+                 trainer_provider: Optional[Callable[[], Any]] = None,
+                 example_store_provider: Optional[Callable[[], Any]] = None,
+                 event_bus_provider: Optional[Callable[[], Any]] = None,
+                 batch_size: Optional[int] = None, stale_seconds: Optional[int] = None):
+        self.engine = engine or get_engine(Config.VANNA_DATABASE_URI, 'background')
+        self._redis_provider = redis_provider or _default_redis_provider
+        self._trainer_provider = trainer_provider or _default_trainer_provider
+        self._example_store_provider = example_store_provider or _default_example_store_provider
+        self._event_bus_provider = event_bus_provider or _default_event_bus_provider
+        self.batch_size = batch_size or Config.TRAINING_BATCH_SIZE
+        self.stale_seconds = stale_seconds or Config.TRAINING_STALE_SECONDS
+        self._token = f'{os.getpid()}:{uuid.uuid4().hex}'
+
+    # ================================
+    # 提交与查询
+    # ================================
+
+    def submit(self, items: List[Dict[str, Any]], job_type: str = 'manual',
+               user_id: Optional[int] = None) -> Dict[str, Any]:
+        """
+        登记训练任务并投递到队列，立即返回
+
+        Args:
+            items: normalize_training_items返回的训练条目（可带source_table标记来源表），samples任务为空列表
+            job_type: 任务类型（manual/auto/samples）
+            user_id: 提交用户ID
+        """
+        if job_type != 'samples' and not items:
+            raise ValidationException('训练数据不能为空')
+        if len(items) > Config.TRAINING_MAX_ITEMS:
+            raise ValidationException(f'单个训练任务最多{Config.TRAINING_MAX_ITEMS}条内容')
+
+        task_id = str(uuid.uuid4())
+        total = len(items) if items else 1
+        with self.engine.begin() as conn:
+            conn.execute(text("""
+                INSERT INTO ai_training_jobs (id, job_type, status, total_items, created_by)
+                VALUES (:id, :job_type, 'queued', :total, :user_id)
+            """), {'id': task_id, 'job_type': job_type, 'total': total, 'user_id': user_id})
+            if items:
+                conn.execute(text("""
+                    INSERT INTO ai_training_records
+                        (job_id, training_type, content, question, sql_statement, source_table, train_status)
+                    VALUES (:job_id, :training_type, :content, :question, :sql_statement, :source_table, 'pending')
+                """), [{**item, 'source_table': item.get('source_table'), 'job_id': task_id} for item in items])
+
+        self.enqueue(task_id)
+        return {'task_id': task_id, 'status': 'queued', 'total_items': total}
+
+    def enqueue(self, task_id: str) -> bool:
+        """投递任务到Redis Stream，失败时由巡检补投"""
+        try:
+            self._redis_provider().xadd(STREAM_KEY, {'task_id': task_id},
+                                        maxlen=Config.TRAINING_STREAM_MAXLEN, approximate=True)
+            return True
+        except Exception as e:
+            logger.warning(f"训练任务{task_id}入队失败，等待巡检补投: {str(e)}")
+            return False
+
+    def collect_history_items(self, limit: int, min_confidence: float) -> List[Dict[str, Any]]:
+        """从执行成功的问答历史中收集尚未训练过的问题-SQL对"""
+        with self.engine.connect() as conn:
+            rows = conn.execute(text("""
+                SELECT h.question, MAX(h.generated_sql) AS generated_sql
+                FROM qa_history h
+                WHERE h.success = 1 AND h.confidence >= :min_confidence AND h.generated_sql IS NOT NULL
+                  AND NOT EXISTS (
+                      SELECT 1 FROM ai_training_records r
+                      WHERE r.training_type = 'question_sql' AND r.question = h.question
+                  )
+                GROUP BY h.question
+                ORDER BY MAX(h.id) DESC
+                LIMIT :limit
+            """), {'min_confidence': min_confidence, 'limit': limit}).fetchall()
+        return [{'training_type': 'question_sql', 'content': row.generated_sql, 'question': row.question,
+                 'sql_statement': row.generated_sql} for row in rows]
+
+    def get_status(self, task_id: str) -> Dict[str, Any]:
+        """获取任务进度、吞吐量（条/秒）和预计剩余时间（秒）"""
+        with self.engine.connect() as conn:
+            job = conn.execute(text(f"SELECT {_JOB_COLUMNS} FROM ai_training_jobs WHERE id = :id"),
+                               {'id': task_id}).fetchone()
+        if not job:
+            raise ResourceNotFoundException('训练任务不存在')
+
+        total, processed = job.total_items or 0, job.processed_items or 0
+        elapsed = None
+        if job.started_at:
+            elapsed = max(((job.finished_at or datetime.now()) - job.started_at).total_seconds(), 0.0)
+        throughput = round(processed / elapsed, 2) if elapsed and processed else 0.0
+        eta = None
+        if job.status == 'running' and throughput:
+            eta = round((total - processed) / throughput, 1)
+        elif job.status in ('completed', 'failed'):
+            eta = 0
+
+        def _time(value):
+            return value.strftime('%Y-%m-%d %H:%M:%S') if isinstance(value, datetime) else value
+
+        return {
+            'task_id': job.id,
+            'job_type': job.job_type,
+            'created_by': job.created_by,
+            'status': job.status,
+            'total_items': total,
+            'processed_items': processed,
+            'failed_items': job.failed_items or 0,
+            'progress': round(processed / total, 4) if total else 0.0,
+            'throughput': throughput,
+            'eta_seconds': eta,
+            'elapsed_seconds': round(elapsed, 1) if elapsed is not None else None,
+            'error_message': job.error_message,
+            'created_at': _time(job.created_at),
+            'started_at': _time(job.started_at),
+            'finished_at': _time(job.finished_at),
+        }
+
+    # ================================
+    # 任务执行
+    # ================================
+
+    def _publish_progress(self, task_id: str):
+        """向提交用户推送任务进度，推送失败不影响训练"""
+        try:
+            status = self.get_status(task_id)
+            if status['created_by'] is not None:
+                self._event_bus_provider().publish(status['created_by'], 'training_progress', status)
+        except Exception as e:
+            logger.warning(f"推送训练任务{task_id}进度失败: {str(e)}")
+
+    def _acquire_job(self, task_id: str) -> bool:
+        try:
+            return bool(self._redis_provider().set(f'{JOB_LOCK_PREFIX}{task_id}', self._token,
+                                                   nx=True, ex=self.stale_seconds))
+        except Exception as e:
+            logger.warning(f"获取训练任务{task_id}锁失败，本进程直接执行: {str(e)}")
+            return True
+
+    def _renew_job(self, task_id: str):
+        """续期任务锁并更新心跳；锁已被其他worker取得时不覆盖"""
+        try:
+            client = self._redis_provider()
+            key = f'{JOB_LOCK_PREFIX}{task_id}'
+            if client.get(key) in (None, self._token):
+                client.set(key, self._token, ex=self.stale_seconds)
+            else:
+                logger.warning(f"训练任务{task_id}的锁已被其他worker取得")
+        except Exception:
+            pass
+        with self.engine.begin() as conn:
+            conn.execute(text("""
+                UPDATE ai_training_jobs SET heartbeat_at = CURRENT_TIMESTAMP WHERE id = :id AND status = 'running'
+            """), {'id': task_id})
+
+    def _keepalive(self, task_id: str, stopped: threading.Event):
+        """任务执行期间定期续期锁和心跳，单条内容或初始样本训练耗时超过锁有效期时任务也不会被判定为中断"""
+        interval = max(self.stale_seconds / 3.0, 1.0)
+        while not stopped.wait(interval):
+            try:
+                self._renew_job(task_id)
+            except Exception as e:
+                logger.warning(f"训练任务{task_id}续期失败: {str(e)}")
+
+    def _job_locked(self, task_id: str) -> bool:
+        try:
+            return bool(self._redis_provider().exists(f'{JOB_LOCK_PREFIX}{task_id}'))
+        except Exception:
+            return False
+
+    def _release_job(self, task_id: str):
+        try:
+            client = self._redis_provider()
+            key = f'{JOB_LOCK_PREFIX}{task_id}'
+            if client.get(key) == self._token:
+                client.delete(key)
+        except Exception:
+            pass
+
+    def process(self, task_id: str, stop_event: Optional[threading.Event] = None) -> Optional[str]:
+        """
+        执行训练任务直到完成或stop_event置位
+
+        Returns:
+            任务结束状态；任务已被其他worker处理、已结束或中途停止时返回None
+        """
+        if not self._acquire_job(task_id):
+            return None
+        keepalive_stopped = threading.Event()
+        keepalive = threading.Thread(target=self._keepalive, args=(task_id, keepalive_stopped),
+                                     name='training-keepalive', daemon=True)
+        keepalive.start()
+        try:
+            with self.engine.begin() as conn:
+                claimed = conn.execute(text("""
+                    UPDATE ai_training_jobs
+                    SET status = 'running', started_at = COALESCE(started_at, CURRENT_TIMESTAMP),
+                        heartbeat_at = CURRENT_TIMESTAMP
+                    WHERE id = :id AND status IN ('queued', 'running')
+                """), {'id': task_id}).rowcount
+                job_type = conn.execute(text("SELECT job_type FROM ai_training_jobs WHERE id = :id"),
+                                        {'id': task_id}).scalar()
+            if not claimed:
+                return None
+            self._publish_progress(task_id)
+
+            if job_type == 'samples':
+                return self._run_samples(task_id)
+
+            while not (stop_event and stop_event.is_set()):
+                with self.engine.connect() as conn:
+                    batch = conn.execute(text("""
+                        SELECT id, training_type, content, question, sql_statement
+                        FROM ai_training_records
+                        WHERE job_id = :id AND train_status = 'pending' AND status = 1
+                        ORDER BY id
+                        LIMIT :limit
+                    """), {'id': task_id, 'limit': self.batch_size}).fetchall()
+                if not batch:
+                    return self._finish(task_id)
+                errors = self._train_batch(batch)
+                self._record_batch(task_id, batch, errors)
+                self._publish_progress(task_id)
+            return None
+        finally:
+            keepalive_stopped.set()
+            keepalive.join()
+            self._release_job(task_id)
+
+    def _train_batch(self, batch) -> Dict[int, str]:
+        """训练一批内容，返回失败条目ID到错误信息的映射"""
+        trainer = self._trainer_provider()
+        errors: Dict[int, str] = {}
+
+        def _call(record_id, func, *args):
+            try:
+                if not func(*args):
+                    errors[record_id] = '训练返回失败'
+            except Exception as e:
+                errors[record_id] = str(e)[:1000]
+
+        ddl = [row for row in batch if row.training_type == 'ddl']
+        if ddl:
+            try:
+                ok = trainer.train_with_ddl([row.content for row in ddl])
+            except Exception as e:
+                logger.warning(f"批量DDL训练失败，逐条重试: {str(e)}")
+                ok = False
+            if not ok:
+                for row in ddl:
+                    _call(row.id, trainer.train_with_ddl, [row.content])
+
+        for row in batch:
+            if row.training_type == 'documentation':
+                _call(row.id, trainer.train_with_documentation, row.content)
+            elif row.training_type == 'question_sql':
+                _call(row.id, trainer.train_with_sql, row.question, row.sql_statement)
+        return errors
+
+    def _record_batch(self, task_id: str, batch, errors: Dict[int, str]):
+        trained = [row.id for row in batch if row.id not in errors]
+        with self.engine.begin() as conn:
+            if trained:
+                conn.execute(text("""
+                    UPDATE ai_training_records
+                    SET train_status = 'trained', error_message = NULL, trained_at = CURRENT_TIMESTAMP
+                    WHERE id IN :ids
+                """).bindparams(bindparam('ids', expanding=True)), {'ids': trained})
+            if errors:
+                conn.execute(text("""
+                    UPDATE ai_training_records SET train_status = 'failed', error_message = :error WHERE id = :id
+                """), [{'id': record_id, 'error': error} for record_id, error in errors.items()])
+            conn.execute(text("""
+                UPDATE ai_training_jobs
+                SET processed_items = processed_items + :processed,
+                    failed_items = failed_items + :failed,
+                    heartbeat_at = CURRENT_TIMESTAMP
+                WHERE id = :id
+            """), {'processed': len(batch), 'failed': len(errors), 'id': task_id})
+        self._index_records([row for row in batch if row.id not in errors])
+
+    def _index_records(self, rows):
+        """训练成功的内容写入本地样本索引，失败不影响训练结果"""
+        if not rows:
+            return
+        try:
+            example_store = self._example_store_provider()
+            if example_store is not None:
+                example_store.add_records(rows)
+        except Exception as e:
+            logger.warning(f"写入训练样本索引失败: {str(e)}")
+
+    def _run_samples(self, task_id: str) -> str:
+        error = None
+        try:
+            result = self._trainer_provider().train_initial_samples()
+            if isinstance(result, dict) and not result.get('success', True):
+                error = result.get('error') or '训练初始样本失败'
+        except Exception as e:
+            error = str(e)
+        with self.engine.begin() as conn:
+            conn.execute(text("""
+                UPDATE ai_training_jobs
+                SET processed_items = 1, failed_items = :failed, heartbeat_at = CURRENT_TIMESTAMP
+                WHERE id = :id
+            """), {'failed': 1 if error else 0, 'id': task_id})
+        return self._finish(task_id, error)
+
+    def _finish(self, task_id: str, error: Optional[str] = None) -> str:
+        """全部条目失败（或任务本身出错）时任务为failed，部分失败仍为completed"""
+        with self.engine.begin() as conn:
+            conn.execute(text("""
+                UPDATE ai_training_jobs
+                SET status = CASE WHEN :error IS NOT NULL OR failed_items >= total_items
+                                  THEN 'failed' ELSE 'completed' END,
+                    error_message = COALESCE(:error, error_message),
+                    finished_at = CURRENT_TIMESTAMP, heartbeat_at = CURRENT_TIMESTAMP
+                WHERE id = :id
+            """), {'error': error[:2000] if error else None, 'id': task_id})
+            status = conn.execute(text("SELECT status FROM ai_training_jobs WHERE id = :id"),
+                                  {'id': task_id}).scalar()
+        logger.info(f"训练任务{task_id}结束: {status}")
+        self._publish_progress(task_id)
+        return status
+
+    def requeue_stale(self) -> int:
+        """重新投递入队失败或worker中途退出的任务（任务锁仍被持有说明worker还在执行，跳过）"""
+        with self.engine.connect() as conn:
+            rows = conn.execute(text("""
+                SELECT id FROM ai_training_jobs
+                WHERE status IN ('queued', 'running')
+                  AND COALESCE(heartbeat_at, created_at) < :before
+                ORDER BY created_at
+                LIMIT 100
+            """), {'before': datetime.fromtimestamp(time.time() - self.stale_seconds)}).fetchall()
+        return sum(1 for row in rows if not self._job_locked(row.id) and self.enqueue(row.id))
+
+class TrainingWorker:
+    """训练任务worker，通过Redis Stream消费组在多个进程间分发任务"""
+
+    def __init__(self, service_provider: Optional[Callable[[], TrainingJobService]] = None,
+                 redis_provider: Optional[Callable[[], Any]] = None,
+                 workers: Optional[int] = None, block_ms: int = 5000):
+        self._service_provider = service_provider or get_training_job_service
+        self._redis_provider = redis_provider or _default_redis_provider
+        self.workers = workers or Config.TRAINING_WORKERS
+        self.block_ms = block_ms
+        self._consumer = f'{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self._threads: List[threading.Thread] = []
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+
+    def _ensure_group(self):
+        try:
+            self._redis_provider().xgroup_create(STREAM_KEY, CONSUMER_GROUP, id='0', mkstream=True)
+        except Exception as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    def run_once(self, block_ms: Optional[int] = None) -> int:
+        """读取并执行一个任务，返回处理的任务数"""
+        self._maybe_sweep()
+        messages = self._redis_provider().xreadgroup(
+            CONSUMER_GROUP, self._consumer, {STREAM_KEY: '>'}, count=1,
+            block=self.block_ms if block_ms is None else block_ms
+        )
+        handled = 0
+        for _, entries in messages or []:
+            for message_id, fields in entries:
+                # 立即确认，任务执行进度以数据库为准，中途退出由巡检重新投递
+                self._redis_provider().xack(STREAM_KEY, CONSUMER_GROUP, message_id)
+                try:
+                    self._service_provider().process(fields['task_id'], self._stop_event)
+                except Exception as e:
+                    logger.error(f"执行训练任务{fields.get('task_id')}异常: {str(e)}")
+                handled += 1
+        return handled
+
+    def _maybe_sweep(self):
+        service = self._service_provider()
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_sweep < service.stale_seconds / 2.0:
+                return
+            self._last_sweep = now
+        try:
+            requeued = service.requeue_stale()
+            if requeued:
+                logger.info(f"重新投递训练任务{requeued}个")
+        except Exception as e:
+            logger.warning(f"巡检训练任务失败: {str(e)}")
+
+    def start(self):
+        """启动worker线程"""
+        with self._lock:
+            if any(thread.is_alive() for thread in self._threads):
+                return
+            self._ensure_group()
+            self._stop_event.clear()
+            self._threads = [
+                threading.Thread(target=self._loop, name=f'training-worker-{i}', daemon=True)
+                for i in range(self.workers)
+            ]
+        for thread in self._threads:
+            thread.start()
+
+    def _loop(self):
+        while not self._stop_event.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"训练worker异常: {str(e)}")
+                self._stop_event.wait(1)
+
+    def run_forever(self):
+        """在当前线程之外启动worker并阻塞，供独立进程使用"""
+        self.start()
+        try:
+            while any(thread.is_alive() for thread in self._threads):
+                time.sleep(1)
+        except KeyboardInterrupt:
+            self.stop()
+
+    def stop(self):
+        """停止worker线程，正在执行的任务在当前批次结束后停止"""
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join(timeout=(self.block_ms / 1000.0) + 5)
+
+# 全局训练任务服务实例
+_training_job_service = None
+_training_worker = None
+_training_lock = threading.Lock()
+
+def get_training_job_service() -> TrainingJobService:
+    """获取训练任务服务实例"""
+    global _training_job_service
+    if _training_job_service is None:
+        with _training_lock:
+            if _training_job_service is None:
+                _training_job_service = TrainingJobService()
+    return _training_job_service
+
+def get_training_worker() -> TrainingWorker:
+    """获取训练worker实例（首次调用时启动worker线程）"""
+    global _training_worker
+    if _training_worker is None:
+        with _training_lock:
+            if _training_worker is None:
+                worker = TrainingWorker()
+                worker.start()
+                _training_worker = worker
+    return _training_worker
@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+"""
+字段取值词典模块
+用户提到"华东分公司"或某个产品名称时，大模型往往猜测字面值，生成的SQL查不到数据而反复重试。
+后台任务通过DatabaseService采样业务库中低基数的文本字段，生成压缩的取值词典（vanna库ai_value_dictionary）；
+生成SQL前用Aho-Corasick自动机扫描问题，把提到的取值解析为（表, 字段, 精确取值）提示给大模型：
+
+- 候选字段：char/varchar/enum且长度不超过上限，字段名不含密码、令牌、手机号等敏感词
+- 去重取值超过上限的字段记为高基数，不进入词典，全量刷新时重新检查
+- 有updated_at的表按水位增量采样新增取值；取值删除和无updated_at的表由定期全量刷新处理
+- 每个进程按词典表的变化重建自动机，匹配耗时与问题长度成正比（微秒级）
+"""
+import re
+import json
+import time
+import zlib
+import logging
+import threading
+import unicodedata
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Callable, Tuple
+from sqlalchemy import text, DateTime
+from config.base_config import Config
+from tools.engine_registry import get_engine
+from tools.aho_corasick import AhoCorasick
+
+logger = logging.getLogger(__name__)
+
+REFRESH_LOCK_KEY = 'ai:value_dictionary:refresh_lock'
+
+_TEXT_TYPES = ('char', 'varchar', 'enum')
+_NUMERIC = re.compile(r'[\d.\-:/\s]+')
+
+def normalize_value(content: str) -> str:
+    """匹配用的规范化：全角半角统一、英文小写"""
+    return unicodedata.normalize('NFKC', content or '').lower()
+
+def _quote(identifier: str) -> str:
+    return '`' + identifier.replace('`', '``') + '`'
+
+def compress_values(values) -> bytes:
+    return zlib.compress(json.dumps(sorted(values), ensure_ascii=False).encode('utf-8'))
+
+def decompress_values(blob) -> List[str]:
+    return json.loads(zlib.decompress(bytes(blob)).decode('utf-8')) if blob else []
+
+def _as_datetime(value) -> Optional[datetime]:
+    """业务库驱动可能把时间返回为字符串"""
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+def _default_db_provider():
+    from tools.database import get_database_service
+    return get_database_service()
+
+def _default_redis_provider():
+    from tools.redis_service import get_redis_service
+    return get_redis_service().redis_client
+
+class ValueDictionaryService:
+    """字段取值词典的采样、存储与匹配"""
+
+    def __init__(self, db_provider: Optional[Callable[[], Any]] = None, store_engine=None,
+                 schema: Optional[str] = None, max_distinct: Optional[int] = None):
+        self._db_provider = db_provider or _default_db_provider
+        self.store_engine = store_engine or get_engine(Config.VANNA_DATABASE_URI)
+        self.schema = schema or Config.VALUE_DICTIONARY_SCHEMA
+        self.max_distinct = max_distinct or Config.VALUE_DICTIONARY_MAX_DISTINCT
+        self._exclude = re.compile(Config.VALUE_DICTIONARY_EXCLUDE_PATTERN, re.I)
+        self._lock = threading.Lock()
+        self._automaton = AhoCorasick(())
+        self._signature = None
+        self._checked_at = None
+
+    # ================================
+    # 采样
+    # ================================
+
+    def _discover_columns(self) -> Tuple[List[Tuple[str, str]], set]:
+        """
+        Returns:
+            (候选(表, 字段)列表, 含updated_at字段的表)
+        """
+        rows = self._db_provider().execute_query("""
+            SELECT c.TABLE_NAME AS table_name, c.COLUMN_NAME AS column_name,
+                   c.DATA_TYPE AS data_type, c.CHARACTER_MAXIMUM_LENGTH AS max_length
+            FROM INFORMATION_SCHEMA.COLUMNS c
+            JOIN INFORMATION_SCHEMA.TABLES t
+              ON t.TABLE_SCHEMA = c.TABLE_SCHEMA AND t.TABLE_NAME = c.TABLE_NAME
+            WHERE c.TABLE_SCHEMA = :schema AND t.TABLE_TYPE = 'BASE TABLE'
+            ORDER BY c.TABLE_NAME, c.ORDINAL_POSITION
+        """, {'schema': self.schema})
+        columns, watermarked = [], set()
+        for row in rows:
+            if row['column_name'] == 'updated_at':
+                watermarked.add(row['table_name'])
+            if row['data_type'] not in _TEXT_TYPES or self._exclude.search(row['column_name']):
+                continue
+            if row['data_type'] != 'enum' and (row['max_length'] or 0) > Config.VALUE_DICTIONARY_MAX_LENGTH:
+                continue
+            columns.append((row['table_name'], row['column_name']))
+        return columns, watermarked
+
+    def _sample(self, table: str, column: str, since=None) -> List[str]:
+        """读取去重取值，最多max_distinct + 1个（超过即高基数）"""
+        condition = f'AND {_quote("updated_at")} >= :since' if since is not None else ''
+        rows = self._db_provider().execute_query(f"""
+            SELECT DISTINCT {_quote(column)} AS value
+            FROM {_quote(self.schema)}.{_quote(table)}
+            WHERE {_quote(column)} IS NOT NULL {condition}
+            LIMIT :limit
+        """, {'since': since, 'limit': self.max_distinct + 1})
+        return [str(row['value']) for row in rows]
+
+    def _max_updated(self, table: str):
+        rows = self._db_provider().execute_query(
+            f'SELECT MAX({_quote("updated_at")}) AS watermark FROM {_quote(self.schema)}.{_quote(table)}'
+        )
+        return _as_datetime(rows[0]['watermark']) if rows else None
+
+    def _load_entries(self) -> Dict[Tuple[str, str], Any]:
+        with self.store_engine.connect() as conn:
+            rows = conn.execute(text("""
+                SELECT table_name, column_name, status, value_blob, watermark, full_refreshed_at
+                FROM ai_value_dictionary
+            """).columns(watermark=DateTime, full_refreshed_at=DateTime)).fetchall()
+        return {(row.table_name, row.column_name): row for row in rows}
+
+    @staticmethod
+    def _usable(value: str) -> bool:
+        value = value.strip()
+        return Config.VALUE_DICTIONARY_MIN_LENGTH <= len(value) <= 100 and not _NUMERIC.fullmatch(value)
+
+    def refresh(self, full: bool = False) -> Dict[str, Any]:
+        """
+        刷新词典
+
+        Args:
+            full: 全部字段重新采样；否则有updated_at的表只采样水位之后的新增取值，
+                  超过VALUE_DICTIONARY_FULL_REFRESH_HOURS未全量采样的字段自动全量采样
+
+        Returns:
+            本次刷新的字段数、增量字段数、高基数字段数和词典取值数
+        """
+        started = time.monotonic()
+        columns, watermarked = self._discover_columns()
+        entries = self._load_entries()
+        stale_before = datetime.now() - timedelta(hours=Config.VALUE_DICTIONARY_FULL_REFRESH_HOURS)
+
+        changed, stats = [], {'columns': len(columns), 'sampled': 0, 'incremental': 0, 'high_cardinality': 0}
+        watermarks = {}
+        for table, column in columns:
+            entry = entries.get((table, column))
+            due = full or entry is None or entry.full_refreshed_at is None or entry.full_refreshed_at < stale_before
+            if not due and entry.status == 'high_cardinality':
+                stats['high_cardinality'] += 1
+                continue
+            try:
+                if table in watermarked and table not in watermarks:
+                    watermarks[table] = self._max_updated(table)
+                watermark = watermarks.get(table)
+                if due:
+                    values = set(self._sample(table, column))
+                    stats['sampled'] += 1
+                elif table in watermarked:
+                    if watermark is None or (entry.watermark is not None and watermark <= entry.watermark):
+                        continue
+                    values = set(decompress_values(entry.value_blob)) | set(self._sample(table, column, entry.watermark))
+                    stats['incremental'] += 1
+                else:
+                    continue
+            except Exception as e:
+                logger.warning(f"采样字段{table}.{column}失败: {str(e)}")
+                continue
+
+            high = len(values) > self.max_distinct
+            stats['high_cardinality'] += int(high)
+            usable = [] if high else [value for value in values if self._usable(value)]
+            changed.append({
+                'table_name': table, 'column_name': column,
+                'status': 'high_cardinality' if high else 'active',
+                'value_count': len(usable), 'value_blob': compress_values(usable),
+                'watermark': watermark,
+                'full_refreshed_at': datetime.now() if due else entry.full_refreshed_at,
+            })
+
+        candidates = set(columns)
+        dropped = [key for key in entries if key not in candidates]
+        self._save(changed, dropped)
+        self._checked_at = None
+
+        stats.update({
+            'changed': len(changed),
+            'dropped': len(dropped),
+            'elapsed_ms': int((time.monotonic() - started) * 1000),
+        })
+        logger.info(f"字段取值词典刷新: {stats}")
+        return stats
+
+    def _save(self, changed: List[Dict[str, Any]], dropped: List[Tuple[str, str]]):
+        stale = [(row['table_name'], row['column_name']) for row in changed] + dropped
+        if not stale:
+            return
+        with self.store_engine.begin() as conn:
+            conn.execute(text("""
+                DELETE FROM ai_value_dictionary WHERE table_name = :table_name AND column_name = :column_name
+            """), [{'table_name': table, 'column_name': column} for table, column in stale])
+            if changed:
+                conn.execute(text("""
+                    INSERT INTO ai_value_dictionary
+                        (table_name, column_name, status, value_count, value_blob, watermark, full_refreshed_at)
+                    VALUES (:table_name, :column_name, :status, :value_count, :value_blob, :watermark,
+                            :full_refreshed_at)
+                """), changed)
+
+    # ================================
+    # 匹配
+    # ================================
+
+    def reload(self, force: bool = False):
+        """词典表有变化时重建自动机（按间隔检查）"""
+        now = time.monotonic()
+        if not force and self._checked_at is not None and now - self._checked_at < Config.VALUE_DICTIONARY_RELOAD_SECONDS:
+            return
+        with self._lock:
+            if not force and self._checked_at is not None and now - self._checked_at < Config.VALUE_DICTIONARY_RELOAD_SECONDS:
+                return
+            self._checked_at = now
+            with self.store_engine.connect() as conn:
+                signature = tuple(conn.execute(text("""
+                    SELECT COUNT(*) AS total, MAX(id) AS last_id FROM ai_value_dictionary
+                """)).fetchone())
+                if signature == self._signature:
+                    return
+                rows = conn.execute(text("""
+                    SELECT table_name, column_name, value_blob FROM ai_value_dictionary WHERE status = 'active'
+                """)).fetchall()
+
+            # 同一取值可能出现在多个字段
+            targets = defaultdict(list)
+            for row in rows:
+                for value in decompress_values(row.value_blob):
+                    targets[normalize_value(value)].append((row.table_name, row.column_name, value))
+            started = time.monotonic()
+            self._automaton = AhoCorasick((key, tuple(found)) for key, found in targets.items())
+            self._signature = signature
+            logger.info(f"加载字段取值词典: {len(rows)}个字段，{len(targets)}个取值，"
+                        f"构建耗时{int((time.monotonic() - started) * 1000)}ms")
+
+    def link(self, question: str) -> List[Dict[str, Any]]:
+        """
+        识别问题中提到的字段取值
+
+        Returns:
+            [{'text', 'start', 'end', 'targets': [{'table', 'column', 'value'}]}]，最左最长且互不重叠
+        """
+        try:
+            self.reload()
+        except Exception as e:
+            logger.warning(f"加载字段取值词典失败: {str(e)}")
+        content = normalize_value(question)
+        return [{
+            'text': content[start:end], 'start': start, 'end': end,
+            'targets': [{'table': table, 'column': column, 'value': value} for table, column, value in found],
+        } for start, end, found in self._automaton.find_longest(content)]
+
+    @staticmethod
+    def describe(entities: List[Dict[str, Any]], max_targets: int = 3) -> str:
+        """把识别结果整理为提示大模型的文字"""
+        lines = []
+        for entity in entities:
+            targets = '或'.join(
+                f"{target['table']}.{target['column']} = '{target['value']}'"
+                for target in entity['targets'][:max_targets]
+            )
+            lines.append(f"“{entity['text']}”对应 {targets}")
+        return '已确认的字段取值：' + '；'.join(lines) if lines else ''
+
+class ValueDictionaryRefresher:
+    """字段取值词典刷新线程"""
+
+    def __init__(self, service_provider: Optional[Callable[[], ValueDictionaryService]] = None,
+                 redis_provider: Optional[Callable[[], Any]] = None, interval: Optional[float] = None):
+        self._service_provider = service_provider or get_value_dictionary_service
+        self._redis_provider = redis_provider or _default_redis_provider
+        self.interval = interval or Config.VALUE_DICTIONARY_REFRESH_INTERVAL
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+
+    def _acquire_lock(self) -> bool:
+        try:
+            ttl = max(int(self.interval) - 1, 1)
+            return bool(self._redis_provider().set(REFRESH_LOCK_KEY, str(time.time()), nx=True, ex=ttl))
+        except Exception as e:
+            logger.warning(f"获取字段取值词典刷新锁失败，本进程直接刷新: {str(e)}")
+            return True
+
+    def run_once(self) -> Optional[Dict[str, Any]]:
+        """执行一轮刷新，其他进程正在刷新时跳过"""
+        if not self._acquire_lock():
+            return None
+        return self._service_provider().refresh()
+
+    def start(self):
+        """启动刷新线程"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._loop, name='value-dictionary-refresher', daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"字段取值词典刷新失败: {str(e)}")
+
+    def stop(self):
+        """停止刷新线程"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+# 全局字段取值词典实例
+_value_dictionary_service = None
+_value_dictionary_refresher = None
+_value_dictionary_lock = threading.Lock()
+
+def get_value_dictionary_service() -> ValueDictionaryService:
+    """获取字段取值词典服务实例"""
+    global _value_dictionary_service
+    if _value_dictionary_service is None:
+        with _value_dictionary_lock:
+            if _value_dictionary_service is None:
+                _value_dictionary_service = ValueDictionaryService()
+    return _value_dictionary_service
+
+def get_value_dictionary_refresher() -> ValueDictionaryRefresher:
+    """获取字段取值词典刷新线程（首次获取时启动）"""
+    global _value_dictionary_refresher
+    if _value_dictionary_refresher is None:
+        with _value_dictionary_lock:
+            if _value_dictionary_refresher is None:
+                _value_dictionary_refresher = ValueDictionaryRefresher()
+                _value_dictionary_refresher.start()
+    return _value_dictionary_refresher
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+工作流执行后端
+AirflowBackend：线程池异步调用Airflow REST API触发DAG运行，
+后台同步线程按批查询dagRuns（/dags/~/dagRuns/list，按状态过滤），
+每轮一次请求回写一批实例的最终状态，而不是逐个实例轮询；
+未部署Airflow时可配置为进程内执行的LocalBackend（见workflow_local_backend）
+"""
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Callable, List
+from config.base_config import Config
+from tools.airflow_client import AirflowClient, DAG_RUN_FINISHED_STATES, get_airflow_client
+from tools.exceptions import ExternalServiceException
+
+logger = logging.getLogger(__name__)
+
+# 多进程部署时只允许一个进程执行同步
+SYNC_LOCK_KEY = 'workflow:airflow:sync_lock'
+
+# DAG运行状态到实例状态的映射
+DAG_RUN_INSTANCE_STATUS = {
+    'success': 'completed',
+    'failed': 'failed'
+}
+
+# 这些状态码表示请求本身无效（DAG不存在、参数错误），重试无意义
+PERMANENT_TRIGGER_ERRORS = (400, 401, 403, 404)
+
+def _default_service_provider():
+    from service.workflow_service import get_workflow_service
+    return get_workflow_service()
+
+def _default_redis_provider():
+    from tools.redis_service import get_redis_service
+    return get_redis_service().redis_client
+
+class AirflowBackend:
+    """基于Airflow的工作流执行后端"""
+
+    def __init__(self, client: Optional[AirflowClient] = None,
+                 service_provider: Optional[Callable[[], Any]] = None,
+                 redis_provider: Optional[Callable[[], Any]] = None,
+                 workers: Optional[int] = None, sync_interval: Optional[float] = None,
+                 sync_batch: Optional[int] = None, stale_seconds: Optional[float] = None):
+        self.client = client or get_airflow_client()
+        self._service_provider = service_provider or _default_service_provider
+        self._redis_provider = redis_provider or _default_redis_provider
+        self.sync_interval = sync_interval or Config.AIRFLOW_SYNC_INTERVAL
+        self.sync_batch = sync_batch or Config.AIRFLOW_SYNC_BATCH
+        self.stale_seconds = Config.AIRFLOW_TRIGGER_STALE_SECONDS if stale_seconds is None else stale_seconds
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers or Config.AIRFLOW_TRIGGER_WORKERS,
+            thread_name_prefix='airflow-trigger'
+        )
+        self._inflight = set()
+        self._lock = threading.Lock()
+        self._syncer: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    # ================================
+    # 异步触发
+    # ================================
+
+    def submit(self, instance: Dict[str, Any]):
+        """
+        提交实例触发，立即返回
+
+        Args:
+            instance: 包含id、dag_id、dag_run_id、conf的实例信息
+        """
+        with self._lock:
+            if instance['id'] in self._inflight:
+                return None
+            self._inflight.add(instance['id'])
+        return self._executor.submit(self._trigger, instance)
+
+    def _trigger(self, instance: Dict[str, Any]):
+        try:
+            self.client.trigger_dag_run(instance['dag_id'], instance['dag_run_id'], instance.get('conf'))
+            self._service_provider().mark_instances_running([instance['id']])
+        except ExternalServiceException as e:
+            if e.code in PERMANENT_TRIGGER_ERRORS:
+                logger.error(f"触发工作流实例{instance['id']}失败: {e.message}")
+                self._service_provider().complete_instances([instance['id']], 'failed', e.message)
+            else:
+                # 暂时性错误保持pending，由同步任务在超时后重新触发
+                logger.warning(f"触发工作流实例{instance['id']}暂时失败，稍后重试: {e.message}")
+        except Exception as e:
+            logger.error(f"触发工作流实例{instance['id']}异常: {str(e)}")
+        finally:
+            with self._lock:
+                self._inflight.discard(instance['id'])
+
+    # ================================
+    # 批量状态同步
+    # ================================
+
+    def _acquire_sync_lock(self) -> bool:
+        try:
+            client = self._redis_provider()
+            ttl = max(int(self.sync_interval) - 1, 1)
+            return bool(client.set(SYNC_LOCK_KEY, str(time.time()), nx=True, ex=ttl))
+        except Exception as e:
+            logger.warning(f"获取同步锁失败，本进程直接同步: {str(e)}")
+            return True
+
+    def sync_once(self) -> Dict[str, int]:
+        """执行一轮状态同步，返回本轮统计"""
+        stats = {'checked': 0, 'completed': 0, 'failed': 0, 'retriggered': 0, 'requests': 0}
+        if not self._acquire_sync_lock():
+            return stats
+
+        service = self._service_provider()
+        after_id = 0
+        while True:
+            instances = service.get_active_instances(self.sync_batch, after_id)
+            if not instances:
+                break
+            after_id = instances[-1]['id']
+            self._sync_batch(service, instances, stats)
+            if len(instances) < self.sync_batch:
+                break
+        return stats
+
+    def _sync_batch(self, service, instances: List[Dict[str, Any]], stats: Dict[str, int]):
+        stats['checked'] += len(instances)
+        dag_ids = sorted({instance['dag_id'] for instance in instances})
+        # 留出时钟偏差余量，只查询本批实例创建之后开始的运行
+        oldest = min(instance['created_at'] for instance in instances)
+        since = (oldest - timedelta(minutes=10)).strftime('%Y-%m-%dT%H:%M:%SZ') if oldest else None
+
+        stats['requests'] += 1
+        finished = {
+            run['dag_run_id']: run['state']
+            for run in self.client.list_dag_runs(dag_ids, states=list(DAG_RUN_FINISHED_STATES), start_date_gte=since)
+        }
+
+        by_status: Dict[str, List[int]] = {}
+        now = datetime.now()
+        for instance in instances:
+            state = finished.get(instance['dag_run_id'])
+            if state in DAG_RUN_INSTANCE_STATUS:
+                by_status.setdefault(DAG_RUN_INSTANCE_STATUS[state], []).append(instance['id'])
+            elif instance['status'] == 'pending' and instance['created_at'] \
+                    and (now - instance['created_at']).total_seconds() > self.stale_seconds:
+                # 触发请求丢失（进程重启、Airflow暂不可用），按原dag_run_id重新触发
+                conf = instance.get('trigger_data')
+                self.submit({**instance, 'conf': json.loads(conf) if isinstance(conf, str) else (conf or {})})
+                stats['retriggered'] += 1
+
+        for status, instance_ids in by_status.items():
+            result = service.complete_instances(
+                instance_ids, status, 'Airflow DAG运行失败' if status == 'failed' else None
+            )
+            if result['success']:
+                stats[status] += len(result['data']['updated'])
+
+    # ================================
+    # 后台线程
+    # ================================
+
+    def start(self):
+        """启动后台同步线程"""
+        with self._lock:
+            if self._syncer is not None and self._syncer.is_alive():
+                return
+            self._stop_event.clear()
+            self._syncer = threading.Thread(target=self._sync_loop, name='airflow-syncer', daemon=True)
+            self._syncer.start()
+
+    def _sync_loop(self):
+        while not self._stop_event.wait(self.sync_interval):
+            try:
+                stats = self.sync_once()
+                if stats['completed'] or stats['failed'] or stats['retriggered']:
+                    logger.info(f"Airflow状态同步: {stats}")
+            except Exception as e:
+                logger.error(f"Airflow状态同步失败: {str(e)}")
+
+    def stop(self, wait: bool = True):
+        """停止同步线程和触发线程池"""
+        self._stop_event.set()
+        if self._syncer is not None:
+            self._syncer.join(timeout=5)
+        self._executor.shutdown(wait=wait)
+
+# 全局执行后端实例
+_workflow_backend = None
+_workflow_backend_lock = threading.Lock()
+
+def create_workflow_backend(name: Optional[str] = None):
+    """
+    按配置创建工作流执行后端
+
+    Args:
+        name: airflow（默认）或local（进程内执行，无需部署Airflow）
+    """
+    name = name or Config.WORKFLOW_EXECUTION_BACKEND
+    if name == 'airflow':
+        return AirflowBackend()
+    if name == 'local':
+        from service.workflow_local_backend import LocalBackend
+        return LocalBackend()
+    raise ValueError(f'未知的工作流执行后端: {name}')
+
+def get_workflow_backend():
+    """获取工作流执行后端实例（首次调用时启动后台线程）"""
+    global _workflow_backend
+    if _workflow_backend is None:
+        with _workflow_backend_lock:
+            if _workflow_backend is None:
+                backend = create_workflow_backend()
+                backend.start()
+                _workflow_backend = backend
+    return _workflow_backend
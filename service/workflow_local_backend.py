@@ -0,0 +1,509 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+本地工作流执行后端
+不依赖Airflow，在进程内按依赖关系（节点连接，无连接时按step_order分层）拓扑执行节点：
+互不依赖的分支在线程池中并发执行，支持节点超时和重试，
+节点状态写入workflow_node_executions，进程重启后跳过已完成节点从中断处恢复
+"""
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Dict, Any, Optional, Callable, List, Set
+import requests
+from sqlalchemy import text
+from config.base_config import Config
+from tools.engine_registry import get_engine
+
+logger = logging.getLogger(__name__)
+
+# 实例租约：多进程部署时同一实例只由一个进程调度
+LEASE_KEY_PREFIX = 'workflow:local:lease:'
+
+# 节点终止状态；skipped包括上游条件不满足和skip_on_failure的失败
+NODE_FINAL_STATUSES = ('success', 'failed', 'skipped', 'timeout')
+
+# 连接条件类型对应的上游终止状态（condition暂按success处理）
+EDGE_SATISFIED_STATUSES = {
+    'always': ('success', 'failed', 'skipped', 'timeout'),
+    'success': ('success', 'skipped'),
+    'condition': ('success', 'skipped'),
+    'failure': ('failed', 'timeout')
+}
+
+def _default_service_provider():
+    from service.workflow_service import get_workflow_service
+    return get_workflow_service()
+
+def _default_redis_provider():
+    from tools.redis_service import get_redis_service
+    return get_redis_service().redis_client
+
+def _load_json(value, default=None):
+    if value is None:
+        return default
+    return json.loads(value) if isinstance(value, (str, bytes)) else value
+
+# ================================
+# 节点处理器
+# ================================
+
+def _run_api_step(node: Dict[str, Any], context: Dict[str, Any]) -> Dict[str, Any]:
+    """api节点：发送HTTP请求，非2xx视为失败"""
+    config = node['config']
+    response = requests.request(
+        config.get('method', 'GET'), config['url'],
+        headers=config.get('headers'), params=config.get('params'),
+        json=config.get('body'), timeout=context['timeout']
+    )
+    response.raise_for_status()
+    try:
+        body = response.json()
+    except ValueError:
+        body = response.text[:4000]
+    return {'status_code': response.status_code, 'body': body}
+
+def _kill_query(engine, connection_id: int):
+    """从另一个连接中止超时的语句（MySQL的max_execution_time只限制SELECT，KILL QUERY对所有语句有效）"""
+    try:
+        with engine.connect() as conn:
+            conn.execute(text(f'KILL QUERY {int(connection_id)}'))
+        logger.warning(f"SQL节点执行超时，已中止连接{connection_id}上的语句")
+    except Exception as e:
+        logger.error(f"中止超时SQL失败: {str(e)}")
+
+def _run_sql_step(config: Dict[str, Any], context: Dict[str, Any]) -> Dict[str, Any]:
+    """执行SQL，超过节点超时时间时在MySQL端中止语句并回滚，不让超时的节点线程继续占用连接和执行线程"""
+    engine = get_engine(config.get('database_uri') or Config.SQLALCHEMY_DATABASE_URI, 'background')
+    params = {**(context.get('conf') or {}), **(config.get('params') or {})}
+    with engine.begin() as conn:
+        killer = None
+        if engine.dialect.name == 'mysql':
+            connection_id = conn.execute(text('SELECT CONNECTION_ID()')).scalar()
+            killer = threading.Timer(context['timeout'], _kill_query, (engine, connection_id))
+            killer.daemon = True
+            killer.start()
+        try:
+            result = conn.execute(text(config['sql']), params)
+            if result.returns_rows:
+                rows = result.fetchmany(config.get('max_rows', 100))
+                return {'rows': [dict(row._mapping) for row in rows]}
+            return {'rowcount': result.rowcount}
+        finally:
+            if killer is not None:
+                killer.cancel()
+
+def _run_script_step(node: Dict[str, Any], context: Dict[str, Any]) -> Dict[str, Any]:
+    """script节点：subtype为sql时执行SQL，为saved_query时刷新保存查询，为shell时执行命令（需显式开启）"""
+    config = node['config']
+    subtype = node.get('subtype') or config.get('language')
+    if subtype == 'saved_query':
+        from service.saved_query_service import get_saved_query_service
+        result = get_saved_query_service().refresh(int(config['saved_query_id']), full=bool(config.get('full')))
+        if not result['success']:
+            raise RuntimeError(result.get('error') or result['message'])
+        return result['data']
+    if subtype == 'sql':
+        return _run_sql_step(config, context)
+    if subtype == 'shell':
+        if not Config.LOCAL_EXECUTOR_ALLOW_SHELL:
+            raise PermissionError('本地执行后端未开启shell节点')
+        completed = subprocess.run(
+            config['command'], shell=isinstance(config['command'], str),
+            capture_output=True, text=True, timeout=context['timeout']
+        )
+        if completed.returncode != 0:
+            raise RuntimeError(f'命令退出码{completed.returncode}: {completed.stderr[-2000:]}')
+        return {'stdout': completed.stdout[-4000:]}
+    raise ValueError(f'不支持的脚本类型: {subtype}')
+
+def _run_timer_step(node: Dict[str, Any], context: Dict[str, Any]) -> Dict[str, Any]:
+    """timer节点：等待指定秒数"""
+    seconds = float(node['config'].get('seconds', 0))
+    time.sleep(min(seconds, context['timeout']))
+    return {'waited': seconds}
+
+def _pass_through_step(node: Dict[str, Any], context: Dict[str, Any]) -> Dict[str, Any]:
+    """页面、按钮、审批等人工节点和条件、通知节点在本地后端中直接通过"""
+    return {}
+
+STEP_HANDLERS: Dict[str, Callable[[Dict[str, Any], Dict[str, Any]], Any]] = {
+    'api': _run_api_step,
+    'script': _run_script_step,
+    'timer': _run_timer_step,
+    'page': _pass_through_step,
+    'button': _pass_through_step,
+    'approval': _pass_through_step,
+    'condition': _pass_through_step,
+    'notification': _pass_through_step
+}
+
+def register_step_handler(node_type: str, handler: Callable[[Dict[str, Any], Dict[str, Any]], Any]):
+    """注册节点类型处理器，handler(node, context)返回节点输出，抛出异常表示失败"""
+    STEP_HANDLERS[node_type] = handler
+
+# ================================
+# 执行图
+# ================================
+
+def build_dependencies(nodes: List[Dict[str, Any]], connections: List[Dict[str, Any]]) -> Dict[int, List[tuple]]:
+    """
+    构建节点依赖：{node_id: [(上游节点ID, 条件类型), ...]}
+
+    工作流没有节点连接时按step_order分层，每层依赖上一层全部节点，同层并发执行
+    """
+    node_ids = {node['id'] for node in nodes}
+    dependencies: Dict[int, List[tuple]] = {node_id: [] for node_id in node_ids}
+    edges = [c for c in connections if c['from_node_id'] in node_ids and c['to_node_id'] in node_ids]
+    if edges:
+        for edge in edges:
+            dependencies[edge['to_node_id']].append((edge['from_node_id'], edge['condition_type'] or 'always'))
+        return dependencies
+
+    previous: List[int] = []
+    current: List[int] = []
+    current_order = None
+    for node in sorted(nodes, key=lambda n: (n['step_order'], n['id'])):
+        if node['step_order'] != current_order:
+            previous, current, current_order = current, [], node['step_order']
+        dependencies[node['id']] = [(upstream, 'success') for upstream in previous]
+        current.append(node['id'])
+    return dependencies
+
+def find_cycle(dependencies: Dict[int, List[tuple]]) -> Set[int]:
+    """Kahn算法拓扑排序，返回处在环上（无法排序）的节点"""
+    indegree = {node_id: len(upstreams) for node_id, upstreams in dependencies.items()}
+    downstream: Dict[int, List[int]] = {node_id: [] for node_id in dependencies}
+    for node_id, upstreams in dependencies.items():
+        for upstream, _ in upstreams:
+            downstream[upstream].append(node_id)
+    queue = [node_id for node_id, degree in indegree.items() if degree == 0]
+    while queue:
+        node_id = queue.pop()
+        for child in downstream[node_id]:
+            indegree[child] -= 1
+            if indegree[child] == 0:
+                queue.append(child)
+    return {node_id for node_id, degree in indegree.items() if degree > 0}
+
+class _InstanceRun:
+    """单个实例的调度状态"""
+
+    def __init__(self, graph: Dict[str, Any]):
+        self.instance = graph['instance']
+        self.conf = _load_json(self.instance.get('trigger_data'), {}) or {}
+        self.nodes = {node['id']: {**node, 'config': _load_json(node.get('config'), {}) or {}}
+                      for node in graph['nodes']}
+        self.dependencies = build_dependencies(graph['nodes'], graph['connections'])
+        self.status: Dict[int, str] = {}
+        self.attempts: Dict[int, int] = {}
+        self.outputs: Dict[int, Any] = {}
+        self.errors: Dict[int, str] = {}
+        # 恢复：已终止的节点保留结果，running/retry状态的节点按已用次数继续
+        for execution in graph['executions']:
+            node_id = execution['node_id']
+            if node_id not in self.nodes:
+                continue
+            self.attempts[node_id] = execution['attempt_count'] or 0
+            if execution['status'] in NODE_FINAL_STATUSES:
+                self.status[node_id] = execution['status']
+                self.outputs[node_id] = _load_json(execution.get('output_data'))
+                self.errors[node_id] = execution.get('error_message')
+
+    def max_attempts(self, node_id: int) -> int:
+        return 1 + max(int(self.nodes[node_id].get('retry_count') or 0), 0)
+
+    def timeout(self, node_id: int) -> float:
+        node = self.nodes[node_id]
+        return float(node['config'].get('timeout_seconds') or (node.get('timeout_minutes') or 30) * 60)
+
+    def retry_delay(self, node_id: int) -> float:
+        node = self.nodes[node_id]
+        delay = node['config'].get('retry_delay_seconds')
+        return float(delay if delay is not None else (node.get('retry_delay_minutes') or 0) * 60)
+
+    def progress(self) -> float:
+        return round(len(self.status) * 100.0 / len(self.nodes), 2) if self.nodes else 100.0
+
+    def unhandled_failures(self) -> List[int]:
+        """失败且没有failure/always出边承接的节点"""
+        handled = {upstream for upstreams in self.dependencies.values()
+                   for upstream, condition in upstreams if condition in ('failure', 'always')}
+        return [node_id for node_id, status in self.status.items()
+                if status in ('failed', 'timeout') and node_id not in handled]
+
+class LocalBackend:
+    """进程内工作流执行后端，与AirflowBackend提供相同的submit/start/stop接口"""
+
+    def __init__(self, service_provider: Optional[Callable[[], Any]] = None,
+                 redis_provider: Optional[Callable[[], Any]] = None,
+                 workers: Optional[int] = None, max_instances: Optional[int] = None,
+                 poll_interval: Optional[float] = None, lease_seconds: Optional[int] = None,
+                 handlers: Optional[Dict[str, Callable]] = None):
+        self._service_provider = service_provider or _default_service_provider
+        self._redis_provider = redis_provider or _default_redis_provider
+        self.poll_interval = poll_interval or Config.LOCAL_EXECUTOR_POLL_INTERVAL
+        self.lease_seconds = lease_seconds or Config.LOCAL_EXECUTOR_LEASE_SECONDS
+        self.handlers = {**STEP_HANDLERS, **(handlers or {})}
+        # 实例调度线程与节点执行线程分开，调度线程等待节点时不占用节点线程
+        self._instance_executor = ThreadPoolExecutor(
+            max_workers=max_instances or Config.LOCAL_EXECUTOR_MAX_INSTANCES,
+            thread_name_prefix='workflow-instance'
+        )
+        self._step_executor = ThreadPoolExecutor(
+            max_workers=workers or Config.LOCAL_EXECUTOR_WORKERS,
+            thread_name_prefix='workflow-step'
+        )
+        self._token = f'{os.getpid()}:{uuid.uuid4().hex}'
+        self._inflight = set()
+        self._lock = threading.Lock()
+        self._recoverer: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    # ================================
+    # 提交与租约
+    # ================================
+
+    def submit(self, instance: Dict[str, Any]) -> Optional[Future]:
+        """
+        提交实例执行，立即返回
+
+        Args:
+            instance: 至少包含id的实例信息
+        """
+        with self._lock:
+            if instance['id'] in self._inflight or self._stop_event.is_set():
+                return None
+            self._inflight.add(instance['id'])
+        return self._instance_executor.submit(self._run_instance, instance['id'])
+
+    def _acquire_lease(self, instance_id: int) -> bool:
+        try:
+            client = self._redis_provider()
+            return bool(client.set(f'{LEASE_KEY_PREFIX}{instance_id}', self._token, nx=True, ex=self.lease_seconds))
+        except Exception as e:
+            logger.warning(f"获取实例{instance_id}租约失败，本进程直接执行: {str(e)}")
+            return True
+
+    def _renew_lease(self, instance_id: int):
+        try:
+            client = self._redis_provider()
+            key = f'{LEASE_KEY_PREFIX}{instance_id}'
+            if client.get(key) in (self._token, None):
+                client.set(key, self._token, ex=self.lease_seconds)
+        except Exception:
+            pass
+
+    def _release_lease(self, instance_id: int):
+        try:
+            client = self._redis_provider()
+            key = f'{LEASE_KEY_PREFIX}{instance_id}'
+            if client.get(key) == self._token:
+                client.delete(key)
+        except Exception:
+            pass
+
+    # ================================
+    # 实例调度
+    # ================================
+
+    def _run_instance(self, instance_id: int):
+        leased = False
+        try:
+            leased = self._acquire_lease(instance_id)
+            if not leased:
+                return
+            service = self._service_provider()
+            graph = service.get_instance_graph(instance_id)
+            if not graph or graph['instance']['status'] not in ('pending', 'running'):
+                return
+            service.mark_instances_running([instance_id])
+
+            run = _InstanceRun(graph)
+            cycle = find_cycle(run.dependencies)
+            if cycle:
+                service.complete_instances([instance_id], 'failed', f'工作流节点存在循环依赖: {sorted(cycle)}')
+                return
+
+            if self._schedule(service, instance_id, run):
+                failures = run.unhandled_failures()
+                if failures:
+                    message = '; '.join(f"{run.nodes[n]['name']}: {run.errors.get(n) or run.status[n]}" for n in failures)
+                    service.complete_instances([instance_id], 'failed', message[:2000])
+                else:
+                    service.complete_instances([instance_id], 'completed')
+        except Exception as e:
+            logger.error(f"本地执行工作流实例{instance_id}异常: {str(e)}")
+        finally:
+            if leased:
+                self._release_lease(instance_id)
+            with self._lock:
+                self._inflight.discard(instance_id)
+
+    def _schedule(self, service, instance_id: int, run: _InstanceRun) -> bool:
+        """
+        调度实例节点直到全部终止，返回False表示后端停止、实例留待恢复
+        """
+        running: Dict[Future, tuple] = {}  # future -> (node_id, deadline)
+        ready_at: Dict[int, float] = {}    # 等待执行（含重试等待）的节点 -> 可执行时间
+        abandoned: Dict[int, Future] = {}  # 超时后不再等待结果、线程可能仍在执行的上一次尝试
+        renew_interval = max(self.lease_seconds / 3.0, 0.5)
+        last_renew = time.monotonic()
+
+        while not self._stop_event.is_set():
+            now = time.monotonic()
+            active = {node_id for node_id, _ in running.values()}
+
+            # 上游全部终止的节点：条件满足则就绪，否则跳过
+            progressed = True
+            while progressed:
+                progressed = False
+                for node_id, upstreams in run.dependencies.items():
+                    if node_id in run.status or node_id in active or node_id in ready_at:
+                        continue
+                    if any(upstream not in run.status for upstream, _ in upstreams):
+                        continue
+                    if all(run.status[upstream] in EDGE_SATISFIED_STATUSES.get(condition, ('success', 'skipped'))
+                           for upstream, condition in upstreams):
+                        ready_at[node_id] = now
+                    else:
+                        self._finish_node(service, instance_id, run, node_id, 'skipped', error='上游条件不满足')
+                        progressed = True
+
+            # 上一次尝试超时后仍在执行的节点，等其线程结束再重试，避免同一节点并发执行
+            for node_id in [n for n, future in abandoned.items() if future.done()]:
+                del abandoned[node_id]
+            blocked = [abandoned[n] for n in ready_at if n in abandoned]
+
+            for node_id in [n for n, at in ready_at.items() if at <= now and n not in abandoned]:
+                del ready_at[node_id]
+                run.attempts[node_id] = run.attempts.get(node_id, 0) + 1
+                service.save_node_execution(instance_id, node_id, 'running', run.attempts[node_id])
+                future = self._step_executor.submit(self._execute_node, run, node_id)
+                running[future] = (node_id, now + run.timeout(node_id))
+
+            if not running and not ready_at:
+                return True
+
+            wake_at = min([deadline for _, deadline in running.values()]
+                          + [at for n, at in ready_at.items() if n not in abandoned]
+                          + [last_renew + renew_interval])
+            timeout = max(wake_at - time.monotonic(), 0)
+            if running or blocked:
+                done, _ = wait(list(running) + blocked, timeout=timeout, return_when=FIRST_COMPLETED)
+            else:
+                done = set()
+                self._stop_event.wait(timeout)
+
+            for future in done:
+                if future not in running:
+                    continue
+                node_id, _ = running.pop(future)
+                try:
+                    output = future.result()
+                    run.outputs[node_id] = output
+                    self._finish_node(service, instance_id, run, node_id, 'success', output=output)
+                except Exception as e:
+                    self._attempt_failed(service, instance_id, run, node_id, 'failed', str(e) or type(e).__name__, ready_at)
+
+            now = time.monotonic()
+            for future, (node_id, deadline) in list(running.items()):
+                if deadline <= now:
+                    # 线程无法强制终止，放弃等待其结果；api/shell/sql节点自身也按超时时间中止
+                    del running[future]
+                    if not future.cancel():
+                        abandoned[node_id] = future
+                    self._attempt_failed(service, instance_id, run, node_id, 'timeout',
+                                         f'节点执行超过{run.timeout(node_id):g}秒', ready_at)
+
+            if now - last_renew >= renew_interval:
+                self._renew_lease(instance_id)
+                last_renew = now
+        return False
+
+    def _execute_node(self, run: _InstanceRun, node_id: int) -> Any:
+        node = run.nodes[node_id]
+        handler = self.handlers.get(node['type'])
+        if handler is None:
+            raise ValueError(f"不支持的节点类型: {node['type']}")
+        context = {
+            'instance_id': run.instance['id'],
+            'conf': run.conf,
+            'attempt': run.attempts[node_id],
+            'timeout': run.timeout(node_id),
+            'upstream': {run.nodes[upstream]['code']: run.outputs.get(upstream)
+                         for upstream, _ in run.dependencies[node_id]}
+        }
+        return handler(node, context)
+
+    def _attempt_failed(self, service, instance_id: int, run: _InstanceRun, node_id: int,
+                        status: str, error: str, ready_at: Dict[int, float]):
+        if run.attempts[node_id] < run.max_attempts(node_id):
+            logger.warning(f"实例{instance_id}节点{run.nodes[node_id]['code']}第{run.attempts[node_id]}次执行失败，稍后重试: {error}")
+            service.save_node_execution(instance_id, node_id, 'retry', run.attempts[node_id], error_message=error)
+            ready_at[node_id] = time.monotonic() + run.retry_delay(node_id)
+            return
+        if run.nodes[node_id].get('skip_on_failure'):
+            status = 'skipped'
+        self._finish_node(service, instance_id, run, node_id, status, error=error)
+
+    def _finish_node(self, service, instance_id: int, run: _InstanceRun, node_id: int, status: str,
+                     output: Any = None, error: str = None):
+        run.status[node_id] = status
+        run.errors[node_id] = error
+        service.save_node_execution(instance_id, node_id, status, run.attempts.get(node_id, 0),
+                                    output_data=output, error_message=error, progress=run.progress())
+
+    # ================================
+    # 恢复与后台线程
+    # ================================
+
+    def recover_once(self, batch: int = 500) -> int:
+        """提交所有未结束的实例（已在本进程或其他进程执行的由去重和租约排除），返回提交数"""
+        service = self._service_provider()
+        submitted = 0
+        after_id = 0
+        while True:
+            instances = service.get_active_instances(batch, after_id)
+            if not instances:
+                break
+            after_id = instances[-1]['id']
+            for instance in instances:
+                if self.submit(instance) is not None:
+                    submitted += 1
+            if len(instances) < batch:
+                break
+        return submitted
+
+    def start(self):
+        """启动后台恢复线程（启动时立即恢复一次，之后定期接管租约过期的实例）"""
+        with self._lock:
+            if self._recoverer is not None and self._recoverer.is_alive():
+                return
+            self._stop_event.clear()
+            self._recoverer = threading.Thread(target=self._recover_loop, name='workflow-recoverer', daemon=True)
+            self._recoverer.start()
+
+    def _recover_loop(self):
+        while True:
+            try:
+                submitted = self.recover_once()
+                if submitted:
+                    logger.info(f"本地执行后端恢复工作流实例: {submitted}个")
+            except Exception as e:
+                logger.error(f"恢复工作流实例失败: {str(e)}")
+            if self._stop_event.wait(self.poll_interval):
+                break
+
+    def stop(self, wait: bool = True):
+        """停止调度：正在执行的节点结束后不再调度新节点，未完成实例在下次启动时恢复"""
+        self._stop_event.set()
+        if self._recoverer is not None:
+            self._recoverer.join(timeout=5)
+        self._instance_executor.shutdown(wait=wait)
+        self._step_executor.shutdown(wait=wait)
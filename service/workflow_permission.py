@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+工作流权限解析模块
+一次查询加载用户在workflow_permissions中的全部有效授权及其创建的资源，
+按资源类型编译为 资源ID -> 权限位 的映射并按用户缓存，
+列表页可通过check_many批量判定，避免逐行查询
+"""
+import time
+import logging
+import threading
+from typing import Dict, Any, Optional, Callable, Iterable, List
+from sqlalchemy import text
+from config.base_config import Config
+
+logger = logging.getLogger(__name__)
+
+# 权限位，manage隐含全部权限
+PERMISSION_BITS = {
+    'view': 1,
+    'edit': 2,
+    'execute': 4,
+    'delete': 8,
+}
+ALL_PERMISSIONS = sum(PERMISSION_BITS.values())
+PERMISSION_BITS['manage'] = ALL_PERMISSIONS
+
+RESOURCE_TYPES = ('workspace', 'category', 'workflow', 'node')
+
+# 超级管理员用户ID
+SUPERUSER_ID = 1
+
+# 跨进程失效：每个用户一个版本号字段，ALL_FIELD用于全部失效
+GENERATION_KEY = 'workflow:permission:generation'
+ALL_FIELD = 'all'
+
+_LOAD_SQL = text("""
+    SELECT p.resource_type, p.resource_id, p.permission_type,
+           TIMESTAMPDIFF(SECOND, NOW(), p.expires_at) AS expires_in
+    FROM workflow_permissions p
+    WHERE p.subject_type = 'user' AND p.subject_id = :user_id
+      AND p.granted = 1
+      AND (p.expires_at IS NULL OR p.expires_at > NOW())
+
+    UNION ALL
+
+    SELECT 'workspace', w.id, 'manage', NULL
+    FROM workflow_workspaces w
+    WHERE w.creator_id = :user_id
+
+    UNION ALL
+
+    SELECT 'workflow', wf.id, 'manage', NULL
+    FROM enhanced_workflows wf
+    WHERE wf.creator_id = :user_id
+""")
+
+def _permission_bit(permission_type: str) -> int:
+    bit = PERMISSION_BITS.get(permission_type)
+    if bit is None:
+        raise ValueError(f'未知的权限类型: {permission_type}')
+    return bit
+
+class PermissionSet:
+    """单个用户编译后的权限位映射"""
+
+    __slots__ = ('grants', 'valid_until', 'generation')
+
+    def __init__(self, grants: Dict[str, Dict[int, int]], valid_until: float, generation: Any = None):
+        self.grants = grants
+        self.valid_until = valid_until
+        self.generation = generation
+
+    def mask(self, resource_type: str, resource_id: int) -> int:
+        return self.grants.get(resource_type, {}).get(resource_id, 0)
+
+    def allows(self, resource_type: str, resource_id: int, permission_type: str) -> bool:
+        bit = _permission_bit(permission_type)
+        return self.mask(resource_type, resource_id) & bit == bit
+
+    def resource_ids(self, resource_type: str, permission_type: str) -> List[int]:
+        """拥有指定权限的全部资源ID"""
+        bit = _permission_bit(permission_type)
+        return [resource_id for resource_id, mask in self.grants.get(resource_type, {}).items()
+                if mask & bit == bit]
+
+def _default_engine_provider():
+    from tools.engine_registry import get_engine
+    return get_engine(Config.SQLALCHEMY_DATABASE_URI)
+
+def _default_redis_provider():
+    from tools.redis_service import get_redis_service
+    return get_redis_service().redis_client
+
+class WorkflowPermissionResolver:
+    """工作流权限解析器（进程内按用户缓存，Redis版本号跨进程失效）"""
+
+    def __init__(self, engine_provider: Optional[Callable[[], Any]] = None,
+                 redis_provider: Optional[Callable[[], Any]] = None,
+                 ttl: Optional[float] = None):
+        self._engine_provider = engine_provider or _default_engine_provider
+        self._redis_provider = redis_provider or _default_redis_provider
+        self.ttl = ttl if ttl is not None else Config.WORKFLOW_PERMISSION_CACHE_TTL
+        self._cache: Dict[int, PermissionSet] = {}
+        self._lock = threading.Lock()
+
+    # ================================
+    # 加载与缓存
+    # ================================
+
+    def _client(self):
+        try:
+            return self._redis_provider()
+        except Exception as e:
+            logger.warning(f"Redis不可用，权限缓存仅按TTL过期: {str(e)}")
+            return None
+
+    def _generation(self, user_id: int) -> Any:
+        """读取用户当前版本号，Redis不可用时返回None"""
+        client = self._client()
+        if client is None:
+            return None
+        try:
+            return tuple(client.hmget(GENERATION_KEY, [f'user:{user_id}', ALL_FIELD]))
+        except Exception as e:
+            logger.warning(f"读取权限版本号失败: {str(e)}")
+            return None
+
+    def _load(self, user_id: int, generation: Any) -> PermissionSet:
+        """一次查询加载并编译用户的全部授权"""
+        now = time.time()
+        valid_until = now + self.ttl
+        grants: Dict[str, Dict[int, int]] = {resource_type: {} for resource_type in RESOURCE_TYPES}
+
+        with self._engine_provider().connect() as conn:
+            rows = conn.execute(_LOAD_SQL, {'user_id': user_id}).fetchall()
+
+        for row in rows:
+            bit = PERMISSION_BITS.get(row.permission_type)
+            if bit is None:
+                continue
+            resources = grants.setdefault(row.resource_type, {})
+            resources[row.resource_id] = resources.get(row.resource_id, 0) | bit
+            # 最早到期的授权决定缓存有效期
+            if row.expires_in is not None:
+                valid_until = min(valid_until, now + max(int(row.expires_in), 0))
+
+        return PermissionSet(grants, valid_until, generation)
+
+    def get(self, user_id: int) -> PermissionSet:
+        """获取用户权限集合，缓存过期或版本号变化时重新加载"""
+        generation = self._generation(user_id)
+        with self._lock:
+            cached = self._cache.get(user_id)
+        if cached is not None and cached.valid_until > time.time() \
+                and (generation is None or cached.generation == generation):
+            return cached
+
+        permission_set = self._load(user_id, generation)
+        with self._lock:
+            self._cache[user_id] = permission_set
+        return permission_set
+
+    def invalidate(self, user_id: Optional[int] = None):
+        """
+        使权限缓存失效
+
+        Args:
+            user_id: 用户ID，None表示全部用户（如按角色、组织授权）
+        """
+        with self._lock:
+            if user_id is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(user_id, None)
+
+        client = self._client()
+        if client is None:
+            return
+        try:
+            client.hincrby(GENERATION_KEY, ALL_FIELD if user_id is None else f'user:{user_id}', 1)
+        except Exception as e:
+            logger.error(f"更新权限版本号失败: {str(e)}")
+
+    # ================================
+    # 权限判定
+    # ================================
+
+    def check(self, user_id: int, resource_type: str, resource_id: int, permission_type: str) -> bool:
+        """检查单个资源权限"""
+        return self.check_many(user_id, resource_type, [resource_id], permission_type)[resource_id]
+
+    def check_many(self, user_id: int, resource_type: str, resource_ids: Iterable[int],
+                   permission_type: str) -> Dict[int, bool]:
+        """
+        批量检查资源权限
+
+        Args:
+            user_id: 用户ID
+            resource_type: 资源类型（workspace/category/workflow/node）
+            resource_ids: 资源ID列表
+            permission_type: 权限类型（view/edit/execute/delete/manage）
+
+        Returns:
+            Dict[int, bool]: 资源ID -> 是否有权限
+        """
+        bit = _permission_bit(permission_type)
+        resource_ids = list(resource_ids)
+        if user_id == SUPERUSER_ID:
+            return {resource_id: True for resource_id in resource_ids}
+        if not user_id or not resource_ids:
+            return {resource_id: False for resource_id in resource_ids}
+
+        resources = self.get(user_id).grants.get(resource_type, {})
+        return {resource_id: resources.get(resource_id, 0) & bit == bit for resource_id in resource_ids}
+
+    def filter_allowed(self, user_id: int, resource_type: str, items: List[Dict],
+                       permission_type: str, key: str = 'id') -> List[Dict]:
+        """过滤出有权限的列表项，保持原有顺序"""
+        allowed = self.check_many(user_id, resource_type, [item[key] for item in items], permission_type)
+        return [item for item in items if allowed[item[key]]]
+
+# 全局权限解析器实例
+_permission_resolver = None
+_permission_resolver_lock = threading.Lock()
+
+def get_workflow_permission_resolver() -> WorkflowPermissionResolver:
+    """获取工作流权限解析器实例"""
+    global _permission_resolver
+    if _permission_resolver is None:
+        with _permission_resolver_lock:
+            if _permission_resolver is None:
+                _permission_resolver = WorkflowPermissionResolver()
+    return _permission_resolver
@@ -10,14 +10,80 @@ import uuid
 from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional, Tuple
 from tools.database import DatabaseService, get_database_service
-from sqlalchemy import text, create_engine
+from sqlalchemy import text
 from sqlalchemy.orm import sessionmaker
 from config.base_config import Config
+from tools.engine_registry import get_engine
+from service.workflow_permission import get_workflow_permission_resolver
+from service.workflow_backend import get_workflow_backend
+from service.workflow_watch import get_workflow_watch
 import logging
 import requests
 
 logger = logging.getLogger(__name__)
 
+# 计入工作域workflow_count的工作流状态
+COUNTED_WORKFLOW_STATUSES = ('active', 'inactive')
+
+# 批量操作允许设置的工作流状态（删除使用bulk_delete归档）
+BULK_WORKFLOW_STATUSES = ('active', 'inactive', 'disabled')
+
+# 实例终止状态，实例从未终止状态转入这些状态时计数
+TERMINAL_INSTANCE_STATUSES = ('completed', 'failed', 'cancelled', 'timeout')
+
+# 计数校正：只更新与明细不一致的行
+RECONCILE_WORKFLOW_COUNTS_SQL = """
+    UPDATE enhanced_workflows wf
+    LEFT JOIN (
+        SELECT workflow_id, COUNT(*) AS cnt
+        FROM workflow_nodes
+        WHERE status = 'active'
+        GROUP BY workflow_id
+    ) n ON n.workflow_id = wf.id
+    LEFT JOIN (
+        SELECT workflow_id, COUNT(*) AS cnt, SUM(status = 'completed') AS succeeded
+        FROM workflow_instances
+        GROUP BY workflow_id
+    ) i ON i.workflow_id = wf.id
+    SET wf.node_count = COALESCE(n.cnt, 0),
+        wf.instance_count = COALESCE(i.cnt, 0),
+        wf.success_count = COALESCE(i.succeeded, 0),
+        wf.updated_at = wf.updated_at
+    WHERE wf.node_count <> COALESCE(n.cnt, 0)
+       OR wf.instance_count <> COALESCE(i.cnt, 0)
+       OR wf.success_count <> COALESCE(i.succeeded, 0)
+"""
+
+RECONCILE_WORKSPACE_COUNTS_SQL = """
+    UPDATE workflow_workspaces w
+    LEFT JOIN (
+        SELECT workspace_id, COUNT(*) AS cnt
+        FROM workflow_categories
+        WHERE status = 'active'
+        GROUP BY workspace_id
+    ) c ON c.workspace_id = w.id
+    LEFT JOIN (
+        SELECT workspace_id, COUNT(*) AS cnt
+        FROM enhanced_workflows
+        WHERE status IN ('active', 'inactive')
+        GROUP BY workspace_id
+    ) wf ON wf.workspace_id = w.id
+    SET w.category_count = COALESCE(c.cnt, 0),
+        w.workflow_count = COALESCE(wf.cnt, 0),
+        w.updated_at = w.updated_at
+    WHERE w.category_count <> COALESCE(c.cnt, 0)
+       OR w.workflow_count <> COALESCE(wf.cnt, 0)
+"""
+
+def _in_clause(prefix: str, values: List[Any], params: Dict[str, Any]) -> str:
+    """生成IN子句占位符并写入参数"""
+    placeholders = []
+    for index, value in enumerate(values):
+        key = f'{prefix}{index}'
+        params[key] = value
+        placeholders.append(f':{key}')
+    return ', '.join(placeholders)
+
 class WorkflowService:
     """统一工作流管理服务 - 支持多工作域和权限控制"""
     
@@ -25,19 +91,22 @@ class WorkflowService:
         """初始化工作流服务"""
         self.config = Config()
         
-        # 连接到airflow数据库
-        self.airflow_db_url = f'mysql+pymysql://{self.config.DB_USER}:{self.config.DB_PASSWORD}@{self.config.DB_HOST}:{self.config.DB_PORT}/airflow'
-        self.airflow_engine = create_engine(self.airflow_db_url)
+        # 连接到airflow数据库（引擎由注册表共享，多个服务实例不会重复建连接池）
+        self.airflow_db_url = self.config.AIRFLOW_DATABASE_URI
+        self.airflow_engine = get_engine(self.airflow_db_url)
         self.AirflowSession = sessionmaker(bind=self.airflow_engine)
         
-        # 连接到主数据库（dataask）
-        self.main_db_url = f'mysql+pymysql://{self.config.DB_USER}:{self.config.DB_PASSWORD}@{self.config.DB_HOST}:{self.config.DB_PORT}/{self.config.DB_NAME}'
-        self.main_engine = create_engine(self.main_db_url)
+        # 连接到主数据库（dataask），与DatabaseService共用连接池
+        self.main_db_url = self.config.SQLALCHEMY_DATABASE_URI
+        self.main_engine = get_engine(self.main_db_url)
         self.MainSession = sessionmaker(bind=self.main_engine)
         
         # Airflow API配置
-        self.airflow_api_url = f"http://localhost:8080/api/v1"
-        self.airflow_auth = ('admin', 'admin')
+        self.airflow_api_url = self.config.AIRFLOW_API_URL
+        self.airflow_auth = (self.config.AIRFLOW_USERNAME, self.config.AIRFLOW_PASSWORD)
+        
+        # 权限解析器（按用户缓存权限位）
+        self.permissions = get_workflow_permission_resolver()
 
     # ================================
     # 工作域管理
@@ -47,30 +116,21 @@ class WorkflowService:
         """获取用户可访问的工作域列表"""
         try:
             with self.main_engine.begin() as conn:
-                # 查询用户有权限的工作域
+                # 查询启用的工作域（计数读冗余列），权限在内存中按缓存的权限位过滤
                 sql = text("""
-                    SELECT DISTINCT w.*, 
-                           COUNT(c.id) as category_count,
-                           COUNT(wf.id) as workflow_count
+                    SELECT w.*
                     FROM workflow_workspaces w
-                    LEFT JOIN workflow_categories c ON c.workspace_id = w.id AND c.status = 'active'
-                    LEFT JOIN enhanced_workflows wf ON wf.workspace_id = w.id AND wf.status IN ('active', 'inactive')
-                    LEFT JOIN workflow_permissions p ON p.resource_type = 'workspace' 
-                                                     AND p.resource_id = w.id 
-                                                     AND p.subject_type = 'user' 
-                                                     AND p.subject_id = :user_id
-                                                     AND p.permission_type = 'view'
-                                                     AND p.granted = 1
-                    WHERE w.status = 'active' 
-                      AND (p.id IS NOT NULL OR w.creator_id = :user_id OR :user_id = 1)
-                    GROUP BY w.id
+                    WHERE w.status = 'active'
                     ORDER BY w.order_num, w.name
                 """)
                 
-                result = conn.execute(sql, {'user_id': user_id})
+                rows = conn.execute(sql).fetchall()
+                allowed = self.permissions.check_many(user_id, 'workspace', [row.id for row in rows], 'view')
                 workspaces = []
                 
-                for row in result:
+                for row in rows:
+                    if not allowed[row.id]:
+                        continue
                     workspaces.append({
                         'id': row.id,
                         'name': row.name,
@@ -134,12 +194,13 @@ class WorkflowService:
                 
                 # 自动为创建者分配管理权限
                 self._grant_workspace_permission(conn, workspace_id, 'user', user_id, 'manage', user_id)
-                
-                return {
-                    'success': True,
-                    'workspace_id': workspace_id,
-                    'message': '工作域创建成功'
-                }
+            
+            self.permissions.invalidate(user_id)
+            return {
+                'success': True,
+                'workspace_id': workspace_id,
+                'message': '工作域创建成功'
+            }
                 
         except Exception as e:
             logger.error(f"创建工作域失败: {e}")
@@ -194,19 +255,13 @@ class WorkflowService:
                            w.name as workspace_name, w.code as workspace_code,
                            c.name as category_name, c.code as category_code,
                            u1.username as creator_name,
-                           u2.username as updater_name,
-                           COUNT(n.id) as node_count,
-                           COUNT(DISTINCT i.id) as instance_count,
-                           COALESCE(AVG(CASE WHEN i.status = 'completed' THEN 1 ELSE 0 END), 0) * 100 as success_rate
+                           u2.username as updater_name
                     FROM enhanced_workflows wf
                     LEFT JOIN workflow_workspaces w ON w.id = wf.workspace_id
                     LEFT JOIN workflow_categories c ON c.id = wf.category_id
                     LEFT JOIN users u1 ON u1.id = wf.creator_id
                     LEFT JOIN users u2 ON u2.id = wf.updater_id
-                    LEFT JOIN workflow_nodes n ON n.workflow_id = wf.id AND n.status = 'active'
-                    LEFT JOIN workflow_instances i ON i.workflow_id = wf.id
                     WHERE {where_clause}
-                    GROUP BY wf.id
                     ORDER BY wf.updated_at DESC
                 """)
                 
@@ -237,7 +292,8 @@ class WorkflowService:
                         'notification_enabled': bool(row.notification_enabled),
                         'node_count': row.node_count or 0,
                         'instance_count': row.instance_count or 0,
-                        'success_rate': float(row.success_rate or 0),
+                        'success_count': row.success_count or 0,
+                        'success_rate': round(row.success_count * 100.0 / row.instance_count, 2) if row.instance_count else 0.0,
                         'creator_name': row.creator_name,
                         'updater_name': row.updater_name,
                         'published_at': row.published_at.isoformat() if row.published_at else None,
@@ -332,13 +388,14 @@ class WorkflowService:
                 
                 # 自动为创建者分配管理权限
                 self._grant_workflow_permission(conn, workflow_id, 'user', user_id, 'manage', user_id)
-                
-                return {
-                    'success': True,
-                    'workflow_id': workflow_id,
-                    'dag_id': dag_id,
-                    'message': '工作流创建成功'
-                }
+            
+            self.permissions.invalidate(user_id)
+            return {
+                'success': True,
+                'workflow_id': workflow_id,
+                'dag_id': dag_id,
+                'message': '工作流创建成功'
+            }
                 
         except Exception as e:
             logger.error(f"创建工作流失败: {e}")
@@ -352,13 +409,7 @@ class WorkflowService:
         """激活工作流"""
         try:
             with self.main_engine.begin() as conn:
-                update_sql = text("""
-                    UPDATE enhanced_workflows 
-                    SET status = 'active', updated_at = NOW()
-                    WHERE id = :workflow_id
-                """)
-                
-                conn.execute(update_sql, {'workflow_id': workflow_id})
+                self._change_workflow_status(conn, [workflow_id], 'active')
                 
                 return {
                     'success': True,
@@ -377,13 +428,7 @@ class WorkflowService:
         """停用工作流"""
         try:
             with self.main_engine.begin() as conn:
-                update_sql = text("""
-                    UPDATE enhanced_workflows 
-                    SET status = 'inactive', updated_at = NOW()
-                    WHERE id = :workflow_id
-                """)
-                
-                conn.execute(update_sql, {'workflow_id': workflow_id})
+                self._change_workflow_status(conn, [workflow_id], 'inactive')
                 
                 return {
                     'success': True,
@@ -402,13 +447,7 @@ class WorkflowService:
         """删除工作流"""
         try:
             with self.main_engine.begin() as conn:
-                update_sql = text("""
-                    UPDATE enhanced_workflows 
-                    SET status = 'archived', updated_at = NOW()
-                    WHERE id = :workflow_id
-                """)
-                
-                conn.execute(update_sql, {'workflow_id': workflow_id})
+                self._change_workflow_status(conn, [workflow_id], 'archived')
                 
                 return {
                     'success': True,
@@ -423,8 +462,83 @@ class WorkflowService:
                 'message': '删除工作流失败'
             }
 
-    def execute_workflow(self, workflow_id: int) -> Dict:
-        """执行工作流"""
+    def bulk_set_status(self, workflow_ids: List[int], status: str, user_id: int) -> Dict:
+        """
+        批量修改工作流状态
+
+        一次判定全部工作流的权限，按块执行 UPDATE ... WHERE id IN (...)，
+        所有块在同一事务中提交，不会出现部分成功
+
+        Args:
+            workflow_ids: 工作流ID列表
+            status: 目标状态（active/inactive/disabled）
+            user_id: 操作用户ID
+
+        Returns:
+            Dict: data.results为 工作流ID -> updated/unchanged/forbidden/not_found
+        """
+        if status not in BULK_WORKFLOW_STATUSES:
+            return {
+                'success': False,
+                'message': f'无效的工作流状态: {status}'
+            }
+        return self._bulk_change_status(workflow_ids, status, user_id, 'edit', '批量修改工作流状态失败')
+
+    def bulk_delete(self, workflow_ids: List[int], user_id: int) -> Dict:
+        """批量删除（归档）工作流，返回逐个工作流的处理结果"""
+        return self._bulk_change_status(workflow_ids, 'archived', user_id, 'delete', '批量删除工作流失败')
+
+    def _bulk_change_status(self, workflow_ids: List[int], status: str, user_id: int,
+                            permission_type: str, error_message: str) -> Dict:
+        """批量修改状态的公共实现"""
+        try:
+            try:
+                ids = list(dict.fromkeys(int(workflow_id) for workflow_id in workflow_ids))
+            except (TypeError, ValueError):
+                return {
+                    'success': False,
+                    'message': '工作流ID格式错误'
+                }
+            
+            allowed = self.permissions.check_many(user_id, 'workflow', ids, permission_type)
+            results = {workflow_id: 'forbidden' for workflow_id in ids if not allowed[workflow_id]}
+            permitted = [workflow_id for workflow_id in ids if allowed[workflow_id]]
+            
+            chunk_size = self.config.WORKFLOW_BULK_CHUNK_SIZE
+            with self.main_engine.begin() as conn:
+                for start in range(0, len(permitted), chunk_size):
+                    chunk = permitted[start:start + chunk_size]
+                    outcomes = self._change_workflow_status(conn, chunk, status, user_id)
+                    for workflow_id in chunk:
+                        results[workflow_id] = outcomes.get(workflow_id, 'not_found')
+            
+            ordered = {workflow_id: results[workflow_id] for workflow_id in ids}
+            summary: Dict[str, int] = {}
+            for outcome in ordered.values():
+                summary[outcome] = summary.get(outcome, 0) + 1
+            return {
+                'success': True,
+                'data': {
+                    'results': ordered,
+                    'summary': summary
+                }
+            }
+            
+        except Exception as e:
+            logger.error(f"{error_message}: {e}")
+            return {
+                'success': False,
+                'error': str(e),
+                'message': error_message
+            }
+
+    def execute_workflow(self, workflow_id: int, user_id: int = None, conf: Dict = None) -> Dict:
+        """
+        执行工作流
+
+        实例以pending状态落库后提交给执行后端异步触发，接口不等待Airflow响应；
+        触发成功后实例转为running，最终状态由后台同步任务批量回写
+        """
         try:
             with self.main_engine.begin() as conn:
                 # 检查工作流状态
@@ -443,20 +557,47 @@ class WorkflowService:
                         'message': '只能执行已激活的工作流'
                     }
                 
-                # 创建执行实例
+                # 创建执行实例，dag_run_id由本系统生成，重复触发时Airflow返回409保证幂等
+                instance_code = uuid.uuid4().hex
+                dag_run_id = f"dataask__{instance_code}"
                 instance_sql = text("""
-                    INSERT INTO workflow_instances (workflow_id, status, started_at)
-                    VALUES (:workflow_id, 'running', NOW())
+                    INSERT INTO workflow_instances (
+                        workflow_id, instance_code, dag_run_id, status, trigger_type, trigger_user_id, trigger_data
+                    ) VALUES (
+                        :workflow_id, :instance_code, :dag_run_id, 'pending', 'manual', :user_id, :trigger_data
+                    )
                 """)
                 
-                result = conn.execute(instance_sql, {'workflow_id': workflow_id})
+                result = conn.execute(instance_sql, {
+                    'workflow_id': workflow_id,
+                    'instance_code': instance_code,
+                    'dag_run_id': dag_run_id,
+                    'user_id': user_id,
+                    'trigger_data': json.dumps(conf) if conf else None
+                })
                 instance_id = result.lastrowid
                 
-                return {
-                    'success': True,
-                    'instance_id': instance_id,
-                    'message': '工作流执行启动成功'
-                }
+                conn.execute(text("""
+                    UPDATE enhanced_workflows
+                    SET instance_count = instance_count + 1, updated_at = updated_at
+                    WHERE id = :workflow_id
+                """), {'workflow_id': workflow_id})
+            
+            # 事务提交后再提交触发，避免后台线程读不到实例
+            get_workflow_backend().submit({
+                'id': instance_id,
+                'workflow_id': workflow_id,
+                'dag_id': workflow.dag_id,
+                'dag_run_id': dag_run_id,
+                'conf': conf or {}
+            })
+            
+            return {
+                'success': True,
+                'instance_id': instance_id,
+                'dag_run_id': dag_run_id,
+                'message': '工作流执行已提交'
+            }
                 
         except Exception as e:
             logger.error(f"执行工作流失败: {e}")
@@ -466,6 +607,268 @@ class WorkflowService:
                 'message': '执行工作流失败'
             }
 
+    def get_active_instances(self, limit: int, after_id: int = 0) -> List[Dict]:
+        """按ID顺序获取未结束的实例（pending/running），供执行后端批量同步"""
+        with self.main_engine.connect() as conn:
+            rows = conn.execute(text("""
+                SELECT i.id, i.workflow_id, i.dag_run_id, i.status, i.trigger_data, i.created_at, wf.dag_id
+                FROM workflow_instances i
+                JOIN enhanced_workflows wf ON wf.id = i.workflow_id
+                WHERE i.status IN ('pending', 'running') AND i.id > :after_id
+                ORDER BY i.id
+                LIMIT :limit
+            """), {'after_id': after_id, 'limit': limit}).fetchall()
+        return [dict(row._mapping) for row in rows]
+
+    def mark_instances_running(self, instance_ids: List[int]) -> int:
+        """将已被执行后端接收的pending实例标记为running"""
+        if not instance_ids:
+            return 0
+        with self.main_engine.begin() as conn:
+            params: Dict[str, Any] = {}
+            rows = conn.execute(text(f"""
+                SELECT id FROM workflow_instances
+                WHERE id IN ({_in_clause('id', instance_ids, params)}) AND status = 'pending'
+                FOR UPDATE
+            """), params).fetchall()
+            if not rows:
+                return 0
+            params = {}
+            conn.execute(text(f"""
+                UPDATE workflow_instances
+                SET status = 'running', started_at = COALESCE(started_at, NOW())
+                WHERE id IN ({_in_clause('id', [row.id for row in rows], params)})
+            """), params)
+        
+        get_workflow_watch().publish_many([row.id for row in rows], {'status': 'running'})
+        return len(rows)
+
+    def complete_instance(self, instance_id: int, status: str, error_message: str = None) -> Dict:
+        """
+        结束工作流实例并维护成功计数
+
+        只有处于未终止状态的实例会被更新，重复回调不会重复计数
+
+        Args:
+            instance_id: 实例ID
+            status: 终止状态（completed/failed/cancelled/timeout）
+            error_message: 错误信息
+        """
+        result = self.complete_instances([instance_id], status, error_message)
+        if not result['success']:
+            return result
+        updated = bool(result['data']['updated'])
+        return {
+            'success': True,
+            'updated': updated,
+            'message': '实例状态更新成功' if updated else '实例已结束或不存在'
+        }
+
+    def complete_instances(self, instance_ids: List[int], status: str, error_message: str = None) -> Dict:
+        """
+        批量结束工作流实例，同一事务内按工作流累加成功数
+
+        Returns:
+            Dict: data.updated为实际从未结束状态转入终止状态的实例ID
+        """
+        try:
+            if status not in TERMINAL_INSTANCE_STATUSES:
+                return {
+                    'success': False,
+                    'message': f'无效的实例终止状态: {status}'
+                }
+            if not instance_ids:
+                return {'success': True, 'data': {'updated': []}}
+            
+            with self.main_engine.begin() as conn:
+                params: Dict[str, Any] = {}
+                rows = conn.execute(text(f"""
+                    SELECT id, workflow_id FROM workflow_instances
+                    WHERE id IN ({_in_clause('id', instance_ids, params)})
+                      AND status IN ('pending', 'running', 'paused')
+                    FOR UPDATE
+                """), params).fetchall()
+                if not rows:
+                    return {'success': True, 'data': {'updated': []}}
+                
+                params = {'status': status, 'error_message': error_message}
+                conn.execute(text(f"""
+                    UPDATE workflow_instances
+                    SET status = :status, error_message = :error_message, completed_at = NOW(),
+                        duration_seconds = TIMESTAMPDIFF(SECOND, COALESCE(started_at, created_at), NOW())
+                    WHERE id IN ({_in_clause('id', [row.id for row in rows], params)})
+                """), params)
+                
+                if status == 'completed':
+                    succeeded: Dict[int, int] = {}
+                    for row in rows:
+                        succeeded[row.workflow_id] = succeeded.get(row.workflow_id, 0) + 1
+                    for workflow_id, count in succeeded.items():
+                        conn.execute(text("""
+                            UPDATE enhanced_workflows
+                            SET success_count = success_count + :count, updated_at = updated_at
+                            WHERE id = :workflow_id
+                        """), {'count': count, 'workflow_id': workflow_id})
+            
+            get_workflow_watch().publish_many([row.id for row in rows], {
+                'status': status,
+                'error_message': error_message,
+                **({'progress': 100.0} if status == 'completed' else {})
+            })
+            return {'success': True, 'data': {'updated': [row.id for row in rows]}}
+                
+        except Exception as e:
+            logger.error(f"结束工作流实例失败: {e}")
+            return {
+                'success': False,
+                'error': str(e),
+                'message': '结束工作流实例失败'
+            }
+
+    def get_instance_graph(self, instance_id: int) -> Optional[Dict]:
+        """
+        获取实例的执行图：实例、启用节点、节点连接和已有的节点执行记录
+
+        供本地执行后端调度，已有执行记录用于进程重启后从中断处恢复
+        """
+        with self.main_engine.connect() as conn:
+            instance = conn.execute(text("""
+                SELECT id, workflow_id, instance_code, status, trigger_data
+                FROM workflow_instances WHERE id = :instance_id
+            """), {'instance_id': instance_id}).fetchone()
+            if not instance:
+                return None
+
+            params = {'workflow_id': instance.workflow_id, 'instance_id': instance_id}
+            nodes = conn.execute(text("""
+                SELECT id, code, name, type, subtype, step_order, config, timeout_minutes,
+                       retry_count, retry_delay_minutes, skip_on_failure
+                FROM workflow_nodes
+                WHERE workflow_id = :workflow_id AND status = 'active'
+                ORDER BY step_order, id
+            """), params).fetchall()
+            connections = conn.execute(text("""
+                SELECT from_node_id, to_node_id, condition_type
+                FROM workflow_node_connections
+                WHERE workflow_id = :workflow_id
+                ORDER BY order_num, id
+            """), params).fetchall()
+            executions = conn.execute(text("""
+                SELECT node_id, status, attempt_count, output_data, error_message
+                FROM workflow_node_executions
+                WHERE instance_id = :instance_id
+            """), params).fetchall()
+
+        return {
+            'instance': dict(instance._mapping),
+            'nodes': [dict(row._mapping) for row in nodes],
+            'connections': [dict(row._mapping) for row in connections],
+            'executions': [dict(row._mapping) for row in executions]
+        }
+
+    def save_node_execution(self, instance_id: int, node_id: int, status: str, attempt: int,
+                            output_data: Any = None, error_message: str = None,
+                            progress: float = None) -> None:
+        """
+        写入节点执行状态（每个实例的每个节点一行，重试累加attempt_count）
+
+        节点进入终止状态时在同一事务内更新实例的当前节点和进度
+        """
+        with self.main_engine.begin() as conn:
+            conn.execute(text("""
+                INSERT INTO workflow_node_executions (
+                    instance_id, node_id, execution_code, status, attempt_count,
+                    output_data, error_message, started_at, completed_at
+                ) VALUES (
+                    :instance_id, :node_id, :execution_code, :status, :attempt,
+                    :output_data, :error_message, NOW(), IF(:running, NULL, NOW())
+                )
+                ON DUPLICATE KEY UPDATE
+                    status = VALUES(status),
+                    attempt_count = VALUES(attempt_count),
+                    output_data = VALUES(output_data),
+                    error_message = VALUES(error_message),
+                    started_at = IF(:running, NOW(), started_at),
+                    completed_at = VALUES(completed_at),
+                    duration_seconds = IF(:running, NULL, TIMESTAMPDIFF(SECOND, started_at, NOW()))
+            """), {
+                'instance_id': instance_id,
+                'node_id': node_id,
+                'execution_code': f'{instance_id}:{node_id}',
+                'status': status,
+                'attempt': attempt,
+                'output_data': json.dumps(output_data, ensure_ascii=False, default=str) if output_data is not None else None,
+                'error_message': error_message,
+                'running': status == 'running'
+            })
+
+            if progress is not None:
+                conn.execute(text("""
+                    UPDATE workflow_instances
+                    SET current_node_id = :node_id, progress_percentage = :progress
+                    WHERE id = :instance_id
+                """), {'node_id': node_id, 'progress': progress, 'instance_id': instance_id})
+
+        get_workflow_watch().publish(
+            instance_id,
+            {'id': instance_id, 'current_node_id': node_id, 'progress': progress} if progress is not None else None,
+            [{'node_id': node_id, 'status': status, 'attempt': attempt, 'error_message': error_message}]
+        )
+
+    def get_instance_snapshot(self, instance_id: int) -> Optional[Dict]:
+        """获取实例及其节点执行的当前状态，用于初始化实例状态订阅"""
+        with self.main_engine.connect() as conn:
+            instance = conn.execute(text("""
+                SELECT id, workflow_id, status, progress_percentage, current_node_id, error_message
+                FROM workflow_instances WHERE id = :instance_id
+            """), {'instance_id': instance_id}).fetchone()
+            if not instance:
+                return None
+            executions = conn.execute(text("""
+                SELECT node_id, status, attempt_count, error_message
+                FROM workflow_node_executions
+                WHERE instance_id = :instance_id
+            """), {'instance_id': instance_id}).fetchall()
+
+        return {
+            'instance': {
+                'id': instance.id,
+                'workflow_id': instance.workflow_id,
+                'status': instance.status,
+                'progress': float(instance.progress_percentage or 0),
+                'current_node_id': instance.current_node_id,
+                'error_message': instance.error_message
+            },
+            'nodes': [{
+                'node_id': row.node_id,
+                'status': row.status,
+                'attempt': row.attempt_count,
+                'error_message': row.error_message
+            } for row in executions]
+        }
+
+    def reconcile_counters(self) -> Dict:
+        """按明细表校正工作流和工作域的冗余计数，返回被校正的行数"""
+        try:
+            with self.main_engine.begin() as conn:
+                workflows = conn.execute(text(RECONCILE_WORKFLOW_COUNTS_SQL)).rowcount
+                workspaces = conn.execute(text(RECONCILE_WORKSPACE_COUNTS_SQL)).rowcount
+            
+            if workflows or workspaces:
+                logger.warning(f"工作流计数存在偏差，已校正: 工作流{workflows}行, 工作域{workspaces}行")
+            return {
+                'success': True,
+                'data': {'workflows': workflows, 'workspaces': workspaces}
+            }
+            
+        except Exception as e:
+            logger.error(f"校正工作流计数失败: {e}")
+            return {
+                'success': False,
+                'error': str(e),
+                'message': '校正工作流计数失败'
+            }
+
     # ================================
     # 节点管理
     # ================================
@@ -691,12 +1094,14 @@ class WorkflowService:
                     })
                     
                     permission_id = result.lastrowid
-                
-                return {
-                    'success': True,
-                    'permission_id': permission_id,
-                    'message': '权限授予成功'
-                }
+            
+            # 事务提交后再失效缓存，避免并发请求把旧授权重新加载进缓存
+            self.permissions.invalidate(subject_id if subject_type == 'user' else None)
+            return {
+                'success': True,
+                'permission_id': permission_id,
+                'message': '权限授予成功'
+            }
                 
         except Exception as e:
             logger.error(f"授予权限失败: {e}")
@@ -749,44 +1154,63 @@ class WorkflowService:
             'creator_id': user_id
         })
         
+        conn.execute(text("""
+            UPDATE enhanced_workflows
+            SET node_count = node_count + 1, updated_at = updated_at
+            WHERE id = :workflow_id
+        """), {'workflow_id': workflow_id})
+        
         return result.lastrowid
 
+    def _change_workflow_status(self, conn, workflow_ids: List[int], status: str,
+                                updater_id: int = None) -> Dict[int, str]:
+        """
+        在当前事务中修改工作流状态并维护工作域工作流数
+
+        Returns:
+            Dict[int, str]: 存在的工作流ID -> updated（已更新）/ unchanged（已是目标状态）
+        """
+        if not workflow_ids:
+            return {}
+        params: Dict[str, Any] = {}
+        rows = conn.execute(text(f"""
+            SELECT id, workspace_id, status FROM enhanced_workflows
+            WHERE id IN ({_in_clause('id', workflow_ids, params)})
+            FOR UPDATE
+        """), params).fetchall()
+        
+        outcomes = {row.id: 'unchanged' if row.status == status else 'updated' for row in rows}
+        changed = [row for row in rows if row.status != status]
+        if not changed:
+            return outcomes
+        
+        params = {'status': status, 'updater_id': updater_id}
+        conn.execute(text(f"""
+            UPDATE enhanced_workflows
+            SET status = :status, updater_id = COALESCE(:updater_id, updater_id), updated_at = NOW()
+            WHERE id IN ({_in_clause('id', [row.id for row in changed], params)})
+        """), params)
+        
+        deltas: Dict[int, int] = {}
+        counted = status in COUNTED_WORKFLOW_STATUSES
+        for row in changed:
+            was_counted = row.status in COUNTED_WORKFLOW_STATUSES
+            if was_counted != counted:
+                deltas[row.workspace_id] = deltas.get(row.workspace_id, 0) + (1 if counted else -1)
+        for workspace_id, delta in deltas.items():
+            if delta:
+                conn.execute(text("""
+                    UPDATE workflow_workspaces
+                    SET workflow_count = GREATEST(workflow_count + :delta, 0), updated_at = updated_at
+                    WHERE id = :workspace_id
+                """), {'delta': delta, 'workspace_id': workspace_id})
+        
+        return outcomes
+
     def _check_workspace_permission(self, workspace_id: int, user_id: int, permission_type: str) -> bool:
         """检查工作域权限"""
         try:
-            with self.main_engine.begin() as conn:
-                sql = text("""
-                    SELECT COUNT(*) as has_permission
-                    FROM workflow_permissions p
-                    WHERE p.resource_type = 'workspace' AND p.resource_id = :workspace_id
-                      AND p.subject_type = 'user' AND p.subject_id = :user_id
-                      AND p.permission_type IN (:permission_type, 'manage')
-                      AND p.granted = 1
-                      AND (p.expires_at IS NULL OR p.expires_at > NOW())
-                    
-                    UNION ALL
-                    
-                    SELECT COUNT(*) as has_permission
-                    FROM workflow_workspaces w
-                    WHERE w.id = :workspace_id AND w.creator_id = :user_id
-                    
-                    UNION ALL
-                    
-                    SELECT CASE WHEN :user_id = 1 THEN 1 ELSE 0 END as has_permission
-                """)
-                
-                result = conn.execute(sql, {
-                    'workspace_id': workspace_id,
-                    'user_id': user_id,
-                    'permission_type': permission_type
-                })
-                
-                for row in result:
-                    if row.has_permission > 0:
-                        return True
-                
-                return False
-                
+            return self.permissions.check(user_id, 'workspace', workspace_id, permission_type)
         except Exception as e:
             logger.error(f"检查工作域权限失败: {e}")
             return False
@@ -794,39 +1218,7 @@ class WorkflowService:
     def _check_workflow_permission(self, workflow_id: int, user_id: int, permission_type: str) -> bool:
         """检查工作流权限"""
         try:
-            with self.main_engine.begin() as conn:
-                sql = text("""
-                    SELECT COUNT(*) as has_permission
-                    FROM workflow_permissions p
-                    WHERE p.resource_type = 'workflow' AND p.resource_id = :workflow_id
-                      AND p.subject_type = 'user' AND p.subject_id = :user_id
-                      AND p.permission_type IN (:permission_type, 'manage')
-                      AND p.granted = 1
-                      AND (p.expires_at IS NULL OR p.expires_at > NOW())
-                    
-                    UNION ALL
-                    
-                    SELECT COUNT(*) as has_permission
-                    FROM enhanced_workflows wf
-                    WHERE wf.id = :workflow_id AND wf.creator_id = :user_id
-                    
-                    UNION ALL
-                    
-                    SELECT CASE WHEN :user_id = 1 THEN 1 ELSE 0 END as has_permission
-                """)
-                
-                result = conn.execute(sql, {
-                    'workflow_id': workflow_id,
-                    'user_id': user_id,
-                    'permission_type': permission_type
-                })
-                
-                for row in result:
-                    if row.has_permission > 0:
-                        return True
-                
-                return False
-                
+            return self.permissions.check(user_id, 'workflow', workflow_id, permission_type)
         except Exception as e:
             logger.error(f"检查工作流权限失败: {e}")
             return False
@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+工作流实例状态订阅
+每个实例在Redis中维护一个状态哈希（实例一项、每个节点一项，各自记录最后变化的版本号），
+状态写入与PUBLISH在同一个Lua脚本中完成。长轮询请求按since版本只返回变化的部分，
+无变化时阻塞等待本进程唯一的订阅连接分发的通知，不再轮询数据库
+"""
+import json
+import time
+import logging
+import threading
+from typing import Dict, Any, Optional, List, Callable, Set
+from config.base_config import Config
+from tools.exceptions import AuthorizationException
+
+logger = logging.getLogger(__name__)
+
+STATE_KEY_PREFIX = 'workflow:instance:state:'
+CHANNEL_PREFIX = 'workflow:instance:changed:'
+
+# 实例终止状态，客户端收到后停止等待
+FINISHED_STATUSES = ('completed', 'failed', 'cancelled', 'timeout')
+
+# ARGV: ttl, 模式(update：新值覆盖；seed：已有值优先并标记已初始化), 字段/JSON对...
+_UPDATE_SCRIPT = """
+local version = redis.call('HINCRBY', KEYS[1], 'version', 1)
+for i = 3, #ARGV, 2 do
+    local entry = cjson.decode(ARGV[i + 1])
+    local existing = redis.call('HGET', KEYS[1], ARGV[i])
+    if existing then
+        local old = cjson.decode(existing)
+        if ARGV[2] == 'seed' then
+            for k, v in pairs(old) do entry[k] = v end
+        else
+            for k, v in pairs(entry) do old[k] = v end
+            entry = old
+        end
+    end
+    entry['version'] = version
+    redis.call('HSET', KEYS[1], ARGV[i], cjson.encode(entry))
+end
+if ARGV[2] == 'seed' then
+    redis.call('HSET', KEYS[1], 'seeded', 1)
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+redis.call('PUBLISH', KEYS[2], version)
+return version
+"""
+
+def _default_service_provider():
+    from service.workflow_service import get_workflow_service
+    return get_workflow_service()
+
+def _default_redis_provider():
+    from tools.redis_service import get_redis_service
+    return get_redis_service().redis_client
+
+class WorkflowWatch:
+    """工作流实例状态版本化发布与长轮询等待"""
+
+    def __init__(self, redis_provider: Optional[Callable[[], Any]] = None,
+                 service_provider: Optional[Callable[[], Any]] = None,
+                 state_ttl: Optional[int] = None, recheck: Optional[float] = None):
+        self._redis_provider = redis_provider or _default_redis_provider
+        self._service_provider = service_provider or _default_service_provider
+        self.state_ttl = state_ttl or Config.WORKFLOW_WATCH_STATE_TTL
+        self.recheck = recheck or Config.WORKFLOW_WATCH_RECHECK
+        self._script = None
+        self._waiters: Dict[int, Set[threading.Event]] = {}
+        self._lock = threading.Lock()
+        self._listener: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    @property
+    def redis(self):
+        return self._redis_provider()
+
+    # ================================
+    # 发布
+    # ================================
+
+    def _write(self, instance_id: int, entries: Dict[str, Dict[str, Any]], mode: str = 'update') -> int:
+        client = self.redis
+        if self._script is None:
+            self._script = client.register_script(_UPDATE_SCRIPT)
+        args: List[Any] = [self.state_ttl, mode]
+        for field, entry in entries.items():
+            args.extend([field, json.dumps(entry, ensure_ascii=False, default=str)])
+        return int(self._script(keys=[f'{STATE_KEY_PREFIX}{instance_id}', f'{CHANNEL_PREFIX}{instance_id}'],
+                                args=args))
+
+    def publish(self, instance_id: int, instance: Optional[Dict[str, Any]] = None,
+                nodes: Optional[List[Dict[str, Any]]] = None) -> Optional[int]:
+        """
+        发布实例和节点的状态变化（只需包含变化的字段）
+
+        由工作流服务在事务提交后调用，发布失败只记录日志，不影响业务
+
+        Returns:
+            Optional[int]: 新版本号，发布失败时返回None
+        """
+        entries = {}
+        if instance:
+            entries['instance'] = instance
+        for node in nodes or []:
+            entries[f"node:{node['node_id']}"] = node
+        if not entries:
+            return None
+        try:
+            return self._write(instance_id, entries)
+        except Exception as e:
+            logger.warning(f"发布工作流实例{instance_id}状态变化失败: {str(e)}")
+            return None
+
+    def publish_many(self, instance_ids: List[int], instance: Dict[str, Any]):
+        """多个实例发布相同的实例级变化（如批量结束）"""
+        for instance_id in instance_ids:
+            self.publish(instance_id, {'id': instance_id, **instance})
+
+    # ================================
+    # 读取与增量
+    # ================================
+
+    def _read_state(self, instance_id: int) -> Optional[Dict[str, Any]]:
+        """读取状态哈希，尚未初始化时从数据库加载快照"""
+        state = self.redis.hgetall(f'{STATE_KEY_PREFIX}{instance_id}')
+        if state.get('seeded'):
+            return state
+        snapshot = self._service_provider().get_instance_snapshot(instance_id)
+        if snapshot is None:
+            return None
+        entries = {'instance': snapshot['instance']}
+        for node in snapshot['nodes']:
+            entries[f"node:{node['node_id']}"] = node
+        self._write(instance_id, entries, mode='seed')
+        return self.redis.hgetall(f'{STATE_KEY_PREFIX}{instance_id}')
+
+    @staticmethod
+    def delta(state: Dict[str, Any], since: int) -> Dict[str, Any]:
+        """
+        计算since版本之后的变化
+
+        since大于当前版本（状态过期后重新初始化）时返回完整状态
+        """
+        version = int(state.get('version', 0))
+        if since > version:
+            since = 0
+        instance = json.loads(state['instance']) if 'instance' in state else {}
+        nodes = [json.loads(value) for field, value in state.items() if field.startswith('node:')]
+        changed_nodes = sorted((node for node in nodes if node.get('version', 0) > since),
+                               key=lambda node: node['node_id'])
+        instance_changed = instance.get('version', 0) > since
+        return {
+            'version': version,
+            'workflow_id': instance.get('workflow_id'),
+            'changed': instance_changed or bool(changed_nodes),
+            'finished': instance.get('status') in FINISHED_STATUSES,
+            'instance': instance if instance_changed else None,
+            'nodes': changed_nodes
+        }
+
+    # ================================
+    # 长轮询
+    # ================================
+
+    def wait(self, instance_id: int, since: int = 0, timeout: float = 30,
+             authorize: Optional[Callable[[int], bool]] = None) -> Optional[Dict[str, Any]]:
+        """
+        等待实例在since版本之后发生变化
+
+        先注册通知再读取状态，两者之间发布的变化不会丢失；
+        订阅连接异常时按recheck间隔重新读取状态兜底
+
+        Args:
+            instance_id: 实例ID
+            since: 客户端已知的版本号，0表示获取完整状态
+            timeout: 最长等待秒数，超时返回changed=False
+            authorize: 按工作流ID判断是否有查看权限
+
+        Returns:
+            Optional[Dict]: 增量状态，实例不存在时返回None
+        """
+        self._ensure_listener()
+        event = threading.Event()
+        with self._lock:
+            self._waiters.setdefault(instance_id, set()).add(event)
+        try:
+            state = self._read_state(instance_id)
+            if state is None:
+                return None
+            result = self.delta(state, since)
+            if authorize is not None and not authorize(result['workflow_id']):
+                raise AuthorizationException('没有查看该工作流实例的权限')
+
+            deadline = time.monotonic() + timeout
+            while not result['changed'] and not result['finished']:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                event.wait(min(remaining, self.recheck))
+                event.clear()
+                state = self._read_state(instance_id)
+                if state is None:
+                    return None
+                result = self.delta(state, since)
+            return result
+        finally:
+            with self._lock:
+                waiters = self._waiters.get(instance_id)
+                if waiters:
+                    waiters.discard(event)
+                    if not waiters:
+                        del self._waiters[instance_id]
+
+    def waiter_count(self) -> int:
+        """本进程正在等待的请求数"""
+        with self._lock:
+            return sum(len(waiters) for waiters in self._waiters.values())
+
+    def _dispatch(self, channel: str):
+        try:
+            instance_id = int(channel[len(CHANNEL_PREFIX):])
+        except ValueError:
+            return
+        with self._lock:
+            waiters = list(self._waiters.get(instance_id, ()))
+        for event in waiters:
+            event.set()
+
+    def _ensure_listener(self):
+        if self._listener is not None and self._listener.is_alive():
+            return
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._stop_event.clear()
+                self._listener = threading.Thread(
+                    target=self._listen, name='workflow-watch-listener', daemon=True
+                )
+                self._listener.start()
+
+    def _listen(self):
+        """订阅循环，断线后重连并唤醒所有等待者重新读取状态"""
+        while not self._stop_event.is_set():
+            pubsub = None
+            try:
+                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(f'{CHANNEL_PREFIX}*')
+                while not self._stop_event.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message['type'] == 'pmessage':
+                        self._dispatch(message['channel'])
+            except Exception as e:
+                logger.error(f"工作流实例订阅连接异常，稍后重连: {str(e)}")
+                with self._lock:
+                    waiters = [event for events in self._waiters.values() for event in events]
+                for event in waiters:
+                    event.set()
+                time.sleep(1)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+    def stop(self):
+        """停止订阅线程"""
+        self._stop_event.set()
+        if self._listener is not None:
+            self._listener.join(timeout=5)
+
+# 全局实例状态订阅
+_workflow_watch = None
+_workflow_watch_lock = threading.Lock()
+
+def get_workflow_watch() -> WorkflowWatch:
+    """获取工作流实例状态订阅实例"""
+    global _workflow_watch
+    if _workflow_watch is None:
+        with _workflow_watch_lock:
+            if _workflow_watch is None:
+                _workflow_watch = WorkflowWatch()
+    return _workflow_watch
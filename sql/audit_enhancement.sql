@@ -0,0 +1,53 @@
+-- ============================================================
+-- 百惟数问 - 操作审计表增强脚本
+-- 目标：按月分区、(operation_time, id)键集分页、日/周/月汇总表
+-- 说明：分区表要求分区列包含在主键中，主键调整为(id, operation_time)
+-- ============================================================
+
+USE dataask;
+
+-- ============================================================
+-- 第一步：调整主键和索引
+-- ============================================================
+
+ALTER TABLE operation_audit
+    MODIFY id BIGINT NOT NULL AUTO_INCREMENT COMMENT '审计记录ID',
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (id, operation_time),
+    DROP INDEX idx_operation_time,
+    ADD INDEX idx_operation_time_id (operation_time, id),
+    ADD INDEX idx_created_at (created_at);
+
+-- ============================================================
+-- 第二步：按月分区（历史数据进入p_history，之后由服务自动拆分pmax）
+-- ============================================================
+
+ALTER TABLE operation_audit
+PARTITION BY RANGE (TO_DAYS(operation_time)) (
+    PARTITION p_history VALUES LESS THAN (TO_DAYS('2025-08-01')),
+    PARTITION pmax VALUES LESS THAN MAXVALUE
+);
+
+-- ============================================================
+-- 第三步：汇总表
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS operation_audit_rollup (
+    id BIGINT PRIMARY KEY AUTO_INCREMENT COMMENT '主键ID',
+    period_type ENUM('day', 'week', 'month') NOT NULL COMMENT '统计周期',
+    period_start DATE NOT NULL COMMENT '周期开始日期（周以周一为起点）',
+    module VARCHAR(50) NOT NULL COMMENT '操作模块',
+    operation VARCHAR(20) NOT NULL COMMENT '操作类型',
+    username VARCHAR(50) NOT NULL COMMENT '操作用户名',
+    result VARCHAR(20) NOT NULL COMMENT '操作结果',
+    op_count INT NOT NULL DEFAULT 0 COMMENT '操作次数',
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+    UNIQUE KEY uk_rollup (period_type, period_start, module, operation, username, result),
+    KEY idx_period_operation (period_type, operation, period_start)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='审计汇总表';
+
+CREATE TABLE IF NOT EXISTS operation_audit_rollup_state (
+    id TINYINT PRIMARY KEY COMMENT '固定为1',
+    last_rolled_at DATETIME NOT NULL COMMENT '已汇总的created_at上界',
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='审计汇总进度表';
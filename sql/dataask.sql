@@ -125,7 +125,7 @@ CREATE TABLE IF NOT EXISTS user_sessions (
 
 -- 操作审计表
 CREATE TABLE IF NOT EXISTS operation_audit (
-    id BIGINT PRIMARY KEY AUTO_INCREMENT COMMENT '审计记录ID',
+    id BIGINT NOT NULL AUTO_INCREMENT COMMENT '审计记录ID',
     user_id INT NOT NULL COMMENT '操作用户ID',
     username VARCHAR(50) NOT NULL COMMENT '操作用户名',
     user_code VARCHAR(50) NOT NULL COMMENT '操作用户编码',
@@ -145,12 +145,77 @@ CREATE TABLE IF NOT EXISTS operation_audit (
     result VARCHAR(20) NOT NULL DEFAULT 'success' COMMENT '操作结果（success/failure）',
     error_message TEXT COMMENT '错误信息（操作失败时）',
     created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
-    PRIMARY KEY (id),
+    PRIMARY KEY (id, operation_time),
     KEY idx_user_id (user_id),
-    KEY idx_operation_time (operation_time),
+    KEY idx_operation_time_id (operation_time, id),
+    KEY idx_created_at (created_at),
     KEY idx_module_operation (module, operation),
     KEY idx_target (target_type, target_id)
-) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='操作审计表';
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='操作审计表'
+-- 按月分区，新分区由AuditService.rotate_partitions自动从pmax中拆分
+PARTITION BY RANGE (TO_DAYS(operation_time)) (
+    PARTITION p_history VALUES LESS THAN (TO_DAYS('2025-08-01')),
+    PARTITION pmax VALUES LESS THAN MAXVALUE
+);
+
+-- 审计汇总表（按日/周/月预聚合，统计接口只读该表）
+CREATE TABLE IF NOT EXISTS operation_audit_rollup (
+    id BIGINT PRIMARY KEY AUTO_INCREMENT COMMENT '主键ID',
+    period_type ENUM('day', 'week', 'month') NOT NULL COMMENT '统计周期',
+    period_start DATE NOT NULL COMMENT '周期开始日期（周以周一为起点）',
+    module VARCHAR(50) NOT NULL COMMENT '操作模块',
+    operation VARCHAR(20) NOT NULL COMMENT '操作类型',
+    username VARCHAR(50) NOT NULL COMMENT '操作用户名',
+    result VARCHAR(20) NOT NULL COMMENT '操作结果',
+    op_count INT NOT NULL DEFAULT 0 COMMENT '操作次数',
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+    UNIQUE KEY uk_rollup (period_type, period_start, module, operation, username, result),
+    KEY idx_period_operation (period_type, operation, period_start)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='审计汇总表';
+
+-- 审计汇总进度表（记录已汇总到的created_at水位）
+CREATE TABLE IF NOT EXISTS operation_audit_rollup_state (
+    id TINYINT PRIMARY KEY COMMENT '固定为1',
+    last_rolled_at DATETIME NOT NULL COMMENT '已汇总的created_at上界',
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='审计汇总进度表';
+
+-- 消息表（消息内容只写一份）
+CREATE TABLE IF NOT EXISTS messages (
+    id BIGINT PRIMARY KEY AUTO_INCREMENT COMMENT '消息ID',
+    title VARCHAR(200) NOT NULL COMMENT '消息标题',
+    content TEXT NOT NULL COMMENT '消息内容',
+    type VARCHAR(20) NOT NULL COMMENT '消息类型（system/business/alert）',
+    status VARCHAR(20) NOT NULL DEFAULT 'draft' COMMENT '状态（draft/sending/sent/failed）',
+    sender_id BIGINT NOT NULL COMMENT '发送人ID',
+    sender_name VARCHAR(100) NOT NULL COMMENT '发送人名称',
+    recipient_type VARCHAR(20) NOT NULL DEFAULT 'all' COMMENT '接收范围（all/users/org）',
+    recipient_scope JSON NULL COMMENT '接收对象（用户ID列表或机构编码列表）',
+    recipient_count INT NOT NULL DEFAULT 0 COMMENT '已投递人数（全体广播为0，读时合并）',
+    channels JSON NULL COMMENT '推送渠道',
+    error_message VARCHAR(500) NULL COMMENT '投递失败原因',
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+    sent_at DATETIME NULL COMMENT '发送时间',
+    KEY idx_type_status_created (type, status, created_at),
+    KEY idx_status_created (status, created_at),
+    KEY idx_sender_created (sender_name, created_at),
+    KEY idx_broadcast (recipient_type, status, sent_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='消息表';
+
+-- 收件箱表（定向消息发送时按接收人扇出；全体广播仅在已读时写入）
+CREATE TABLE IF NOT EXISTS message_inbox (
+    id BIGINT PRIMARY KEY AUTO_INCREMENT COMMENT '主键ID',
+    user_id BIGINT NOT NULL COMMENT '接收人ID',
+    message_id BIGINT NOT NULL COMMENT '消息ID',
+    is_read TINYINT NOT NULL DEFAULT 0 COMMENT '是否已读',
+    read_at DATETIME NULL COMMENT '阅读时间',
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '投递时间',
+    UNIQUE KEY uk_user_message (user_id, message_id),
+    KEY idx_user_read (user_id, is_read, message_id),
+    KEY idx_message_id (message_id),
+    FOREIGN KEY (message_id) REFERENCES messages(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='消息收件箱表';
 
 -- ============================================================
 -- 第二部分：初始化基础数据
@@ -0,0 +1,52 @@
+-- ============================================================
+-- 百惟数问 - 消息中心建表脚本
+-- 目标：消息内容只写一份，定向消息按接收人扇出到收件箱，全体广播读时合并
+-- 说明：未读数由Redis哈希维护，数据库为准，Redis丢失时按用户重建
+-- ============================================================
+
+USE dataask;
+
+-- ============================================================
+-- 第一步：消息表
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS messages (
+    id BIGINT PRIMARY KEY AUTO_INCREMENT COMMENT '消息ID',
+    title VARCHAR(200) NOT NULL COMMENT '消息标题',
+    content TEXT NOT NULL COMMENT '消息内容',
+    type VARCHAR(20) NOT NULL COMMENT '消息类型（system/business/alert）',
+    status VARCHAR(20) NOT NULL DEFAULT 'draft' COMMENT '状态（draft/sending/sent/failed）',
+    sender_id BIGINT NOT NULL COMMENT '发送人ID',
+    sender_name VARCHAR(100) NOT NULL COMMENT '发送人名称',
+    recipient_type VARCHAR(20) NOT NULL DEFAULT 'all' COMMENT '接收范围（all/users/org）',
+    recipient_scope JSON NULL COMMENT '接收对象（用户ID列表或机构编码列表）',
+    recipient_count INT NOT NULL DEFAULT 0 COMMENT '已投递人数（全体广播为0，读时合并）',
+    channels JSON NULL COMMENT '推送渠道',
+    error_message VARCHAR(500) NULL COMMENT '投递失败原因',
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+    sent_at DATETIME NULL COMMENT '发送时间',
+    KEY idx_type_status_created (type, status, created_at),
+    KEY idx_status_created (status, created_at),
+    KEY idx_sender_created (sender_name, created_at),
+    KEY idx_broadcast (recipient_type, status, sent_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='消息表';
+
+-- ============================================================
+-- 第二步：收件箱表
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS message_inbox (
+    id BIGINT PRIMARY KEY AUTO_INCREMENT COMMENT '主键ID',
+    user_id BIGINT NOT NULL COMMENT '接收人ID',
+    message_id BIGINT NOT NULL COMMENT '消息ID',
+    is_read TINYINT NOT NULL DEFAULT 0 COMMENT '是否已读',
+    read_at DATETIME NULL COMMENT '阅读时间',
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '投递时间',
+    UNIQUE KEY uk_user_message (user_id, message_id),
+    KEY idx_user_read (user_id, is_read, message_id),
+    KEY idx_message_id (message_id),
+    FOREIGN KEY (message_id) REFERENCES messages(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='消息收件箱表';
+
+SELECT '消息中心建表完成！' as message, NOW() as completion_time;
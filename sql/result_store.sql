@@ -0,0 +1,13 @@
+-- ============================================================
+-- 百惟数问 - 查询结果引用索引脚本
+-- 目标：会话消息中大结果的结果引用（query_result.result_ref）提取为生成列并建立索引，
+--       /api/text2sql/results/<result_ref>校验归属时按(user_id, result_ref)走索引，不再逐行解析JSON
+-- ============================================================
+
+USE vanna;
+
+ALTER TABLE text2sql_messages ADD COLUMN result_ref VARCHAR(64)
+    GENERATED ALWAYS AS (JSON_UNQUOTE(JSON_EXTRACT(query_result, '$.result_ref'))) VIRTUAL
+    COMMENT '结果引用（大结果存储的清单哈希）' AFTER query_result;
+
+ALTER TABLE text2sql_messages ADD INDEX idx_user_result_ref (user_id, result_ref);
@@ -0,0 +1,46 @@
+-- ============================================================
+-- 百惟数问 - Text2SQL保存查询脚本
+-- 目标：保存问题及校验过的SQL，结果物化后按计划增量刷新，看板直接读取物化结果
+-- ============================================================
+
+USE vanna;
+
+-- 保存查询表
+CREATE TABLE IF NOT EXISTS `text2sql_saved_queries` (
+  `id` bigint NOT NULL AUTO_INCREMENT COMMENT '主键ID',
+  `user_id` int NOT NULL COMMENT '创建用户ID',
+  `session_id` varchar(36) COLLATE utf8mb4_unicode_ci DEFAULT NULL COMMENT '来源会话ID',
+  `name` varchar(200) COLLATE utf8mb4_unicode_ci NOT NULL COMMENT '名称',
+  `question` varchar(500) COLLATE utf8mb4_unicode_ci NOT NULL COMMENT '用户问题',
+  `sql_query` text COLLATE utf8mb4_unicode_ci NOT NULL COMMENT '校验过的SQL',
+  `watermark_column` varchar(64) COLLATE utf8mb4_unicode_ci DEFAULT NULL COMMENT '单调递增的水位列，设置后增量刷新',
+  `key_columns` json DEFAULT NULL COMMENT '行唯一键列，增量刷新时按键合并',
+  `refresh_interval` int NOT NULL DEFAULT '3600' COMMENT '刷新间隔（秒）',
+  `status` enum('active','paused') COLLATE utf8mb4_unicode_ci NOT NULL DEFAULT 'active' COMMENT '状态',
+  `columns` json DEFAULT NULL COMMENT '结果列',
+  `row_count` int NOT NULL DEFAULT '0' COMMENT '物化行数',
+  `result_digest` char(40) COLLATE utf8mb4_unicode_ci DEFAULT NULL COMMENT '全量结果摘要，未变化时跳过重写',
+  `last_watermark` varchar(64) COLLATE utf8mb4_unicode_ci DEFAULT NULL COMMENT '已物化的最大水位值',
+  `last_refreshed_at` timestamp NULL DEFAULT NULL COMMENT '最近刷新时间',
+  `last_refresh_ms` int DEFAULT NULL COMMENT '最近刷新耗时（毫秒）',
+  `refresh_error` text COLLATE utf8mb4_unicode_ci COMMENT '最近刷新错误',
+  `next_refresh_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP COMMENT '下次刷新时间',
+  `created_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+  `updated_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+  PRIMARY KEY (`id`),
+  KEY `idx_saved_user` (`user_id`),
+  KEY `idx_saved_due` (`status`, `next_refresh_at`),
+  CONSTRAINT `text2sql_saved_queries_ibfk_1` FOREIGN KEY (`session_id`) REFERENCES `text2sql_sessions` (`id`) ON DELETE SET NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='Text2SQL保存查询表';
+
+-- 保存查询物化结果表（按插入顺序分页读取）
+CREATE TABLE IF NOT EXISTS `text2sql_saved_query_rows` (
+  `id` bigint NOT NULL AUTO_INCREMENT COMMENT '主键ID',
+  `saved_query_id` bigint NOT NULL COMMENT '保存查询ID',
+  `row_key` char(40) COLLATE utf8mb4_unicode_ci NOT NULL COMMENT '行键（键列或整行的SHA1）',
+  `row_data` json NOT NULL COMMENT '行数据',
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `uk_saved_row` (`saved_query_id`, `row_key`),
+  KEY `idx_saved_row_page` (`saved_query_id`, `id`),
+  CONSTRAINT `text2sql_saved_query_rows_ibfk_1` FOREIGN KEY (`saved_query_id`) REFERENCES `text2sql_saved_queries` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='Text2SQL保存查询物化结果表';
@@ -0,0 +1,22 @@
+-- ============================================================
+-- 百惟数问 - 表结构增量自动训练脚本
+-- 目标：按表记录结构指纹，只为新增或变化的表生成训练内容，已删除表的训练内容失效
+-- ============================================================
+
+USE vanna;
+
+-- 表结构快照表（每表一行，指纹为字段名、类型、注释及表注释的SHA1）
+CREATE TABLE IF NOT EXISTS `ai_schema_snapshots` (
+  `schema_name` varchar(64) COLLATE utf8mb4_unicode_ci NOT NULL COMMENT '库名',
+  `table_name` varchar(64) COLLATE utf8mb4_unicode_ci NOT NULL COMMENT '表名',
+  `fingerprint` char(40) COLLATE utf8mb4_unicode_ci NOT NULL COMMENT '表结构指纹',
+  `column_count` int NOT NULL DEFAULT '0' COMMENT '字段数',
+  `job_id` varchar(36) COLLATE utf8mb4_unicode_ci DEFAULT NULL COMMENT '最近一次训练任务ID',
+  `updated_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+  PRIMARY KEY (`schema_name`, `table_name`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='表结构快照表';
+
+-- 训练记录关联来源表，表变化或删除时按来源表使旧训练内容失效
+ALTER TABLE `ai_training_records`
+  ADD COLUMN `source_table` varchar(130) COLLATE utf8mb4_unicode_ci DEFAULT NULL COMMENT '来源表（库名.表名）' AFTER `sql_statement`,
+  ADD KEY `idx_training_source` (`source_table`, `status`);
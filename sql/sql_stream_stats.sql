@@ -0,0 +1,15 @@
+-- ============================================================
+-- 百惟数问 - SQL流式生成统计脚本
+-- 目标：记录流式生成（/api/text2sql/generate/stream）的首个token耗时分布，作为感知延迟的主要指标
+-- ============================================================
+
+USE vanna;
+
+ALTER TABLE sql_generation_stats ADD COLUMN first_token_histogram JSON NULL
+    COMMENT '首个token耗时直方图（对数-线性分桶）' AFTER p99_execution_time;
+
+ALTER TABLE sql_generation_stats ADD COLUMN p50_first_token_time INT DEFAULT 0
+    COMMENT 'P50首个token耗时（毫秒）' AFTER first_token_histogram;
+
+ALTER TABLE sql_generation_stats ADD COLUMN p95_first_token_time INT DEFAULT 0
+    COMMENT 'P95首个token耗时（毫秒）' AFTER p50_first_token_time;
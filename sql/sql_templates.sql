@@ -0,0 +1,26 @@
+-- ============================================================
+-- 百惟数问 - SQL模板快速路径脚本
+-- 目标：从执行成功的问答历史中挖掘参数化SQL模板，字面值不同的同类问题直接填充模板，不调用大模型
+-- ============================================================
+
+USE vanna;
+
+-- SQL模板表（由scripts/mine_sql_templates.py或/api/text2sql/templates/rebuild全量重建）
+CREATE TABLE IF NOT EXISTS `ai_sql_templates` (
+  `id` bigint NOT NULL AUTO_INCREMENT COMMENT '主键ID',
+  `template_key` char(40) COLLATE utf8mb4_unicode_ci NOT NULL COMMENT '模板键（问题骨架、固定值和SQL模板的SHA1）',
+  `skeleton` varchar(500) COLLATE utf8mb4_unicode_ci NOT NULL COMMENT '问题骨架（槽位替换为类型占位符）',
+  `fixed_values` json DEFAULT NULL COMMENT '未出现在SQL中的槽位取值，新问题必须相同',
+  `slots` json NOT NULL COMMENT '槽位定义：类型、日期粒度、枚举列及取值',
+  `sql_template` json NOT NULL COMMENT 'SQL片段与槽位引用',
+  `example_question` varchar(500) COLLATE utf8mb4_unicode_ci NOT NULL COMMENT '示例问题',
+  `example_sql` text COLLATE utf8mb4_unicode_ci NOT NULL COMMENT '示例SQL',
+  `support` int NOT NULL DEFAULT '0' COMMENT '生成该模板的历史问题数',
+  `variants` int NOT NULL DEFAULT '0' COMMENT '不同槽位取值组合数',
+  `confidence` decimal(4,3) NOT NULL DEFAULT '0.000' COMMENT '置信度',
+  `created_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+  `updated_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `uk_template_key` (`template_key`),
+  KEY `idx_template_confidence` (`confidence`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='SQL模板表';
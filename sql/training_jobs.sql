@@ -0,0 +1,33 @@
+-- ============================================================
+-- 百惟数问 - AI训练任务队列脚本
+-- 目标：训练请求只入队，由后台worker分批训练，ai_training_records记录每条训练内容的进度
+-- ============================================================
+
+USE vanna;
+
+-- 训练任务表
+CREATE TABLE IF NOT EXISTS `ai_training_jobs` (
+  `id` varchar(36) COLLATE utf8mb4_unicode_ci NOT NULL COMMENT '任务ID',
+  `job_type` enum('manual','auto','samples') COLLATE utf8mb4_unicode_ci NOT NULL DEFAULT 'manual' COMMENT '任务类型',
+  `status` enum('queued','running','completed','failed') COLLATE utf8mb4_unicode_ci NOT NULL DEFAULT 'queued' COMMENT '任务状态',
+  `total_items` int NOT NULL DEFAULT '0' COMMENT '训练条目总数',
+  `processed_items` int NOT NULL DEFAULT '0' COMMENT '已处理条目数（含失败）',
+  `failed_items` int NOT NULL DEFAULT '0' COMMENT '失败条目数',
+  `created_by` int DEFAULT NULL COMMENT '提交用户ID',
+  `error_message` text COLLATE utf8mb4_unicode_ci COMMENT '任务错误信息',
+  `started_at` timestamp NULL DEFAULT NULL COMMENT '开始时间',
+  `heartbeat_at` timestamp NULL DEFAULT NULL COMMENT 'worker最近心跳时间',
+  `finished_at` timestamp NULL DEFAULT NULL COMMENT '结束时间',
+  `created_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+  PRIMARY KEY (`id`),
+  KEY `idx_training_job_status` (`status`, `heartbeat_at`),
+  KEY `idx_training_job_created` (`created_at`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='AI训练任务表';
+
+-- 训练记录关联任务并记录每条内容的训练状态（历史记录视为已训练）
+ALTER TABLE `ai_training_records`
+  ADD COLUMN `job_id` varchar(36) COLLATE utf8mb4_unicode_ci DEFAULT NULL COMMENT '训练任务ID' AFTER `id`,
+  ADD COLUMN `train_status` enum('pending','trained','failed') COLLATE utf8mb4_unicode_ci NOT NULL DEFAULT 'trained' COMMENT '训练状态' AFTER `status`,
+  ADD COLUMN `error_message` varchar(1000) COLLATE utf8mb4_unicode_ci DEFAULT NULL COMMENT '训练失败原因' AFTER `train_status`,
+  ADD COLUMN `trained_at` timestamp NULL DEFAULT NULL COMMENT '训练完成时间' AFTER `error_message`,
+  ADD KEY `idx_training_job` (`job_id`, `train_status`, `id`);
@@ -0,0 +1,21 @@
+-- ============================================================
+-- 百惟数问 - 字段取值词典脚本
+-- 目标：采样业务库低基数文本字段的取值，生成SQL前把问题中提到的取值解析为（表, 字段, 精确取值）
+-- ============================================================
+
+USE vanna;
+
+-- 字段取值词典表（由后台刷新线程或scripts/refresh_value_dictionary.py维护）
+CREATE TABLE IF NOT EXISTS `ai_value_dictionary` (
+  `id` bigint NOT NULL AUTO_INCREMENT COMMENT '主键ID（每次更新重新插入，用于判断词典变化）',
+  `table_name` varchar(64) COLLATE utf8mb4_unicode_ci NOT NULL COMMENT '业务表名',
+  `column_name` varchar(64) COLLATE utf8mb4_unicode_ci NOT NULL COMMENT '字段名',
+  `status` enum('active','high_cardinality') COLLATE utf8mb4_unicode_ci NOT NULL DEFAULT 'active' COMMENT '状态：active-参与匹配，high_cardinality-去重取值超过上限',
+  `value_count` int NOT NULL DEFAULT '0' COMMENT '词典取值数',
+  `value_blob` mediumblob COMMENT '取值列表（zlib压缩的JSON数组）',
+  `watermark` datetime DEFAULT NULL COMMENT '已采样的业务表最大updated_at，为空表示业务表无updated_at',
+  `full_refreshed_at` datetime DEFAULT NULL COMMENT '最近全量采样时间',
+  `updated_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `uk_table_column` (`table_name`,`column_name`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='字段取值词典表';
@@ -15,16 +15,23 @@ USE vanna;
 -- AI训练记录表
 CREATE TABLE IF NOT EXISTS ai_training_records (
     id BIGINT PRIMARY KEY AUTO_INCREMENT COMMENT '主键ID',
+    job_id VARCHAR(36) NULL COMMENT '训练任务ID',
     training_type ENUM('ddl', 'documentation', 'question_sql') NOT NULL COMMENT '训练类型',
     content TEXT NOT NULL COMMENT '训练内容',
     question VARCHAR(500) NULL COMMENT '问题（仅question_sql类型）',
     sql_statement TEXT NULL COMMENT 'SQL语句（仅question_sql类型）',
+    source_table VARCHAR(130) NULL COMMENT '来源表（库名.表名）',
     status TINYINT DEFAULT 1 COMMENT '状态：1-有效，0-无效',
+    train_status ENUM('pending', 'trained', 'failed') NOT NULL DEFAULT 'trained' COMMENT '训练状态',
+    error_message VARCHAR(1000) NULL COMMENT '训练失败原因',
+    trained_at TIMESTAMP NULL DEFAULT NULL COMMENT '训练完成时间',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
     INDEX idx_training_type (training_type),
     INDEX idx_status (status),
-    INDEX idx_created_at (created_at)
+    INDEX idx_created_at (created_at),
+    INDEX idx_training_job (job_id, train_status, id),
+    INDEX idx_training_source (source_table, status)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='AI训练记录表';
 
 -- 问答历史记录表
@@ -52,6 +59,15 @@ CREATE TABLE IF NOT EXISTS sql_generation_stats (
     failed_requests INT DEFAULT 0 COMMENT '失败请求数',
     avg_confidence DECIMAL(3,2) DEFAULT 0.00 COMMENT '平均置信度',
     avg_execution_time INT DEFAULT 0 COMMENT '平均执行时间（毫秒）',
+    execution_time_sum BIGINT DEFAULT 0 COMMENT '执行时间总和（毫秒）',
+    execution_time_sq_sum BIGINT DEFAULT 0 COMMENT '执行时间平方和',
+    latency_histogram JSON NULL COMMENT '执行时间直方图（对数-线性分桶）',
+    p50_execution_time INT DEFAULT 0 COMMENT 'P50执行时间（毫秒）',
+    p95_execution_time INT DEFAULT 0 COMMENT 'P95执行时间（毫秒）',
+    p99_execution_time INT DEFAULT 0 COMMENT 'P99执行时间（毫秒）',
+    first_token_histogram JSON NULL COMMENT '首个token耗时直方图（对数-线性分桶）',
+    p50_first_token_time INT DEFAULT 0 COMMENT 'P50首个token耗时（毫秒）',
+    p95_first_token_time INT DEFAULT 0 COMMENT 'P95首个token耗时（毫秒）',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
     UNIQUE KEY uk_date (date_key),
@@ -80,6 +96,7 @@ CREATE TABLE IF NOT EXISTS `text2sql_messages` (
   `content` text COLLATE utf8mb4_unicode_ci NOT NULL,
   `sql_query` text COLLATE utf8mb4_unicode_ci,
   `query_result` json DEFAULT NULL,
+  `result_ref` varchar(64) GENERATED ALWAYS AS (json_unquote(json_extract(`query_result`,_utf8mb4'$.result_ref'))) VIRTUAL COMMENT '结果引用（大结果存储的清单哈希）',
   `confidence_score` decimal(3,2) DEFAULT NULL,
   `execution_time` int DEFAULT NULL COMMENT '执行时间(毫秒)',
   `created_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP,
@@ -87,6 +104,7 @@ CREATE TABLE IF NOT EXISTS `text2sql_messages` (
   KEY `idx_session_id` (`session_id`),
   KEY `idx_user_id` (`user_id`),
   KEY `idx_created_at` (`created_at`),
+  KEY `idx_user_result_ref` (`user_id`,`result_ref`),
   CONSTRAINT `text2sql_messages_ibfk_1` FOREIGN KEY (`session_id`) REFERENCES `text2sql_sessions` (`id`) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='Text2SQL消息表';
 
@@ -0,0 +1,29 @@
+-- ============================================================
+-- 百惟数问 - SQL生成统计增强脚本
+-- 目标：支持进程内聚合后批量合并，以及P50/P95/P99耗时统计
+-- ============================================================
+
+USE vanna;
+
+ALTER TABLE sql_generation_stats ADD COLUMN execution_time_sum BIGINT DEFAULT 0
+    COMMENT '执行时间总和（毫秒）' AFTER avg_execution_time;
+
+ALTER TABLE sql_generation_stats ADD COLUMN execution_time_sq_sum BIGINT DEFAULT 0
+    COMMENT '执行时间平方和' AFTER execution_time_sum;
+
+ALTER TABLE sql_generation_stats ADD COLUMN latency_histogram JSON NULL
+    COMMENT '执行时间直方图（对数-线性分桶）' AFTER execution_time_sq_sum;
+
+ALTER TABLE sql_generation_stats ADD COLUMN p50_execution_time INT DEFAULT 0
+    COMMENT 'P50执行时间（毫秒）' AFTER latency_histogram;
+
+ALTER TABLE sql_generation_stats ADD COLUMN p95_execution_time INT DEFAULT 0
+    COMMENT 'P95执行时间（毫秒）' AFTER p50_execution_time;
+
+ALTER TABLE sql_generation_stats ADD COLUMN p99_execution_time INT DEFAULT 0
+    COMMENT 'P99执行时间（毫秒）' AFTER p95_execution_time;
+
+-- 回填历史数据的执行时间总和，保证增量平均值计算正确
+UPDATE sql_generation_stats
+SET execution_time_sum = avg_execution_time * total_requests
+WHERE execution_time_sum = 0 AND total_requests > 0;
@@ -0,0 +1,65 @@
+-- ============================================================
+-- 百惟数问 - 工作流列表计数列脚本
+-- 目标：节点数、实例数、成功数、分类数、工作流数冗余到主表，列表查询不再做聚合连接
+-- 说明：计数列由WorkflowService在同一事务内维护，
+--       scripts/workflow_maintenance.py定期按明细表校正
+-- ============================================================
+
+USE dataask;
+
+-- ============================================================
+-- 第一步：工作流计数列
+-- ============================================================
+
+ALTER TABLE enhanced_workflows
+    ADD COLUMN node_count INT NOT NULL DEFAULT 0 COMMENT '启用节点数',
+    ADD COLUMN instance_count INT NOT NULL DEFAULT 0 COMMENT '执行实例数',
+    ADD COLUMN success_count INT NOT NULL DEFAULT 0 COMMENT '成功完成的实例数',
+    ADD INDEX idx_workflow_workspace_updated (workspace_id, updated_at);
+
+-- ============================================================
+-- 第二步：工作域计数列
+-- ============================================================
+
+ALTER TABLE workflow_workspaces
+    ADD COLUMN category_count INT NOT NULL DEFAULT 0 COMMENT '启用分类数',
+    ADD COLUMN workflow_count INT NOT NULL DEFAULT 0 COMMENT '启用/停用状态的工作流数',
+    ADD INDEX idx_workspace_status_order (status, order_num);
+
+-- ============================================================
+-- 第三步：按明细回填
+-- ============================================================
+
+UPDATE enhanced_workflows wf
+LEFT JOIN (
+    SELECT workflow_id, COUNT(*) AS cnt
+    FROM workflow_nodes
+    WHERE status = 'active'
+    GROUP BY workflow_id
+) n ON n.workflow_id = wf.id
+LEFT JOIN (
+    SELECT workflow_id, COUNT(*) AS cnt, SUM(status = 'completed') AS succeeded
+    FROM workflow_instances
+    GROUP BY workflow_id
+) i ON i.workflow_id = wf.id
+SET wf.node_count = COALESCE(n.cnt, 0),
+    wf.instance_count = COALESCE(i.cnt, 0),
+    wf.success_count = COALESCE(i.succeeded, 0),
+    wf.updated_at = wf.updated_at;
+
+UPDATE workflow_workspaces w
+LEFT JOIN (
+    SELECT workspace_id, COUNT(*) AS cnt
+    FROM workflow_categories
+    WHERE status = 'active'
+    GROUP BY workspace_id
+) c ON c.workspace_id = w.id
+LEFT JOIN (
+    SELECT workspace_id, COUNT(*) AS cnt
+    FROM enhanced_workflows
+    WHERE status IN ('active', 'inactive')
+    GROUP BY workspace_id
+) wf ON wf.workspace_id = w.id
+SET w.category_count = COALESCE(c.cnt, 0),
+    w.workflow_count = COALESCE(wf.cnt, 0),
+    w.updated_at = w.updated_at;
@@ -82,10 +82,14 @@ start_backend() {
         return
     fi
     
-    # 启动 Flask 应用
-    export FLASK_APP=app.py
-    export FLASK_ENV=development
-    flask run --host=0.0.0.0 --port=9000 &
+    # 启动 Flask 应用（安装了gunicorn时使用gevent协程worker，SSE长连接不占用线程）
+    if command -v gunicorn >/dev/null 2>&1; then
+        gunicorn -c gunicorn.conf.py wsgi:app &
+    else
+        export FLASK_APP=app.py
+        export FLASK_ENV=development
+        flask run --host=0.0.0.0 --port=9000 --with-threads &
+    fi
     
     # 等待服务启动
     sleep 2
@@ -97,6 +101,16 @@ start_backend() {
     fi
 }
 
+# 启动训练任务worker（独立进程，训练的CPU密集计算不阻塞Web进程的gevent事件循环）
+start_training_worker() {
+    if pgrep -f "scripts/training_worker.py" >/dev/null 2>&1; then
+        print_message "$YELLOW" "训练任务worker已在运行"
+        return
+    fi
+    python scripts/training_worker.py &
+    print_message "$GREEN" "✓ 训练任务worker已启动"
+}
+
 # 主函数
 main() {
     print_message "$GREEN" "=== DataAsk 服务启动脚本 ==="
@@ -109,6 +123,7 @@ main() {
     
     # 启动服务
     start_backend
+    start_training_worker
     
     print_message "$GREEN" "=== 所有服务启动完成 ==="
     print_message "$GREEN" "后端服务地址: http://localhost:9000"
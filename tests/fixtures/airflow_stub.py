@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Airflow REST API桩服务
+在本地端口上模拟 /api/v1/dags/{dag_id}/dagRuns 与 /api/v1/dags/~/dagRuns/list，
+用于测试触发客户端与批量状态同步，不依赖真实的Airflow部署
+"""
+import json
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Optional
+
+
+class AirflowStub:
+    """Airflow REST API桩"""
+
+    def __init__(self, dag_ids: Optional[List[str]] = None):
+        self.dag_ids = set(dag_ids or [])
+        self.dag_runs: Dict[str, Dict[str, Any]] = {}
+        self.requests: List[Dict[str, Any]] = []
+        self.failures: List[int] = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self._server.server_address[1]}/api/v1'
+
+    def start(self) -> 'AirflowStub':
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def fail_next(self, count: int, status: int = 503):
+        """接下来count个请求返回指定错误码"""
+        self.failures.extend([status] * count)
+
+    def set_state(self, dag_run_id: str, state: str):
+        """修改DAG运行状态"""
+        with self._lock:
+            run = self.dag_runs[dag_run_id]
+            run['state'] = state
+            if state in ('success', 'failed'):
+                run['end_date'] = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S+00:00')
+
+    def _trigger(self, dag_id: str, body: Dict[str, Any]):
+        if self.dag_ids and dag_id not in self.dag_ids:
+            return 404, {'detail': f'DAG with dag_id: {dag_id} not found'}
+        dag_run_id = body['dag_run_id']
+        with self._lock:
+            if dag_run_id in self.dag_runs:
+                return 409, {'detail': f'DAGRun with DAG ID: {dag_id} and DAGRun ID: {dag_run_id} already exists'}
+            run = {
+                'dag_id': dag_id,
+                'dag_run_id': dag_run_id,
+                'state': 'queued',
+                'conf': body.get('conf') or {},
+                'start_date': datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S+00:00'),
+                'end_date': None
+            }
+            self.dag_runs[dag_run_id] = run
+        return 200, run
+
+    def _list(self, body: Dict[str, Any]):
+        with self._lock:
+            runs = [run for run in self.dag_runs.values()
+                    if (not body.get('dag_ids') or run['dag_id'] in body['dag_ids'])
+                    and (not body.get('states') or run['state'] in body['states'])]
+        offset = body.get('page_offset', 0)
+        limit = body.get('page_limit', 100)
+        return 200, {'dag_runs': runs[offset:offset + limit], 'total_entries': len(runs)}
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length) or b'{}')
+                stub.requests.append({'path': self.path, 'body': body})
+
+                if stub.failures:
+                    status, payload = stub.failures.pop(0), {'detail': 'stub failure'}
+                elif self.path == '/api/v1/dags/~/dagRuns/list':
+                    status, payload = stub._list(body)
+                elif self.path.startswith('/api/v1/dags/') and self.path.endswith('/dagRuns'):
+                    status, payload = stub._trigger(self.path.split('/')[4], body)
+                else:
+                    status, payload = 404, {'detail': 'not found'}
+
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
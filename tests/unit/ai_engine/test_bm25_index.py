@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+BM25关键词索引与混合检索单元测试
+测试中文二字和标识符切分、增量增删、剪枝结果与完整计算一致、倒数排名融合和混合上下文选取
+"""
+import math
+import random
+from collections import Counter
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, text
+
+try:
+    from AIEngine.bm25_index import BM25Index, tokenize, reciprocal_rank_fusion
+    from AIEngine.vector_index import VectorIndex
+    from AIEngine.example_store import ExampleStore
+except ImportError:
+    pytest.skip("关键词索引模块导入失败，跳过关键词索引测试", allow_module_level=True)
+
+
+def _brute_force(docs, query, average, k1=1.5, b=0.75):
+    """逐文档计算BM25分数"""
+    counts = {doc_id: Counter(tokenize(content)) for doc_id, content in docs.items()}
+    scores = {}
+    for term in set(tokenize(query)):
+        df = sum(1 for c in counts.values() if term in c)
+        if not df:
+            continue
+        idf = math.log(1 + (len(counts) - df + 0.5) / (df + 0.5))
+        for doc_id, c in counts.items():
+            if term in c:
+                norm = k1 * (1 - b + b * sum(c.values()) / average)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * c[term] * (k1 + 1) / (c[term] + norm)
+    return scores
+
+
+class TestBM25Index:
+    """BM25索引测试"""
+
+    def test_tokenize(self):
+        """测试中文切为二字，标识符整体保留并按下划线和驼峰拆分"""
+        tokens = tokenize('统计orderItems表的user_id订单')
+        assert '统计' in tokens and '订单' in tokens and '统' not in tokens
+        assert {'orderitems', 'order', 'items', 'user_id', 'user', 'id'} <= set(tokens)
+        assert tokenize('查 t_order') == ['查', 't_order', 'order']
+
+    def test_identifier_and_term_match(self):
+        """测试表名子词和业务术语命中，按类型过滤"""
+        index = BM25Index()
+        index.add(1, 'CREATE TABLE t_refund_order (id BIGINT, refund_amount DECIMAL)', 'ddl')
+        index.add(2, 'CREATE TABLE t_customer (id BIGINT, customer_name VARCHAR)', 'ddl')
+        index.add(3, '退款金额口径：只统计审核通过的退款单', 'documentation')
+
+        assert index.search('refund统计', k=1)[0][0] == '1'
+        assert index.search('退款金额', k=5, doc_type='documentation') == [('3', pytest.approx(index.search('退款金额')[0][1]))]
+        assert index.search('退款金额', k=5, doc_type='ddl') == []
+        assert index.search('customerName', k=1)[0][0] == '2'
+
+    def test_remove_replace_and_compact(self):
+        """测试删除、同ID替换和压缩后检索结果正确"""
+        index = BM25Index()
+        for i in range(3000):
+            index.add(i, f'表t_{i} 订单数据 {"退款" if i % 3 == 0 else "发货"}', 'ddl')
+        index.add(7, '完全不同的内容 customer', 'ddl')
+        assert index.search('customer', k=5) == [('7', pytest.approx(index.search('customer')[0][1]))]
+
+        for i in range(0, 3000, 2):
+            index.remove(i)
+        assert len(index) == 1500
+        assert len(index._doc_ids) < 3000
+        hits = index.search('退款', k=3000)
+        assert len(hits) == len([i for i in range(1, 3000, 2) if i % 3 == 0 and i != 7])
+        assert not index.remove(0)
+
+    def test_pruned_search_matches_brute_force(self):
+        """测试剪枝检索的前k结果与逐文档计算一致"""
+        rng = random.Random(0)
+        words = ['订单', '客户', '金额', '退款', '物流', '库存', '门店', '渠道'] + [f'词{i}' for i in range(300)]
+        weights = [1.0 / (i + 1) for i in range(len(words))]
+        docs = {str(i): ''.join(rng.choices(words, weights=weights, k=20)) for i in range(2000)}
+        index = BM25Index()
+        for doc_id, content in docs.items():
+            index.add(doc_id, content)
+
+        for _ in range(20):
+            query = ''.join(rng.choices(words, weights=weights, k=4))
+            expected = sorted(_brute_force(docs, query, index._average_length).values(), reverse=True)[:10]
+            assert [score for _, score in index.search(query, k=10)] == pytest.approx(expected, rel=1e-4)
+
+    def test_reciprocal_rank_fusion(self):
+        """测试两路都靠前的结果排在只出现在一路的结果之前"""
+        fused = reciprocal_rank_fusion([['a', 'b', 'c'], ['b', 'd', 'a']], k=60)
+        assert [doc_id for doc_id, _ in fused] == ['b', 'a', 'd', 'c']
+        assert fused[0][1] == pytest.approx(1 / 61 + 1 / 62)
+
+
+class TestHybridContext:
+    """混合检索上下文测试"""
+
+    @pytest.fixture
+    def engine(self):
+        engine = create_engine('sqlite://')
+        with engine.begin() as conn:
+            conn.execute(text("""
+                CREATE TABLE ai_training_records (
+                    id INTEGER PRIMARY KEY, training_type TEXT, content TEXT, question TEXT,
+                    sql_statement TEXT, status INTEGER DEFAULT 1, train_status TEXT DEFAULT 'trained',
+                    updated_at TIMESTAMP DEFAULT '2026-01-01 00:00:00'
+                )
+            """))
+            conn.execute(text("""
+                INSERT INTO ai_training_records (id, training_type, content) VALUES
+                (1, 'ddl', 'CREATE TABLE t_refund (id BIGINT, refund_amount DECIMAL)'),
+                (2, 'ddl', 'CREATE TABLE t_customer (id BIGINT, name VARCHAR)'),
+                (3, 'documentation', '退款金额只统计审核通过的退款'),
+                (4, 'question_sql', 'SELECT 1')
+            """))
+        return engine
+
+    @staticmethod
+    def _embedder(texts):
+        # 向量只区分是否提到客户，模拟语义检索偏向t_customer
+        return np.array([[1.0, 0.0] if ('customer' in t or '客户' in t) else [0.0, 1.0] for t in texts],
+                        dtype=np.float32)
+
+    def test_context_fuses_keyword_and_vector(self, tmp_path, engine):
+        """测试关键词索引从表加载，融合后按类型选取上下文，并同步其他进程的失效"""
+        store = ExampleStore(index=VectorIndex(str(tmp_path)), engine=engine, embedder=self._embedder)
+        store.index.add([1, 2, 3], self._embedder(['refund', 'customer', '退款']), ['ddl', 'ddl', 'documentation'])
+
+        records = store.context('客户退款金额refund', k=1)
+        assert {(r['id'], r['training_type']) for r in records} == {(1, 'ddl'), (3, 'documentation')}
+        assert len(store.keywords) == 4
+
+        with engine.begin() as conn:
+            conn.execute(text("UPDATE ai_training_records SET status = 0, updated_at = '2026-01-02 00:00:00' WHERE id = 3"))
+        # 与上次同步同一秒的记录会重新读取
+        assert store.sync_keywords(force=True) == 4
+        assert '3' not in store.keywords and len(store.keywords) == 3
+        assert store.sync_keywords(force=True) == 1
+
+    def test_backfill_indexes_existing_records(self, tmp_path, engine):
+        """测试补齐已训练但未写入向量索引的记录，删除失效记录的向量，重复执行只处理差异"""
+        store = ExampleStore(index=VectorIndex(str(tmp_path)), engine=engine, embedder=self._embedder)
+        store.index.add([2, 9], self._embedder(['customer', 'gone']), ['ddl', 'ddl'])
+
+        assert store.backfill(batch_size=2) == {'added': 3, 'removed': 1, 'indexed': 4}
+        assert store.index.alive_ids() == {'1', '2', '3', '4'}
+        assert store.backfill() == {'added': 0, 'removed': 0, 'indexed': 4}
+
+    def test_context_without_embedding(self, tmp_path, engine):
+        """测试向量计算失败时仅用关键词检索"""
+        def failing(texts):
+            raise RuntimeError('模型不可用')
+        store = ExampleStore(index=VectorIndex(str(tmp_path)), engine=engine, embedder=failing)
+
+        records = store.context('refund_amount', k=1, training_types=('ddl',))
+        assert [r['id'] for r in records] == [1]
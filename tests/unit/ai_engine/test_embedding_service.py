@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+批量向量计算单元测试
+测试内容缓存、去重、按长度分桶批量计算和结果顺序
+"""
+import threading
+import numpy as np
+import pytest
+
+try:
+    from AIEngine.embedding_service import EmbeddingService, EmbeddingCache, cache_key, normalize_text
+except ImportError:
+    pytest.skip("向量计算模块导入失败，跳过向量计算测试", allow_module_level=True)
+
+
+class FakeEncoder:
+    """按文本长度生成向量并记录每次调用的批次"""
+
+    def __init__(self):
+        self.batches = []
+        self._lock = threading.Lock()
+
+    def __call__(self, texts):
+        with self._lock:
+            self.batches.append(list(texts))
+        return np.array([[len(t), float(sum(map(ord, t)) % 97), 1.0] for t in texts], dtype=np.float32)
+
+
+@pytest.fixture
+def encoder():
+    return FakeEncoder()
+
+
+@pytest.fixture
+def service(tmp_path, encoder):
+    service = EmbeddingService(model_id='fake-model', encoder=encoder,
+                               cache=EmbeddingCache(str(tmp_path / 'cache.sqlite3')), batch_size=4, workers=2)
+    yield service
+    service.shutdown()
+
+
+class TestEmbeddingService:
+    """向量计算测试"""
+
+    def test_cache_key_normalizes_text(self):
+        """测试空白和全角字符差异不影响缓存键，模型不同则键不同"""
+        assert normalize_text('  订单\n  表 ') == '订单 表'
+        assert cache_key('m', 'ＳＥＬＥＣＴ  1') == cache_key('m', 'SELECT 1')
+        assert cache_key('m', 'SELECT 1') != cache_key('other', 'SELECT 1')
+
+    def test_batches_by_length_and_keeps_order(self, service, encoder):
+        """测试未命中文本去重后按长度分桶，返回顺序与输入一致"""
+        texts = ['a' * n for n in (9, 1, 5, 3, 7, 2, 8, 4, 6, 10)] + ['a' * 5]
+
+        vectors = service.embed(texts)
+
+        assert vectors.shape == (11, 3)
+        assert vectors[:, 0].tolist() == [float(len(t)) for t in texts]
+        assert sorted(len(batch) for batch in encoder.batches) == [2, 4, 4]
+        assert [1, 2, 3, 4] in [[len(t) for t in batch] for batch in encoder.batches]
+
+    def test_cached_texts_are_not_recomputed(self, service, encoder, tmp_path):
+        """测试已计算的文本命中缓存，新实例（新进程）同样命中"""
+        service.embed(['CREATE TABLE a (id INT)', '订单表说明'])
+        encoder.batches.clear()
+
+        service.embed(['CREATE TABLE a  (id INT)', '订单表说明', '新文档'])
+        assert encoder.batches == [['新文档']]
+        assert service.get_stats()['cache_hits'] == 2
+
+        other = EmbeddingService(model_id='fake-model', encoder=encoder,
+                                 cache=EmbeddingCache(str(tmp_path / 'cache.sqlite3')), batch_size=4, workers=1)
+        encoder.batches.clear()
+        other.embed(['订单表说明'])
+        assert encoder.batches == []
+        other.shutdown()
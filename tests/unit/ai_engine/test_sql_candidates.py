@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+多候选SQL生成单元测试
+测试SQL提取、语法检查、EXPLAIN代价评估和第一个可执行候选优先返回
+"""
+import time
+import threading
+import pytest
+
+try:
+    from AIEngine.sql_candidates import CandidateGenerator, SqlValidator, check_sql, extract_sql
+except ImportError:
+    pytest.skip("多候选生成模块导入失败，跳过多候选生成测试", allow_module_level=True)
+
+
+class FakeDatabase:
+    """不存在的表EXPLAIN报错，表名中的big返回大行数"""
+
+    def execute_query(self, sql, params=None):
+        if 'missing' in sql:
+            raise RuntimeError("Table 'missing' doesn't exist")
+        return [{'rows': 10_000_000 if 'big' in sql else 100, 'filtered': 50.0}]
+
+
+def _generator(replies, delays, timeout=5):
+    """按温度返回预设回复和耗时的生成器"""
+    calls = []
+    lock = threading.Lock()
+
+    def complete(messages, temperature):
+        with lock:
+            calls.append(temperature)
+        time.sleep(delays[temperature])
+        return replies[temperature]
+
+    generator = CandidateGenerator(
+        complete=complete, validator=SqlValidator(db_provider=FakeDatabase, max_cost=1000),
+        retriever=lambda question: ([{'training_type': 'ddl', 'content': 'CREATE TABLE t (a INT)'}], []),
+        temperatures=sorted(replies), timeout=timeout, workers=4
+    )
+    return generator, calls
+
+
+class TestSqlCheck:
+    """SQL提取与语法检查测试"""
+
+    def test_extract_sql(self):
+        """测试从代码块和普通文本中提取第一条语句"""
+        assert extract_sql("说明\n```sql\nSELECT a FROM t;\n```") == 'SELECT a FROM t'
+        assert extract_sql("查询语句如下：select ';' AS x from t; 解释") == "select ';' AS x from t"
+        assert extract_sql('无法回答') is None
+
+    def test_check_sql(self):
+        """测试只允许单条查询语句"""
+        assert check_sql("SELECT REPLACE(name, 'a', 'b') FROM t WHERE note = 'drop table; x'") is None
+        assert check_sql('WITH x AS (SELECT 1) SELECT * FROM x') is None
+        assert check_sql('SELECT 1; DROP TABLE t') == '包含多条语句'
+        assert check_sql('DELETE FROM t') == '不是查询语句'
+        assert check_sql('SELECT * FROM t INTO OUTFILE "/tmp/x"').startswith('包含不允许的关键字')
+        assert check_sql("SELECT 'abc FROM t") == '引号未闭合'
+        assert check_sql('SELECT (1 FROM t') == '括号不匹配'
+
+    def test_validator_cost(self):
+        """测试EXPLAIN失败为不可执行，估算行数超过上限为代价过高"""
+        validator = SqlValidator(db_provider=FakeDatabase, max_cost=1000)
+        assert validator.validate('SELECT * FROM missing')['valid'] is False
+        assert validator.validate('SELECT * FROM t') == {'valid': True, 'reason': None, 'cost': 50.0, 'cheap': True}
+        assert validator.validate('SELECT * FROM big')['cheap'] is False
+
+
+class TestCandidateGenerator:
+    """多候选生成测试"""
+
+    def test_first_valid_wins(self):
+        """测试最快的候选不可执行时返回下一个可执行候选，不等待更慢的候选"""
+        generator, _ = _generator(
+            {0.0: 'SELECT * FROM missing', 0.4: 'SELECT * FROM t', 0.8: 'SELECT * FROM t2'},
+            {0.0: 0.01, 0.4: 0.05, 0.8: 2.0}
+        )
+        started = time.monotonic()
+        result = generator.generate('问题')
+        assert time.monotonic() - started < 1.0
+        assert result['success'] and result['data']['sql'] == 'SELECT * FROM t'
+        assert result['data']['temperature'] == 0.4
+        assert result['data']['rejected'][0]['reason'].startswith('EXPLAIN失败')
+        generator.shutdown()
+
+    def test_expensive_fallback_and_failure(self):
+        """测试都代价过高时返回代价最小的候选，都不可执行时返回失败原因"""
+        generator, _ = _generator({0.0: 'SELECT * FROM big', 0.4: 'SELECT * FROM big b JOIN big c'},
+                                  {0.0: 0.01, 0.4: 0.02})
+        result = generator.generate('问题')
+        assert result['data']['sql'] == 'SELECT * FROM big' and result['data']['estimated_cost'] == 5_000_000
+
+        generator, _ = _generator({0.0: 'SELECT * FROM missing', 0.4: '无法回答'}, {0.0: 0.01, 0.4: 0.01})
+        result = generator.generate('问题')
+        assert result['success'] is False and '未生成SQL' in result['error']
+
+    def test_timeout_returns_error(self):
+        """测试超时且没有可执行候选时返回失败"""
+        generator, _ = _generator({0.0: 'SELECT * FROM t'}, {0.0: 1.0}, timeout=0.1)
+        result = generator.generate('问题')
+        assert result['success'] is False and '超时' in result['error']
+        generator.shutdown()
+
+    def test_single_candidate_source(self):
+        """测试默认生成路径的单候选实例使用检索上下文并标记来源"""
+        generator, calls = _generator({0.0: 'SELECT * FROM t'}, {0.0: 0.01})
+        generator.source = 'retrieval'
+        result = generator.generate('问题')
+        assert calls == [0.0]
+        assert result['data']['source'] == 'retrieval' and result['data']['candidates'] == 1
+        generator.shutdown()
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+SQL自动修复单元测试
+测试错误归类、表结构片段、修复重试、尝试次数限制和修复缓存
+"""
+import pytest
+
+try:
+    import fakeredis
+    from AIEngine.sql_repair import SqlRepairer, error_class, referenced_tables, sql_fingerprint
+except ImportError:
+    pytest.skip("SQL修复模块导入失败，跳过SQL修复测试", allow_module_level=True)
+
+
+COLUMNS = {'orders': [('id', 'int'), ('amount', 'decimal(10,2)'), ('region', 'varchar(50)')]}
+
+
+class FakeDatabase:
+    """INFORMATION_SCHEMA查询返回预设的表结构"""
+
+    def execute_query(self, sql, params=None):
+        if 'INFORMATION_SCHEMA.COLUMNS' in sql:
+            tables = [value for key, value in params.items() if key != 'schema']
+            return [{'table_name': table, 'column_name': name, 'column_type': kind, 'column_comment': ''}
+                    for table in tables for name, kind in COLUMNS.get(table, [])]
+        return [{'table_name': table} for table in COLUMNS]
+
+
+class FakeExecutor:
+    """只有引用存在的字段时执行成功"""
+
+    def __init__(self):
+        self.executed = []
+
+    def __call__(self, sql):
+        self.executed.append(sql)
+        if 'order_list' in sql:
+            return {'success': False, 'error': "(1146, \"Table 'dataask.order_list' doesn't exist\")"}
+        if 'total' in sql:
+            return {'success': False, 'error': "(1054, \"Unknown column 'total' in 'field list'\")"}
+        return {'success': True, 'data': [], 'columns': [], 'row_count': 0}
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True)
+
+
+def _repairer(replies, redis_client, max_attempts=2):
+    prompts = []
+
+    def complete(messages, timeout):
+        prompts.append(messages[-1]['content'])
+        return replies[len(prompts) - 1]
+
+    repairer = SqlRepairer(complete=complete, db_provider=FakeDatabase, redis_provider=lambda: redis_client,
+                           schema='dataask', max_attempts=max_attempts, deadline=10)
+    return repairer, prompts
+
+
+class TestHelpers:
+    """辅助函数测试"""
+
+    def test_error_class(self):
+        """测试优先使用MySQL错误码，没有错误码时按关键字归类"""
+        assert error_class("(1054, \"Unknown column 'x'\")") == '1054'
+        assert error_class('Lost connection to MySQL server') == 'connection'
+        assert error_class('奇怪的错误') == 'other'
+
+    def test_fingerprint_and_tables(self):
+        """测试指纹忽略空白和结尾分号，表名去掉库名前缀"""
+        assert sql_fingerprint('SELECT  1\n FROM t;') == sql_fingerprint('SELECT 1 FROM t')
+        assert sql_fingerprint("SELECT 1 FROM t WHERE a = 'x'") != sql_fingerprint("SELECT 1 FROM t WHERE a = 'y'")
+        assert referenced_tables('SELECT * FROM dataask.`orders` o JOIN regions r ON 1 = 1') == ['orders', 'regions']
+
+
+class TestSqlRepairer:
+    """修复流程测试"""
+
+    def test_repair_with_schema_slice_and_cache(self, redis_client):
+        """测试错误信息和表结构交给大模型，修复成功后相同错误直接命中缓存"""
+        repairer, prompts = _repairer(['```sql\nSELECT SUM(amount) FROM orders\n```'], redis_client)
+        executor = FakeExecutor()
+        failed = 'SELECT SUM(total) FROM orders'
+        result, repair = repairer.repair(failed, executor(failed), executor, question='销售总额')
+
+        assert result['success'] and repair['repaired'] and repair['sql'] == 'SELECT SUM(amount) FROM orders'
+        assert "Unknown column 'total'" in prompts[0] and 'amount decimal(10,2)' in prompts[0]
+        assert '销售总额' in prompts[0]
+
+        result, repair = repairer.repair(failed, executor(failed), executor)
+        assert result['success'] and repair['attempts'][0]['cached'] is True
+        assert len(prompts) == 1
+
+    def test_multi_step_repair(self, redis_client):
+        """测试第一次修复仍失败时以新错误继续，成功后每一步的失败SQL都缓存"""
+        repairer, prompts = _repairer([
+            'SELECT SUM(total) FROM orders',
+            'SELECT SUM(amount) FROM orders',
+        ], redis_client)
+        executor = FakeExecutor()
+        failed = 'SELECT SUM(total) FROM order_list'
+        result, repair = repairer.repair(failed, executor(failed), executor)
+
+        assert result['success'] and [attempt['error_class'] for attempt in repair['attempts']] == ['1146', '1054']
+        assert '名称相近的表：orders' in prompts[0]
+        assert len(redis_client.keys('ai:sql_repair:*')) == 2
+
+    def test_bounded_and_unrepairable(self, redis_client):
+        """测试超过尝试次数停止，修复结果不是只读查询时拒绝，连接错误不修复"""
+        repairer, prompts = _repairer(['SELECT SUM(total) FROM orders'] * 3, redis_client, max_attempts=1)
+        executor = FakeExecutor()
+        failed = 'SELECT SUM(total) FROM order_list'
+        result, repair = repairer.repair(failed, executor(failed), executor)
+        assert not result['success'] and not repair['repaired'] and len(prompts) == 1
+        assert redis_client.keys('ai:sql_repair:*') == []
+
+        repairer, _ = _repairer(["SELECT * FROM orders INTO OUTFILE '/tmp/x'"], redis_client)
+        _, repair = repairer.repair(failed, executor(failed), executor)
+        assert repair['attempts'][0]['error'].startswith('包含不允许的关键字') and len(executor.executed) == 3
+
+        _, repair = repairer.repair(failed, {'success': False, 'error': '(2013, "Lost connection")'}, executor)
+        assert repair['attempts'] == []
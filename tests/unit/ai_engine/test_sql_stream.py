@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+流式SQL生成单元测试
+测试SQL增量提取、事件顺序、校验结果缓存和缓存命中
+"""
+import pytest
+
+try:
+    import fakeredis
+    from AIEngine.sql_candidates import SqlValidator
+    from AIEngine.sql_stream import IncrementalSqlExtractor, SqlStreamer, sql_cache_key
+except ImportError:
+    pytest.skip("流式生成模块导入失败，跳过流式生成测试", allow_module_level=True)
+
+
+class FakeDatabase:
+    """不存在的表EXPLAIN报错"""
+
+    def execute_query(self, sql, params=None):
+        if 'missing' in sql:
+            raise RuntimeError("Table 'missing' doesn't exist")
+        return [{'rows': 10, 'filtered': 100.0}]
+
+
+def _feed(chunks):
+    extractor = IncrementalSqlExtractor()
+    return [extractor.feed(chunk) for chunk in chunks], extractor
+
+
+def _streamer(chunks, redis_client):
+    calls = []
+
+    def stream(messages, temperature):
+        calls.append(messages)
+        yield from chunks
+
+    streamer = SqlStreamer(stream=stream, validator=SqlValidator(db_provider=FakeDatabase),
+                           retriever=lambda question: ([], []), redis_provider=lambda: redis_client)
+    return streamer, calls
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True)
+
+
+class TestIncrementalSqlExtractor:
+    """SQL增量提取测试"""
+
+    def test_fenced(self):
+        """测试代码块标记未输出完整时不产出，结尾的反引号暂不产出"""
+        fragments, extractor = _feed(['好的\n``', '`sql\nSELECT a', ' FROM t`', '`', '`\n说明 SELECT b'])
+        assert fragments == ['', 'SELECT a', ' FROM t', '', '']
+        assert ''.join(fragments) == extractor.result() == 'SELECT a FROM t'
+
+    def test_plain_statement(self):
+        """测试无代码块时从SELECT开始，遇到分号结束"""
+        fragments, extractor = _feed(['查询：SEL', 'ECT * FROM t WHERE x = \';\'', '; 以上'])
+        assert fragments == ['', "SELECT * FROM t WHERE x = ';'", '']
+        assert extractor.result() == "SELECT * FROM t WHERE x = ';'"
+
+
+class TestSqlStreamer:
+    """流式生成测试"""
+
+    def test_events_and_cache(self, redis_client):
+        """测试逐段转发后推送校验结果，校验通过的SQL写入缓存，再次请求直接返回"""
+        streamer, calls = _streamer(['```sql\n', 'SELECT a ', 'FROM t', '\n```'], redis_client)
+        events = list(streamer.stream('各区域销售额'))
+        assert [event for event, _ in events] == ['token', 'token', 'sql', 'token', 'sql', 'token', 'final']
+        final = events[-1][1]
+        assert final['sql'] == 'SELECT a FROM t' and final['valid'] and final['cached'] is False
+        assert final['first_token_ms'] is not None
+        assert redis_client.get(final['cache_key']) == 'SELECT a FROM t'
+        assert final['cache_key'] == sql_cache_key(' 各区域销售额 ')
+
+        events = list(streamer.stream('各区域销售额'))
+        assert len(events) == 1 and events[0][0] == 'final'
+        assert events[0][1]['sql'] == 'SELECT a FROM t' and events[0][1]['cached'] is True
+        assert len(calls) == 1
+
+    def test_invalid_not_cached(self, redis_client):
+        """测试EXPLAIN失败的SQL不缓存"""
+        streamer, _ = _streamer(['SELECT * FROM missing'], redis_client)
+        final = list(streamer.stream('问题'))[-1][1]
+        assert final['valid'] is False and final['reason'].startswith('EXPLAIN失败')
+        assert redis_client.get(final['cache_key']) is None
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+训练样本向量索引单元测试
+测试追加写入、按类型过滤、删除、聚类检索召回率和跨实例（进程）读取
+"""
+import numpy as np
+import pytest
+
+try:
+    from AIEngine.vector_index import VectorIndex
+except ImportError:
+    pytest.skip("向量索引模块导入失败，跳过向量索引测试", allow_module_level=True)
+
+
+def _clustered(n, dim=32, clusters=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    return (centers[rng.integers(0, clusters, n)] + 0.3 * rng.normal(size=(n, dim))).astype(np.float32)
+
+
+class TestVectorIndex:
+    """向量索引测试"""
+
+    def test_add_search_and_filter(self, tmp_path):
+        """测试追加后检索到自身，按训练类型过滤"""
+        index = VectorIndex(str(tmp_path))
+        vectors = _clustered(200)
+        types = ['question_sql' if i % 2 else 'ddl' for i in range(200)]
+        index.add(range(200), vectors, types)
+
+        assert index.search(vectors[7], k=1)[0][0] == '7'
+        hits = index.search(vectors[7], k=5, training_type='ddl')
+        assert len(hits) == 5 and all(int(record_id) % 2 == 0 for record_id, _ in hits)
+        assert index.search(vectors[7], k=5, training_type='unknown') == []
+
+    def test_remove_and_readd(self, tmp_path):
+        """测试删除后不再返回，同一ID重新写入时替换旧向量"""
+        index = VectorIndex(str(tmp_path))
+        vectors = _clustered(50)
+        index.add(range(50), vectors, ['ddl'] * 50)
+
+        assert index.remove(['3', '999']) == 1
+        assert '3' not in [record_id for record_id, _ in index.search(vectors[3], k=5)]
+
+        index.add(['4'], vectors[3:4], ['ddl'])
+        assert index.search(vectors[3], k=1)[0][0] == '4'
+        assert index.stats()['alive'] == 49
+
+    def test_ivf_recall_after_training(self, tmp_path):
+        """测试样本数达到阈值后训练聚类，检索召回率接近暴力检索"""
+        index = VectorIndex(str(tmp_path), nprobe=8, train_threshold=2000)
+        vectors = _clustered(3000)
+        for start in range(0, 3000, 500):
+            index.add(range(start, start + 500), vectors[start:start + 500], ['question_sql'] * 500)
+        assert index.stats()['nlist'] > 0
+
+        normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        queries = _clustered(20, seed=1)
+        recall = 0.0
+        for query in queries:
+            truth = set(np.argsort(-(normalized @ (query / np.linalg.norm(query))))[:10].tolist())
+            recall += len(truth & {int(record_id) for record_id, _ in index.search(query, k=10)}) / 10
+        assert recall / len(queries) >= 0.9
+
+    def test_other_instance_sees_writes(self, tmp_path):
+        """测试另一个实例（模拟其他worker进程）重新加载后看到新增和删除"""
+        writer = VectorIndex(str(tmp_path))
+        reader = VectorIndex(str(tmp_path), reload_interval=0)
+        vectors = _clustered(20)
+        writer.add(range(10), vectors[:10], ['ddl'] * 10)
+        assert reader.search(vectors[5], k=1)[0][0] == '5'
+
+        writer.add(range(10, 20), vectors[10:], ['ddl'] * 10)
+        writer.remove(['15'])
+        assert reader.search(vectors[12], k=1)[0][0] == '12'
+        assert '15' not in [record_id for record_id, _ in reader.search(vectors[15], k=3)]
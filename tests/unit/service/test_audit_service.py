@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+审计日志服务单元测试
+测试键集分页游标、汇总统计读取和分区维护语句
+"""
+from datetime import date, datetime
+from unittest.mock import patch
+import pytest
+
+try:
+    from service.audit_service import AuditService, _encode_cursor, _decode_cursor
+    from tools.exceptions import ValidationException
+except ImportError:
+    pytest.skip("审计服务模块导入失败，跳过审计服务测试", allow_module_level=True)
+
+
+@pytest.fixture
+def audit_service(db_service):
+    with patch('service.audit_service.get_database_service', return_value=db_service):
+        return AuditService()
+
+
+def make_row(log_id, operation_time):
+    return {
+        'id': log_id, 'user_id': 1, 'username': 'admin', 'user_code': 'U001', 'org_code': 'O001',
+        'module': 'system', 'operation': 'update', 'target_type': 'user', 'target_id': '1',
+        'target_name': 'admin', 'operation_desc': '修改用户', 'ip_address': '127.0.0.1',
+        'user_agent': 'pytest', 'operation_time': operation_time, 'result': 'success',
+        'error_message': None
+    }
+
+
+class TestAuditCursor:
+    """分页游标测试"""
+
+    def test_roundtrip(self):
+        """测试游标编码解码"""
+        moment = datetime(2025, 8, 1, 12, 30, 5)
+        assert _decode_cursor(_encode_cursor(moment, 42)) == (moment, 42)
+
+    def test_invalid_cursor(self):
+        """测试非法游标"""
+        with pytest.raises(ValidationException):
+            _decode_cursor('not-a-cursor')
+
+
+class TestAuditService:
+    """审计日志服务测试"""
+
+    def test_keyset_page_returns_next_cursor(self, audit_service, db_service):
+        """测试多取一行判断是否有下一页并生成游标"""
+        moment = datetime(2025, 8, 1, 12, 0, 0)
+        rows = [make_row(i, moment) for i in (30, 29, 28)]
+        db_service.execute_query.side_effect = [rows, [{'total': 100}]]
+
+        result = audit_service.get_audit_logs(page_size=2, operator='admin')
+
+        assert result['success'] is True
+        assert [item['id'] for item in result['data']['list']] == [30, 29]
+        assert _decode_cursor(result['data']['next_cursor']) == (moment, 29)
+        assert result['data']['total'] == 100
+
+        sql, params = db_service.execute_query.call_args_list[0][0]
+        assert 'ORDER BY operation_time DESC, id DESC' in sql
+        assert params['limit'] == 3 and params['offset'] == 0
+
+    def test_cursor_replaces_offset(self, audit_service, db_service):
+        """测试提供游标时使用键集条件而非OFFSET"""
+        db_service.execute_query.side_effect = [[], [{'total': 0}]]
+        cursor = _encode_cursor(datetime(2025, 8, 1, 12, 0, 0), 29)
+
+        result = audit_service.get_audit_logs(page=5, page_size=2, cursor=cursor)
+
+        sql, params = db_service.execute_query.call_args_list[0][0]
+        assert 'id < :cursor_id' in sql
+        assert params['offset'] == 0 and params['cursor_id'] == 29
+        assert result['data']['next_cursor'] is None
+
+    def test_stats_invalid_dimension(self, audit_service):
+        """测试非法统计维度"""
+        with pytest.raises(ValidationException):
+            audit_service.get_audit_stats(dimension='year')
+
+    def test_rotate_partitions(self, audit_service, db_service):
+        """测试新建未来分区并删除过期分区"""
+        db_service.execute_query.return_value = [
+            {'name': 'p202401', 'description': str(date(2024, 2, 1).toordinal() + 365)},
+            {'name': 'p202508', 'description': str(date(2025, 9, 1).toordinal() + 365)},
+            {'name': 'pmax', 'description': 'MAXVALUE'},
+        ]
+
+        result = audit_service.rotate_partitions(
+            months_ahead=1, retention_months=12, today=date(2025, 9, 15)
+        )
+
+        assert result['data']['created'] == ['p202509', 'p202510']
+        assert result['data']['dropped'] == ['p202401']
+        statements = [c[0][0] for c in db_service.execute_update.call_args_list]
+        assert "TO_DAYS('2025-11-01')" in statements[1]
+        assert 'DROP PARTITION p202401' in statements[2]
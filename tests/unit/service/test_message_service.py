@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+消息中心服务单元测试
+测试扇出批量写入、未读数计数与重建、数据库侧过滤
+"""
+from unittest.mock import MagicMock
+import pytest
+
+try:
+    import fakeredis
+    from service.message_service import MessageService, UNREAD_KEY
+    from tools.exceptions import ValidationException
+except ImportError:
+    pytest.skip("消息服务模块导入失败，跳过消息服务测试", allow_module_level=True)
+
+
+@pytest.fixture
+def message_service(db_service):
+    service = MessageService(db=db_service, redis_provider=lambda: None, fanout_workers=1,
+                             event_bus=MagicMock())
+    service.fanout_batch = 2
+    return service
+
+
+class TestMessageService:
+    """消息中心服务测试"""
+
+    def test_list_filters_in_database(self, message_service, db_service):
+        """测试过滤条件下推到SQL"""
+        db_service.execute_query.side_effect = [[{'total': 0}], []]
+
+        result = message_service.get_messages(message_type='system', status='sent', sender='管理')
+
+        assert result['success'] is True
+        sql, params = db_service.execute_query.call_args_list[1][0]
+        assert 'm.type = :type' in sql and 'm.status = :status' in sql
+        assert params['sender'] == '管理%'
+
+    def test_fanout_multi_row_insert(self, message_service, db_service):
+        """测试定向消息按批多行写入收件箱并累加未读数"""
+        db_service.execute_query.side_effect = [
+            [{'recipient_type': 'org', 'recipient_scope': '["05"]'}],
+            [{'id': 1}, {'id': 2}],
+            [{'id': 3}],
+            [],
+        ]
+        db_service.execute_update.side_effect = [2, 1, 1]
+        message_service.counter.incr_many = MagicMock()
+
+        message_service._fanout(10)
+
+        inserts = [c[0] for c in db_service.execute_update.call_args_list[:2]]
+        assert 'VALUES (:u0, :message_id), (:u1, :message_id)' in inserts[0][0]
+        assert inserts[1][1] == {'message_id': 10, 'u0': 3}
+        message_service.counter.incr_many.assert_any_call(UNREAD_KEY, [1, 2])
+        message_service.events.publish_many.assert_any_call([3], 'message', {'id': 10, 'title': None, 'type': None})
+        final_sql, final_params = db_service.execute_update.call_args_list[2][0]
+        assert "status = 'sent'" in final_sql and final_params['delivered'] == 3
+
+    def test_resumed_fanout_invalidates_counts(self, message_service, db_service):
+        """测试重新扇出时部分行已存在则清除计数而非累加"""
+        db_service.execute_query.side_effect = [
+            [{'recipient_type': 'users', 'recipient_scope': '[1, 2]'}],
+            [{'id': 1}, {'id': 2}],
+        ]
+        db_service.execute_update.side_effect = [1, 1]
+        message_service.counter.incr_many = MagicMock()
+        message_service.counter.invalidate_users = MagicMock()
+
+        message_service._fanout(11)
+
+        message_service.counter.incr_many.assert_not_called()
+        message_service.counter.invalidate_users.assert_called_once_with([1, 2])
+
+    def test_fanout_skips_message_claimed_by_other_process(self, db_service):
+        """测试其他进程正在扇出的消息不重复扇出，认领过期后才恢复"""
+        server = fakeredis.FakeServer()
+        client = fakeredis.FakeRedis(server=server, decode_responses=True)
+        service = MessageService(db=db_service, redis_provider=lambda: client, fanout_workers=1,
+                                 event_bus=MagicMock())
+        client.set('message:fanout:12', 'other-worker', ex=60)
+        db_service.execute_query.return_value = [{'id': 12}]
+
+        assert service.resume_pending() == 0
+        service._fanout(12)
+        assert db_service.execute_query.call_count == 1
+        service.events.publish_many.assert_not_called()
+
+        client.delete('message:fanout:12')
+        assert service.resume_pending() == 1
+
+    def test_fanout_releases_claim(self, message_service, db_service):
+        """测试扇出完成后释放认领，只释放本进程持有的认领"""
+        client = fakeredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True)
+        message_service._redis_provider = lambda: client
+        db_service.execute_query.side_effect = [
+            [{'recipient_type': 'users', 'recipient_scope': '[1]'}],
+            [{'id': 1}],
+        ]
+        db_service.execute_update.side_effect = [1, 1]
+        message_service.counter.incr_many = MagicMock()
+
+        message_service._fanout(13)
+
+        assert client.get('message:fanout:13') is None
+        final_sql = db_service.execute_update.call_args_list[-1][0][0]
+        assert "status = 'sent'" in final_sql
+
+    def test_unread_count_without_redis(self, message_service, db_service):
+        """测试Redis不可用时从数据库计算未读数"""
+        db_service.execute_query.return_value = [{'unread': 3, 'broadcast_read': 1, 'broadcast_total': 4}]
+
+        assert message_service.get_unread_count(7)['data']['unread'] == 6
+
+    def test_unread_count_rebuilds_missing_fields(self, db_service):
+        """测试Redis字段缺失时重建计数"""
+        client = MagicMock()
+        read_pipe, write_pipe = MagicMock(), MagicMock()
+        read_pipe.execute.return_value = [None, None, '4']
+        client.pipeline.side_effect = [read_pipe, write_pipe]
+        db_service.execute_query.return_value = [{'unread': 2, 'broadcast_read': 4, 'broadcast_total': 4}]
+        service = MessageService(db=db_service, redis_provider=lambda: client, fanout_workers=1,
+                             event_bus=MagicMock())
+
+        assert service.counter.get(7) == 2
+        write_pipe.hset.assert_any_call(UNREAD_KEY, '7', 2)
+
+    def test_validate_recipients(self, message_service):
+        """测试定向消息必须指定接收对象"""
+        with pytest.raises(ValidationException):
+            message_service.create_message(
+                {'title': 't', 'content': 'c', 'type': 'system', 'recipient_type': 'users'}, 1, 'admin'
+            )
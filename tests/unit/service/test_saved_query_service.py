@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+保存查询服务单元测试
+测试SQL校验、按水位增量刷新和全量结果未变化时跳过重写
+"""
+import json
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+import pytest
+
+try:
+    from sqlalchemy import create_engine, text
+    from service.saved_query_service import SavedQueryService, validate_select_sql, build_refresh_sql
+    from tools.exceptions import ValidationException
+except ImportError:
+    pytest.skip("保存查询服务模块导入失败，跳过保存查询服务测试", allow_module_level=True)
+
+
+def _saved_row(**overrides):
+    data = {
+        'id': 1, 'user_id': 9, 'session_id': None, 'name': '每日订单', 'question': '每天的订单',
+        'sql_query': 'SELECT id, amount, created_at FROM orders', 'watermark_column': 'created_at',
+        'key_columns': '["id"]', 'refresh_interval': 3600, 'status': 'active', 'columns': None,
+        'row_count': 0, 'result_digest': None, 'last_watermark': None, 'last_refreshed_at': None,
+        'last_refresh_ms': None, 'refresh_error': None, 'next_refresh_at': None, 'created_at': None
+    }
+    data.update(overrides)
+    return SimpleNamespace(_mapping=data, **data)
+
+
+@pytest.fixture
+def source_engine(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path / "source.db"}')
+    with engine.begin() as conn:
+        conn.execute(text('CREATE TABLE orders (id INTEGER, amount INTEGER, created_at TEXT)'))
+        conn.execute(text('INSERT INTO orders VALUES (1, 10, "2025-08-01 10:00:00"), '
+                          '(2, 20, "2025-08-02 10:00:00"), (3, 30, "2025-08-03 10:00:00")'))
+    return engine
+
+
+@pytest.fixture
+def store():
+    engine = MagicMock()
+    reader, writer = MagicMock(), MagicMock()
+    engine.connect.return_value.__enter__.return_value = reader
+    engine.begin.return_value.__enter__.return_value = writer
+    return SimpleNamespace(engine=engine, reader=reader, writer=writer)
+
+
+def _statements(conn, fragment):
+    return [c[0][1] for c in conn.execute.call_args_list if fragment in str(c[0][0])]
+
+
+class TestSavedQuerySql:
+    """保存查询SQL校验测试"""
+
+    def test_accepts_single_select(self):
+        """测试接受单条SELECT，字符串中的分号和关键字不影响判断"""
+        sql = "SELECT name FROM t WHERE note = 'a; delete' AND updated_at > '2025-01-01';"
+        assert validate_select_sql(sql) == sql.rstrip(';')
+
+    @pytest.mark.parametrize('sql', [
+        'DELETE FROM t',
+        'SELECT 1; DROP TABLE t',
+        'SELECT * FROM t INTO OUTFILE "/tmp/x"',
+        'SELECT * FROM t FOR UPDATE',
+    ])
+    def test_rejects_non_readonly(self, sql):
+        """测试拒绝写操作和多条语句"""
+        with pytest.raises(ValidationException):
+            validate_select_sql(sql)
+
+    def test_incremental_sql_filters_on_watermark(self):
+        """测试增量查询在外层按水位过滤"""
+        assert build_refresh_sql('SELECT * FROM t', 'created_at', True) == \
+            'SELECT * FROM (SELECT * FROM t) AS saved_q WHERE saved_q.`created_at` >= :watermark ' \
+            'ORDER BY saved_q.`created_at`'
+
+
+class TestSavedQueryRefresh:
+    """物化刷新测试"""
+
+    def test_incremental_refresh_fetches_only_new_rows(self, source_engine, store):
+        """测试增量刷新只拉取水位之后的行并按键合并，水位前进"""
+        saved = _saved_row(last_watermark='2025-08-02 10:00:00')
+        store.reader.execute.return_value.fetchone.return_value = saved
+        store.writer.execute.return_value.fetchone.return_value = saved
+        store.writer.execute.return_value.scalar.return_value = 4
+
+        result = SavedQueryService(store.engine, source_engine).refresh(1)
+
+        assert result['data']['mode'] == 'incremental' and result['data']['fetched'] == 2
+        inserted = _statements(store.writer, 'INSERT INTO text2sql_saved_query_rows')[0]
+        assert [json.loads(row['row_data'])['id'] for row in inserted] == [2, 3]
+        update = _statements(store.writer, 'UPDATE text2sql_saved_queries')[0]
+        assert update['watermark'] == '2025-08-03 10:00:00' and update['incremental'] is True
+        assert not _statements(store.writer, 'DELETE FROM text2sql_saved_query_rows')
+
+    def test_full_refresh_skips_unchanged_result(self, source_engine, store):
+        """测试无水位列的全量刷新结果未变化时不重写物化行"""
+        service = SavedQueryService(store.engine, source_engine)
+        saved = _saved_row(watermark_column=None, key_columns=None)
+        store.reader.execute.return_value.fetchone.return_value = saved
+        store.writer.execute.return_value.fetchone.return_value = saved
+        store.writer.execute.return_value.scalar.return_value = 3
+
+        first = service.refresh(1)
+        digest = _statements(store.writer, 'UPDATE text2sql_saved_queries')[0]['digest']
+        assert first['data']['mode'] == 'full'
+
+        store.writer.execute.reset_mock()
+        unchanged = _saved_row(watermark_column=None, key_columns=None, result_digest=digest, row_count=3)
+        store.writer.execute.return_value.fetchone.return_value = unchanged
+
+        second = service.refresh(1)
+
+        assert second['data']['mode'] == 'unchanged'
+        assert not _statements(store.writer, 'INSERT INTO text2sql_saved_query_rows')
+
+    def test_refresh_error_recorded(self, source_engine, store):
+        """测试查询失败时记录错误并推迟下次刷新"""
+        store.reader.execute.return_value.fetchone.return_value = _saved_row(sql_query='SELECT * FROM missing')
+
+        result = SavedQueryService(store.engine, source_engine).refresh(1)
+
+        assert result['success'] is False
+        assert 'missing' in _statements(store.writer, 'refresh_error = :error')[0]['error']
+
+    def test_refresh_due_claims_rows_before_refreshing(self, source_engine, store):
+        """测试到期查询在选取事务内推迟next_refresh_at认领后才刷新，其他进程不会重复刷新"""
+        store.writer.execute.return_value.fetchall.return_value = [SimpleNamespace(id=1), SimpleNamespace(id=2)]
+        service = SavedQueryService(store.engine, source_engine)
+        order = []
+        store.engine.begin.return_value.__exit__.side_effect = lambda *args: order.append('commit')
+        service.refresh = MagicMock(side_effect=lambda saved_query_id: order.append(saved_query_id)
+                                    or {'success': True})
+
+        stats = service.refresh_due(20)
+
+        assert stats == {'refreshed': 2, 'failed': 0}
+        select_sql = str(store.writer.execute.call_args_list[0][0][0])
+        assert 'SKIP LOCKED' in select_sql
+        assert _statements(store.writer, 'SET next_refresh_at')[0]['ids'] == [1, 2]
+        assert order == ['commit', 1, 2]
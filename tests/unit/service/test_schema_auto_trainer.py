@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+表结构增量自动训练单元测试
+测试指纹比较、只为变化的表生成训练内容、删除表的训练内容失效
+"""
+from unittest.mock import MagicMock
+import pytest
+
+try:
+    import fakeredis
+    from sqlalchemy import create_engine, text
+    from service.schema_auto_trainer import SchemaAutoTrainer, diff_snapshots, table_fingerprint, vector_id
+    from tools.exceptions import BusinessException
+except ImportError:
+    pytest.skip("表结构自动训练模块导入失败，跳过表结构自动训练测试", allow_module_level=True)
+
+
+@pytest.fixture
+def store_engine(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path / "vanna.db"}')
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE ai_schema_snapshots (
+                schema_name TEXT, table_name TEXT, fingerprint TEXT, column_count INTEGER, job_id TEXT,
+                PRIMARY KEY (schema_name, table_name)
+            )
+        """))
+        conn.execute(text("""
+            CREATE TABLE ai_training_records (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, job_id TEXT, training_type TEXT, content TEXT,
+                source_table TEXT, status INTEGER DEFAULT 1, train_status TEXT DEFAULT 'trained',
+                error_message TEXT
+            )
+        """))
+    return engine
+
+
+@pytest.fixture
+def training_service(store_engine):
+    """把提交的训练内容直接写入训练记录，模拟训练完成"""
+    service = MagicMock()
+
+    def _submit(items, job_type, user_id=None):
+        with store_engine.begin() as conn:
+            conn.execute(text("""
+                INSERT INTO ai_training_records (job_id, training_type, content, source_table)
+                VALUES ('job', :training_type, :content, :source_table)
+            """), items)
+        return {'task_id': 'job'}
+
+    service.submit.side_effect = _submit
+    return service
+
+
+@pytest.fixture
+def trainer(store_engine):
+    trainer = MagicMock()
+
+    def _training_data():
+        with store_engine.connect() as conn:
+            return [{'id': f'v{row.id}', 'content': row.content}
+                    for row in conn.execute(text('SELECT id, content FROM ai_training_records')).fetchall()]
+
+    trainer.get_training_data.side_effect = _training_data
+    trainer.remove_training_data.return_value = True
+    return trainer
+
+
+@pytest.fixture
+def example_store():
+    return MagicMock()
+
+
+@pytest.fixture
+def auto_trainer(store_engine, training_service, trainer, example_store):
+    redis_client = fakeredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True)
+    auto_trainer = SchemaAutoTrainer(
+        source_engine=MagicMock(), store_engine=store_engine, schema='dataask',
+        training_service_provider=lambda: training_service, trainer_provider=lambda: trainer,
+        redis_provider=lambda: redis_client, workers=4, example_store_provider=lambda: example_store
+    )
+    auto_trainer._show_create = MagicMock(side_effect=lambda table: f'CREATE TABLE `{table}` /* v */')
+    return auto_trainer
+
+
+def _schema(**tables):
+    return {name: {'comment': '', 'columns': columns} for name, columns in tables.items()}
+
+
+class TestSchemaDiff:
+    """表结构指纹比较测试"""
+
+    def test_fingerprint_covers_types_and_comments(self):
+        """测试字段类型或注释变化时指纹变化，字段顺序也参与计算"""
+        base = table_fingerprint('用户表', [('id', 'int', ''), ('name', 'varchar(50)', '姓名')])
+        assert base == table_fingerprint('用户表', [('id', 'int', ''), ('name', 'varchar(50)', '姓名')])
+        assert base != table_fingerprint('用户表', [('id', 'int', ''), ('name', 'varchar(100)', '姓名')])
+        assert base != table_fingerprint('用户表', [('id', 'int', ''), ('name', 'varchar(50)', '名称')])
+        assert base != table_fingerprint('', [('id', 'int', ''), ('name', 'varchar(50)', '姓名')])
+
+    def test_diff_with_retry(self):
+        """测试新增、变化、删除和上次训练失败的表"""
+        added, changed, dropped = diff_snapshots({'a': '1', 'b': '2', 'c': '3'},
+                                                 {'b': '2', 'c': 'x', 'd': '4'}, retry={'b'})
+        assert (added, changed, dropped) == (['a'], ['b', 'c'], ['d'])
+
+
+class TestSchemaAutoTrainer:
+    """增量自动训练测试"""
+
+    def test_only_changed_tables_are_retrained(self, auto_trainer, training_service, trainer, example_store):
+        """测试首轮训练全部表，之后只训练变化的表并删除其旧向量，删除的表训练内容失效"""
+        tables = {f't{i}': [('id', 'int', '')] for i in range(50)}
+        auto_trainer._read_schema = MagicMock(return_value=_schema(**tables))
+
+        first = auto_trainer.run()
+        assert len(first['added']) == 50 and first['training_items'] == 100
+
+        training_service.submit.reset_mock()
+        tables['t7'] = [('id', 'bigint', '')]
+        del tables['t9']
+        auto_trainer._read_schema.return_value = _schema(**tables)
+
+        second = auto_trainer.run()
+
+        assert (second['added'], second['changed'], second['dropped']) == ([], ['t7'], ['t9'])
+        items = training_service.submit.call_args[0][0]
+        assert {item['source_table'] for item in items} == {'dataask.t7'}
+        assert 'id（bigint）' in items[1]['content']
+        # t7和t9各有DDL和文档两条旧向量，按内容计算向量ID删除，不读取整个向量库
+        assert second['removed_vectors'] == 4 and trainer.remove_training_data.call_count == 4
+        trainer.get_training_data.assert_not_called()
+        removed_ids = {call.args[0] for call in trainer.remove_training_data.call_args_list}
+        assert vector_id('ddl', 'CREATE TABLE `t9` /* v */') in removed_ids
+        assert len(example_store.remove_records.call_args[0][0]) == 4
+
+        training_service.submit.reset_mock()
+        third = auto_trainer.run()
+        assert third['task_id'] is None and third['changed'] == []
+        training_service.submit.assert_not_called()
+
+    def test_failed_table_retried(self, auto_trainer, store_engine, training_service):
+        """测试上次训练失败的表在下次执行时重新训练"""
+        auto_trainer._read_schema = MagicMock(return_value=_schema(a=[('id', 'int', '')], b=[('id', 'int', '')]))
+        auto_trainer.run()
+        with store_engine.begin() as conn:
+            conn.execute(text("UPDATE ai_training_records SET train_status = 'failed' WHERE source_table = 'dataask.b'"))
+
+        result = auto_trainer.run()
+
+        assert result['changed'] == ['b']
+
+    def test_retired_pending_items_marked_failed(self, auto_trainer, store_engine):
+        """测试尚未训练的旧内容失效时标记为失败，训练worker不再训练"""
+        auto_trainer._read_schema = MagicMock(return_value=_schema(a=[('id', 'int', '')]))
+        auto_trainer.run()
+        with store_engine.begin() as conn:
+            conn.execute(text("UPDATE ai_training_records SET train_status = 'pending'"))
+
+        auto_trainer._read_schema.return_value = _schema(a=[('id', 'bigint', '')])
+        auto_trainer.run()
+
+        with store_engine.connect() as conn:
+            rows = conn.execute(text("SELECT status, train_status FROM ai_training_records ORDER BY id")).fetchall()
+        assert [tuple(row) for row in rows] == [(0, 'failed'), (0, 'failed'), (1, 'trained'), (1, 'trained')]
+
+    def test_vector_id_matches_vanna(self):
+        """测试向量ID与Vanna按内容生成的确定性ID一致"""
+        assert vector_id('ddl', 'CREATE TABLE t (id int)').endswith('-ddl')
+        assert vector_id('documentation', '表t') != vector_id('documentation', '表s')
+        assert vector_id('question_sql', '{}') is None
+        try:
+            from vanna.utils import deterministic_uuid
+        except ImportError:
+            return
+        assert vector_id('documentation', '表t') == deterministic_uuid('表t') + '-doc'
+
+    def test_release_keeps_other_process_lock(self, auto_trainer):
+        """测试执行超过锁有效期后，其他进程取得的锁不会被本实例释放"""
+        client = auto_trainer._redis_provider()
+        assert auto_trainer._acquire_lock()
+        client.set('ai:schema_auto_train:lock', 'other')
+
+        auto_trainer._release_lock()
+
+        assert client.get('ai:schema_auto_train:lock') == 'other'
+
+    def test_concurrent_run_rejected(self, auto_trainer):
+        """测试已有自动训练执行时拒绝重复执行"""
+        auto_trainer._redis_provider().set('ai:schema_auto_train:lock', '1')
+        auto_trainer._read_schema = MagicMock(return_value={})
+
+        with pytest.raises(BusinessException):
+            auto_trainer.run()
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+SQL模板快速路径单元测试
+测试问题骨架与槽位识别、SQL字面值绑定、历史挖掘、模板匹配填充和命中统计
+"""
+import pytest
+
+try:
+    import fakeredis
+    from sqlalchemy import create_engine, text
+    from service.sql_template_service import (
+        SqlTemplateService, QuestionNormalizer, build_template, fill_template, sql_literals
+    )
+except ImportError:
+    pytest.skip("SQL模板模块导入失败，跳过SQL模板测试", allow_module_level=True)
+
+
+ORGS = {'省公司': '0501', '科数部': '050101', '集团总部': '05'}
+
+
+@pytest.fixture
+def engines(tmp_path):
+    store = create_engine(f'sqlite:///{tmp_path / "vanna.db"}')
+    with store.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE qa_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, question TEXT, generated_sql TEXT,
+                confidence REAL DEFAULT 0.9, success INTEGER DEFAULT 1
+            )
+        """))
+        conn.execute(text("""
+            CREATE TABLE text2sql_messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT, message_type TEXT, content TEXT,
+                sql_query TEXT, created_at TEXT
+            )
+        """))
+        conn.execute(text("""
+            CREATE TABLE ai_sql_templates (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, template_key TEXT UNIQUE, skeleton TEXT, fixed_values TEXT,
+                slots TEXT, sql_template TEXT, example_question TEXT, example_sql TEXT, support INTEGER,
+                variants INTEGER, confidence REAL
+            )
+        """))
+    orgs = create_engine(f'sqlite:///{tmp_path / "dataask.db"}')
+    with orgs.begin() as conn:
+        conn.execute(text("CREATE TABLE organizations (org_name TEXT, org_code TEXT, status INTEGER DEFAULT 1)"))
+        conn.execute(text("INSERT INTO organizations (org_name, org_code) VALUES (:name, :code)"),
+                     [{'name': name, 'code': code} for name, code in ORGS.items()])
+    return store, orgs
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True)
+
+
+@pytest.fixture
+def service(engines, redis_client):
+    store, orgs = engines
+    return SqlTemplateService(engine=store, org_engine=orgs, redis_provider=lambda: redis_client,
+                              min_confidence=0.75)
+
+
+def _add_history(engine, pairs):
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO qa_history (question, generated_sql) VALUES (:q, :s)"),
+                     [{'q': q, 's': s} for q, s in pairs])
+
+
+class TestTemplateExtraction:
+    """模板提取测试"""
+
+    def test_canonicalize_slots(self):
+        """测试日期、机构、枚举和数字识别为槽位"""
+        normalizer = QuestionNormalizer(ORGS, ['已完成'])
+        skeleton, slots = normalizer.canonicalize('统计 省公司 2024年3月 状态为已完成的前10笔订单？')
+        assert skeleton == '统计⟨org⟩⟨date:month⟩状态为⟨enum⟩的前⟨number⟩笔订单'
+        assert [slot['type'] for slot in slots] == ['org', 'date', 'enum', 'number']
+        assert slots[0]['forms']['code'] == '0501'
+        assert slots[1]['forms']['start'] == '2024-03-01' and slots[1]['forms']['next'] == '2024-04-01'
+
+    def test_sql_literals_skip_identifiers_and_comments(self):
+        """测试只提取字符串和数字字面值，并识别比较的列名"""
+        literals = sql_literals("SELECT t_2024.a FROM `t1` -- 'x'\nWHERE o.status = 'done' AND amount > 10")
+        assert [(literal['value'], literal['quote'], literal['column']) for literal in literals] == \
+            [('done', "'", 'status'), ('10', '', 'amount')]
+
+    def test_build_and_fill(self):
+        """测试字面值绑定到槽位的派生形式，填充新取值"""
+        normalizer = QuestionNormalizer(ORGS)
+        template = build_template(
+            normalizer, '查询省公司2024年的用户数',
+            "SELECT COUNT(*) FROM users WHERE org_code = '0501' AND created_at >= '2024-01-01' "
+            "AND created_at < '2025-01-01'"
+        )
+        _, slots = normalizer.canonicalize('查询科数部2023年的用户数')
+        assert fill_template(template['segments'], slots) == (
+            "SELECT COUNT(*) FROM users WHERE org_code = '050101' AND created_at >= '2023-01-01' "
+            "AND created_at < '2024-01-01'"
+        )
+
+    def test_ambiguous_binding_rejected(self):
+        """测试同一槽位对应多个字面值时不生成模板，未出现在SQL中的槽位作为固定值"""
+        normalizer = QuestionNormalizer()
+        assert build_template(normalizer, '前1名', 'SELECT * FROM t WHERE status = 1 LIMIT 1') is None
+
+        template = build_template(normalizer, '2号仓库的库存', "SELECT * FROM stock WHERE warehouse = 'W2'")
+        assert template['fixed'] == {'0': '2'}
+
+
+class TestSqlTemplateService:
+    """模板挖掘与匹配测试"""
+
+    def test_rebuild_and_match(self, service, engines):
+        """测试从问答历史和会话消息挖掘模板，新取值命中并填充"""
+        store, _ = engines
+        _add_history(store, [
+            ('查询省公司的用户数', "SELECT COUNT(*) FROM users WHERE org_code = '0501'"),
+            ('查询科数部的用户数', "SELECT COUNT(*) FROM users WHERE org_code = '050101'"),
+            ('统计2023年的订单金额', "SELECT SUM(amount) FROM orders WHERE YEAR(created_at) = 2023"),
+        ])
+        with store.begin() as conn:
+            conn.execute(text("""
+                INSERT INTO text2sql_messages (session_id, message_type, content, sql_query, created_at) VALUES
+                ('s1', 'user', '统计2024年的订单金额', NULL, '2026-01-01 10:00:00'),
+                ('s1', 'assistant', 'SQL执行成功，返回1条记录',
+                 'SELECT SUM(amount) FROM orders WHERE YEAR(created_at) = 2024', '2026-01-01 10:00:05')
+            """))
+
+        result = service.rebuild()
+        assert result['pairs'] == 4 and result['enabled'] == 2
+
+        match = service.match('查询集团总部的用户数')
+        assert match['sql'] == "SELECT COUNT(*) FROM users WHERE org_code = '05'"
+        assert service.match('统计2025年的订单金额')['sql'] == \
+            'SELECT SUM(amount) FROM orders WHERE YEAR(created_at) = 2025'
+        assert service.match('查询未知机构的用户数') is None
+
+    def test_low_confidence_and_enum_membership(self, service, engines):
+        """测试单一取值的模板不启用，枚举取值必须出现过"""
+        store, _ = engines
+        _add_history(store, [
+            ('状态为已完成的订单数', "SELECT COUNT(*) FROM orders WHERE status = '已完成'"),
+            ('状态为已取消的订单数', "SELECT COUNT(*) FROM orders WHERE status = '已取消'"),
+            ('华东区的门店数', "SELECT COUNT(*) FROM stores WHERE region = '华东区'"),
+        ])
+        service.rebuild()
+
+        assert service.match('状态为已取消的订单数')['sql'] == "SELECT COUNT(*) FROM orders WHERE status = '已取消'"
+        assert service.match('状态为华东区的订单数') is None
+        assert service.match('华东区的门店数') is None
+
+    def test_stats(self, service, engines):
+        """测试命中率和节省耗时统计"""
+        store, _ = engines
+        _add_history(store, [
+            ('查询省公司的用户数', "SELECT COUNT(*) FROM users WHERE org_code = '0501'"),
+            ('查询科数部的用户数', "SELECT COUNT(*) FROM users WHERE org_code = '050101'"),
+        ])
+        service.rebuild()
+
+        service.match('查询集团总部的用户数')
+        service.match('完全不同的问题')
+        service.record_fallback(2000)
+
+        stats = service.get_stats()
+        assert stats['lookups'] == 2 and stats['hits'] == 1 and stats['hit_rate'] == 0.5
+        assert stats['avg_llm_ms'] == 2000 and 1900 < stats['saved_ms'] <= 2000
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+训练任务队列单元测试
+测试训练数据解析、入队、分批训练与失败定位、进度计算和worker消费
+"""
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+import pytest
+
+try:
+    import fakeredis
+    from sqlalchemy import create_engine, text
+    from service.training_job_service import (
+        TrainingJobService, TrainingWorker, normalize_training_items, STREAM_KEY
+    )
+    from tools.exceptions import ValidationException
+except ImportError:
+    pytest.skip("训练任务队列模块导入失败，跳过训练任务队列测试", allow_module_level=True)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path / "vanna.db"}')
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE ai_training_jobs (
+                id TEXT PRIMARY KEY, job_type TEXT, status TEXT, total_items INTEGER DEFAULT 0,
+                processed_items INTEGER DEFAULT 0, failed_items INTEGER DEFAULT 0, created_by INTEGER,
+                error_message TEXT, started_at TEXT, heartbeat_at TEXT, finished_at TEXT,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        """))
+        conn.execute(text("""
+            CREATE TABLE ai_training_records (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, job_id TEXT, training_type TEXT, content TEXT,
+                question TEXT, sql_statement TEXT, source_table TEXT, status INTEGER DEFAULT 1,
+                train_status TEXT DEFAULT 'trained',
+                error_message TEXT, trained_at TEXT
+            )
+        """))
+    return engine
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True)
+
+
+@pytest.fixture
+def trainer():
+    trainer = MagicMock()
+    trainer.train_with_ddl.return_value = True
+    trainer.train_with_documentation.return_value = True
+    trainer.train_with_sql.return_value = True
+    return trainer
+
+
+@pytest.fixture
+def example_store():
+    return MagicMock()
+
+
+@pytest.fixture
+def service(engine, redis_client, trainer, example_store):
+    return TrainingJobService(engine, redis_provider=lambda: redis_client, trainer_provider=lambda: trainer,
+                              example_store_provider=lambda: example_store, event_bus_provider=MagicMock,
+                              batch_size=2, stale_seconds=60)
+
+
+def _job(engine, task_id):
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT * FROM ai_training_jobs WHERE id = :id"), {'id': task_id}).fetchone()
+
+
+class TestNormalizeTrainingItems:
+    """训练数据解析测试"""
+
+    def test_mixed_payload(self):
+        """测试一次请求混合提交DDL、文档和问题-SQL对"""
+        items = normalize_training_items({
+            'ddl': ['CREATE TABLE a (id INT)', ' '],
+            'documentation': '订单表说明',
+            'sql': [{'question': '订单数', 'sql': 'SELECT COUNT(*) FROM orders'}]
+        })
+        assert [item['training_type'] for item in items] == ['ddl', 'documentation', 'question_sql']
+        assert items[2]['question'] == '订单数'
+
+    def test_invalid_payload(self):
+        """测试空数据和不完整的问题-SQL对被拒绝"""
+        with pytest.raises(ValidationException):
+            normalize_training_items({'ddl': []})
+        with pytest.raises(ValidationException):
+            normalize_training_items({'sql': [{'question': '订单数'}]})
+
+
+class TestTrainingJobService:
+    """训练任务执行测试"""
+
+    def test_submit_enqueues_without_training(self, service, engine, redis_client, trainer):
+        """测试提交只登记任务并投递到队列，不在请求中训练"""
+        job = service.submit(normalize_training_items({'ddl': ['CREATE TABLE a (id INT)']}), user_id=7)
+
+        assert job['status'] == 'queued' and job['total_items'] == 1
+        assert redis_client.xrange(STREAM_KEY)[0][1] == {'task_id': job['task_id']}
+        assert _job(engine, job['task_id']).created_by == 7
+        trainer.train_with_ddl.assert_not_called()
+
+    def test_process_batches_and_isolates_failures(self, service, engine, trainer, example_store):
+        """测试DDL合并训练、批量失败时逐条重试定位失败内容，部分失败任务仍完成，只有成功内容写入样本索引"""
+        trainer.train_with_ddl.side_effect = lambda ddl: 'bad' not in ddl[0] if len(ddl) == 1 else False
+        items = normalize_training_items({
+            'ddl': ['CREATE TABLE a (id INT)', 'bad ddl', 'CREATE TABLE c (id INT)'],
+            'documentation': ['说明'],
+        })
+        task_id = service.submit(items)['task_id']
+
+        assert service.process(task_id) == 'completed'
+
+        job = _job(engine, task_id)
+        assert (job.processed_items, job.failed_items) == (4, 1)
+        with engine.connect() as conn:
+            statuses = dict(conn.execute(text(
+                "SELECT content, train_status FROM ai_training_records WHERE job_id = :id"), {'id': task_id}).fetchall())
+        assert statuses['bad ddl'] == 'failed' and statuses['说明'] == 'trained'
+        indexed = [row.content for call in example_store.add_records.call_args_list for row in call[0][0]]
+        assert 'bad ddl' not in indexed and len(indexed) == 3
+        # 每批2条：第一批合并调用一次后逐条重试，第二批合并调用一次
+        assert trainer.train_with_ddl.call_args_list[0][0][0] == ['CREATE TABLE a (id INT)', 'bad ddl']
+        assert service.process(task_id) is None
+
+    def test_stopped_job_resumes_pending_items(self, service, engine, trainer):
+        """测试中途停止后重新执行只训练剩余内容"""
+        items = normalize_training_items({'documentation': ['一', '二', '三']})
+        task_id = service.submit(items)['task_id']
+        stop = MagicMock()
+        stop.is_set.side_effect = [False, True]
+
+        assert service.process(task_id, stop) is None
+        assert _job(engine, task_id).status == 'running'
+
+        assert service.process(task_id) == 'completed'
+        assert trainer.train_with_documentation.call_count == 3
+
+    def test_all_failed_marks_job_failed(self, service, engine, trainer):
+        """测试全部条目失败时任务为failed"""
+        trainer.train_with_sql.side_effect = RuntimeError('embedding服务不可用')
+        task_id = service.submit(normalize_training_items({'question': '订单数', 'sql': 'SELECT 1'}))['task_id']
+
+        assert service.process(task_id) == 'failed'
+
+    def test_progress_published_to_submitter(self, service, engine, monkeypatch):
+        """测试任务开始、每批完成和结束时向提交用户推送进度事件"""
+        bus = MagicMock()
+        service._event_bus_provider = lambda: bus
+        monkeypatch.setattr(service, 'get_status', lambda task_id: {
+            'task_id': task_id, 'created_by': _job(engine, task_id).created_by, 'status': _job(engine, task_id).status
+        })
+        task_id = service.submit(normalize_training_items({'documentation': ['一', '二', '三']}), user_id=7)['task_id']
+
+        assert service.process(task_id) == 'completed'
+        calls = bus.publish.call_args_list
+        assert {call[0][0] for call in calls} == {7} and {call[0][1] for call in calls} == {'training_progress'}
+        # 开始1次 + 2批 + 结束1次
+        assert len(calls) == 4 and calls[-1][0][2]['status'] == 'completed'
+
+    def test_renew_keeps_other_worker_lock(self, service, engine, redis_client):
+        """测试续期更新心跳，但不覆盖其他worker持有的锁"""
+        task_id = service.submit(normalize_training_items({'documentation': ['说明']}))['task_id']
+        with engine.begin() as conn:
+            conn.execute(text("UPDATE ai_training_jobs SET status = 'running', heartbeat_at = '2000-01-01 00:00:00' "
+                              "WHERE id = :id"), {'id': task_id})
+        redis_client.set(f'ai:training:job_lock:{task_id}', 'other-worker')
+
+        service._renew_job(task_id)
+
+        assert redis_client.get(f'ai:training:job_lock:{task_id}') == 'other-worker'
+        assert _job(engine, task_id).heartbeat_at > '2000-01-01 00:00:00'
+
+    def test_requeue_skips_locked_job(self, service, engine, redis_client):
+        """测试心跳过期但任务锁仍被持有的任务不重新投递"""
+        task_id = service.submit(normalize_training_items({'documentation': ['说明']}))['task_id']
+        with engine.begin() as conn:
+            conn.execute(text("UPDATE ai_training_jobs SET created_at = '2000-01-01 00:00:00' WHERE id = :id"),
+                         {'id': task_id})
+        redis_client.set(f'ai:training:job_lock:{task_id}', 'other-worker')
+
+        assert service.requeue_stale() == 0
+        redis_client.delete(f'ai:training:job_lock:{task_id}')
+        assert service.requeue_stale() == 1
+
+    def test_status_reports_throughput_and_eta(self):
+        """测试根据已处理条目数计算吞吐量和预计剩余时间"""
+        engine = MagicMock()
+        now = datetime.now()
+        engine.connect.return_value.__enter__.return_value.execute.return_value.fetchone.return_value = SimpleNamespace(
+            id='t1', job_type='manual', status='running', total_items=1000, processed_items=250, failed_items=0,
+            created_by=1, error_message=None, started_at=now - timedelta(seconds=50), heartbeat_at=now,
+            finished_at=None, created_at=now - timedelta(seconds=60)
+        )
+
+        status = TrainingJobService(engine, redis_provider=MagicMock(), trainer_provider=MagicMock()).get_status('t1')
+
+        assert status['progress'] == 0.25
+        assert status['throughput'] == pytest.approx(5.0, rel=0.05)
+        assert status['eta_seconds'] == pytest.approx(150, rel=0.05)
+
+
+class TestTrainingWorker:
+    """训练worker测试"""
+
+    def test_run_once_consumes_job(self, service, engine, redis_client):
+        """测试worker通过消费组读取任务并执行"""
+        worker = TrainingWorker(service_provider=lambda: service, redis_provider=lambda: redis_client, workers=1)
+        worker._ensure_group()
+        task_id = service.submit(normalize_training_items({'documentation': ['说明']}))['task_id']
+
+        assert worker.run_once(block_ms=10) == 1
+        assert _job(engine, task_id).status == 'completed'
+        assert worker.run_once(block_ms=10) == 0
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+字段取值词典单元测试
+测试低基数字段采样、高基数字段排除、按updated_at增量刷新和问题中的取值识别
+"""
+import pytest
+
+try:
+    import fakeredis
+    from sqlalchemy import create_engine, text
+    from service.value_dictionary_service import (
+        ValueDictionaryService, ValueDictionaryRefresher, compress_values, decompress_values
+    )
+except ImportError:
+    pytest.skip("字段取值词典模块导入失败，跳过字段取值词典测试", allow_module_level=True)
+
+
+class SqliteDatabaseService:
+    """以sqlite代替业务库的DatabaseService"""
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def execute_query(self, sql, params=None):
+        with self.engine.connect() as conn:
+            result = conn.execute(text(sql), params or {})
+            return [dict(zip(result.keys(), row)) for row in result.fetchall()]
+
+
+class SqliteValueDictionaryService(ValueDictionaryService):
+    """sqlite没有INFORMATION_SCHEMA，候选字段直接给出"""
+
+    columns = [('orders', 'region'), ('orders', 'status'), ('orders', 'order_no'), ('stores', 'store_name')]
+
+    def _discover_columns(self):
+        return list(self.columns), {'orders'}
+
+
+@pytest.fixture
+def business(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path / "dataask.db"}')
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE orders (id INTEGER PRIMARY KEY, order_no TEXT, region TEXT, status TEXT, updated_at TEXT)
+        """))
+        conn.execute(text("CREATE TABLE stores (id INTEGER PRIMARY KEY, store_name TEXT)"))
+        conn.execute(text("""
+            INSERT INTO orders (order_no, region, status, updated_at)
+            VALUES (:order_no, :region, :status, '2026-01-01 10:00:00')
+        """), [{'order_no': f'NO{i:04d}', 'region': ['华东分公司', '华南分公司'][i % 2],
+                'status': ['已完成', '已取消', '1'][i % 3]} for i in range(30)])
+        conn.execute(text("INSERT INTO stores (store_name) VALUES ('Apple Store'), ('华东')"))
+    return engine
+
+
+@pytest.fixture
+def service(tmp_path, business):
+    store = create_engine(f'sqlite:///{tmp_path / "vanna.db"}')
+    with store.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE ai_value_dictionary (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, table_name TEXT, column_name TEXT,
+                status TEXT DEFAULT 'active', value_count INTEGER DEFAULT 0, value_blob BLOB,
+                watermark DATETIME, full_refreshed_at DATETIME, updated_at TEXT
+            )
+        """))
+    database = SqliteDatabaseService(business)
+    return SqliteValueDictionaryService(db_provider=lambda: database, store_engine=store, schema='main',
+                                        max_distinct=10)
+
+
+def _entries(service):
+    with service.store_engine.connect() as conn:
+        rows = conn.execute(text("SELECT table_name, column_name, status, value_blob FROM ai_value_dictionary"))
+        return {(row.table_name, row.column_name): (row.status, decompress_values(row.value_blob)) for row in rows}
+
+
+class TestValueDictionaryService:
+    """字段取值词典测试"""
+
+    def test_compress_round_trip(self):
+        """测试取值压缩存储"""
+        assert decompress_values(compress_values({'华南', '华东'})) == sorted(['华南', '华东'])
+        assert decompress_values(None) == []
+
+    def test_full_refresh(self, service):
+        """测试低基数字段进入词典，高基数字段和纯数字取值被排除"""
+        stats = service.refresh()
+        assert stats['sampled'] == 4 and stats['high_cardinality'] == 1
+
+        entries = _entries(service)
+        assert entries[('orders', 'region')] == ('active', ['华东分公司', '华南分公司'])
+        assert entries[('orders', 'status')] == ('active', ['已取消', '已完成'])
+        assert entries[('orders', 'order_no')] == ('high_cardinality', [])
+
+    def test_incremental_refresh(self, service, business):
+        """测试只有updated_at前进的表增量采样，新取值合并进词典"""
+        service.refresh()
+        assert service.refresh()['incremental'] == 0
+
+        with business.begin() as conn:
+            conn.execute(text("""
+                INSERT INTO orders (order_no, region, status, updated_at)
+                VALUES ('NEW1', '西北分公司', '已完成', '2026-02-01 09:00:00')
+            """))
+        stats = service.refresh()
+        assert stats['incremental'] == 2 and stats['sampled'] == 0
+        assert _entries(service)[('orders', 'region')][1] == ['华东分公司', '华南分公司', '西北分公司']
+
+    def test_link(self, service):
+        """测试问题中的取值解析为表、字段和精确取值，忽略大小写并优先最长取值"""
+        service.refresh()
+        entities = service.link('华东分公司在APPLE STORE已取消的订单')
+        assert [(entity['text'], entity['targets'][0]['column'], entity['targets'][0]['value'])
+                for entity in entities] == [
+            ('华东分公司', 'region', '华东分公司'),
+            ('apple store', 'store_name', 'Apple Store'),
+            ('已取消', 'status', '已取消'),
+        ]
+        assert "orders.region = '华东分公司'" in service.describe(entities)
+        assert service.link('没有提到任何取值') == []
+
+    def test_refresher_lock(self, service):
+        """测试多进程只有一个刷新"""
+        redis_client = fakeredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True)
+        first = ValueDictionaryRefresher(lambda: service, lambda: redis_client, interval=60)
+        second = ValueDictionaryRefresher(lambda: service, lambda: redis_client, interval=60)
+        assert first.run_once()['columns'] == 4
+        assert second.run_once() is None
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+工作流执行后端单元测试
+使用Airflow桩服务测试异步触发、批量状态同步和丢失触发的重试
+"""
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+import pytest
+
+try:
+    import fakeredis
+    from service.workflow_backend import AirflowBackend
+    from tools.airflow_client import AirflowClient
+    from tests.fixtures.airflow_stub import AirflowStub
+except ImportError:
+    pytest.skip("工作流执行后端模块导入失败，跳过执行后端测试", allow_module_level=True)
+
+
+@pytest.fixture
+def stub():
+    stub = AirflowStub(dag_ids=['dag_a', 'dag_b']).start()
+    yield stub
+    stub.stop()
+
+
+@pytest.fixture
+def workflow_service():
+    service = MagicMock()
+    service.complete_instances.side_effect = lambda ids, status, error=None: {
+        'success': True, 'data': {'updated': list(ids)}
+    }
+    return service
+
+
+@pytest.fixture
+def backend(stub, workflow_service):
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+    backend = AirflowBackend(
+        client=AirflowClient(stub.url, timeout=5, max_retries=0),
+        service_provider=lambda: workflow_service,
+        redis_provider=lambda: redis_client,
+        workers=2, sync_interval=5, sync_batch=2, stale_seconds=60
+    )
+    yield backend
+    backend.stop()
+
+
+def _instance(instance_id, dag_id, status='running', age=0):
+    return {
+        'id': instance_id, 'workflow_id': 1, 'dag_id': dag_id, 'dag_run_id': f'run-{instance_id}',
+        'status': status, 'trigger_data': None, 'created_at': datetime.now() - timedelta(seconds=age)
+    }
+
+
+class TestAirflowBackend:
+    """Airflow执行后端测试"""
+
+    def test_submit_triggers_asynchronously(self, backend, stub, workflow_service):
+        """测试异步触发成功后标记实例运行中"""
+        backend.submit({'id': 1, 'dag_id': 'dag_a', 'dag_run_id': 'run-1', 'conf': {'k': 'v'}}).result()
+
+        assert stub.dag_runs['run-1']['conf'] == {'k': 'v'}
+        workflow_service.mark_instances_running.assert_called_once_with([1])
+
+    def test_submit_unknown_dag_fails_instance(self, backend, workflow_service):
+        """测试DAG不存在时实例直接失败"""
+        backend.submit({'id': 2, 'dag_id': 'missing', 'dag_run_id': 'run-2'}).result()
+
+        workflow_service.complete_instances.assert_called_once()
+        assert workflow_service.complete_instances.call_args[0][:2] == ([2], 'failed')
+
+    def test_sync_batches_instances(self, backend, stub, workflow_service):
+        """测试每批实例只发一次查询请求并批量回写终止状态"""
+        for instance_id, dag_id in ((1, 'dag_a'), (2, 'dag_b'), (3, 'dag_a')):
+            backend.client.trigger_dag_run(dag_id, f'run-{instance_id}')
+        stub.set_state('run-1', 'success')
+        stub.set_state('run-2', 'failed')
+        stub.set_state('run-3', 'success')
+        workflow_service.get_active_instances.side_effect = [
+            [_instance(1, 'dag_a'), _instance(2, 'dag_b')],
+            [_instance(3, 'dag_a')],
+        ]
+
+        stats = backend.sync_once()
+
+        assert stats['requests'] == 2 and stats['completed'] == 2 and stats['failed'] == 1
+        calls = [c[0][:2] for c in workflow_service.complete_instances.call_args_list]
+        assert ([1], 'completed') in calls and ([2], 'failed') in calls and ([3], 'completed') in calls
+        list_body = [r['body'] for r in stub.requests if r['path'].endswith('/list')][0]
+        assert list_body['dag_ids'] == ['dag_a', 'dag_b'] and list_body['states'] == ['success', 'failed']
+
+    def test_sync_retriggers_stale_pending(self, backend, stub, workflow_service):
+        """测试长时间pending且Airflow无对应运行的实例被重新触发"""
+        workflow_service.get_active_instances.side_effect = [
+            [_instance(4, 'dag_a', status='pending', age=300), _instance(5, 'dag_a', status='pending')],
+            [],
+        ]
+
+        stats = backend.sync_once()
+        backend._executor.shutdown(wait=True)
+
+        assert stats['retriggered'] == 1
+        assert list(stub.dag_runs) == ['run-4']
+
+    def test_sync_lock_single_process(self, backend, workflow_service):
+        """测试同步间隔内只有一个进程执行同步"""
+        workflow_service.get_active_instances.return_value = []
+
+        backend.sync_once()
+        backend.sync_once()
+
+        assert workflow_service.get_active_instances.call_count == 1
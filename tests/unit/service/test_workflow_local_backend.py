@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+本地工作流执行后端单元测试
+使用内存中的工作流服务测试拓扑调度、分支并发、超时重试、条件跳过和重启恢复
+"""
+import threading
+import time
+from unittest.mock import patch
+import pytest
+
+try:
+    import fakeredis
+    from service.workflow_local_backend import LocalBackend, build_dependencies, find_cycle
+    from service.workflow_backend import create_workflow_backend
+except ImportError:
+    pytest.skip("本地执行后端模块导入失败，跳过本地执行后端测试", allow_module_level=True)
+
+
+class MemoryWorkflowService:
+    """内存中的工作流服务，实现执行后端用到的方法"""
+
+    def __init__(self, nodes, connections=(), executions=(), status='pending'):
+        self.instance = {'id': 1, 'workflow_id': 1, 'instance_code': 'c1', 'status': status, 'trigger_data': '{"day": 1}'}
+        self.nodes = [self._node(n) for n in nodes]
+        self.connections = [{'from_node_id': a, 'to_node_id': b, 'condition_type': c} for a, b, c in connections]
+        self.executions = {e['node_id']: e for e in executions}
+        self.history = []
+        self.finished = threading.Event()
+
+    @staticmethod
+    def _node(node):
+        return {'type': 'script', 'subtype': None, 'step_order': 1, 'config': {}, 'timeout_minutes': 30,
+                'retry_count': 0, 'retry_delay_minutes': 0, 'skip_on_failure': 0, 'name': node['code'], **node}
+
+    def get_instance_graph(self, instance_id):
+        return {'instance': dict(self.instance), 'nodes': self.nodes, 'connections': self.connections,
+                'executions': list(self.executions.values())}
+
+    def mark_instances_running(self, ids):
+        if self.instance['status'] == 'pending':
+            self.instance['status'] = 'running'
+
+    def save_node_execution(self, instance_id, node_id, status, attempt, output_data=None,
+                            error_message=None, progress=None):
+        self.history.append((node_id, status, attempt))
+        self.executions[node_id] = {'node_id': node_id, 'status': status, 'attempt_count': attempt,
+                                    'output_data': output_data, 'error_message': error_message}
+
+    def complete_instances(self, ids, status, error_message=None):
+        self.instance.update(status=status, error_message=error_message)
+        self.finished.set()
+        return {'success': True, 'data': {'updated': list(ids)}}
+
+    def get_active_instances(self, limit, after_id=0):
+        active = self.instance['status'] in ('pending', 'running') and self.instance['id'] > after_id
+        return [dict(self.instance)] if active else []
+
+    def final(self):
+        return {node_id: e['status'] for node_id, e in self.executions.items()}
+
+
+def _backend(service, handler):
+    redis_client = fakeredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True)
+    return LocalBackend(
+        service_provider=lambda: service,
+        redis_provider=lambda: redis_client,
+        workers=4, max_instances=2, poll_interval=60, lease_seconds=30,
+        handlers={'script': handler}
+    )
+
+
+def _run(service, handler):
+    backend = _backend(service, handler)
+    try:
+        backend.submit({'id': 1}).result(timeout=10)
+    finally:
+        backend.stop()
+    return service
+
+
+class TestLocalBackend:
+    """本地执行后端测试"""
+
+    def test_diamond_runs_branches_concurrently(self):
+        """测试菱形依赖按拓扑顺序执行，两个分支并发，下游收到上游输出"""
+        barrier = threading.Barrier(2, timeout=5)
+        seen = {}
+
+        def handler(node, context):
+            if node['code'] in ('b', 'c'):
+                barrier.wait()
+            seen[node['code']] = context['upstream']
+            return {'code': node['code']}
+
+        service = MemoryWorkflowService(
+            [{'id': 1, 'code': 'a'}, {'id': 2, 'code': 'b'}, {'id': 3, 'code': 'c'}, {'id': 4, 'code': 'd'}],
+            [(1, 2, 'success'), (1, 3, 'success'), (2, 4, 'success'), (3, 4, 'success')]
+        )
+        _run(service, handler)
+
+        assert service.instance['status'] == 'completed'
+        assert seen['d'] == {'b': {'code': 'b'}, 'c': {'code': 'c'}}
+        assert service.history.index((1, 'success', 1)) < service.history.index((2, 'running', 1))
+
+    def test_retry_then_success(self):
+        """测试失败后按重试次数重新执行"""
+        calls = []
+
+        def handler(node, context):
+            calls.append(context['attempt'])
+            if context['attempt'] == 1:
+                raise RuntimeError('boom')
+            return {}
+
+        service = MemoryWorkflowService([{'id': 1, 'code': 'a', 'retry_count': 2}])
+        _run(service, handler)
+
+        assert calls == [1, 2]
+        assert (1, 'retry', 1) in service.history
+        assert service.instance['status'] == 'completed'
+
+    def test_timeout_fails_instance_and_skips_downstream(self):
+        """测试节点超时后实例失败，依赖其成功的下游被跳过"""
+        def handler(node, context):
+            if node['code'] == 'slow':
+                time.sleep(1)
+            return {}
+
+        service = MemoryWorkflowService(
+            [{'id': 1, 'code': 'slow', 'config': {'timeout_seconds': 0.1}}, {'id': 2, 'code': 'next'}],
+            [(1, 2, 'success')]
+        )
+        _run(service, handler)
+
+        assert service.final() == {1: 'timeout', 2: 'skipped'}
+        assert service.instance['status'] == 'failed'
+
+    def test_retry_waits_for_timed_out_attempt(self):
+        """测试超时的上一次尝试仍在执行时不开始重试，同一节点不会并发执行"""
+        active, overlaps, calls = [], [], []
+
+        def handler(node, context):
+            calls.append(context['attempt'])
+            if active:
+                overlaps.append(context['attempt'])
+            active.append(context['attempt'])
+            try:
+                if context['attempt'] == 1:
+                    time.sleep(0.5)
+                return {}
+            finally:
+                active.remove(context['attempt'])
+
+        service = MemoryWorkflowService(
+            [{'id': 1, 'code': 'slow', 'retry_count': 1, 'config': {'timeout_seconds': 0.1, 'retry_delay_seconds': 0}}]
+        )
+        _run(service, handler)
+
+        assert calls == [1, 2] and overlaps == []
+        assert service.instance['status'] == 'completed'
+
+    def test_failure_edge_handles_failure(self):
+        """测试failure连接承接失败节点时执行补偿分支且实例成功"""
+        def handler(node, context):
+            if node['code'] == 'load':
+                raise RuntimeError('bad data')
+            return {}
+
+        service = MemoryWorkflowService(
+            [{'id': 1, 'code': 'load'}, {'id': 2, 'code': 'report'}, {'id': 3, 'code': 'alert'}],
+            [(1, 2, 'success'), (1, 3, 'failure')]
+        )
+        _run(service, handler)
+
+        assert service.final() == {1: 'failed', 2: 'skipped', 3: 'success'}
+        assert service.instance['status'] == 'completed'
+
+    def test_resume_skips_finished_nodes(self):
+        """测试重启恢复时跳过已成功节点，中断的节点继续累计执行次数"""
+        executed = []
+        service = MemoryWorkflowService(
+            [{'id': 1, 'code': 'a', 'step_order': 1}, {'id': 2, 'code': 'b', 'step_order': 2}],
+            executions=[{'node_id': 1, 'status': 'success', 'attempt_count': 1, 'output_data': '{"rows": 3}'},
+                        {'node_id': 2, 'status': 'running', 'attempt_count': 1, 'output_data': None}],
+            status='running'
+        )
+        backend = _backend(service, lambda node, context: executed.append((node['code'], context)) or {})
+        backend.start()
+        try:
+            assert service.finished.wait(10)
+        finally:
+            backend.stop()
+
+        assert [code for code, _ in executed] == ['b']
+        assert executed[0][1]['upstream'] == {'a': {'rows': 3}} and executed[0][1]['attempt'] == 2
+        assert service.instance['status'] == 'completed'
+
+    def test_lease_prevents_duplicate_scheduling(self):
+        """测试其他进程持有实例租约时不重复调度"""
+        service = MemoryWorkflowService([{'id': 1, 'code': 'a'}])
+        redis_client = fakeredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True)
+        redis_client.set('workflow:local:lease:1', 'other-process')
+        backend = LocalBackend(service_provider=lambda: service, redis_provider=lambda: redis_client,
+                               workers=1, max_instances=1, handlers={'script': lambda node, context: {}})
+        try:
+            backend.submit({'id': 1}).result(timeout=5)
+        finally:
+            backend.stop()
+
+        assert service.history == [] and service.instance['status'] == 'pending'
+
+
+class TestExecutionGraph:
+    """执行图构建测试"""
+
+    def test_step_order_layers_without_connections(self):
+        """测试无连接时按step_order分层，同层并发"""
+        nodes = [{'id': 1, 'step_order': 1}, {'id': 2, 'step_order': 2}, {'id': 3, 'step_order': 2},
+                 {'id': 4, 'step_order': 3}]
+
+        dependencies = build_dependencies(nodes, [])
+
+        assert dependencies == {1: [], 2: [(1, 'success')], 3: [(1, 'success')],
+                                4: [(2, 'success'), (3, 'success')]}
+
+    def test_cycle_detected(self):
+        """测试检测循环依赖"""
+        assert find_cycle({1: [(2, 'success')], 2: [(1, 'success')], 3: []}) == {1, 2}
+
+    def test_backend_selected_by_config(self):
+        """测试按配置选择执行后端"""
+        with patch('config.base_config.Config.WORKFLOW_EXECUTION_BACKEND', 'local'):
+            backend = create_workflow_backend()
+        try:
+            assert isinstance(backend, LocalBackend)
+        finally:
+            backend.stop()
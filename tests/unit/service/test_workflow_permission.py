@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+工作流权限解析器单元测试
+测试授权编译为权限位、批量判定、缓存与失效
+"""
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+import pytest
+
+try:
+    import fakeredis
+    from service.workflow_permission import WorkflowPermissionResolver
+except ImportError:
+    pytest.skip("工作流权限模块导入失败，跳过工作流权限测试", allow_module_level=True)
+
+
+def _row(resource_type, resource_id, permission_type, expires_in=None):
+    return SimpleNamespace(resource_type=resource_type, resource_id=resource_id,
+                           permission_type=permission_type, expires_in=expires_in)
+
+
+@pytest.fixture
+def engine():
+    engine = MagicMock()
+    conn = engine.connect.return_value.__enter__.return_value
+    conn.execute.return_value.fetchall.return_value = [
+        _row('workspace', 1, 'view'),
+        _row('workspace', 2, 'manage'),
+        _row('workflow', 10, 'view'),
+        _row('workflow', 10, 'execute'),
+    ]
+    return engine
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+@pytest.fixture
+def resolver(engine, redis_client):
+    return WorkflowPermissionResolver(lambda: engine, lambda: redis_client, ttl=60)
+
+
+def _load_count(engine):
+    return engine.connect.return_value.__enter__.return_value.execute.call_count
+
+
+class TestWorkflowPermissionResolver:
+    """工作流权限解析器测试"""
+
+    def test_check_many_uses_single_query(self, resolver, engine):
+        """测试批量判定只加载一次授权，manage隐含全部权限"""
+        assert resolver.check_many(5, 'workspace', [1, 2, 3], 'view') == {1: True, 2: True, 3: False}
+        assert resolver.check_many(5, 'workspace', [1, 2], 'edit') == {1: False, 2: True}
+        assert resolver.check(5, 'workflow', 10, 'execute') is True
+        assert resolver.check(5, 'workflow', 10, 'delete') is False
+        assert _load_count(engine) == 1
+
+    def test_superuser_skips_loading(self, resolver, engine):
+        """测试超级管理员不查询授权"""
+        assert resolver.check_many(1, 'workflow', [7, 8], 'manage') == {7: True, 8: True}
+        assert _load_count(engine) == 0
+
+    def test_invalidate_user_reloads(self, resolver, engine):
+        """测试按用户失效后重新加载，其他用户缓存不受影响"""
+        resolver.check(5, 'workspace', 1, 'view')
+        resolver.check(6, 'workspace', 1, 'view')
+        resolver.invalidate(5)
+        resolver.check(5, 'workspace', 1, 'view')
+        resolver.check(6, 'workspace', 1, 'view')
+        assert _load_count(engine) == 3
+
+    def test_generation_invalidates_across_processes(self, engine, redis_client):
+        """测试其他进程授权后通过Redis版本号失效本进程缓存"""
+        local = WorkflowPermissionResolver(lambda: engine, lambda: redis_client, ttl=60)
+        remote = WorkflowPermissionResolver(lambda: engine, lambda: redis_client, ttl=60)
+        local.check(5, 'workspace', 1, 'view')
+        remote.invalidate(None)
+        local.check(5, 'workspace', 1, 'view')
+        assert _load_count(engine) == 2
+
+    def test_expiring_grant_bounds_cache(self, engine, redis_client):
+        """测试即将到期的授权缩短缓存有效期"""
+        conn = engine.connect.return_value.__enter__.return_value
+        conn.execute.return_value.fetchall.return_value = [_row('workflow', 3, 'view', expires_in=0)]
+        resolver = WorkflowPermissionResolver(lambda: engine, lambda: redis_client, ttl=60)
+
+        assert resolver.check(5, 'workflow', 3, 'view') is True
+        resolver.check(5, 'workflow', 3, 'view')
+        assert _load_count(engine) == 2
+
+    def test_unknown_permission_rejected(self, resolver):
+        """测试未知权限类型"""
+        with pytest.raises(ValueError):
+            resolver.check_many(5, 'workflow', [1], 'approve')
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+工作流服务单元测试
+测试冗余计数的事务内维护与校正、批量状态修改
+"""
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+import pytest
+
+try:
+    from service.workflow_service import WorkflowService
+except ImportError:
+    pytest.skip("工作流服务模块导入失败，跳过工作流服务测试", allow_module_level=True)
+
+
+@pytest.fixture
+def conn():
+    return MagicMock()
+
+
+@pytest.fixture
+def workflow_service(conn):
+    service = WorkflowService()
+    service.main_engine = MagicMock()
+    service.main_engine.begin.return_value.__enter__.return_value = conn
+    service.permissions = MagicMock()
+    with patch('service.workflow_service.get_workflow_watch'):
+        yield service
+
+
+class TestWorkflowCounters:
+    """工作流冗余计数测试"""
+
+    def test_status_change_adjusts_workspace_count(self, workflow_service, conn):
+        """测试状态变化只对进出计数集合的工作流调整工作域工作流数"""
+        conn.execute.return_value.fetchall.return_value = [
+            SimpleNamespace(id=1, workspace_id=7, status='draft'),
+            SimpleNamespace(id=2, workspace_id=7, status='inactive'),
+            SimpleNamespace(id=3, workspace_id=8, status='draft'),
+        ]
+
+        outcomes = workflow_service._change_workflow_status(conn, [1, 2, 3], 'active')
+
+        assert outcomes == {1: 'updated', 2: 'updated', 3: 'updated'}
+        deltas = [c[0][1] for c in conn.execute.call_args_list if 'workflow_count' in str(c[0][0])]
+        assert deltas == [{'delta': 1, 'workspace_id': 7}, {'delta': 1, 'workspace_id': 8}]
+
+    def test_archive_decrements_workspace_count(self, workflow_service, conn):
+        """测试归档已启用的工作流时工作域工作流数减一"""
+        conn.execute.return_value.fetchall.return_value = [
+            SimpleNamespace(id=4, workspace_id=7, status='active'),
+        ]
+
+        result = workflow_service.delete_workflow(4)
+
+        assert result['success'] is True
+        deltas = [c[0][1] for c in conn.execute.call_args_list if 'workflow_count' in str(c[0][0])]
+        assert deltas == [{'delta': -1, 'workspace_id': 7}]
+
+    def test_complete_instance_counts_success_once(self, workflow_service, conn):
+        """测试实例成功完成时累加成功数，重复回调不再计数"""
+        conn.execute.return_value.fetchall.return_value = [SimpleNamespace(id=5, workflow_id=3)]
+        assert workflow_service.complete_instance(5, 'completed')['updated'] is True
+        increments = [c[0][1] for c in conn.execute.call_args_list if 'success_count + :count' in str(c[0][0])]
+        assert increments == [{'count': 1, 'workflow_id': 3}]
+
+        conn.execute.reset_mock()
+        conn.execute.return_value.fetchall.return_value = []
+        assert workflow_service.complete_instance(5, 'completed')['updated'] is False
+        assert len(conn.execute.call_args_list) == 1
+
+    def test_complete_instances_groups_success_by_workflow(self, workflow_service, conn):
+        """测试批量结束实例时按工作流合并成功数"""
+        conn.execute.return_value.fetchall.return_value = [
+            SimpleNamespace(id=1, workflow_id=3),
+            SimpleNamespace(id=2, workflow_id=3),
+            SimpleNamespace(id=4, workflow_id=8),
+        ]
+
+        result = workflow_service.complete_instances([1, 2, 4, 9], 'completed')
+
+        assert result['data']['updated'] == [1, 2, 4]
+        increments = [c[0][1] for c in conn.execute.call_args_list if 'success_count + :count' in str(c[0][0])]
+        assert increments == [{'count': 2, 'workflow_id': 3}, {'count': 1, 'workflow_id': 8}]
+
+    def test_mark_running_publishes_only_pending(self, workflow_service, conn):
+        """测试只有pending实例被标记为运行中并发布状态变化"""
+        conn.execute.return_value.fetchall.return_value = [SimpleNamespace(id=2)]
+
+        with patch('service.workflow_service.get_workflow_watch') as get_watch:
+            assert workflow_service.mark_instances_running([1, 2]) == 1
+
+        get_watch.return_value.publish_many.assert_called_once_with([2], {'status': 'running'})
+
+    def test_complete_instance_rejects_non_terminal(self, workflow_service, conn):
+        """测试拒绝非终止状态"""
+        assert workflow_service.complete_instance(5, 'running')['success'] is False
+        conn.execute.assert_not_called()
+
+    def test_execute_submits_pending_instance(self, workflow_service, conn):
+        """测试执行时实例以pending落库并在提交后交给执行后端"""
+        conn.execute.return_value.fetchone.return_value = SimpleNamespace(status='active', dag_id='dag_a')
+        conn.execute.return_value.lastrowid = 42
+
+        with patch('service.workflow_service.get_workflow_backend') as get_backend:
+            result = workflow_service.execute_workflow(3, user_id=9, conf={'date': '2025-08-01'})
+
+        assert result['instance_id'] == 42
+        insert_params = conn.execute.call_args_list[1][0][1]
+        assert insert_params['dag_run_id'] == result['dag_run_id'] and insert_params['user_id'] == 9
+        submitted = get_backend.return_value.submit.call_args[0][0]
+        assert submitted['dag_id'] == 'dag_a' and submitted['conf'] == {'date': '2025-08-01'}
+
+    def test_reconcile_reports_corrected_rows(self, workflow_service, conn):
+        """测试校正返回被修正的行数"""
+        conn.execute.side_effect = [MagicMock(rowcount=2), MagicMock(rowcount=0)]
+
+        result = workflow_service.reconcile_counters()
+
+        assert result['data'] == {'workflows': 2, 'workspaces': 0}
+
+
+class TestWorkflowBulkStatus:
+    """批量修改工作流状态测试"""
+
+    def test_bulk_set_status_per_id_outcomes(self, workflow_service, conn):
+        """测试一次判定权限，按块更新并返回逐个结果"""
+        workflow_service.config.WORKFLOW_BULK_CHUNK_SIZE = 2
+        workflow_service.permissions.check_many.return_value = {1: True, 2: True, 3: False, 4: True}
+        conn.execute.return_value.fetchall.side_effect = [
+            [SimpleNamespace(id=1, workspace_id=7, status='inactive'),
+             SimpleNamespace(id=2, workspace_id=7, status='active')],
+            [],
+        ]
+
+        result = workflow_service.bulk_set_status([1, 2, 3, 4, 1], 'active', 9)
+
+        assert result['data']['results'] == {1: 'updated', 2: 'unchanged', 3: 'forbidden', 4: 'not_found'}
+        workflow_service.permissions.check_many.assert_called_once_with(9, 'workflow', [1, 2, 3, 4], 'edit')
+        workflow_service.main_engine.begin.assert_called_once()
+        updates = [c[0][1] for c in conn.execute.call_args_list if 'SET status = :status' in str(c[0][0])]
+        assert updates == [{'id0': 1, 'status': 'active', 'updater_id': 9}]
+
+    def test_bulk_delete_requires_delete_permission(self, workflow_service, conn):
+        """测试批量删除按delete权限判定并归档"""
+        workflow_service.permissions.check_many.return_value = {5: True}
+        conn.execute.return_value.fetchall.return_value = [SimpleNamespace(id=5, workspace_id=7, status='draft')]
+
+        result = workflow_service.bulk_delete([5], 9)
+
+        assert result['data']['summary'] == {'updated': 1}
+        workflow_service.permissions.check_many.assert_called_once_with(9, 'workflow', [5], 'delete')
+
+    def test_bulk_set_status_rejects_invalid_status(self, workflow_service):
+        """测试拒绝批量设置为归档等非法状态"""
+        assert workflow_service.bulk_set_status([1], 'archived', 9)['success'] is False
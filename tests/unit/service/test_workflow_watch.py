@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+工作流实例状态订阅单元测试
+测试状态初始化、按版本返回增量、长轮询唤醒和超时
+"""
+import threading
+import time
+from unittest.mock import MagicMock
+import pytest
+
+try:
+    import fakeredis
+    from service.workflow_watch import WorkflowWatch
+    from tools.exceptions import AuthorizationException
+except ImportError:
+    pytest.skip("实例状态订阅模块导入失败，跳过实例状态订阅测试", allow_module_level=True)
+
+
+@pytest.fixture
+def workflow_service():
+    service = MagicMock()
+    service.get_instance_snapshot.return_value = {
+        'instance': {'id': 1, 'workflow_id': 3, 'status': 'running', 'progress': 50.0,
+                     'current_node_id': 10, 'error_message': None},
+        'nodes': [{'node_id': 10, 'status': 'success', 'attempt': 1, 'error_message': None}]
+    }
+    return service
+
+
+@pytest.fixture
+def watch(workflow_service):
+    redis_client = fakeredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True)
+    watch = WorkflowWatch(redis_provider=lambda: redis_client, service_provider=lambda: workflow_service,
+                          state_ttl=60, recheck=0.2)
+    yield watch
+    watch.stop()
+
+
+class TestWorkflowWatch:
+    """实例状态订阅测试"""
+
+    def test_initial_wait_returns_snapshot_once(self, watch, workflow_service):
+        """测试首次请求从数据库初始化并返回完整状态，之后不再查询数据库"""
+        first = watch.wait(1, since=0, timeout=0)
+
+        assert first['changed'] is True and first['workflow_id'] == 3
+        assert first['instance']['status'] == 'running'
+        assert [node['node_id'] for node in first['nodes']] == [10]
+
+        second = watch.wait(1, since=first['version'], timeout=0)
+        assert second['changed'] is False and second['nodes'] == []
+        workflow_service.get_instance_snapshot.assert_called_once_with(1)
+
+    def test_delta_contains_only_changed_entries(self, watch):
+        """测试增量只包含since之后变化的节点，实例部分字段更新时保留其他字段"""
+        version = watch.wait(1, since=0, timeout=0)['version']
+        watch.publish(1, nodes=[{'node_id': 11, 'status': 'running', 'attempt': 1, 'error_message': None}])
+        watch.publish(1, {'id': 1, 'progress': 75.0})
+
+        delta = watch.wait(1, since=version, timeout=0)
+
+        assert delta['version'] == version + 2
+        assert [node['node_id'] for node in delta['nodes']] == [11]
+        assert delta['instance']['progress'] == 75.0 and delta['instance']['workflow_id'] == 3
+
+    def test_wait_wakes_on_publish(self, watch):
+        """测试等待中的请求在状态变化后立即返回"""
+        version = watch.wait(1, since=0, timeout=0)['version']
+        threading.Timer(0.3, watch.publish, args=(1, {'id': 1, 'status': 'completed'})).start()
+
+        started = time.monotonic()
+        delta = watch.wait(1, since=version, timeout=10)
+
+        assert time.monotonic() - started < 5
+        assert delta['changed'] is True and delta['finished'] is True
+        assert watch.waiter_count() == 0
+
+    def test_wait_times_out_without_change(self, watch):
+        """测试无变化时等待到超时返回changed=False"""
+        version = watch.wait(1, since=0, timeout=0)['version']
+
+        delta = watch.wait(1, since=version, timeout=0.5)
+
+        assert delta['changed'] is False and delta['version'] == version
+
+    def test_stale_version_returns_full_state(self, watch):
+        """测试since大于当前版本（状态过期重建）时返回完整状态"""
+        delta = watch.wait(1, since=999, timeout=0)
+
+        assert delta['instance'] is not None and len(delta['nodes']) == 1
+
+    def test_unauthorized_and_missing_instance(self, watch, workflow_service):
+        """测试无权限时拒绝，实例不存在时返回None"""
+        with pytest.raises(AuthorizationException):
+            watch.wait(1, since=0, timeout=0, authorize=lambda workflow_id: workflow_id != 3)
+
+        workflow_service.get_instance_snapshot.return_value = None
+        assert watch.wait(2, since=0, timeout=0) is None
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+Aho-Corasick多模式匹配单元测试
+测试全部匹配、失败指针上的输出合并和最左最长选择
+"""
+
+import random
+import pytest
+
+try:
+    from tools.aho_corasick import AhoCorasick
+except ImportError:
+    pytest.skip("多模式匹配模块导入失败，跳过多模式匹配测试", allow_module_level=True)
+
+
+class TestAhoCorasick:
+    """自动机匹配测试"""
+
+    def test_all_matches(self):
+        """测试重叠词和后缀词都被找到"""
+        automaton = AhoCorasick([('he', 1), ('she', 2), ('his', 3), ('hers', 4)])
+        assert sorted(automaton.iter_matches('ushers')) == [(1, 4, 2), (2, 4, 1), (2, 6, 4)]
+        assert len(automaton) == 4
+
+    def test_longest_non_overlapping(self):
+        """测试最左最长且互不重叠"""
+        automaton = AhoCorasick([('华东', 'a'), ('华东分公司', 'b'), ('分公司', 'c'), ('已完成', 'd')])
+        assert automaton.find_longest('华东分公司已完成的订单') == [(0, 5, 'b'), (5, 8, 'd')]
+        assert automaton.find_longest('没有匹配') == []
+
+    def test_matches_brute_force(self):
+        """测试与逐词查找的结果一致"""
+        random.seed(3)
+        words = {''.join(random.choice('abc') for _ in range(random.randint(1, 4))) for _ in range(40)}
+        automaton = AhoCorasick((word, word) for word in words)
+        content = ''.join(random.choice('abcd') for _ in range(300))
+        expected = sorted(
+            (start, start + len(word), word)
+            for word in words for start in range(len(content)) if content.startswith(word, start)
+        )
+        assert sorted(automaton.iter_matches(content)) == expected
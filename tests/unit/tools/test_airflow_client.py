@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Airflow REST API客户端单元测试
+使用本地Airflow桩服务测试触发幂等、重试和批量查询翻页
+"""
+import pytest
+
+try:
+    from tools.airflow_client import AirflowClient
+    from tools.exceptions import ExternalServiceException
+    from tests.fixtures.airflow_stub import AirflowStub
+except ImportError:
+    pytest.skip("Airflow客户端模块导入失败，跳过Airflow客户端测试", allow_module_level=True)
+
+
+@pytest.fixture
+def stub():
+    stub = AirflowStub(dag_ids=['dag_a', 'dag_b']).start()
+    yield stub
+    stub.stop()
+
+
+@pytest.fixture
+def client(stub):
+    client = AirflowClient(stub.url, auth=('admin', 'admin'), timeout=5, max_retries=3, pool_size=2)
+    client.session.adapters['http://'].max_retries.backoff_factor = 0
+    yield client
+    client.close()
+
+
+class TestAirflowClient:
+    """Airflow客户端测试"""
+
+    def test_trigger_is_idempotent(self, client, stub):
+        """测试重复触发同一dag_run_id按已存在处理"""
+        run = client.trigger_dag_run('dag_a', 'run-1', {'x': 1})
+        assert run['state'] == 'queued'
+        assert stub.dag_runs['run-1']['conf'] == {'x': 1}
+
+        again = client.trigger_dag_run('dag_a', 'run-1')
+        assert again['existing'] is True
+        assert len(stub.dag_runs) == 1
+
+    def test_trigger_retries_server_errors(self, client, stub):
+        """测试5xx错误自动重试"""
+        stub.fail_next(2, 503)
+
+        client.trigger_dag_run('dag_a', 'run-2')
+
+        assert 'run-2' in stub.dag_runs
+        assert len(stub.requests) == 3
+
+    def test_unknown_dag_raises(self, client):
+        """测试DAG不存在时抛出带状态码的异常"""
+        with pytest.raises(ExternalServiceException) as exc_info:
+            client.trigger_dag_run('missing', 'run-3')
+        assert exc_info.value.code == 404
+
+    def test_list_dag_runs_paginates(self, client, stub):
+        """测试批量查询按状态过滤并自动翻页"""
+        for index in range(5):
+            client.trigger_dag_run('dag_a' if index % 2 else 'dag_b', f'run-{index}')
+            stub.set_state(f'run-{index}', 'success' if index < 4 else 'running')
+
+        runs = list(client.list_dag_runs(['dag_a', 'dag_b'], states=['success', 'failed'], page_limit=2))
+
+        assert sorted(run['dag_run_id'] for run in runs) == ['run-0', 'run-1', 'run-2', 'run-3']
+        list_requests = [r for r in stub.requests if r['path'].endswith('/list')]
+        assert [r['body']['page_offset'] for r in list_requests] == [0, 2]
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+审计日志导出服务单元测试
+测试CSV/XLSX流式导出、任务状态和失败处理
+"""
+import csv
+from datetime import datetime, timedelta
+import pytest
+
+try:
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.pool import StaticPool
+    from tools.audit_export import AuditExportService
+except ImportError:
+    pytest.skip("审计导出模块导入失败，跳过审计导出测试", allow_module_level=True)
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE operation_audit (
+                id INTEGER PRIMARY KEY, username TEXT, module TEXT, operation TEXT,
+                target_type TEXT, target_id TEXT, target_name TEXT, operation_desc TEXT,
+                ip_address TEXT, user_agent TEXT, operation_time TIMESTAMP, result TEXT,
+                error_message TEXT
+            )
+        """))
+        start = datetime(2025, 8, 1)
+        conn.execute(text("""
+            INSERT INTO operation_audit (id, username, module, operation, operation_desc,
+                                         ip_address, operation_time, result)
+            VALUES (:id, :username, :module, :operation, :operation_desc, '127.0.0.1', :operation_time, 'success')
+        """), [{
+            'id': i,
+            'username': 'admin' if i % 2 else 'guest',
+            'module': 'auth' if i % 5 == 0 else 'system',
+            'operation': 'login' if i % 5 == 0 else 'update',
+            'operation_desc': '=HYPERLINK("x")' if i == 1 else f'操作{i}',
+            'operation_time': start + timedelta(minutes=i)
+        } for i in range(1, 121)])
+    return engine
+
+
+@pytest.fixture
+def export_service(engine, tmp_path):
+    service = AuditExportService(lambda: engine, export_dir=str(tmp_path), max_workers=1, fetch_size=7)
+    yield service
+    service.shutdown()
+
+
+class TestAuditExportService:
+    """审计日志导出服务测试"""
+
+    def test_csv_export(self, export_service):
+        """测试CSV导出按条件流式写入并更新任务状态"""
+        job = export_service.submit(
+            'operation', 'csv', ['username = :username'], {'username': 'admin'}, estimated_total=60
+        )
+        export_service.shutdown()
+
+        status = export_service.get_job(job['job_id'])
+        assert status['status'] == 'completed'
+        assert status['rows'] == 60
+        assert status['progress'] == 100
+
+        with open(export_service.get_file_path(status), encoding='utf-8-sig', newline='') as f:
+            rows = list(csv.reader(f))
+        assert rows[0][0] == '日志ID'
+        assert len(rows) == 61
+        assert rows[1][0] == '119'  # 按时间倒序
+        assert rows[-1][8] == '\'=HYPERLINK("x")'  # 公式注入被转义
+
+    def test_xlsx_export(self, export_service):
+        """测试XLSX只写模式导出"""
+        openpyxl = pytest.importorskip('openpyxl')
+        job = export_service.submit('login', 'xlsx', ["module = 'auth'"], {})
+        export_service.shutdown()
+
+        status = export_service.get_job(job['job_id'])
+        assert status['status'] == 'completed'
+        sheet = openpyxl.load_workbook(export_service.get_file_path(status), read_only=True).active
+        rows = list(sheet.iter_rows(values_only=True))
+        assert rows[0][1] == '登录时间'
+        assert len(rows) == 25
+
+    def test_failed_job(self, export_service, tmp_path):
+        """测试查询失败时任务标记为失败且不留下残缺文件"""
+        job = export_service.submit('operation', 'csv', ['no_such_column = 1'], {})
+        export_service.shutdown()
+
+        status = export_service.get_job(job['job_id'])
+        assert status['status'] == 'failed'
+        assert status['error']
+        assert not list(tmp_path.glob('*.part'))
+
+    def test_unknown_job(self, export_service):
+        """测试非法或不存在的任务ID"""
+        assert export_service.get_job('../../etc/passwd') is None
+        assert export_service.get_job('0' * 32) is None
+        with pytest.raises(ValueError):
+            export_service.submit('operation', 'pdf', [], {})
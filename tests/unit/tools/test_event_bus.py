@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+事件推送模块单元测试
+测试事件发布、积压补发、Last-Event-ID续传、实时推送和连接票据
+"""
+import threading
+import pytest
+
+try:
+    from tools.event_bus import EventBus, format_sse, decode_event_id
+except ImportError:
+    pytest.skip("事件推送模块导入失败，跳过事件推送测试", allow_module_level=True)
+
+fakeredis = pytest.importorskip('fakeredis')
+
+
+@pytest.fixture
+def bus():
+    client = fakeredis.FakeRedis(decode_responses=True)
+    event_bus = EventBus(lambda: client, backlog=50, backlog_ttl=60)
+    yield event_bus
+    event_bus.stop()
+
+
+def parse_event_ids(chunks):
+    return [line[4:] for chunk in chunks for line in chunk.splitlines() if line.startswith('id: ')]
+
+
+class TestEventBus:
+    """事件总线测试"""
+
+    def test_format_sse(self):
+        """测试多行数据按SSE格式拆分"""
+        assert format_sse('message', 'a\nb', '1-0,0-0') == 'id: 1-0,0-0\nevent: message\ndata: a\ndata: b\n\n'
+        assert decode_event_id('bad') is None
+
+    def test_ticket_single_use(self, bus):
+        """测试SSE票据只能兑换一次"""
+        ticket = bus.issue_ticket(7, 1700000000)
+
+        assert bus.redeem_ticket(ticket) == {'id': 7, 'exp': 1700000000}
+        assert bus.redeem_ticket(ticket) is None
+        assert bus.redeem_ticket('unknown') is None
+
+    def test_replay_merges_user_and_broadcast(self, bus):
+        """测试补发按时间合并用户流和广播流"""
+        first = bus.publish(1, 'message', {'n': 1})
+        bus.publish(None, 'notice', {'n': 2})
+        bus.publish(2, 'message', {'n': 3})
+        bus.publish(1, 'export_progress', {'n': 4})
+
+        events = bus.replay(1, ('0-0', '0-0'))
+        assert [event for _, _, event, _ in events] == ['message', 'notice', 'export_progress']
+
+        events = bus.replay(1, (first, '0-0'))
+        assert len(events) == 2
+
+    def test_stream_resumes_from_last_event_id(self, bus):
+        """测试携带Last-Event-ID重连时只补发之后的事件"""
+        bus.publish(1, 'message', {'n': 1})
+        stream = bus.stream(1, heartbeat=0.05)
+        assert next(stream).startswith('retry:')
+        bus.publish(1, 'message', {'n': 2})
+
+        chunk = next(e for e in stream if not e.startswith(':'))
+        stream.close()
+        assert '"n": 2' in chunk
+        last_event_id = parse_event_ids([chunk])[0]
+
+        bus.publish(1, 'message', {'n': 3})
+        resumed = bus.stream(1, last_event_id=last_event_id, heartbeat=0.05)
+        next(resumed)
+        chunk = next(resumed)
+        resumed.close()
+        assert '"n": 3' in chunk
+        assert bus.connection_count() == 0
+
+    def test_heartbeat_and_deadline(self, bus):
+        """测试空闲时发送心跳，到期后结束"""
+        import time
+        chunks = list(bus.stream(1, heartbeat=0.05, deadline=time.time() + 0.2))
+        assert chunks[0].startswith('retry:')
+        assert ': heartbeat\n\n' in chunks
+
+    def test_live_delivery_from_other_thread(self, bus):
+        """测试其他线程发布的事件实时推送到连接"""
+        stream = bus.stream(7, heartbeat=0.05)
+        next(stream)
+        timer = threading.Timer(0.1, bus.publish, args=(None, 'notice', {'title': '维护通知'}))
+        timer.start()
+
+        chunk = next(e for e in stream if not e.startswith(':'))
+        stream.close()
+        assert 'event: notice' in chunk
+        assert '维护通知' in chunk
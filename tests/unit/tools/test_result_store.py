@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+查询结果存储单元测试
+测试内容寻址写入、去重、分页读取和消息预览生成
+"""
+
+import os
+import pytest
+
+try:
+    from tools.result_store import ResultStore, LocalBlobBackend
+except ImportError:
+    pytest.skip("结果存储模块导入失败，跳过结果存储测试", allow_module_level=True)
+
+
+class TestResultStore:
+    """查询结果存储测试"""
+
+    @pytest.fixture
+    def store(self, tmp_path):
+        """创建使用临时目录的结果存储"""
+        return ResultStore(LocalBlobBackend(str(tmp_path)), page_size=10)
+
+    @pytest.fixture
+    def records(self):
+        """模拟查询结果"""
+        return [{'id': i, 'name': f'机构{i}', 'amount': i * 1.5} for i in range(25)]
+
+    def test_put_result_is_content_addressed(self, store, records):
+        """测试相同结果得到相同引用且只写入一次"""
+        ref1 = store.put_result(records)
+        files_before = sum(len(files) for _, _, files in os.walk(store.backend.root_dir))
+        ref2 = store.put_result(list(records))
+        files_after = sum(len(files) for _, _, files in os.walk(store.backend.root_dir))
+
+        assert ref1 == ref2
+        assert len(ref1) == 64
+        assert files_before == files_after
+
+    def test_get_page(self, store, records):
+        """测试按页读取结果"""
+        ref = store.put_result(records, ['id', 'name', 'amount'])
+
+        first = store.get_page(ref, 1)
+        last = store.get_page(ref, 3)
+
+        assert first['row_count'] == 25
+        assert first['total_pages'] == 3
+        assert first['records'] == records[:10]
+        assert last['records'] == records[20:]
+        assert store.get_page(ref, 4)['records'] == []
+
+    def test_get_page_unknown_ref(self, store):
+        """测试读取不存在的引用"""
+        assert store.get_page('0' * 64) is None
+
+    def test_build_message_result_small(self, store, records):
+        """测试小结果原样保留"""
+        assert store.build_message_result(records, threshold=100) == records
+
+    def test_build_message_result_spills(self, store, records):
+        """测试大结果只保留预览和引用"""
+        message_result = store.build_message_result(records, threshold=20, preview_rows=5)
+
+        assert message_result['truncated'] is True
+        assert message_result['row_count'] == 25
+        assert len(message_result['preview']) == 5
+        assert store.get_page(message_result['result_ref'], 1)['records'] == records[:10]
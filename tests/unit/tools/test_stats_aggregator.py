@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+SQL生成统计聚合器单元测试
+测试直方图分位数、线程分片聚合和刷盘失败重试
+"""
+
+import random
+import threading
+from datetime import date
+from unittest.mock import Mock
+import pytest
+
+try:
+    from tools.stats_aggregator import LatencyHistogram, SqlStatsAggregator
+except ImportError:
+    pytest.skip("统计聚合模块导入失败，跳过统计聚合测试", allow_module_level=True)
+
+
+class TestLatencyHistogram:
+    """耗时直方图测试"""
+
+    def test_percentiles_within_relative_error(self):
+        """测试分位数相对误差在桶精度以内"""
+        random.seed(7)
+        values = [random.randint(1, 20000) for _ in range(20000)]
+        histogram = LatencyHistogram()
+        for value in values:
+            histogram.record(value)
+
+        values.sort()
+        for p in (50, 95, 99):
+            exact = values[int(len(values) * p / 100) - 1]
+            assert abs(histogram.percentile(p) - exact) <= exact / 16 + 1
+
+    def test_json_roundtrip_and_merge(self):
+        """测试序列化和合并"""
+        a, b = LatencyHistogram(), LatencyHistogram()
+        for value in range(100):
+            a.record(value)
+            b.record(value + 1000)
+
+        restored = LatencyHistogram.from_json(a.to_json())
+        restored.merge(b)
+
+        assert restored.total == 200
+        assert restored.percentile(25) < 100
+        assert restored.percentile(75) >= 1000
+
+    def test_empty(self):
+        """测试空直方图"""
+        assert LatencyHistogram().percentile(99) == 0
+
+
+class TestSqlStatsAggregator:
+    """统计聚合器测试"""
+
+    def test_records_from_many_threads(self):
+        """测试多线程记录后快照数据完整"""
+        aggregator = SqlStatsAggregator(Mock())
+        today = date.today()
+
+        def worker():
+            for i in range(1000):
+                aggregator.record(success=i % 10 != 0, execution_time=i, confidence=0.9)
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        snapshot = aggregator.snapshot(today)
+        summary = aggregator.summarize(today, snapshot)
+
+        assert snapshot.total == 4000
+        assert snapshot.failed == 400
+        assert summary['success_rate'] == 90.0
+        assert summary['avg_confidence'] == 0.9
+        assert 450 <= summary['p50_execution_time'] <= 550
+
+    def test_shards_bounded(self):
+        """测试大量短生命周期线程不会让分片数量增长，刷盘后数据全部换出"""
+        aggregator = SqlStatsAggregator(Mock(), shards=4)
+        for _ in range(50):
+            t = threading.Thread(target=aggregator.record, kwargs={'success': True, 'execution_time': 10})
+            t.start()
+            t.join()
+
+        assert len(aggregator._shards) == 4
+        assert aggregator.snapshot().total == 50
+        aggregator._collect()
+        assert all(not shard.buckets for shard in aggregator._shards)
+
+    def test_first_token_time(self):
+        """测试只统计流式生成请求的首个token耗时"""
+        aggregator = SqlStatsAggregator(Mock())
+        aggregator.record(success=True, execution_time=3000)
+        for i in range(100):
+            aggregator.record(success=True, execution_time=3000, first_token_time=200 + i)
+
+        summary = aggregator.summarize(date.today(), aggregator.snapshot())
+        assert summary['streamed_requests'] == 100
+        assert 240 <= summary['p50_first_token_time'] <= 260
+        assert summary['p95_first_token_time'] >= 290
+
+    def test_failed_flush_keeps_pending(self):
+        """测试刷盘失败时数据保留在内存中"""
+        engine = Mock()
+        engine.begin.side_effect = RuntimeError("数据库不可用")
+        aggregator = SqlStatsAggregator(lambda: engine)
+        aggregator.record(success=True, execution_time=120)
+
+        assert aggregator.flush(drain=True) == 0
+        assert aggregator.snapshot().total == 1
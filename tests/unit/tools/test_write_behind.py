@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+异步批量写入队列单元测试
+测试多行合并写入、WAL落盘与回放、违反约束和会话归属不符的行写入死信文件、非法表名校验
+"""
+
+import json
+import os
+import subprocess
+import sys
+import pytest
+
+try:
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.pool import StaticPool
+    from tools.write_behind import WriteBehindQueue
+except ImportError:
+    pytest.skip("异步写入模块导入失败，跳过异步写入测试", allow_module_level=True)
+
+
+class FlakyEngineProvider:
+    """可切换可用状态的引擎提供者"""
+
+    def __init__(self):
+        self.engine = create_engine(
+            'sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool
+        )
+        with self.engine.begin() as conn:
+            conn.execute(text(
+                "CREATE TABLE qa_history (question TEXT, success INTEGER CHECK (success IN (0, 1)))"
+            ))
+            conn.execute(text(
+                "CREATE TABLE text2sql_sessions (id TEXT PRIMARY KEY, user_id INTEGER, is_deleted INTEGER DEFAULT 0)"
+            ))
+            conn.execute(text("CREATE TABLE text2sql_messages (id TEXT, session_id TEXT, user_id INTEGER, content TEXT)"))
+            conn.execute(text("INSERT INTO text2sql_sessions VALUES ('s1', 1, 0), ('s2', 2, 0), ('s3', 1, 1)"))
+        self.available = True
+
+    def __call__(self, database):
+        if not self.available:
+            raise RuntimeError("数据库不可用")
+        return self.engine
+
+    def count(self):
+        with self.engine.connect() as conn:
+            return conn.execute(text("SELECT COUNT(*) FROM qa_history")).scalar()
+
+
+class TestWriteBehindQueue:
+    """异步批量写入队列测试"""
+
+    @pytest.fixture
+    def provider(self):
+        return FlakyEngineProvider()
+
+    @pytest.fixture
+    def write_queue(self, provider, tmp_path):
+        return WriteBehindQueue(provider, batch_rows=50, wal_path=str(tmp_path / 'wb.wal'))
+
+    def test_flush_batches_rows(self, write_queue, provider):
+        """测试入队不写库，刷盘时合并写入"""
+        for i in range(120):
+            write_queue.submit('vanna', 'qa_history', {'question': f'问题{i}', 'success': 1})
+
+        assert provider.count() == 0
+        assert write_queue.flush() == 120
+        assert provider.count() == 120
+        assert write_queue.stats['batches'] == 3
+
+    def test_spill_and_replay(self, write_queue, provider, tmp_path):
+        """测试数据库不可用时写入WAL，恢复后回放"""
+        provider.available = False
+        for i in range(10):
+            write_queue.submit('vanna', 'qa_history', {'question': f'问题{i}', 'success': 0})
+        write_queue.flush()
+
+        assert write_queue.stats['spilled'] == 10
+        assert (tmp_path / 'wb.wal').exists()
+
+        provider.available = True
+        write_queue.flush()
+
+        assert provider.count() == 10
+        assert write_queue.stats['replayed'] == 10
+        assert not (tmp_path / 'wb.wal').exists()
+
+    def test_bad_row_goes_to_dead_letter(self, write_queue, provider, tmp_path):
+        """测试违反约束的行写入死信文件，同组其他行正常写入"""
+        for i in range(5):
+            write_queue.submit('vanna', 'qa_history', {'question': f'问题{i}', 'success': 7 if i == 2 else 1})
+
+        assert write_queue.flush() == 4
+        assert provider.count() == 4
+        assert write_queue.stats['dead_lettered'] == 1
+        assert write_queue.stats['spilled'] == 0
+        dead = json.loads((tmp_path / 'wb.wal.dead').read_text(encoding='utf-8').strip())
+        assert dead['row'] == {'question': '问题2', 'success': 7}
+        assert dead['error']
+
+    def test_session_owner_checked_on_flush(self, write_queue, provider, tmp_path):
+        """测试刷盘时校验会话归属，他人会话和已删除会话的消息写入死信文件"""
+        for i, session_id in enumerate(['s1', 's2', 's3', 's1']):
+            write_queue.submit('vanna', 'text2sql_messages',
+                               {'id': f'm{i}', 'session_id': session_id, 'user_id': 1, 'content': '问题'})
+
+        assert write_queue.flush() == 2
+        assert write_queue.stats['dead_lettered'] == 2
+        with provider.engine.connect() as conn:
+            assert conn.execute(text("SELECT id FROM text2sql_messages ORDER BY id")).scalars().all() == ['m0', 'm3']
+        dead = [json.loads(line) for line in (tmp_path / 'wb.wal.dead').read_text(encoding='utf-8').splitlines()]
+        assert [entry['row']['session_id'] for entry in dead] == ['s2', 's3']
+
+    def test_resume_leftover_replay_file(self, provider, tmp_path):
+        """测试回放中途退出遗留的.replay文件在下次刷盘时回放"""
+        replay = tmp_path / 'wb.wal.replay'
+        replay.write_text(''.join(
+            json.dumps({'database': 'vanna', 'table': 'qa_history', 'row': {'question': f'问题{i}', 'success': 1}},
+                       ensure_ascii=False) + '\n'
+            for i in range(3)
+        ), encoding='utf-8')
+
+        provider.available = False
+        write_queue = WriteBehindQueue(provider, wal_path=str(tmp_path / 'wb.wal'))
+        write_queue.flush()
+        # 数据库不可用时行转回WAL，回放文件处理完才删除
+        assert not replay.exists()
+        assert write_queue.stats['spilled'] == 3
+
+        provider.available = True
+        write_queue.flush()
+        assert provider.count() == 3
+
+    def test_replay_claims_only_dead_process_files(self, write_queue, provider, tmp_path):
+        """测试只认领已退出进程遗留的回放文件，其他存活进程正在回放的文件不重复回放"""
+        dead = subprocess.Popen([sys.executable, '-c', 'pass'])
+        dead.wait()
+        for pid in (dead.pid, os.getppid()):
+            (tmp_path / f'wb.wal.replay.{pid}').write_text(
+                json.dumps({'database': 'vanna', 'table': 'qa_history',
+                            'row': {'question': f'问题{pid}', 'success': 1}}, ensure_ascii=False) + '\n',
+                encoding='utf-8'
+            )
+
+        write_queue.flush()
+
+        assert provider.count() == 1
+        assert not (tmp_path / f'wb.wal.replay.{dead.pid}').exists()
+        assert (tmp_path / f'wb.wal.replay.{os.getppid()}').exists()
+
+    def test_background_flusher_and_stop(self, provider, tmp_path):
+        """测试后台线程刷盘及停止时写完剩余数据"""
+        write_queue = WriteBehindQueue(provider, flush_interval_ms=10, wal_path=str(tmp_path / 'wb.wal'))
+        write_queue.start()
+        for i in range(5):
+            write_queue.submit('vanna', 'qa_history', {'question': f'问题{i}', 'success': 1})
+        write_queue.stop()
+
+        assert provider.count() == 5
+
+    def test_reject_unknown_table(self, write_queue):
+        """测试拒绝未登记的表和非法列名"""
+        with pytest.raises(ValueError):
+            write_queue.submit('vanna', 'users', {'id': 1})
+        with pytest.raises(ValueError):
+            write_queue.submit('vanna', 'qa_history', {'question; DROP': 1})
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Aho-Corasick多模式匹配模块
+一次扫描文本即可找出所有词典词的出现位置，耗时与文本长度成正比，与词典大小无关。
+
+转移表使用以(状态, 字符)为键的单个字典，比每个节点一个字典节省内存；
+失败指针按广度优先构建，输出链合并后每个状态直接持有以该状态结尾的全部词。
+"""
+from collections import deque
+from typing import Dict, Any, List, Iterable, Tuple
+
+class AhoCorasick:
+    """不可变的Aho-Corasick自动机，构建后可被多个线程并发查询"""
+
+    def __init__(self, words: Iterable[Tuple[str, Any]]):
+        """
+        Args:
+            words: (词, 附带数据)，同一个词出现多次时保留最后一次的数据
+        """
+        self._goto: Dict[Tuple[int, str], int] = {}
+        self._fail: List[int] = [0]
+        self._output: List[Tuple[Tuple[int, Any], ...]] = [()]
+        payloads: Dict[int, Tuple[int, Any]] = {}
+        children: List[List[str]] = [[]]
+
+        for word, payload in words:
+            if not word:
+                continue
+            state = 0
+            for char in word:
+                key = (state, char)
+                next_state = self._goto.get(key)
+                if next_state is None:
+                    next_state = len(self._fail)
+                    self._goto[key] = next_state
+                    self._fail.append(0)
+                    self._output.append(())
+                    children.append([])
+                    children[state].append(char)
+                state = next_state
+            payloads[state] = (len(word), payload)
+
+        queue = deque()
+        for char in children[0]:
+            state = self._goto[(0, char)]
+            queue.append(state)
+            if state in payloads:
+                self._output[state] = (payloads[state],)
+        while queue:
+            state = queue.popleft()
+            for char in children[state]:
+                child = self._goto[(state, char)]
+                fallback = self._fail[state]
+                while fallback and (fallback, char) not in self._goto:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto.get((fallback, char), 0)
+                own = (payloads[child],) if child in payloads else ()
+                self._output[child] = own + self._output[self._fail[child]]
+                queue.append(child)
+        self.size = len(payloads)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def iter_matches(self, content: str):
+        """逐个产出 (起始位置, 结束位置, 附带数据)，按结束位置排列"""
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for index, char in enumerate(content):
+            while state and (state, char) not in goto:
+                state = fail[state]
+            state = goto.get((state, char), 0)
+            for length, payload in output[state]:
+                yield index + 1 - length, index + 1, payload
+
+    def find_longest(self, content: str) -> List[Tuple[int, int, Any]]:
+        """
+        最左最长且互不重叠的匹配
+
+        Returns:
+            [(起始位置, 结束位置, 附带数据)]，按起始位置排列
+        """
+        matches = sorted(self.iter_matches(content), key=lambda match: (match[0], match[0] - match[1]))
+        selected, position = [], 0
+        for start, end, payload in matches:
+            if start >= position:
+                selected.append((start, end, payload))
+                position = end
+        return selected
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Airflow REST API客户端
+使用带连接池的requests会话，对连接错误和5xx/429自动退避重试。
+触发DAG运行时由调用方指定dag_run_id，重试导致的重复提交返回409并按已触发处理
+"""
+import logging
+import threading
+from typing import Dict, Any, Optional, List, Iterator, Tuple
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from config.base_config import Config
+from tools.exceptions import ExternalServiceException
+
+logger = logging.getLogger(__name__)
+
+# Airflow DAG运行状态
+DAG_RUN_ACTIVE_STATES = ('queued', 'running')
+DAG_RUN_FINISHED_STATES = ('success', 'failed')
+
+class AirflowClient:
+    """Airflow REST API客户端（线程安全，可在线程池中共享）"""
+
+    def __init__(self, base_url: Optional[str] = None, auth: Optional[Tuple[str, str]] = None,
+                 timeout: Optional[float] = None, max_retries: Optional[int] = None,
+                 pool_size: Optional[int] = None):
+        self.base_url = (base_url or Config.AIRFLOW_API_URL).rstrip('/')
+        self.timeout = timeout or Config.AIRFLOW_REQUEST_TIMEOUT
+        retries = Retry(
+            total=Config.AIRFLOW_MAX_RETRIES if max_retries is None else max_retries,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=None,  # POST同样重试：dag_run_id保证幂等
+            raise_on_status=False
+        )
+        pool_size = pool_size or Config.AIRFLOW_TRIGGER_WORKERS
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retries)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.auth = auth or (Config.AIRFLOW_USERNAME, Config.AIRFLOW_PASSWORD)
+        self.session.headers.update({'Content-Type': 'application/json'})
+
+    def _request(self, method: str, path: str, **kwargs) -> requests.Response:
+        try:
+            return self.session.request(method, f'{self.base_url}{path}', timeout=self.timeout, **kwargs)
+        except requests.RequestException as e:
+            raise ExternalServiceException(f'Airflow请求失败: {str(e)}')
+
+    @staticmethod
+    def _error(response: requests.Response, action: str) -> ExternalServiceException:
+        try:
+            detail = response.json().get('detail') or response.text
+        except ValueError:
+            detail = response.text
+        return ExternalServiceException(f'{action}失败({response.status_code}): {detail}', code=response.status_code)
+
+    def trigger_dag_run(self, dag_id: str, dag_run_id: str, conf: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        触发DAG运行
+
+        Returns:
+            Dict: DAG运行信息；dag_run_id已存在时返回{'dag_run_id':..., 'state': None, 'existing': True}
+        """
+        response = self._request('POST', f'/dags/{dag_id}/dagRuns', json={
+            'dag_run_id': dag_run_id,
+            'conf': conf or {}
+        })
+        if response.status_code == 409:
+            return {'dag_id': dag_id, 'dag_run_id': dag_run_id, 'state': None, 'existing': True}
+        if response.status_code >= 400:
+            raise self._error(response, f'触发DAG {dag_id}')
+        return response.json()
+
+    def list_dag_runs(self, dag_ids: List[str], states: Optional[List[str]] = None,
+                      start_date_gte: Optional[str] = None, page_limit: int = 100) -> Iterator[Dict[str, Any]]:
+        """
+        批量查询多个DAG的运行记录（/dags/~/dagRuns/list），自动翻页
+
+        Args:
+            dag_ids: DAG ID列表
+            states: 状态过滤
+            start_date_gte: 只查询该时间（ISO格式）之后开始的运行
+            page_limit: 每页条数
+        """
+        body: Dict[str, Any] = {'dag_ids': list(dag_ids), 'page_limit': page_limit, 'order_by': 'start_date'}
+        if states:
+            body['states'] = list(states)
+        if start_date_gte:
+            body['start_date_gte'] = start_date_gte
+
+        offset = 0
+        while True:
+            response = self._request('POST', '/dags/~/dagRuns/list', json={**body, 'page_offset': offset})
+            if response.status_code >= 400:
+                raise self._error(response, '查询DAG运行列表')
+            payload = response.json()
+            runs = payload.get('dag_runs') or []
+            yield from runs
+            offset += len(runs)
+            if not runs or offset >= payload.get('total_entries', 0):
+                break
+
+    def close(self):
+        self.session.close()
+
+# 全局Airflow客户端实例
+_airflow_client = None
+_airflow_client_lock = threading.Lock()
+
+def get_airflow_client() -> AirflowClient:
+    """获取Airflow客户端实例"""
+    global _airflow_client
+    if _airflow_client is None:
+        with _airflow_client_lock:
+            if _airflow_client is None:
+                _airflow_client = AirflowClient()
+    return _airflow_client
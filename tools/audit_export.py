@@ -0,0 +1,321 @@
+"""
+审计日志导出服务模块
+后台任务通过服务端游标流式读取operation_audit，逐行写入CSV或只写模式的XLSX文件，
+内存占用与导出行数无关；任务状态以JSON文件保存在导出目录中，多进程部署时共享同一目录即可查询
+"""
+import csv
+import json
+import os
+import re
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Tuple, Callable, Iterator
+from sqlalchemy import text
+from config.base_config import Config
+
+try:
+    from openpyxl import Workbook
+    from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+except ImportError:  # XLSX导出为可选功能
+    Workbook = None
+    ILLEGAL_CHARACTERS_RE = None
+
+logger = logging.getLogger(__name__)
+
+# 导出列定义: (字段, 表头)
+EXPORT_COLUMNS = {
+    'operation': [
+        ('id', '日志ID'),
+        ('operation_time', '操作时间'),
+        ('username', '操作人'),
+        ('module', '模块'),
+        ('operation', '操作类型'),
+        ('target_type', '对象类型'),
+        ('target_id', '对象ID'),
+        ('target_name', '对象名称'),
+        ('operation_desc', '操作描述'),
+        ('ip_address', 'IP地址'),
+        ('result', '结果'),
+        ('error_message', '错误信息'),
+    ],
+    'login': [
+        ('id', '日志ID'),
+        ('operation_time', '登录时间'),
+        ('username', '用户名'),
+        ('ip_address', 'IP地址'),
+        ('user_agent', '设备'),
+        ('result', '结果'),
+        ('error_message', '失败原因'),
+    ],
+}
+
+EXPORT_FORMATS = ('csv', 'xlsx')
+
+# 单个工作表最多1048576行，超过后续写到新的工作表
+XLSX_SHEET_ROWS = 1000000
+
+# 以这些字符开头的单元格会被表格软件当作公式执行
+_FORMULA_PREFIXES = ('=', '+', '-', '@')
+
+_JOB_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+def _sanitize(value: Any) -> Any:
+    """防止公式注入"""
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+class _CsvSink:
+    """CSV写入器（带BOM，Excel可直接打开）"""
+
+    def __init__(self, path: str, headers: List[str]):
+        self._file = open(path, 'w', encoding='utf-8-sig', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(headers)
+
+    def write(self, values: List[Any]):
+        self._writer.writerow([
+            '' if value is None else _sanitize(
+                value.strftime('%Y-%m-%d %H:%M:%S') if isinstance(value, datetime) else value
+            )
+            for value in values
+        ])
+
+    def close(self):
+        self._file.close()
+
+class _XlsxSink:
+    """XLSX写入器，使用openpyxl只写模式逐行落盘"""
+
+    def __init__(self, path: str, headers: List[str]):
+        if Workbook is None:
+            raise RuntimeError('未安装openpyxl，无法导出XLSX')
+        self._path = path
+        self._headers = headers
+        self._workbook = Workbook(write_only=True)
+        self._sheet = None
+        self._sheet_rows = 0
+        self._new_sheet()
+
+    def _new_sheet(self):
+        index = len(self._workbook.worksheets) + 1
+        self._sheet = self._workbook.create_sheet(title=f'审计日志{index}' if index > 1 else '审计日志')
+        self._sheet.append(self._headers)
+        self._sheet_rows = 0
+
+    def write(self, values: List[Any]):
+        if self._sheet_rows >= XLSX_SHEET_ROWS:
+            self._new_sheet()
+        self._sheet.append([
+            ILLEGAL_CHARACTERS_RE.sub('', _sanitize(value)) if isinstance(value, str) else value
+            for value in values
+        ])
+        self._sheet_rows += 1
+
+    def close(self):
+        self._workbook.save(self._path)
+
+class AuditExportService:
+    """审计日志导出任务服务类"""
+
+    def __init__(
+        self,
+        engine_provider: Optional[Callable[[], Any]] = None,
+        export_dir: Optional[str] = None,
+        max_workers: Optional[int] = None,
+        fetch_size: Optional[int] = None
+    ):
+        """
+        初始化导出服务
+
+        Args:
+            engine_provider: 返回主库引擎的可调用对象
+            export_dir: 导出文件及任务状态目录
+            max_workers: 并发导出任务数
+            fetch_size: 每次从服务端游标读取的行数
+        """
+        self._engine_provider = engine_provider or _default_engine_provider
+        self.export_dir = export_dir or Config.AUDIT_EXPORT_DIR
+        self.fetch_size = fetch_size or Config.AUDIT_EXPORT_FETCH_SIZE
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or Config.AUDIT_EXPORT_WORKERS,
+            thread_name_prefix='audit-export'
+        )
+        os.makedirs(self.export_dir, exist_ok=True)
+
+    # ================================
+    # 任务状态
+    # ================================
+
+    def _status_path(self, job_id: str) -> str:
+        return os.path.join(self.export_dir, f'{job_id}.json')
+
+    def _save_job(self, job: Dict[str, Any]):
+        """原子写入任务状态"""
+        path = self._status_path(job['job_id'])
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(job, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        if job.get('user_id') is not None:
+            from tools.event_bus import get_event_bus
+            get_event_bus().publish(job['user_id'], 'export_progress', job)
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """获取任务状态，任务不存在时返回None"""
+        if not _JOB_ID_RE.match(job_id or ''):
+            return None
+        try:
+            with open(self._status_path(job_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def get_file_path(self, job: Dict[str, Any]) -> str:
+        """获取任务导出文件路径"""
+        return os.path.join(self.export_dir, job['file_name'])
+
+    # ================================
+    # 提交与执行
+    # ================================
+
+    def submit(
+        self,
+        log_type: str,
+        file_format: str,
+        conditions: List[str],
+        params: Dict[str, Any],
+        estimated_total: Optional[int] = None,
+        user_id: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        提交导出任务
+
+        Args:
+            log_type: 日志类型（operation/login）
+            file_format: 文件格式（csv/xlsx）
+            conditions: 查询条件（由AuditService构建）
+            params: 查询参数
+            estimated_total: 预估行数，用于计算进度
+            user_id: 发起导出的用户ID
+
+        Returns:
+            Dict[str, Any]: 任务状态
+        """
+        if log_type not in EXPORT_COLUMNS:
+            raise ValueError(f'不支持的日志类型: {log_type}')
+        if file_format not in EXPORT_FORMATS:
+            raise ValueError(f'不支持的导出格式: {file_format}')
+        if file_format == 'xlsx' and Workbook is None:
+            raise ValueError('未安装openpyxl，无法导出XLSX')
+
+        job_id = uuid.uuid4().hex
+        now = datetime.now()
+        job = {
+            'job_id': job_id,
+            'status': 'pending',
+            'log_type': log_type,
+            'format': file_format,
+            'user_id': user_id,
+            'file_name': f"audit_{log_type}_logs_{now.strftime('%Y%m%d%H%M%S')}_{job_id[:8]}.{file_format}",
+            'rows': 0,
+            'estimated_total': estimated_total,
+            'progress': 0,
+            'file_size': None,
+            'error': None,
+            'created_at': now.strftime('%Y-%m-%d %H:%M:%S'),
+            'finished_at': None
+        }
+        self._save_job(job)
+        self._executor.submit(self._run, dict(job), conditions, params)
+        return job
+
+    def _stream_rows(self, log_type: str, conditions: List[str],
+                     params: Dict[str, Any]) -> Iterator[Tuple]:
+        """通过服务端游标逐批读取，客户端只缓存fetch_size行"""
+        columns = ', '.join(column for column, _ in EXPORT_COLUMNS[log_type])
+        where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        sql = text(f"""
+            SELECT {columns}
+            FROM operation_audit
+            {where_clause}
+            ORDER BY operation_time DESC, id DESC
+        """)
+        with self._engine_provider().connect() as conn:
+            result = conn.execution_options(
+                stream_results=True, max_row_buffer=self.fetch_size
+            ).execute(sql, params)
+            for batch in result.partitions(self.fetch_size):
+                yield from batch
+
+    def _run(self, job: Dict[str, Any], conditions: List[str], params: Dict[str, Any]):
+        """执行导出任务"""
+        path = self.get_file_path(job)
+        tmp_path = f'{path}.part'
+        headers = [header for _, header in EXPORT_COLUMNS[job['log_type']]]
+        sink = None
+        try:
+            job['status'] = 'running'
+            self._save_job(job)
+
+            sink = (_XlsxSink if job['format'] == 'xlsx' else _CsvSink)(tmp_path, headers)
+            for row in self._stream_rows(job['log_type'], conditions, params):
+                sink.write(list(row))
+                job['rows'] += 1
+                if job['rows'] % self.fetch_size == 0:
+                    estimated = job['estimated_total']
+                    if estimated:
+                        job['progress'] = min(99, job['rows'] * 100 // estimated)
+                    self._save_job(job)
+            sink.close()
+            sink = None
+            os.replace(tmp_path, path)
+
+            job.update({
+                'status': 'completed',
+                'progress': 100,
+                'file_size': os.path.getsize(path),
+                'finished_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            })
+            logger.info(f"审计日志导出完成: {job['job_id']}, {job['rows']}行")
+        except Exception as e:
+            logger.error(f"审计日志导出失败: {job['job_id']}, {str(e)}")
+            job.update({
+                'status': 'failed',
+                'error': str(e),
+                'finished_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            })
+            if sink is not None:
+                try:
+                    sink.close()
+                except Exception:
+                    pass
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        finally:
+            self._save_job(job)
+
+    def shutdown(self, wait: bool = True):
+        """停止导出线程池"""
+        self._executor.shutdown(wait=wait)
+
+def _default_engine_provider():
+    # 导出长时间占用服务端游标连接，使用独立连接池
+    from tools.engine_registry import get_engine
+    return get_engine(Config.SQLALCHEMY_DATABASE_URI, 'export')
+
+# 全局导出服务实例
+_audit_export_service = None
+_audit_export_lock = threading.Lock()
+
+def get_audit_export_service() -> AuditExportService:
+    """获取审计日志导出服务实例"""
+    global _audit_export_service
+    if _audit_export_service is None:
+        with _audit_export_lock:
+            if _audit_export_service is None:
+                _audit_export_service = AuditExportService()
+    return _audit_export_service
@@ -6,9 +6,9 @@
 import logging
 from typing import Optional, Dict, Any, List
 import pymysql
-from sqlalchemy import create_engine, text
-from sqlalchemy.pool import QueuePool
+from sqlalchemy import text
 from config.base_config import Config
+from tools.engine_registry import get_engine
 from contextlib import contextmanager
 from sqlalchemy.orm import sessionmaker, scoped_session
 from models import Base
@@ -17,10 +17,10 @@ logger = logging.getLogger(__name__)
 
 config = Config()
 # 数据库连接配置
-DATABASE_URL = f"mysql+pymysql://{config.DB_USER}:{config.DB_PASSWORD}@{config.DB_HOST}:{config.DB_PORT}/{config.DB_NAME}"
+DATABASE_URL = config.SQLALCHEMY_DATABASE_URI
 
-# 创建数据库引擎
-engine = create_engine(DATABASE_URL)
+# 数据库引擎（与DatabaseService共享同一连接池）
+engine = get_engine(DATABASE_URL)
 
 # 创建所有表
 Base.metadata.create_all(engine)
@@ -56,16 +56,9 @@ class DatabaseService:
         self.VannaSession = scoped_session(sessionmaker(bind=self.vanna_engine))
         
     def _create_engine(self, database_uri: str, db_name: str):
-        """创建数据库引擎"""
+        """从引擎注册表获取数据库引擎"""
         try:
-            engine = create_engine(
-                database_uri,
-                poolclass=QueuePool,
-                **self.config.SQLALCHEMY_ENGINE_OPTIONS,
-                echo=self.config.DEBUG
-            )
-            logger.info(f"{db_name}引擎创建成功")
-            return engine
+            return get_engine(database_uri)
         except Exception as e:
             logger.error(f"{db_name}引擎创建失败: {str(e)}")
             raise
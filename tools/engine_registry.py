@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+数据库引擎注册表
+进程内按(连接URL, 负载类型)共享SQLAlchemy引擎，各服务不再各自create_engine。
+负载类型用于隔离连接池：长时间占用连接的导出、后台刷盘不会耗尽在线请求的连接池。
+进程fork后子进程丢弃继承的连接（不关闭父进程的socket），首次使用时重新建立
+"""
+import os
+import logging
+import threading
+from typing import Dict, Any, Optional, Tuple, List
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import QueuePool
+from config.base_config import Config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKLOAD = 'default'
+
+class EngineRegistry:
+    """进程级数据库引擎注册表"""
+
+    def __init__(self, base_options: Optional[Dict[str, Any]] = None,
+                 workload_options: Optional[Dict[str, Dict[str, Any]]] = None):
+        if base_options is None:
+            base_options = {**Config.SQLALCHEMY_ENGINE_OPTIONS, 'echo': Config.DEBUG}
+        self.base_options = dict(base_options)
+        self.workload_options = dict(Config.DB_WORKLOAD_POOL_OPTIONS if workload_options is None else workload_options)
+        self._engines: Dict[Tuple[str, str], Engine] = {}
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def _options(self, url: str, workload: str) -> Dict[str, Any]:
+        options = dict(self.base_options)
+        options.update(self.workload_options.get(workload, {}))
+        if make_url(url).get_backend_name() == 'sqlite':
+            # SQLite不使用连接池参数
+            return {key: value for key, value in options.items() if key == 'echo'}
+        options.setdefault('poolclass', QueuePool)
+        return options
+
+    def get_engine(self, url: str, workload: str = DEFAULT_WORKLOAD) -> Engine:
+        """
+        获取共享引擎，不存在时按配置创建
+
+        Args:
+            url: 数据库连接URL
+            workload: 负载类型（default/export/background等），决定使用的连接池参数
+        """
+        self._check_fork()
+        key = (url, workload)
+        engine = self._engines.get(key)
+        if engine is not None:
+            return engine
+        with self._lock:
+            engine = self._engines.get(key)
+            if engine is None:
+                engine = create_engine(url, **self._options(url, workload))
+                self._engines[key] = engine
+                logger.info(f"数据库引擎创建成功: {engine.url.render_as_string(hide_password=True)} [{workload}]")
+        return engine
+
+    def _check_fork(self):
+        """fork后首次访问时兜底丢弃继承的连接（未注册at_fork回调的平台）"""
+        if self._pid != os.getpid():
+            self.after_fork()
+
+    def after_fork(self):
+        """子进程中丢弃继承的连接池，不关闭与父进程共享的socket"""
+        # fork时其他线程可能持有锁，子进程中只有当前线程，直接重建锁
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        for engine in list(self._engines.values()):
+            engine.dispose(close=False)
+
+    def dispose_all(self):
+        """关闭全部连接（进程退出时调用）"""
+        with self._lock:
+            for engine in self._engines.values():
+                engine.dispose()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """各引擎连接池使用情况"""
+        with self._lock:
+            items = list(self._engines.items())
+        result = []
+        for (_, workload), engine in items:
+            pool = engine.pool
+            item = {
+                'url': engine.url.render_as_string(hide_password=True),
+                'workload': workload,
+                'pool_class': type(pool).__name__
+            }
+            if isinstance(pool, QueuePool):
+                item.update({
+                    'pool_size': pool.size(),
+                    'checked_out': pool.checkedout(),
+                    'checked_in': pool.checkedin(),
+                    'overflow': pool.overflow(),
+                    'max_overflow': pool._max_overflow
+                })
+            result.append(item)
+        return result
+
+# 全局引擎注册表
+_engine_registry = None
+_engine_registry_lock = threading.Lock()
+
+def get_engine_registry() -> EngineRegistry:
+    """获取引擎注册表实例"""
+    global _engine_registry
+    if _engine_registry is None:
+        with _engine_registry_lock:
+            if _engine_registry is None:
+                registry = EngineRegistry()
+                if hasattr(os, 'register_at_fork'):
+                    os.register_at_fork(after_in_child=registry.after_fork)
+                _engine_registry = registry
+    return _engine_registry
+
+def get_engine(url: str, workload: str = DEFAULT_WORKLOAD) -> Engine:
+    """获取共享数据库引擎"""
+    return get_engine_registry().get_engine(url, workload)
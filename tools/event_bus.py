@@ -0,0 +1,352 @@
+# -*- coding: utf-8 -*-
+"""
+事件推送模块
+基于Redis Stream + Pub/Sub的服务端推送（SSE）
+
+每个用户一个事件流events:user:<id>，全体广播使用events:broadcast。
+发布时在同一个Lua脚本中XADD到短期积压流并PUBLISH，客户端断线重连时
+凭Last-Event-ID从积压流补发。每个进程只保持一个订阅连接，
+再分发到本进程内各SSE连接的队列，空闲连接不占用Redis连接
+"""
+import json
+import queue
+import logging
+import secrets
+import threading
+import time
+from typing import Dict, Any, Optional, List, Iterator, Tuple, Callable, Set
+from config.base_config import Config
+
+logger = logging.getLogger(__name__)
+
+USER_STREAM_PREFIX = 'events:user:'
+BROADCAST_STREAM = 'events:broadcast'
+TICKET_PREFIX = 'events:ticket:'
+
+# 订阅连接恢复后通知各SSE连接从积压流补发
+RESYNC = object()
+
+_PUBLISH_SCRIPT = """
+local id = redis.call('XADD', KEYS[1], 'MAXLEN', '~', ARGV[1], '*', 'event', ARGV[2], 'data', ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+redis.call('PUBLISH', KEYS[1], cjson.encode({id = id, event = ARGV[2], data = ARGV[3]}))
+return id
+"""
+
+def _stream_key(user_id: Optional[int]) -> str:
+    return BROADCAST_STREAM if user_id is None else f'{USER_STREAM_PREFIX}{user_id}'
+
+def _parse_stream_id(stream_id: str) -> Tuple[int, int]:
+    ms, _, seq = stream_id.partition('-')
+    return int(ms), int(seq or 0)
+
+def encode_event_id(user_cursor: str, broadcast_cursor: str) -> str:
+    """SSE事件ID同时记录用户流和广播流的位置"""
+    return f'{user_cursor},{broadcast_cursor}'
+
+def decode_event_id(event_id: Optional[str]) -> Optional[Tuple[str, str]]:
+    """解析Last-Event-ID，格式不合法时返回None"""
+    if not event_id:
+        return None
+    try:
+        user_cursor, broadcast_cursor = event_id.split(',', 1)
+        _parse_stream_id(user_cursor)
+        _parse_stream_id(broadcast_cursor)
+        return user_cursor, broadcast_cursor
+    except ValueError:
+        return None
+
+def format_sse(event: str, data: str, event_id: Optional[str] = None) -> str:
+    """格式化一条SSE消息"""
+    lines = []
+    if event_id:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    for line in data.splitlines() or ['']:
+        lines.append(f'data: {line}')
+    return '\n'.join(lines) + '\n\n'
+
+def _default_redis_provider():
+    from tools.redis_service import get_redis_service
+    return get_redis_service().redis_client
+
+class EventBus:
+    """事件总线：发布、积压补发和进程内订阅分发"""
+
+    def __init__(self, redis_provider: Optional[Callable[[], Any]] = None,
+                 backlog: Optional[int] = None, backlog_ttl: Optional[int] = None):
+        self._redis_provider = redis_provider or _default_redis_provider
+        self.backlog = backlog or Config.EVENT_BACKLOG_SIZE
+        self.backlog_ttl = backlog_ttl or Config.EVENT_BACKLOG_TTL
+        self._script = None
+        self._subscribers: Dict[str, Set[queue.Queue]] = {}
+        self._lock = threading.Lock()
+        self._listener: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    @property
+    def redis(self):
+        return self._redis_provider()
+
+    # ================================
+    # 发布
+    # ================================
+
+    def publish(self, user_id: Optional[int], event: str, data: Any) -> Optional[str]:
+        """
+        发布事件
+
+        Args:
+            user_id: 接收用户ID，None表示全体广播
+            event: 事件名称
+            data: 事件数据（可JSON序列化）
+
+        Returns:
+            Optional[str]: 事件流ID，发布失败时返回None
+        """
+        return self.publish_many([user_id], event, data)[0]
+
+    def publish_many(self, user_ids: List[Optional[int]], event: str, data: Any) -> List[Optional[str]]:
+        """向多个用户发布同一事件（管道一次提交）"""
+        if not user_ids:
+            return []
+        try:
+            client = self.redis
+            if self._script is None:
+                self._script = client.register_script(_PUBLISH_SCRIPT)
+            payload = json.dumps(data, ensure_ascii=False, default=str)
+            pipe = client.pipeline(transaction=False)
+            for user_id in user_ids:
+                self._script(
+                    keys=[_stream_key(user_id)],
+                    args=[self.backlog, event, payload, self.backlog_ttl],
+                    client=pipe
+                )
+            return pipe.execute()
+        except Exception as e:
+            logger.error(f"发布事件失败 {event}: {str(e)}")
+            return [None] * len(user_ids)
+
+    # ================================
+    # 连接票据
+    # ================================
+
+    def issue_ticket(self, user_id: int, expires_at: Optional[float] = None) -> str:
+        """
+        签发SSE连接票据
+
+        EventSource无法设置请求头，凭证只能放在URL中，会被访问日志和代理记录；
+        因此URL中只传短期有效、一次性使用的随机票据，不传访问令牌
+
+        Args:
+            user_id: 用户ID
+            expires_at: 访问令牌的过期时间戳，作为事件流的结束时间
+        """
+        ticket = secrets.token_urlsafe(32)
+        self.redis.set(f'{TICKET_PREFIX}{ticket}', json.dumps({'id': user_id, 'exp': expires_at}),
+                       ex=Config.EVENT_TICKET_TTL)
+        return ticket
+
+    def redeem_ticket(self, ticket: str) -> Optional[Dict[str, Any]]:
+        """兑换票据（读取后立即删除），无效或已使用时返回None"""
+        pipe = self.redis.pipeline()
+        pipe.get(f'{TICKET_PREFIX}{ticket}')
+        pipe.delete(f'{TICKET_PREFIX}{ticket}')
+        raw, _ = pipe.execute()
+        return json.loads(raw) if raw else None
+
+    # ================================
+    # 积压补发
+    # ================================
+
+    def tail_cursor(self, user_id: int) -> Tuple[str, str]:
+        """获取用户流和广播流当前最新位置"""
+        client = self.redis
+        pipe = client.pipeline(transaction=False)
+        pipe.xrevrange(_stream_key(user_id), count=1)
+        pipe.xrevrange(BROADCAST_STREAM, count=1)
+        user_tail, broadcast_tail = pipe.execute()
+        return (
+            user_tail[0][0] if user_tail else '0-0',
+            broadcast_tail[0][0] if broadcast_tail else '0-0'
+        )
+
+    def replay(self, user_id: int, cursor: Tuple[str, str]) -> List[Tuple[str, str, str, str]]:
+        """
+        读取游标之后的积压事件
+
+        Returns:
+            按时间排序的(流, 事件流ID, 事件名称, 数据)列表
+        """
+        client = self.redis
+        pipe = client.pipeline(transaction=False)
+        pipe.xrange(_stream_key(user_id), min=f'({cursor[0]}', count=self.backlog)
+        pipe.xrange(BROADCAST_STREAM, min=f'({cursor[1]}', count=self.backlog)
+        user_events, broadcast_events = pipe.execute()
+
+        events = [('user', stream_id, fields.get('event'), fields.get('data'))
+                  for stream_id, fields in user_events]
+        events += [('broadcast', stream_id, fields.get('event'), fields.get('data'))
+                   for stream_id, fields in broadcast_events]
+        events.sort(key=lambda item: _parse_stream_id(item[1]))
+        return events
+
+    # ================================
+    # 进程内订阅
+    # ================================
+
+    def subscribe(self, user_id: int) -> queue.Queue:
+        """注册一个SSE连接的事件队列"""
+        self._ensure_listener()
+        subscriber: queue.Queue = queue.Queue(maxsize=Config.EVENT_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.setdefault(_stream_key(user_id), set()).add(subscriber)
+            self._subscribers.setdefault(BROADCAST_STREAM, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, user_id: int, subscriber: queue.Queue):
+        """注销SSE连接的事件队列"""
+        with self._lock:
+            for key in (_stream_key(user_id), BROADCAST_STREAM):
+                subscribers = self._subscribers.get(key)
+                if subscribers:
+                    subscribers.discard(subscriber)
+                    if not subscribers:
+                        del self._subscribers[key]
+
+    def connection_count(self) -> int:
+        """本进程SSE连接数"""
+        with self._lock:
+            return len(self._subscribers.get(BROADCAST_STREAM, ()))
+
+    def _dispatch(self, channel: str, payload: str):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        if not subscribers:
+            return
+        message = json.loads(payload)
+        item = ('broadcast' if channel == BROADCAST_STREAM else 'user',
+                message['id'], message['event'], message['data'])
+        for subscriber in subscribers:
+            self._offer(subscriber, item)
+
+    @staticmethod
+    def _offer(subscriber: queue.Queue, item: Any):
+        """队列满时丢弃并要求该连接从积压流补发，慢连接不阻塞分发"""
+        try:
+            subscriber.put_nowait(item)
+        except queue.Full:
+            try:
+                while True:
+                    subscriber.get_nowait()
+            except queue.Empty:
+                pass
+            subscriber.put_nowait(RESYNC)
+
+    def _ensure_listener(self):
+        if self._listener is not None and self._listener.is_alive():
+            return
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._stop_event.clear()
+                self._listener = threading.Thread(
+                    target=self._listen, name='event-bus-listener', daemon=True
+                )
+                self._listener.start()
+
+    def _listen(self):
+        """订阅循环，断线后重连并通知所有连接补发"""
+        reconnecting = False
+        while not self._stop_event.is_set():
+            pubsub = None
+            try:
+                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(f'{USER_STREAM_PREFIX}*')
+                pubsub.subscribe(BROADCAST_STREAM)
+                if reconnecting:
+                    with self._lock:
+                        subscribers = set().union(*self._subscribers.values()) if self._subscribers else set()
+                    for subscriber in subscribers:
+                        self._offer(subscriber, RESYNC)
+                    reconnecting = False
+                while not self._stop_event.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message['type'] in ('message', 'pmessage'):
+                        self._dispatch(message['channel'], message['data'])
+            except Exception as e:
+                logger.error(f"事件订阅连接异常，稍后重连: {str(e)}")
+                reconnecting = True
+                time.sleep(1)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+    def stop(self):
+        """停止订阅线程"""
+        self._stop_event.set()
+        if self._listener is not None:
+            self._listener.join(timeout=5)
+
+    # ================================
+    # SSE流
+    # ================================
+
+    def stream(self, user_id: int, last_event_id: Optional[str] = None,
+               heartbeat: Optional[float] = None, deadline: Optional[float] = None) -> Iterator[str]:
+        """
+        生成用户的SSE消息流
+
+        先注册队列再确定起始位置，保证两者之间发布的事件不会丢失；
+        队列中的事件按流ID去重，补发与实时推送重叠的部分只发送一次。
+        到达deadline（通常为令牌过期时间）后结束，客户端携带新令牌重连
+        """
+        heartbeat = heartbeat or Config.EVENT_HEARTBEAT_SECONDS
+        subscriber = self.subscribe(user_id)
+        try:
+            cursor = decode_event_id(last_event_id)
+            pending: List[Tuple[str, str, str, str]] = []
+            if cursor is None:
+                cursor = self.tail_cursor(user_id)
+            else:
+                pending = self.replay(user_id, cursor)
+            positions = {'user': _parse_stream_id(cursor[0]), 'broadcast': _parse_stream_id(cursor[1])}
+            ids = {'user': cursor[0], 'broadcast': cursor[1]}
+
+            yield f'retry: {Config.EVENT_RETRY_MS}\n\n'
+            while deadline is None or time.time() < deadline:
+                for source, stream_id, event, data in pending:
+                    position = _parse_stream_id(stream_id)
+                    if position <= positions[source]:
+                        continue
+                    positions[source] = position
+                    ids[source] = stream_id
+                    yield format_sse(event, data, encode_event_id(ids['user'], ids['broadcast']))
+                pending = []
+
+                try:
+                    item = subscriber.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ': heartbeat\n\n'
+                    continue
+                if item is RESYNC:
+                    pending = self.replay(user_id, (ids['user'], ids['broadcast']))
+                else:
+                    pending = [item]
+        finally:
+            self.unsubscribe(user_id, subscriber)
+
+# 全局事件总线实例
+_event_bus = None
+_event_bus_lock = threading.Lock()
+
+def get_event_bus() -> EventBus:
+    """获取事件总线实例"""
+    global _event_bus
+    if _event_bus is None:
+        with _event_bus_lock:
+            if _event_bus is None:
+                _event_bus = EventBus()
+    return _event_bus
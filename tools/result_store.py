@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""
+查询结果存储模块
+将大体积的Text2SQL查询结果按内容哈希压缩存储，消息表中只保留预览和引用
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Optional, Dict, Any, List
+from config.base_config import Config
+
+logger = logging.getLogger(__name__)
+
+
+def _json_default(obj):
+    """处理查询结果中常见的非JSON原生类型"""
+    if isinstance(obj, datetime):
+        return obj.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(obj, date):
+        return obj.strftime('%Y-%m-%d')
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, bytes):
+        return obj.decode('utf-8', errors='replace')
+    return str(obj)
+
+
+def _dumps(value: Any) -> bytes:
+    """规范化JSON序列化，保证相同内容得到相同哈希"""
+    return json.dumps(
+        value, ensure_ascii=False, sort_keys=True,
+        separators=(',', ':'), default=_json_default
+    ).encode('utf-8')
+
+
+class LocalBlobBackend:
+    """本地文件系统Blob存储"""
+
+    def __init__(self, root_dir: str):
+        self.root_dir = root_dir
+        os.makedirs(self.root_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        # 按哈希前缀分目录，避免单目录文件过多
+        return os.path.join(self.root_dir, key[:2], key[2:4], key)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def put(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 先写临时文件再原子替换，避免并发写入读到半个文件
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+
+class MinioBlobBackend:
+    """MinIO/S3兼容对象存储"""
+
+    def __init__(self, endpoint: str, access_key: str, secret_key: str,
+                 bucket: str, secure: bool = False):
+        try:
+            from minio import Minio
+        except ImportError:
+            raise RuntimeError("使用MinIO存储需要安装minio依赖")
+        self.client = Minio(endpoint, access_key=access_key, secret_key=secret_key, secure=secure)
+        self.bucket = bucket
+        if not self.client.bucket_exists(bucket):
+            self.client.make_bucket(bucket)
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.stat_object(self.bucket, key)
+            return True
+        except Exception:
+            return False
+
+    def put(self, key: str, data: bytes) -> None:
+        import io
+        if self.exists(key):
+            return
+        self.client.put_object(self.bucket, key, io.BytesIO(data), length=len(data))
+
+    def get(self, key: str) -> Optional[bytes]:
+        response = None
+        try:
+            response = self.client.get_object(self.bucket, key)
+            return response.read()
+        except Exception:
+            return None
+        finally:
+            if response is not None:
+                response.close()
+                response.release_conn()
+
+
+class ResultStore:
+    """
+    内容寻址的查询结果存储
+
+    结果按页切分，每页压缩后以其SHA-256为键写入一次；
+    清单（manifest）记录列信息、总行数和各页哈希，清单哈希即对外引用。
+    相同结果重复执行只会写入一次，重开会话时按页懒加载。
+    """
+
+    def __init__(self, backend, page_size: int = 500, compress_level: int = 6):
+        self.backend = backend
+        self.page_size = page_size
+        self.compress_level = compress_level
+
+    def _put_blob(self, payload: bytes) -> str:
+        key = hashlib.sha256(payload).hexdigest()
+        if not self.backend.exists(key):
+            self.backend.put(key, gzip.compress(payload, compresslevel=self.compress_level))
+        return key
+
+    def _get_blob(self, key: str) -> Optional[Any]:
+        data = self.backend.get(key)
+        if data is None:
+            return None
+        return json.loads(gzip.decompress(data).decode('utf-8'))
+
+    def put_result(self, records: List[Dict[str, Any]], columns: Optional[List[str]] = None) -> str:
+        """
+        存储查询结果
+
+        Args:
+            records: 结果记录列表
+            columns: 列名列表
+
+        Returns:
+            str: 结果引用（清单哈希）
+        """
+        if columns is None:
+            columns = list(records[0].keys()) if records else []
+        pages = []
+        for start in range(0, len(records), self.page_size):
+            pages.append(self._put_blob(_dumps(records[start:start + self.page_size])))
+        manifest = {
+            'columns': list(columns),
+            'row_count': len(records),
+            'page_size': self.page_size,
+            'pages': pages
+        }
+        return self._put_blob(_dumps(manifest))
+
+    def get_manifest(self, result_ref: str) -> Optional[Dict[str, Any]]:
+        """获取结果清单"""
+        manifest = self._get_blob(result_ref)
+        if not isinstance(manifest, dict) or 'pages' not in manifest:
+            return None
+        return manifest
+
+    def get_page(self, result_ref: str, page: int = 1) -> Optional[Dict[str, Any]]:
+        """
+        按页读取结果
+
+        Args:
+            result_ref: 结果引用
+            page: 页码（从1开始）
+
+        Returns:
+            Optional[Dict[str, Any]]: 分页数据，引用不存在时返回None
+        """
+        manifest = self.get_manifest(result_ref)
+        if manifest is None:
+            return None
+        total_pages = len(manifest['pages'])
+        records = []
+        if 1 <= page <= total_pages:
+            records = self._get_blob(manifest['pages'][page - 1]) or []
+        return {
+            'records': records,
+            'columns': manifest['columns'],
+            'row_count': manifest['row_count'],
+            'page': page,
+            'page_size': manifest['page_size'],
+            'total_pages': total_pages
+        }
+
+    def build_message_result(self, records: List[Dict[str, Any]], columns: Optional[List[str]] = None,
+                             threshold: int = 200, preview_rows: int = 20) -> Any:
+        """
+        生成写入消息表的query_result
+
+        小结果原样返回；超过阈值的结果写入存储，只返回预览和引用
+        """
+        if len(records) <= threshold:
+            return records
+        result_ref = self.put_result(records, columns)
+        return {
+            'result_ref': result_ref,
+            'preview': json.loads(_dumps(records[:preview_rows])),
+            'columns': list(columns) if columns is not None else list(records[0].keys()),
+            'row_count': len(records),
+            'truncated': True
+        }
+
+
+# 单例模式
+_result_store = None
+
+def get_result_store() -> ResultStore:
+    """获取查询结果存储实例"""
+    global _result_store
+    if _result_store is None:
+        if Config.RESULT_STORE_BACKEND == 'minio':
+            backend = MinioBlobBackend(
+                Config.MINIO_ENDPOINT,
+                Config.MINIO_ACCESS_KEY,
+                Config.MINIO_SECRET_KEY,
+                Config.MINIO_BUCKET,
+                Config.MINIO_SECURE
+            )
+        else:
+            backend = LocalBlobBackend(Config.RESULT_STORE_DIR)
+        _result_store = ResultStore(backend, page_size=Config.RESULT_STORE_PAGE_SIZE)
+        logger.info(f"查询结果存储初始化成功: {Config.RESULT_STORE_BACKEND}")
+    return _result_store
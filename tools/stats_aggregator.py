@@ -0,0 +1,378 @@
+# -*- coding: utf-8 -*-
+"""
+SQL生成统计聚合模块
+在进程内按日期聚合请求计数、置信度和耗时分布，定期批量合并到sql_generation_stats表，
+避免每个请求都更新同一行造成热点行锁
+"""
+import atexit
+import json
+import logging
+import math
+import threading
+from datetime import date
+from typing import Optional, Dict, Any, List, Callable
+from sqlalchemy import text
+from config.base_config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyHistogram:
+    """
+    HDR风格的对数-线性直方图
+
+    每个2的幂区间再线性切分为sub_buckets个子桶，相对误差约为1/sub_buckets，
+    记录为O(1)，可与其他直方图按桶相加合并
+    """
+
+    def __init__(self, sub_buckets: int = 32, counts: Optional[Dict[int, int]] = None):
+        self.sub_buckets = sub_buckets
+        self.counts: Dict[int, int] = dict(counts or {})
+        self.total = sum(self.counts.values())
+
+    def _index(self, value: float) -> int:
+        value = max(int(value), 0)
+        if value < self.sub_buckets:
+            return value
+        exponent = value.bit_length() - 1
+        shift = exponent - int(math.log2(self.sub_buckets))
+        return (shift + 1) * self.sub_buckets + ((value >> shift) - self.sub_buckets)
+
+    def _value_at(self, index: int) -> int:
+        """桶对应的代表值（桶上界）"""
+        if index < self.sub_buckets:
+            return index
+        shift = index // self.sub_buckets - 1
+        sub = index % self.sub_buckets
+        return ((self.sub_buckets + sub + 1) << shift) - 1
+
+    def record(self, value: float, count: int = 1) -> None:
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.total += count
+
+    def merge(self, other: 'LatencyHistogram') -> None:
+        # 先复制再遍历，避免与写入线程并发修改冲突
+        for index, count in list(other.counts.items()):
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total += other.total
+
+    def percentile(self, p: float) -> int:
+        """返回第p百分位的值（p取0-100）"""
+        if self.total == 0:
+            return 0
+        threshold = max(1, math.ceil(self.total * p / 100.0))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= threshold:
+                return self._value_at(index)
+        return self._value_at(max(self.counts))
+
+    def to_json(self) -> str:
+        return json.dumps({str(k): v for k, v in self.counts.items()})
+
+    @classmethod
+    def from_json(cls, raw: Optional[str], sub_buckets: int = 32) -> 'LatencyHistogram':
+        if not raw:
+            return cls(sub_buckets)
+        data = json.loads(raw) if isinstance(raw, str) else raw
+        return cls(sub_buckets, {int(k): int(v) for k, v in data.items()})
+
+
+class DailyCounters:
+    """单日的累加器"""
+
+    __slots__ = ('total', 'success', 'failed', 'confidence_sum', 'time_sum', 'time_sq_sum', 'histogram',
+                 'first_token_histogram')
+
+    def __init__(self):
+        self.total = 0
+        self.success = 0
+        self.failed = 0
+        self.confidence_sum = 0.0
+        self.time_sum = 0
+        self.time_sq_sum = 0
+        self.histogram = LatencyHistogram()
+        self.first_token_histogram = LatencyHistogram()  # 流式生成的首个token耗时
+
+    def merge(self, other: 'DailyCounters') -> None:
+        self.total += other.total
+        self.success += other.success
+        self.failed += other.failed
+        self.confidence_sum += other.confidence_sum
+        self.time_sum += other.time_sum
+        self.time_sq_sum += other.time_sq_sum
+        self.histogram.merge(other.histogram)
+        self.first_token_histogram.merge(other.first_token_histogram)
+
+
+class _Shard:
+    """计数分片，由哈希到该分片的线程共用，读写都持有分片自己的锁"""
+
+    __slots__ = ('buckets', 'lock')
+
+    def __init__(self):
+        self.buckets: Dict[date, DailyCounters] = {}
+        self.lock = threading.Lock()
+
+
+class SqlStatsAggregator:
+    """
+    SQL生成统计聚合器
+
+    热路径按线程标识哈希到固定数量的分片，各分片独立加锁，线程间基本不竞争。
+    分片数量固定，gevent下每个greenlet都有独立的线程标识也不会让分片无限增长；
+    刷盘时在分片锁内把字典整体换成新字典，锁外合并。
+    """
+
+    def __init__(self, engine_provider: Callable[[], Any], flush_interval: float = 5.0, shards: int = 31):
+        """
+        Args:
+            engine_provider: 返回SQLAlchemy引擎的函数
+            flush_interval: 刷盘间隔（秒）
+            shards: 分片数量，线程标识通常是按固定字节对齐的地址，取质数分布更均匀
+        """
+        self.engine_provider = engine_provider
+        self.flush_interval = flush_interval
+        self._shards: List[_Shard] = [_Shard() for _ in range(shards)]
+        self._pending: Dict[date, DailyCounters] = {}
+        self._flush_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _shard(self) -> _Shard:
+        return self._shards[threading.get_ident() % len(self._shards)]
+
+    def record(self, success: bool, execution_time: int, confidence: Optional[float] = None,
+               date_key: Optional[date] = None, first_token_time: Optional[int] = None) -> None:
+        """
+        记录一次SQL生成请求
+
+        Args:
+            success: 是否成功
+            execution_time: 耗时（毫秒）
+            confidence: 置信度
+            date_key: 统计日期，默认当天
+            first_token_time: 流式生成时首个token的耗时（毫秒）
+        """
+        date_key = date_key or date.today()
+        execution_time = int(execution_time or 0)
+        shard = self._shard()
+        with shard.lock:
+            counters = shard.buckets.get(date_key)
+            if counters is None:
+                counters = shard.buckets[date_key] = DailyCounters()
+            counters.total += 1
+            if success:
+                counters.success += 1
+            else:
+                counters.failed += 1
+            counters.confidence_sum += float(confidence or 0)
+            counters.time_sum += execution_time
+            counters.time_sq_sum += execution_time * execution_time
+            counters.histogram.record(execution_time)
+            if first_token_time is not None:
+                counters.first_token_histogram.record(first_token_time)
+
+    def _collect(self) -> Dict[date, DailyCounters]:
+        """换下全部分片的数据并合并"""
+        collected: Dict[date, DailyCounters] = {}
+        for shard in self._shards:
+            with shard.lock:
+                old, shard.buckets = shard.buckets, {}
+            for date_key, counters in old.items():
+                collected.setdefault(date_key, DailyCounters()).merge(counters)
+        return collected
+
+    def snapshot(self, date_key: Optional[date] = None) -> DailyCounters:
+        """读取进程内尚未落库的数据（只读，不影响刷盘）"""
+        date_key = date_key or date.today()
+        result = DailyCounters()
+        counters = self._pending.get(date_key)
+        if counters is not None:
+            result.merge(counters)
+        for shard in self._shards:
+            with shard.lock:
+                counters = shard.buckets.get(date_key)
+                if counters is not None:
+                    result.merge(counters)
+        return result
+
+    def flush(self, drain: bool = False) -> int:
+        """
+        合并数据并写入数据库
+
+        Args:
+            drain: 停止时传入True；分片加锁后换出即包含全部已完成的写入，与普通刷盘处理相同
+
+        Returns:
+            int: 写入的日期行数
+        """
+        with self._flush_lock:
+            for date_key, counters in self._collect().items():
+                self._pending.setdefault(date_key, DailyCounters()).merge(counters)
+            if not self._pending:
+                return 0
+            try:
+                with self.engine_provider().begin() as conn:
+                    for date_key, counters in self._pending.items():
+                        self._upsert(conn, date_key, counters)
+                flushed = len(self._pending)
+                self._pending = {}
+                return flushed
+            except Exception as e:
+                # 保留在内存中，下个周期重试
+                logger.error(f"SQL生成统计写入失败: {str(e)}")
+                return 0
+
+    def _upsert(self, conn, date_key: date, counters: DailyCounters) -> None:
+        row = conn.execute(text("""
+            SELECT latency_histogram, first_token_histogram FROM sql_generation_stats
+            WHERE date_key = :date_key FOR UPDATE
+        """), {'date_key': date_key}).fetchone()
+        histogram = LatencyHistogram.from_json(row.latency_histogram if row else None)
+        histogram.merge(counters.histogram)
+        first_token = LatencyHistogram.from_json(row.first_token_histogram if row else None)
+        first_token.merge(counters.first_token_histogram)
+
+        # ON DUPLICATE KEY UPDATE按书写顺序求值，平均值须在累计数更新前计算
+        conn.execute(text("""
+            INSERT INTO sql_generation_stats (
+                date_key, total_requests, successful_requests, failed_requests,
+                avg_confidence, avg_execution_time, execution_time_sum, execution_time_sq_sum,
+                latency_histogram, p50_execution_time, p95_execution_time, p99_execution_time,
+                first_token_histogram, p50_first_token_time, p95_first_token_time
+            ) VALUES (
+                :date_key, :total, :success, :failed,
+                :avg_confidence, :avg_execution_time, :time_sum, :time_sq_sum,
+                :histogram, :p50, :p95, :p99,
+                :first_token_histogram, :first_token_p50, :first_token_p95
+            ) ON DUPLICATE KEY UPDATE
+                avg_confidence = (avg_confidence * total_requests + :confidence_sum) / (total_requests + :total),
+                avg_execution_time = (execution_time_sum + :time_sum) / (total_requests + :total),
+                total_requests = total_requests + :total,
+                successful_requests = successful_requests + :success,
+                failed_requests = failed_requests + :failed,
+                execution_time_sum = execution_time_sum + :time_sum,
+                execution_time_sq_sum = execution_time_sq_sum + :time_sq_sum,
+                latency_histogram = :histogram,
+                p50_execution_time = :p50,
+                p95_execution_time = :p95,
+                p99_execution_time = :p99,
+                first_token_histogram = :first_token_histogram,
+                p50_first_token_time = :first_token_p50,
+                p95_first_token_time = :first_token_p95
+        """), {
+            'date_key': date_key,
+            'total': counters.total,
+            'success': counters.success,
+            'failed': counters.failed,
+            'confidence_sum': counters.confidence_sum,
+            'avg_confidence': counters.confidence_sum / counters.total if counters.total else 0,
+            'avg_execution_time': counters.time_sum // counters.total if counters.total else 0,
+            'time_sum': counters.time_sum,
+            'time_sq_sum': counters.time_sq_sum,
+            'histogram': histogram.to_json(),
+            'p50': histogram.percentile(50),
+            'p95': histogram.percentile(95),
+            'p99': histogram.percentile(99),
+            'first_token_histogram': first_token.to_json(),
+            'first_token_p50': first_token.percentile(50),
+            'first_token_p95': first_token.percentile(95)
+        })
+
+    def get_stats(self, date_key: Optional[date] = None) -> Dict[str, Any]:
+        """
+        获取某日的统计数据（数据库已落库部分 + 进程内未落库部分）
+
+        Returns:
+            Dict[str, Any]: 计数、平均值、标准差、p50/p95/p99耗时及流式生成的首个token耗时
+        """
+        date_key = date_key or date.today()
+        with self.engine_provider().connect() as conn:
+            row = conn.execute(text("""
+                SELECT total_requests, successful_requests, failed_requests, avg_confidence,
+                       execution_time_sum, execution_time_sq_sum, latency_histogram, first_token_histogram
+                FROM sql_generation_stats WHERE date_key = :date_key
+            """), {'date_key': date_key}).fetchone()
+
+        counters = DailyCounters()
+        if row:
+            counters.total = row.total_requests or 0
+            counters.success = row.successful_requests or 0
+            counters.failed = row.failed_requests or 0
+            counters.confidence_sum = float(row.avg_confidence or 0) * counters.total
+            counters.time_sum = row.execution_time_sum or 0
+            counters.time_sq_sum = row.execution_time_sq_sum or 0
+            counters.histogram = LatencyHistogram.from_json(row.latency_histogram)
+            counters.first_token_histogram = LatencyHistogram.from_json(row.first_token_histogram)
+        counters.merge(self.snapshot(date_key))
+        return self.summarize(date_key, counters)
+
+    @staticmethod
+    def summarize(date_key: date, counters: DailyCounters) -> Dict[str, Any]:
+        total = counters.total
+        mean = counters.time_sum / total if total else 0
+        variance = max(counters.time_sq_sum / total - mean * mean, 0) if total else 0
+        return {
+            'date': date_key.isoformat(),
+            'total_requests': total,
+            'successful_requests': counters.success,
+            'failed_requests': counters.failed,
+            'success_rate': round(counters.success / total * 100, 2) if total else 0,
+            'avg_confidence': round(counters.confidence_sum / total, 2) if total else 0,
+            'avg_execution_time': round(mean, 2),
+            'stddev_execution_time': round(math.sqrt(variance), 2),
+            'p50_execution_time': counters.histogram.percentile(50),
+            'p95_execution_time': counters.histogram.percentile(95),
+            'p99_execution_time': counters.histogram.percentile(99),
+            'streamed_requests': counters.first_token_histogram.total,
+            'p50_first_token_time': counters.first_token_histogram.percentile(50),
+            'p95_first_token_time': counters.first_token_histogram.percentile(95)
+        }
+
+    # ================================
+    # 生命周期
+    # ================================
+
+    def start(self) -> None:
+        """启动后台刷盘线程"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='sql-stats-flusher', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """停止后台线程并写出全部数据"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(self.flush_interval + 1)
+            self._thread = None
+        self.flush(drain=True)
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.flush_interval):
+            self.flush()
+
+
+# 单例模式
+_stats_aggregator = None
+_aggregator_lock = threading.Lock()
+
+def get_stats_aggregator() -> SqlStatsAggregator:
+    """获取SQL生成统计聚合器实例（首次调用时启动后台线程）"""
+    global _stats_aggregator
+    if _stats_aggregator is None:
+        with _aggregator_lock:
+            if _stats_aggregator is None:
+                from tools.engine_registry import get_engine
+                aggregator = SqlStatsAggregator(
+                    lambda: get_engine(Config.VANNA_DATABASE_URI, 'background'),
+                    flush_interval=Config.SQL_STATS_FLUSH_INTERVAL
+                )
+                aggregator.start()
+                atexit.register(aggregator.stop)
+                _stats_aggregator = aggregator
+    return _stats_aggregator
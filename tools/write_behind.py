@@ -0,0 +1,391 @@
+# -*- coding: utf-8 -*-
+"""
+异步批量写入模块
+将会话消息、问答历史、审计日志等追加型数据移出请求路径，
+由后台线程按时间或行数合并成多行INSERT写入，数据库不可用时落盘到本地WAL文件
+"""
+import atexit
+import fcntl
+import glob
+import json
+import logging
+import os
+import queue
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Optional, Dict, Any, List, Callable, Tuple
+from sqlalchemy import text, bindparam
+from sqlalchemy.exc import DataError, IntegrityError
+from config.base_config import Config
+
+logger = logging.getLogger(__name__)
+
+# 允许异步写入的表（库别名 -> 表名集合）
+ALLOWED_TABLES = {
+    'vanna': {'text2sql_messages', 'qa_history'},
+    'main': {'operation_audit'},
+}
+
+_IDENTIFIER_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def _check_session_owner(conn, rows: List[Dict[str, Any]]) -> Dict[int, str]:
+    """会话消息只能写入本人未删除的会话，返回不合法行的序号到原因的映射"""
+    session_ids = list({row['session_id'] for row in rows})
+    owners = {r.id: r.user_id for r in conn.execute(text("""
+        SELECT id, user_id FROM text2sql_sessions WHERE id IN :ids AND is_deleted = 0
+    """).bindparams(bindparam('ids', expanding=True)), {'ids': session_ids})}
+    return {i: '会话不存在或不属于该用户' for i, row in enumerate(rows)
+            if owners.get(row['session_id']) != row['user_id']}
+
+# 写入前的批量校验（在刷盘线程中执行，不占用请求路径），不合法的行写入死信文件
+ROW_CHECKS: Dict[Tuple[str, str], Callable[[Any, List[Dict[str, Any]]], Dict[int, str]]] = {
+    ('vanna', 'text2sql_messages'): _check_session_owner,
+}
+
+
+def _json_default(obj):
+    """WAL序列化时处理非JSON原生类型"""
+    if isinstance(obj, datetime):
+        return obj.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(obj, date):
+        return obj.strftime('%Y-%m-%d')
+    if isinstance(obj, Decimal):
+        return float(obj)
+    return str(obj)
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class WriteBehindQueue:
+    """
+    有界的异步批量写入队列
+
+    - 请求线程只做入队，不等待数据库
+    - 后台线程每隔flush_interval_ms或攒够batch_rows行合并写入
+    - 写入失败的批次追加到WAL文件，数据库恢复后优先回放；
+      多个gunicorn worker共用同一个WAL，追加和认领回放文件都持有文件锁
+    - 因数据本身违反约束（外键、类型、长度等）失败的批次逐行重试，
+      仍失败的行写入死信文件（WAL路径加.dead后缀），不阻塞同组的其他行
+    - 进程正常退出时通过atexit刷盘
+    """
+
+    def __init__(self, engine_provider: Callable[[str], Any], max_size: int = 10000,
+                 flush_interval_ms: int = 200, batch_rows: int = 500,
+                 wal_path: Optional[str] = None, enqueue_timeout: float = 0.05):
+        """
+        Args:
+            engine_provider: 根据库别名（main/vanna）返回SQLAlchemy引擎的函数
+            max_size: 队列最大行数
+            flush_interval_ms: 刷盘间隔（毫秒）
+            batch_rows: 单次刷盘最大行数
+            wal_path: WAL文件路径
+            enqueue_timeout: 队列满时入队等待时间（秒），超时后直接写WAL
+        """
+        self.engine_provider = engine_provider
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.batch_rows = batch_rows
+        self.wal_path = wal_path
+        self.dead_letter_path = f"{wal_path}.dead" if wal_path else None
+        self.enqueue_timeout = enqueue_timeout
+        self._queue: queue.Queue = queue.Queue(maxsize=max_size)
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._wal_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {'enqueued': 0, 'written': 0, 'batches': 0, 'spilled': 0, 'replayed': 0,
+                      'dead_lettered': 0}
+
+    # ================================
+    # 生命周期
+    # ================================
+
+    def start(self) -> None:
+        """启动后台刷盘线程"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='write-behind-flusher', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+        logger.info("异步批量写入队列已启动")
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """停止后台线程并写完队列中剩余数据"""
+        if self._thread is None:
+            return
+        self._stopped.set()
+        self._wakeup.set()
+        self._thread.join(timeout)
+        self._thread = None
+        # 线程退出后再兜底刷一次，保证队列为空
+        self.flush()
+        logger.info(f"异步批量写入队列已停止: {self.stats}")
+
+    # ================================
+    # 入队与刷盘
+    # ================================
+
+    def submit(self, database: str, table: str, row: Dict[str, Any]) -> None:
+        """
+        提交一行待写入数据
+
+        Args:
+            database: 库别名（main/vanna）
+            table: 表名，必须在ALLOWED_TABLES中
+            row: 列名到值的映射
+        """
+        if table not in ALLOWED_TABLES.get(database, set()):
+            raise ValueError(f"不支持异步写入的表: {database}.{table}")
+        for column in row:
+            if not _IDENTIFIER_RE.match(column):
+                raise ValueError(f"非法列名: {column}")
+
+        item = (database, table, row)
+        try:
+            self._queue.put(item, timeout=self.enqueue_timeout)
+        except queue.Full:
+            # 队列已满说明数据库写入跟不上，直接落盘避免阻塞请求
+            logger.warning(f"异步写入队列已满，写入WAL: {database}.{table}")
+            self._spill([item])
+            return
+        self.stats['enqueued'] += 1
+        if self._queue.qsize() >= self.batch_rows:
+            self._wakeup.set()
+
+    def flush(self) -> int:
+        """立即写出队列中的全部数据，返回写入行数"""
+        written = 0
+        with self._flush_lock:
+            self._replay_wal()
+            while True:
+                batch = self._drain(self.batch_rows)
+                if not batch:
+                    break
+                written += self._write_batch(batch)
+        return written
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"异步批量写入失败: {str(e)}")
+
+    def _drain(self, limit: int) -> List[Tuple[str, str, Dict[str, Any]]]:
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_batch(self, batch: List[Tuple[str, str, Dict[str, Any]]]) -> int:
+        """按（库, 表, 列集合）分组后逐组执行多行INSERT，失败的组写入WAL，违反约束的组逐行重试"""
+        groups: Dict[Tuple[str, str, Tuple[str, ...]], List[Dict[str, Any]]] = OrderedDict()
+        for database, table, row in batch:
+            groups.setdefault((database, table, tuple(row.keys())), []).append(row)
+
+        written = 0
+        for (database, table, columns), rows in groups.items():
+            try:
+                rows = self._check_rows(database, table, rows)
+                if not rows:
+                    continue
+                self._insert_rows(database, table, columns, rows)
+                written += len(rows)
+                self.stats['batches'] += 1
+            except (IntegrityError, DataError) as e:
+                logger.warning(f"批量写入{database}.{table}违反约束，逐行重试{len(rows)}行: {str(e)}")
+                written += self._write_rows(database, table, columns, rows)
+            except Exception as e:
+                logger.error(f"批量写入{database}.{table}失败，{len(rows)}行写入WAL: {str(e)}")
+                self._spill([(database, table, row) for row in rows])
+        self.stats['written'] += written
+        return written
+
+    def _check_rows(self, database: str, table: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """执行表的写入前校验，不合法的行写入死信文件，返回其余行"""
+        check = ROW_CHECKS.get((database, table))
+        if check is None:
+            return rows
+        with self.engine_provider(database).connect() as conn:
+            rejected = check(conn, rows)
+        if rejected:
+            logger.error(f"{database}.{table}有{len(rejected)}行未通过写入前校验，写入死信文件")
+            self._dead_letter([{'database': database, 'table': table, 'row': row, 'error': rejected[i]}
+                               for i, row in enumerate(rows) if i in rejected])
+        return [row for i, row in enumerate(rows) if i not in rejected]
+
+    def _write_rows(self, database: str, table: str, columns: Tuple[str, ...],
+                    rows: List[Dict[str, Any]]) -> int:
+        """逐行写入：违反约束的行写入死信文件，其他失败（如数据库不可用）写入WAL"""
+        written = 0
+        dead, spill = [], []
+        for row in rows:
+            try:
+                self._insert_rows(database, table, columns, [row])
+                written += 1
+            except (IntegrityError, DataError) as e:
+                dead.append({'database': database, 'table': table, 'row': row, 'error': str(e.orig or e)})
+            except Exception as e:
+                logger.error(f"逐行写入{database}.{table}失败，写入WAL: {str(e)}")
+                spill.append((database, table, row))
+        if written:
+            self.stats['batches'] += 1
+        if spill:
+            self._spill(spill)
+        if dead:
+            logger.error(f"{database}.{table}有{len(dead)}行违反约束，写入死信文件")
+            self._dead_letter(dead)
+        return written
+
+    def _insert_rows(self, database: str, table: str, columns: Tuple[str, ...],
+                     rows: List[Dict[str, Any]]) -> None:
+        values_sql = []
+        params = {}
+        for i, row in enumerate(rows):
+            placeholders = []
+            for j, column in enumerate(columns):
+                key = f"p{i}_{j}"
+                placeholders.append(f":{key}")
+                params[key] = row[column]
+            values_sql.append(f"({', '.join(placeholders)})")
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES {', '.join(values_sql)}"
+        with self.engine_provider(database).begin() as conn:
+            conn.execute(text(sql), params)
+
+    # ================================
+    # WAL
+    # ================================
+
+    def _spill(self, items: List[Tuple[str, str, Dict[str, Any]]]) -> None:
+        if not self.wal_path:
+            logger.error(f"未配置WAL文件，丢弃{len(items)}行数据")
+            return
+        with self._file_lock():
+            self._append_lines(self.wal_path, [{'database': database, 'table': table, 'row': row}
+                                               for database, table, row in items])
+        self.stats['spilled'] += len(items)
+
+    @contextmanager
+    def _file_lock(self):
+        """进程内线程锁 + 跨进程文件锁，保护WAL和死信文件的追加及WAL改名"""
+        with self._wal_lock:
+            os.makedirs(os.path.dirname(self.wal_path), exist_ok=True)
+            with open(f"{self.wal_path}.lock", 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _append_lines(self, path: str, entries: List[Dict[str, Any]]) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False, default=_json_default))
+                f.write('\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _dead_letter(self, entries: List[Dict[str, Any]]) -> None:
+        if not self.dead_letter_path:
+            logger.error(f"未配置WAL文件，丢弃{len(entries)}行违反约束的数据")
+            return
+        with self._file_lock():
+            self._append_lines(self.dead_letter_path, entries)
+        self.stats['dead_lettered'] += len(entries)
+
+    def _claim_replay(self) -> Optional[str]:
+        """
+        在文件锁内认领一个待回放文件：改名为本进程的.replay.<pid>，其他进程不会再回放它
+
+        优先认领本进程或已退出进程遗留的回放文件（含旧版本的.replay），没有时认领当前WAL
+        """
+        replay_prefix = f"{self.wal_path}.replay"
+        claim = f"{replay_prefix}.{os.getpid()}"
+        with self._file_lock():
+            if os.path.exists(claim):
+                return claim
+            for path in sorted(glob.glob(f"{glob.escape(replay_prefix)}*")):
+                suffix = path[len(replay_prefix):]
+                if suffix == '' or (suffix[1:].isdigit() and not _pid_alive(int(suffix[1:]))):
+                    os.replace(path, claim)
+                    return claim
+            if os.path.exists(self.wal_path) and os.path.getsize(self.wal_path) > 0:
+                os.replace(self.wal_path, claim)
+                return claim
+        return None
+
+    def _replay_wal(self) -> None:
+        """
+        回放WAL中积压的数据，仍失败的行会重新写回WAL
+
+        WAL先改名为本进程的回放文件再回放，全部处理完才删除；
+        进程在回放中途退出时，下次刷盘（包括其他进程或重启后的首次刷盘）认领并回放遗留的回放文件
+        """
+        if not self.wal_path:
+            return
+        replay_path = self._claim_replay()
+        if replay_path is None:
+            return
+
+        items = []
+        with open(replay_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                    items.append((entry['database'], entry['table'], entry['row']))
+                except (json.JSONDecodeError, KeyError):
+                    logger.error(f"WAL记录损坏，已跳过: {line[:200]}")
+
+        # 写入失败的行由_write_batch追加到新的WAL或死信文件，此时才可以删除回放文件
+        for start in range(0, len(items), self.batch_rows):
+            self.stats['replayed'] += self._write_batch(items[start:start + self.batch_rows])
+        os.remove(replay_path)
+
+
+# 单例模式
+_write_behind_queue = None
+_queue_lock = threading.Lock()
+
+def _default_engine_provider(database: str):
+    from tools.engine_registry import get_engine
+    url = Config.VANNA_DATABASE_URI if database == 'vanna' else Config.SQLALCHEMY_DATABASE_URI
+    return get_engine(url, 'background')
+
+def get_write_behind_queue() -> WriteBehindQueue:
+    """获取异步批量写入队列实例（首次调用时启动后台线程）"""
+    global _write_behind_queue
+    if _write_behind_queue is None:
+        with _queue_lock:
+            if _write_behind_queue is None:
+                write_queue = WriteBehindQueue(
+                    _default_engine_provider,
+                    max_size=Config.WRITE_BEHIND_MAX_QUEUE,
+                    flush_interval_ms=Config.WRITE_BEHIND_FLUSH_INTERVAL_MS,
+                    batch_rows=Config.WRITE_BEHIND_BATCH_ROWS,
+                    wal_path=Config.WRITE_BEHIND_WAL_PATH
+                )
+                write_queue.start()
+                _write_behind_queue = write_queue
+    return _write_behind_queue
@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+"""
+WSGI入口
+供gunicorn等WSGI服务器加载: gunicorn -c gunicorn.conf.py wsgi:app
+"""
+import os
+from app import create_app
+
+app = create_app(os.environ.get('FLASK_CONFIG', 'default'))